@@ -1,348 +1,403 @@
 import datetime
 import os
 import logging
-from flask import Flask, jsonify, send_from_directory, request
+import threading
+from flask import Flask, jsonify, request
 from extensions import db, migrate, jwt, mail, limiter
+from utils.challenges import init_challenge_store
+from utils.logging_config import configure_logging, init_request_logging
+from utils.search import init_search
+from utils.occupancy import init_occupancy
+from utils.availability import init_availability
+from utils.storage import init_storage, get_storage, storage_key
+from utils.celery_app import init_celery
+from utils.startup import StartupProfile
 from config import Config
 from dotenv import load_dotenv
 from pathlib import Path
-from flask_swagger_ui import get_swaggerui_blueprint
-from flask_caching import Cache
-from flask_cors import CORS
-from celery import Celery
-from models.refresh_tokens import RefreshToken
-import firebase_admin
-from firebase_admin import credentials, messaging
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 # Load biến môi trường từ file .env
 dotenv_path = Path(__file__).resolve().parent / '.env'
 load_dotenv(dotenv_path)
 
-# Khởi tạo Firebase Admin SDK
-cred = credentials.Certificate('firebase-adminsdk.json')
-firebase_admin.initialize_app(cred)
-
-# Khởi tạo ứng dụng Flask
-app = Flask(__name__)
-
-# Cấu hình logging với mã hóa UTF-8
-logging.basicConfig(
-    filename='app.log',
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s: %(message)s',
-    encoding='utf-8'
-)
+logger = logging.getLogger(__name__)
 
-# Cấu hình CORS
-CORS(app, resources={r"/api/*": {
-    "origins": "*",
-    "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    "allow_headers": ["Content-Type", "Authorization", "Range"],
-    "expose_headers": ["Content-Range", "Accept-Ranges"],
-    "supports_credentials": False,
-}})
-
-# Cấu hình ứng dụng trước khi khởi tạo các extension
-app.config.from_object(Config())
-app.config['RATELIMIT_STORAGE_URI'] = app.config['REDIS_STORAGE_URI']
-app.config['RATELIMIT_DEFAULT_LIMITS'] = app.config['RATE_LIMIT_DEFAULT']
-
-# Khởi tạo Celery
-celery = Celery(app.name, broker=app.config['REDIS_STORAGE_URI'])
-
-# Cấu hình Swagger UI
-SWAGGER_URL = '/docs'
-API_URL = '/static/swagger.json'
-swaggerui_blueprint = get_swaggerui_blueprint(
-    SWAGGER_URL,
-    API_URL,
-    config={'app_name': "Dormitory API"}
+# Thư mục upload: (khóa config = biến môi trường, thư mục con mặc định trong UPLOAD_BASE).
+# Không tạo thư mục lúc khởi động; LocalStorage tạo khi ghi file.
+UPLOAD_FOLDERS = (
+    ('REPORT_IMAGES_FOLDER', 'report_images'),
+    ('NOTIFICATION_MEDIA_BASE', 'notification_media'),
+    ('ROOM_IMAGES_BASE', 'roomimage'),
+    ('AVATAR_UPLOAD_FOLDER', 'avatars'),
+    ('TRASH_BASE', 'trash'),
 )
 
-# Thêm cấu hình upload
-app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
-app.config['MAX_FILE_SIZE'] = 5 * 1024 * 1024  # 5MB
-
-# Cấu hình Flask-Caching
-cache = Cache(config={'CACHE_TYPE': 'redis', 'CACHE_REDIS_URL': app.config['REDIS_CACHE_URI']})
-cache.init_app(app)
 
-# Khởi tạo extensions
-db.init_app(app)
-migrate.init_app(app, db)
-jwt.init_app(app)
-mail.init_app(app)
-limiter.init_app(app)
-
-app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
-logger = logging.getLogger(__name__)
-
-# Kiểm tra JWT_SECRET_KEY
-if app.config.get('JWT_SECRET_KEY') == 'your_jwt_secret_key_here':
-    logger.warning("JWT_SECRET_KEY đang sử dụng giá trị mặc định, điều này không an toàn trong môi trường production!")
-
-print("DB URI:", app.config.get('SQLALCHEMY_DATABASE_URI'))
-
-# Cấu hình thư mục upload gốc
-UPLOAD_BASE = os.getenv('UPLOAD_BASE', os.path.join(app.root_path, 'Uploads')).strip()
-os.makedirs(UPLOAD_BASE, exist_ok=True)
-app.config['UPLOAD_BASE'] = UPLOAD_BASE
-logger.info("UPLOAD_BASE: %s", UPLOAD_BASE)
-
-# Thư mục cho report_images
-REPORT_IMAGES_FOLDER = os.getenv('REPORT_IMAGES_FOLDER', os.path.join(UPLOAD_BASE, 'report_images')).strip()
-os.makedirs(REPORT_IMAGES_FOLDER, exist_ok=True)
-app.config['REPORT_IMAGES_FOLDER'] = REPORT_IMAGES_FOLDER
-logger.info("REPORT_IMAGES_FOLDER: %s", REPORT_IMAGES_FOLDER)
-
-# Thư mục cho notification_media
-NOTIFICATION_MEDIA_BASE = os.getenv('NOTIFICATION_MEDIA_BASE', os.path.join(UPLOAD_BASE, 'notification_media')).strip()
-os.makedirs(NOTIFICATION_MEDIA_BASE, exist_ok=True)
-app.config['NOTIFICATION_MEDIA_BASE'] = NOTIFICATION_MEDIA_BASE
-logger.info("NOTIFICATION_MEDIA_BASE: %s", NOTIFICATION_MEDIA_BASE)
-
-# Thư mục gốc cho roomimage
-ROOM_IMAGES_BASE = os.getenv('ROOM_IMAGES_BASE', os.path.join(UPLOAD_BASE, 'roomimage')).strip()
-os.makedirs(ROOM_IMAGES_BASE, exist_ok=True)
-app.config['ROOM_IMAGES_BASE'] = ROOM_IMAGES_BASE
-logger.info("ROOM_IMAGES_BASE: %s", ROOM_IMAGES_BASE)
-
-# Thư mục cho avatars
-AVATAR_UPLOAD_FOLDER = os.getenv('AVATAR_UPLOAD_FOLDER', os.path.join(UPLOAD_BASE, 'avatars')).strip()
-os.makedirs(AVATAR_UPLOAD_FOLDER, exist_ok=True)
-app.config['AVATAR_UPLOAD_FOLDER'] = AVATAR_UPLOAD_FOLDER
-logger.info("AVATAR_UPLOAD_FOLDER: %s", AVATAR_UPLOAD_FOLDER)
-
-# Thư mục rác
-TRASH_BASE = os.getenv('TRASH_BASE', os.path.join(UPLOAD_BASE, 'trash')).strip()
-os.makedirs(TRASH_BASE, exist_ok=True)
-app.config['TRASH_BASE'] = TRASH_BASE
-logger.info("TRASH_BASE: %s", TRASH_BASE)
-
-# Import models
-from models.area import Area
-from models.room import Room
-from models.user import User
-from models.register import Register
-from models.roomimage import RoomImage
-from models.contract import Contract
-from models.report_type import ReportType
-from models.report import Report
-from models.reportimage import ReportImage
-from models.notification_type import NotificationType
-from models.notification import Notification
-from models.notification_recipient import NotificationRecipient
-from models.service import Service
-from models.service_rate import ServiceRate
-from models.monthly_bill import MonthlyBill
-from models.bill_detail import BillDetail
-from models.payment_transaction import PaymentTransaction
-from models.admin import Admin
-from models.token_blacklist import TokenBlacklist
-from models.notification_media import NotificationMedia
-
-# Import controllers
-from controllers.auth_controller import auth_bp
-from controllers.user_controller import user_bp
-from controllers.admin_controller import admin_bp
-from controllers.area_controller import area_bp
-from controllers.room_controller import room_bp
-from controllers.room_image_controller import roomimage_bp
-from controllers.contract_controller import contract_bp
-from controllers.registration_controller import registration_bp
-from controllers.report_controller import report_bp
-from controllers.report_image_controller import report_image_bp
-from controllers.notification_controller import notification_bp
-from controllers.notification_recipient_controller import notification_recipient_bp
-from controllers.service_rate_controller import service_rate_bp
-from controllers.service_controller import service_bp
-from controllers.monthly_bill_controller import monthly_bill_bp
-from controllers.payment_transaction_controller import payment_transaction_bp
-from controllers.report_type_controller import report_type_bp
-from controllers.notification_type_controller import notification_type_bp
-from controllers.notification_media_controller import notification_media_bp
-from controllers.statistics_controller import statistics_bp
-
-# Register blueprints
-app.register_blueprint(auth_bp, url_prefix='/api')
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(admin_bp, url_prefix='/api')
-app.register_blueprint(area_bp, url_prefix='/api')
-app.register_blueprint(room_bp, url_prefix='/api')
-app.register_blueprint(roomimage_bp, url_prefix='/api')
-app.register_blueprint(contract_bp, url_prefix='/api')
-app.register_blueprint(registration_bp, url_prefix='/api')
-app.register_blueprint(report_bp, url_prefix='/api')
-app.register_blueprint(report_image_bp, url_prefix='/api')
-app.register_blueprint(notification_bp, url_prefix='/api')
-app.register_blueprint(service_rate_bp, url_prefix='/api')
-app.register_blueprint(service_bp, url_prefix='/api')
-app.register_blueprint(notification_media_bp, url_prefix='/api')
-app.register_blueprint(notification_recipient_bp, url_prefix='/api')
-app.register_blueprint(monthly_bill_bp, url_prefix='/api')
-app.register_blueprint(payment_transaction_bp, url_prefix='/api')
-app.register_blueprint(report_type_bp, url_prefix='/api')
-app.register_blueprint(notification_type_bp, url_prefix='/api')
-app.register_blueprint(statistics_bp, url_prefix='/api')
-
-# Debug route to list all registered routes
-@app.route('/debug/routes')
-def debug_routes():
-    routes = []
-    for rule in app.url_map.iter_rules():
-        routes.append({
-            'endpoint': rule.endpoint,
-            'methods': list(rule.methods),
-            'rule': rule.rule
-        })
-    logger.info("Registered routes: %s", routes)
-    return jsonify(routes)
-
-# Route phục vụ file tĩnh cho roomimage
-@app.route('/api/roomimage/<path:filename>')
-def serve_room_image(filename):
-    logger.info(f"Serving room image: {filename}")
-    full_path = os.path.join(app.config['ROOM_IMAGES_BASE'], filename)
-    logger.info(f"Full path: {full_path}")
+def _config_value(app, key, default=None):
+    """Giá trị trong ``app.config`` (config truyền vào create_app), rồi biến môi trường, rồi mặc định."""
+    value = app.config.get(key)
+    if value is None:
+        value = os.getenv(key, default)
+    return value
+
+
+def _configure_uploads(app):
+    upload_base = _config_value(app, 'UPLOAD_BASE', os.path.join(app.root_path, 'Uploads')).strip()
+    app.config['UPLOAD_BASE'] = upload_base
+    for config_key, folder in UPLOAD_FOLDERS:
+        app.config[config_key] = _config_value(app, config_key, os.path.join(upload_base, folder)).strip()
+    app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
+    app.config['MAX_FILE_SIZE'] = 5 * 1024 * 1024  # 5MB
+    logger.debug("UPLOAD_BASE: %s", upload_base)
+
+
+def _import_models():
+    from models.area import Area
+    from models.room import Room
+    from models.user import User
+    from models.register import Register
+    from models.roomimage import RoomImage
+    from models.contract import Contract
+    from models.report_type import ReportType
+    from models.report import Report
+    from models.reportimage import ReportImage
+    from models.notification_type import NotificationType
+    from models.notification import Notification
+    from models.notification_recipient import NotificationRecipient
+    from models.service import Service
+    from models.service_rate import ServiceRate
+    from models.monthly_bill import MonthlyBill
+    from models.bill_detail import BillDetail
+    from models.payment_transaction import PaymentTransaction
+    from models.admin import Admin
+    from models.token_blacklist import TokenBlacklist
+    from models.notification_media import NotificationMedia
+    from models.purge_checkpoint import PurgeCheckpoint
+    from models.job_run import JobRun
+    from models.job_watermark import JobWatermark
+    from models.email_outbox import EmailOutbox
+    from models.search_document import SearchDocument
+    from models.payment_event import PaymentEvent, PaymentNotificationTask
+    from models.push_task import PushTask
+    from models.refresh_tokens import RefreshToken
+
+
+def _register_blueprints(app):
+    from controllers.auth_controller import auth_bp
+    from controllers.user_controller import user_bp
+    from controllers.admin_controller import admin_bp
+    from controllers.area_controller import area_bp
+    from controllers.room_controller import room_bp
+    from controllers.room_image_controller import roomimage_bp
+    from controllers.contract_controller import contract_bp
+    from controllers.registration_controller import registration_bp
+    from controllers.report_controller import report_bp
+    from controllers.report_image_controller import report_image_bp
+    from controllers.notification_controller import notification_bp
+    from controllers.notification_recipient_controller import notification_recipient_bp
+    from controllers.service_rate_controller import service_rate_bp
+    from controllers.service_controller import service_bp
+    from controllers.monthly_bill_controller import monthly_bill_bp
+    from controllers.payment_transaction_controller import payment_transaction_bp
+    from controllers.report_type_controller import report_type_bp
+    from controllers.notification_type_controller import notification_type_bp
+    from controllers.notification_media_controller import notification_media_bp
+    from controllers.statistics_controller import statistics_bp
+
+    app.register_blueprint(auth_bp, url_prefix='/api')
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(admin_bp, url_prefix='/api')
+    app.register_blueprint(area_bp, url_prefix='/api')
+    app.register_blueprint(room_bp, url_prefix='/api')
+    app.register_blueprint(roomimage_bp, url_prefix='/api')
+    app.register_blueprint(contract_bp, url_prefix='/api')
+    app.register_blueprint(registration_bp, url_prefix='/api')
+    app.register_blueprint(report_bp, url_prefix='/api')
+    app.register_blueprint(report_image_bp, url_prefix='/api')
+    app.register_blueprint(notification_bp, url_prefix='/api')
+    app.register_blueprint(service_rate_bp, url_prefix='/api')
+    app.register_blueprint(service_bp, url_prefix='/api')
+    app.register_blueprint(notification_media_bp, url_prefix='/api')
+    app.register_blueprint(notification_recipient_bp, url_prefix='/api')
+    app.register_blueprint(monthly_bill_bp, url_prefix='/api')
+    app.register_blueprint(payment_transaction_bp, url_prefix='/api')
+    app.register_blueprint(report_type_bp, url_prefix='/api')
+    app.register_blueprint(notification_type_bp, url_prefix='/api')
+    app.register_blueprint(statistics_bp, url_prefix='/api')
+
+
+def _serve_storage_file(key, not_found_message, inline_video=False):
     try:
-        if not os.path.exists(full_path):
-            logger.error(f"File does not exist: {full_path}")
-            return jsonify({'message': f'Không tìm thấy hình ảnh: {filename}'}), 404
-        logger.info(f"Serving file: {full_path}")
-        return send_from_directory(app.config['ROOM_IMAGES_BASE'], filename)
+        response = get_storage().send(key)
+    except FileNotFoundError:
+        logger.error(f"File does not exist: {key}")
+        return jsonify({'message': not_found_message}), 404
     except Exception as e:
-        logger.error(f"Error serving room image {filename}: {str(e)}")
-        return jsonify({'message': f'Không tìm thấy hình ảnh: {filename}'}), 404
-
-# Route phục vụ file tĩnh cho reportimage
-@app.route('/api/reportimage/<path:filename>')
-def serve_report_image(filename):
-    logger.info(f"Serving report image: {filename}")
-    full_path = os.path.join(app.config['REPORT_IMAGES_FOLDER'], filename)
-    logger.info(f"Full path: {full_path}")
-    try:
-        if not os.path.exists(full_path):
-            logger.error(f"File does not exist: {full_path}")
-            return jsonify({'message': f'Không tìm thấy tệp: {filename}'}), 404
-        logger.info(f"Serving file: {full_path}")
-        response = send_from_directory(app.config['REPORT_IMAGES_FOLDER'], filename)
-        if filename.lower().endswith(('.mp4', '.avi')):
-            response.headers['Content-Disposition'] = 'inline'
-            response.headers['Accept-Ranges'] = 'bytes'
-        return response
-    except Exception as e:
-        logger.error(f"Error serving report image {filename}: {str(e)}")
-        return jsonify({'message': f'Không tìm thấy tệp: {filename}'}), 404
-
-# Route phục vụ file tĩnh cho notification media
-@app.route('/api/notification_media/<path:filename>')
-def serve_noti_image(filename):
-    logger.info(f"Serving notification media: {filename}")
-    full_path = os.path.join(app.config['NOTIFICATION_MEDIA_BASE'], filename)
-    logger.info(f"Full path: {full_path}")
-    try:
-        if not os.path.exists(full_path):
-            logger.error(f"File does not exist: {full_path}")
-            return jsonify({'message': f'Không tìm thấy tệp: {filename}'}), 404
-        logger.info(f"Serving file: {full_path}")
-        response = send_from_directory(app.config['NOTIFICATION_MEDIA_BASE'], filename)
-        if filename.lower().endswith(('.mp4', '.avi')):
-            response.headers['Content-Disposition'] = 'inline'
-            response.headers['Accept-Ranges'] = 'bytes'
-        return response
-    except Exception as e:
-        logger.error(f"Error serving notification media {filename}: {str(e)}")
-        return jsonify({'message': f'Không tìm thấy tệp: {filename}'}), 404
-
-# Route phục vụ file tĩnh cho avatar
-@app.route('/api/avatars/<path:filename>')
-def serve_avatar(filename):
-    logger.info(f"Serving avatar: {filename}")
-    full_path = os.path.join(app.config['AVATAR_UPLOAD_FOLDER'], filename)
-    logger.info(f"Full path: {full_path}")
-    try:
-        if not os.path.exists(full_path):
-            logger.error(f"File does not exist: {full_path}")
-            return jsonify({'message': f'Không tìm thấy ảnh: {filename}'}), 404
-        logger.info(f"Serving file: {full_path}")
-        return send_from_directory(app.config['AVATAR_UPLOAD_FOLDER'], filename)
-    except Exception as e:
-        logger.error(f"Error serving avatar {filename}: {str(e)}")
-        return jsonify({'message': f'Không tìm thấy ảnh: {filename}'}), 404
-
-# Route phục vụ file tĩnh
-@app.route('/Uploads/<path:filename>')
-def uploaded_file(filename):
-    return send_from_directory(UPLOAD_BASE, filename)
-
-# Log tất cả các yêu cầu
-@app.before_request
-def log_request():
-    logger.info(f"Before request: method={request.method}, url={request.url}, headers={request.headers}")
-    if request.method == 'OPTIONS':
-        logger.info("Handling OPTIONS preflight request")
-        return '', 200
-
-# Error handlers
-@app.errorhandler(404)
-def not_found(error):
-    logger.error("404 Error: %s", str(error))
-    return jsonify({'message': 'Resource not found'}), 404
-
-@app.errorhandler(500)
-def internal_error(error):
-    db.session.rollback()
-    logger.error("500 Error: %s", str(error))
-    return jsonify({'message': 'Internal server error'}), 500
-
-@app.errorhandler(401)
-def unauthorized(error):
-    logger.error("401 Error: %s", str(error))
-    return jsonify({'message': 'Unauthorized'}), 401
-
-@app.errorhandler(403)
-def forbidden(error):
-    logger.error("403 Error: %s", str(error))
-    return jsonify({'message': 'Forbidden'}), 403
-
-from scheduler import init_scheduler
-init_scheduler(db)
-
-@jwt.token_in_blocklist_loader
-def check_if_token_revoked(jwt_header, jwt_payload):
-    try:
-        jti = jwt_payload['jti']
-        token_type = jwt_payload.get('type')  # 'access' or 'refresh'
-
-        if token_type == 'access':
-            from models.token_blacklist import TokenBlacklist
-            token = TokenBlacklist.query.filter_by(jti=jti).first()
-            if token:
-                logger.debug("Access token %s đã bị vô hiệu hóa", jti)
-                return True
-            logger.debug("Access token %s không có trong danh sách đen", jti)
-
-        if token_type == 'refresh':
-            refresh_token = RefreshToken.query.filter_by(jti=jti).first()
-            if refresh_token:
-                if refresh_token.revoked_at or refresh_token.expires_at < datetime.datetime.now(datetime.timezone.utc):
-                    logger.debug("Refresh token %s đã bị thu hồi hoặc hết hạn", jti)
+        logger.error(f"Error serving {key}: {str(e)}")
+        return jsonify({'message': not_found_message}), 404
+    if inline_video and key.lower().endswith(('.mp4', '.avi')):
+        response.headers['Content-Disposition'] = 'inline'
+        response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _register_routes(app):
+    # Debug route to list all registered routes
+    @app.route('/debug/routes')
+    def debug_routes():
+        routes = []
+        for rule in app.url_map.iter_rules():
+            routes.append({
+                'endpoint': rule.endpoint,
+                'methods': list(rule.methods),
+                'rule': rule.rule
+            })
+        logger.info("Registered routes: %s", routes)
+        return jsonify(routes)
+
+    # Route phục vụ file tĩnh cho roomimage
+    @app.route('/api/roomimage/<path:filename>')
+    def serve_room_image(filename):
+        return _serve_storage_file(storage_key('roomimage', filename), f'Không tìm thấy hình ảnh: {filename}')
+
+    # Route phục vụ file tĩnh cho reportimage
+    @app.route('/api/reportimage/<path:filename>')
+    def serve_report_image(filename):
+        return _serve_storage_file(storage_key('report_images', filename), f'Không tìm thấy tệp: {filename}', inline_video=True)
+
+    # Route phục vụ file tĩnh cho notification media
+    @app.route('/api/notification_media/<path:filename>')
+    def serve_noti_image(filename):
+        return _serve_storage_file(storage_key('notification_media', filename), f'Không tìm thấy tệp: {filename}', inline_video=True)
+
+    # Route phục vụ file tĩnh cho avatar
+    @app.route('/api/avatars/<path:filename>')
+    def serve_avatar(filename):
+        return _serve_storage_file(storage_key('avatars', filename), f'Không tìm thấy ảnh: {filename}')
+
+    # Route phục vụ file qua URL đã ký (driver local)
+    @app.route('/api/storage/<path:key>')
+    def serve_signed_storage(key):
+        storage = get_storage()
+        if not hasattr(storage, 'verify_signature') or not storage.verify_signature(
+                key, request.args.get('expires'), request.args.get('signature')):
+            return jsonify({'message': 'URL không hợp lệ hoặc đã hết hạn'}), 403
+        return _serve_storage_file(key, 'Không tìm thấy tệp', inline_video=True)
+
+    # Route phục vụ file tĩnh
+    @app.route('/Uploads/<path:filename>')
+    def uploaded_file(filename):
+        return _serve_storage_file(filename, 'Resource not found')
+
+
+def _register_handlers(app):
+    @app.before_request
+    def handle_preflight():
+        if request.method == 'OPTIONS':
+            return '', 200
+
+    @app.errorhandler(404)
+    def not_found(error):
+        logger.error("404 Error: %s", str(error))
+        return jsonify({'message': 'Resource not found'}), 404
+
+    @app.errorhandler(500)
+    def internal_error(error):
+        db.session.rollback()
+        logger.error("500 Error: %s", str(error))
+        return jsonify({'message': 'Internal server error'}), 500
+
+    @app.errorhandler(401)
+    def unauthorized(error):
+        logger.error("401 Error: %s", str(error))
+        return jsonify({'message': 'Unauthorized'}), 401
+
+    @app.errorhandler(403)
+    def forbidden(error):
+        logger.error("403 Error: %s", str(error))
+        return jsonify({'message': 'Forbidden'}), 403
+
+
+def _register_token_loader():
+    from models.refresh_tokens import RefreshToken
+
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload):
+        try:
+            jti = jwt_payload['jti']
+            token_type = jwt_payload.get('type')  # 'access' or 'refresh'
+
+            if token_type == 'access':
+                from models.token_blacklist import TokenBlacklist
+                token = TokenBlacklist.query.filter_by(jti=jti).first()
+                if token:
+                    logger.debug("Access token %s đã bị vô hiệu hóa", jti)
+                    return True
+                logger.debug("Access token %s không có trong danh sách đen", jti)
+
+            if token_type == 'refresh':
+                refresh_token = RefreshToken.query.filter_by(jti=jti).first()
+                if refresh_token:
+                    if refresh_token.revoked_at or refresh_token.expires_at < datetime.datetime.now(datetime.timezone.utc):
+                        logger.debug("Refresh token %s đã bị thu hồi hoặc hết hạn", jti)
+                        return True
+                    logger.debug("Refresh token %s hợp lệ", jti)
+                else:
+                    logger.debug("Refresh token %s không tồn tại", jti)
                     return True
-                logger.debug("Refresh token %s hợp lệ", jti)
-            else:
-                logger.debug("Refresh token %s không tồn tại", jti)
-                return True
 
-        return False
-    except Exception as e:
-        logger.error("Lỗi khi kiểm tra blacklist token: %s", str(e))
-        return True
+            return False
+        except Exception as e:
+            logger.error("Lỗi khi kiểm tra blacklist token: %s", str(e))
+            return True
+
+
+def start_background_services(app):
+    """Scheduler và các worker nền trong web process (chỉ dùng khi phát triển, 1 process)."""
+    # Scheduler chạy trong process riêng: python run_scheduler.py run
+    if app.config.get('SCHEDULER_ENABLED'):
+        from scheduler import init_scheduler
+        init_scheduler(app)
+
+    # Email outbox gửi bằng process riêng: python run_email_worker.py
+    if app.config.get('EMAIL_WORKER_ENABLED'):
+        from utils.email_outbox import start_outbox_worker
+        start_outbox_worker(app)
+
+    # Thông báo thanh toán gửi bằng process riêng: python run_payment_worker.py
+    if app.config.get('PAYMENT_WORKER_ENABLED'):
+        from utils.payment_events import start_payment_worker
+        start_payment_worker(app)
+
+    # Push FCM của thông báo nhắc nhở gửi bằng process riêng: python run_push_worker.py
+    if app.config.get('PUSH_WORKER_ENABLED'):
+        from utils.push_outbox import start_push_worker
+        start_push_worker(app)
+
+
+def create_app(config=None, start_background=True):
+    """Tạo ứng dụng Flask.
+
+    ``config`` là object cấu hình hoặc dict (mặc định ``Config()`` từ biến môi
+    trường); dict chỉ cần các khóa muốn đặt, khóa thiếu lấy từ biến môi trường
+    hoặc giá trị mặc định (Redis -> ``memory://``). Firebase và Celery chỉ khởi tạo khi được dùng lần đầu; scheduler và
+    worker nền chỉ chạy khi bật cờ tương ứng và ``start_background`` (các script
+    ``run_*.py`` tắt để tự quản lý).
+    """
+    profile = StartupProfile()
+    app = Flask(__name__)
+
+    with profile.phase('config'):
+        if config is None:
+            config = Config()
+        if isinstance(config, dict):
+            app.config.update(config)
+        else:
+            app.config.from_object(config)
+        # Cấu hình logging (JSON, ghi qua hàng đợi không chặn) - nơi duy nhất đặt log level
+        configure_logging(app.config)
+        # Config dạng dict có thể thiếu các khóa Config() bắt buộc: lấy từ biến môi trường,
+        # không có thì dùng bộ nhớ trong process (memory://) như các store khác
+        if app.config.get('SQLALCHEMY_DATABASE_URI') is None and os.getenv('DATABASE_URL'):
+            app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
+        app.config['REDIS_STORAGE_URI'] = _config_value(app, 'REDIS_STORAGE_URI', 'memory://')
+        app.config.setdefault('CELERY_BROKER_URL', app.config['REDIS_STORAGE_URI'])
+        app.config['RATELIMIT_STORAGE_URI'] = app.config['REDIS_STORAGE_URI']
+        rate_limits = _config_value(app, 'RATE_LIMIT_DEFAULT')
+        if isinstance(rate_limits, str):
+            rate_limits = rate_limits.split(',')
+        if rate_limits:
+            app.config['RATELIMIT_DEFAULT_LIMITS'] = rate_limits
+        _configure_uploads(app)
+
+    with profile.phase('extensions'):
+        from flask_caching import Cache
+        from flask_cors import CORS
+        from flask_swagger_ui import get_swaggerui_blueprint
+
+        # Cấu hình CORS
+        CORS(app, resources={r"/api/*": {
+            "origins": "*",
+            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization", "Range"],
+            "expose_headers": ["Content-Range", "Accept-Ranges"],
+            "supports_credentials": False,
+        }})
+
+        # Cấu hình Flask-Caching (không có REDIS_CACHE_URI thì cache trong process)
+        cache_uri = _config_value(app, 'REDIS_CACHE_URI')
+        if cache_uri:
+            Cache(config={'CACHE_TYPE': 'redis', 'CACHE_REDIS_URL': cache_uri}).init_app(app)
+        else:
+            Cache(config={'CACHE_TYPE': 'SimpleCache'}).init_app(app)
+
+        db.init_app(app)
+        migrate.init_app(app, db)
+        jwt.init_app(app)
+        mail.init_app(app)
+        limiter.init_app(app)
+        init_celery(app)
+
+        # Cấu hình Swagger UI
+        app.register_blueprint(get_swaggerui_blueprint(
+            '/docs',
+            '/static/swagger.json',
+            config={'app_name': "Dormitory API"}
+        ), url_prefix='/docs')
+
+    # Kiểm tra JWT_SECRET_KEY
+    if app.config.get('JWT_SECRET_KEY') == 'your_jwt_secret_key_here':
+        logger.warning("JWT_SECRET_KEY đang sử dụng giá trị mặc định, điều này không an toàn trong môi trường production!")
+
+    with profile.phase('services'):
+        # Khởi tạo storage backend (local hoặc S3/MinIO)
+        init_storage(app)
+        init_challenge_store(app)
+        init_search(app)
+        init_occupancy(app)
+        init_availability(app)
+
+    with profile.phase('models'):
+        _import_models()
+        _register_token_loader()
+
+    with profile.phase('blueprints'):
+        _register_blueprints(app)
+        _register_routes(app)
+        # Access log có cấu trúc, lấy mẫu theo route (header nhạy cảm được che)
+        init_request_logging(app)
+        _register_handlers(app)
+
+    if start_background:
+        with profile.phase('background'):
+            start_background_services(app)
+
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+    app.extensions['startup_profile'] = profile.to_dict()
+    profile.log(verbose=app.config.get('STARTUP_PROFILE'))
+    return app
+
+
+_app = None
+_app_lock = threading.Lock()
+
+
+def __getattr__(name):
+    # ``from app import app`` / gunicorn ``app:app``: ứng dụng mặc định chỉ được tạo khi
+    # được truy cập, nên ``from app import create_app`` không khởi tạo gì
+    global _app
+    if name == 'app':
+        with _app_lock:
+            if _app is None:
+                _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
 if __name__ == '__main__':
+    app = create_app()
     if os.getenv('FLASK_ENV') == 'development':
         app.run(debug=True, host='127.0.0.1', port=5000)
     else:
-        app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
+        app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,47 @@
+import sys
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(project_root)
+
+from utils.passwords import PasswordPolicy
+
+def _hash_for(policy_kwargs, seconds):
+    policy = PasswordPolicy(**policy_kwargs)
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        policy.hash('Benchmark@Password123')
+        count += 1
+    return count, time.perf_counter() - started
+
+def benchmark(policy_kwargs, seconds=3.0, workers=1):
+    """Chạy song song ``workers`` process, trả về (hashes/s mỗi core, tổng hashes/s)."""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_hash_for, [policy_kwargs] * workers, [seconds] * workers))
+    per_core = [count / elapsed for count, elapsed in results]
+    return sum(per_core) / len(per_core), sum(per_core)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark password hashing cost (hashes per second per core)")
+    parser.add_argument('--method', choices=['scrypt', 'pbkdf2'], default=os.getenv('PASSWORD_HASH_METHOD', 'scrypt'))
+    parser.add_argument('--scrypt-n', type=int, nargs='+', default=[int(os.getenv('PASSWORD_SCRYPT_N', 32768))], help="scrypt N values to try")
+    parser.add_argument('--scrypt-r', type=int, default=int(os.getenv('PASSWORD_SCRYPT_R', 8)))
+    parser.add_argument('--scrypt-p', type=int, default=int(os.getenv('PASSWORD_SCRYPT_P', 1)))
+    parser.add_argument('--iterations', type=int, nargs='+', default=[int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', 600000))], help="pbkdf2 iteration counts to try")
+    parser.add_argument('--seconds', type=float, default=3.0, help="Duration per measurement (default: 3)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Parallel processes (default: all cores)")
+    args = parser.parse_args()
+
+    if args.method == 'scrypt':
+        candidates = [dict(method='scrypt', scrypt_n=n, scrypt_r=args.scrypt_r, scrypt_p=args.scrypt_p) for n in args.scrypt_n]
+    else:
+        candidates = [dict(method='pbkdf2', pbkdf2_iterations=i) for i in args.iterations]
+
+    print(f"{'method':28} {'hash/s/core':>12} {'hash/s total':>13} {'ms/hash':>9}  ({args.workers} workers)")
+    for kwargs in candidates:
+        per_core, total = benchmark(kwargs, seconds=args.seconds, workers=args.workers)
+        print(f"{PasswordPolicy(**kwargs).method_string:28} {per_core:12.1f} {total:13.1f} {1000 / per_core:9.1f}")
@@ -0,0 +1,80 @@
+import sys
+import os
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+project_root = os.path.abspath(os.path.dirname(__file__))
+
+# Chạy trong process mới: import app, create_app(), rồi request đầu tiên qua test client
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+application = app_module.create_app(start_background={background})
+created = time.perf_counter()
+response = application.test_client().get({path!r})
+finished = time.perf_counter()
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'create_ms': (created - imported) * 1000,
+    'first_request_ms': (finished - created) * 1000,
+    'status': response.status_code,
+    'phases': application.extensions['startup_profile']['phases']
+}}))
+'''
+
+def run_once(path, background, importtime=False):
+    """Một lần khởi động; trả về (số đo của process con, thời gian tới request đầu tính từ lúc spawn, stderr)."""
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', CHILD.format(path=path, background=background)]
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=project_root, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'child failed')
+    measurement = json.loads(result.stdout.strip().splitlines()[-1])
+    return measurement, wall_ms, result.stderr
+
+def slowest_imports(stderr, top):
+    """Các module có thời gian import cộng dồn lớn nhất từ output của ``-X importtime``."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace('import time:', '|', 1).split('|')]
+        rows.append((int(cumulative_us), int(self_us), name))
+    return sorted(rows, reverse=True)[:top]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure application startup: time from process start to the first served request")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh processes to start (default: 5)")
+    parser.add_argument('--path', default='/debug/routes', help="Path of the first request (default: /debug/routes)")
+    parser.add_argument('--background', action='store_true', help="Start the scheduler/workers enabled in the environment, like the web process")
+    parser.add_argument('--importtime', type=int, metavar='N', help="Also list the N slowest imports (python -X importtime)")
+    args = parser.parse_args()
+
+    results = [run_once(args.path, args.background) for _ in range(args.runs)]
+    columns = ['import_ms', 'create_ms', 'first_request_ms']
+    print(f"{'':18} {'median':>9} {'min':>9} {'max':>9}  ({args.runs} runs, GET {args.path} -> {results[0][0]['status']})")
+    for column in columns:
+        values = [measurement[column] for measurement, _, _ in results]
+        print(f"{column:18} {statistics.median(values):9.1f} {min(values):9.1f} {max(values):9.1f}")
+    walls = [wall for _, wall, _ in results]
+    print(f"{'spawn_to_first':18} {statistics.median(walls):9.1f} {min(walls):9.1f} {max(walls):9.1f}")
+
+    print("\ncreate_app phases (median ms):")
+    for index, phase in enumerate(results[0][0]['phases']):
+        values = [measurement['phases'][index]['ms'] for measurement, _, _ in results]
+        print(f"  {phase['name']:16} {statistics.median(values):9.1f}")
+
+    if args.importtime:
+        _, _, stderr = run_once(args.path, args.background, importtime=True)
+        print("\nSlowest imports (cumulative ms, self ms):")
+        for cumulative_us, self_us, name in slowest_imports(stderr, args.importtime):
+            print(f"  {cumulative_us / 1000:9.1f} {self_us / 1000:9.1f}  {name}")
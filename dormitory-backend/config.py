@@ -4,11 +4,30 @@ import re
 
 class Config:
     def __init__(self):
+        # Logging (cấu hình duy nhất, xem utils/logging_config.py)
+        self.LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+        self.LOG_LEVELS = os.getenv('LOG_LEVELS', 'sqlalchemy.engine=WARNING,werkzeug=WARNING')
+        self.LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+        self.LOG_FILE = os.getenv('LOG_FILE', 'app.log')
+        self.LOG_STDOUT = os.getenv('LOG_STDOUT', 'False').lower() == 'true'
+        self.LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+        self.LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 1.0))
+        self.LOG_ROUTE_SAMPLE_RATES = os.getenv('LOG_ROUTE_SAMPLE_RATES', '')
+        self.LOG_SLOW_REQUEST_MS = int(os.getenv('LOG_SLOW_REQUEST_MS', 1000))
+        self.LOG_REQUEST_HEADERS = os.getenv('LOG_REQUEST_HEADERS', 'False').lower() == 'true'
+
         # Database settings
         self.SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
         if not self.SQLALCHEMY_DATABASE_URI:
             raise ValueError("DATABASE_URL is not set in environment variables")
         self.SQLALCHEMY_TRACK_MODIFICATIONS = False
+        # pool_pre_ping thay cho việc retry + sleep khi MySQL đóng kết nối idle
+        self.SQLALCHEMY_ENGINE_OPTIONS = {
+            'pool_pre_ping': True,
+            'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 280)),
+            'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20))
+        }
 
         # JWT settings
         self.JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
@@ -30,10 +49,50 @@ class Config:
         # File upload settings
         self.MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
 
+        # Storage settings ('local' hoặc 's3' - S3/MinIO)
+        self.STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'local').lower()
+        self.STORAGE_URL_EXPIRES = int(os.getenv('STORAGE_URL_EXPIRES', 3600))
+        self.S3_BUCKET = os.getenv('S3_BUCKET')
+        self.S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')
+        self.S3_REGION = os.getenv('S3_REGION', 'us-east-1')
+        self.S3_ACCESS_KEY_ID = os.getenv('S3_ACCESS_KEY_ID')
+        self.S3_SECRET_ACCESS_KEY = os.getenv('S3_SECRET_ACCESS_KEY')
+        self.S3_KEY_PREFIX = os.getenv('S3_KEY_PREFIX', '')
+        if self.STORAGE_BACKEND == 's3' and not self.S3_BUCKET:
+            raise ValueError("S3_BUCKET is not set in environment variables")
+
+        # Purge settings (xóa vĩnh viễn bản ghi đã soft delete)
+        self.PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', 500))
+        self.PURGE_MAX_WORKERS = int(os.getenv('PURGE_MAX_WORKERS', 8))
+        self.PURGE_RETENTION_DAYS = int(os.getenv('PURGE_RETENTION_DAYS', 30))
+
+        # Search backend: 'auto' (FULLTEXT với MySQL, index trong process với database khác), 'fulltext', 'memory'
+        self.SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto').lower()
+
+        # Chỉ mục chỗ trống của phòng (mặc định dùng REDIS_STORAGE_URI, 'memory://' cho dev)
+        self.AVAILABILITY_STORE_URI = os.getenv('AVAILABILITY_STORE_URI')
+        # Thời gian giữ chỗ cho đăng ký PENDING (giây)
+        self.AVAILABILITY_HOLD_TTL = int(os.getenv('AVAILABILITY_HOLD_TTL', 48 * 3600))
+
+        # Phân trang: thời gian cache tổng số dòng (giây) theo bộ lọc
+        self.PAGINATION_COUNT_TTL = int(os.getenv('PAGINATION_COUNT_TTL', 30))
+
+        # Password hashing (scrypt hoặc pbkdf2); đổi tham số thì hash cũ được băm lại khi đăng nhập
+        self.PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt').lower()
+        if self.PASSWORD_HASH_METHOD not in ('scrypt', 'pbkdf2'):
+            raise ValueError("PASSWORD_HASH_METHOD must be 'scrypt' or 'pbkdf2'")
+        self.PASSWORD_SCRYPT_N = int(os.getenv('PASSWORD_SCRYPT_N', 32768))
+        self.PASSWORD_SCRYPT_R = int(os.getenv('PASSWORD_SCRYPT_R', 8))
+        self.PASSWORD_SCRYPT_P = int(os.getenv('PASSWORD_SCRYPT_P', 1))
+        self.PASSWORD_PBKDF2_HASH = os.getenv('PASSWORD_PBKDF2_HASH', 'sha256')
+        self.PASSWORD_PBKDF2_ITERATIONS = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', 600000))
+        self.RESET_CODE_PBKDF2_ITERATIONS = int(os.getenv('RESET_CODE_PBKDF2_ITERATIONS', 10000))
+
         # VNPAY settings
         self.VNPAY_TMN_CODE = os.getenv('VNPAY_TMN_CODE')
         self.VNPAY_HASH_SECRET = os.getenv('VNPAY_HASH_SECRET')
         self.VNPAY_URL = os.getenv('VNPAY_URL')
+        self.VNPAY_QUERY_URL = os.getenv('VNPAY_QUERY_URL')
 
         # Mail settings
         self.MAIL_SERVER = os.getenv('MAIL_SERVER')
@@ -45,9 +104,41 @@ class Config:
         if not self.MAIL_DEFAULT_SENDER or not re.match(r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$', self.MAIL_DEFAULT_SENDER):
             raise ValueError("MAIL_DEFAULT_SENDER is not a valid email address")
 
+        # Email outbox: email được ghi vào bảng email_outbox rồi gửi nền (run_email_worker.py)
+        self.EMAIL_WORKER_ENABLED = os.getenv('EMAIL_WORKER_ENABLED', 'False').lower() == 'true'
+        self.EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', 50))
+        self.EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', 6))
+        self.EMAIL_OUTBOX_BASE_DELAY = int(os.getenv('EMAIL_OUTBOX_BASE_DELAY', 30))
+        self.EMAIL_OUTBOX_INTERVAL = float(os.getenv('EMAIL_OUTBOX_INTERVAL', 5))
+
+        # Thông báo thanh toán (tạo bởi callback VNPay, gửi bởi run_payment_worker.py)
+        self.PAYMENT_WORKER_ENABLED = os.getenv('PAYMENT_WORKER_ENABLED', 'False').lower() == 'true'
+        self.PAYMENT_WORKER_INTERVAL = float(os.getenv('PAYMENT_WORKER_INTERVAL', 2))
+        self.PAYMENT_NOTIFY_BATCH_SIZE = int(os.getenv('PAYMENT_NOTIFY_BATCH_SIZE', 50))
+        self.PAYMENT_NOTIFY_MAX_ATTEMPTS = int(os.getenv('PAYMENT_NOTIFY_MAX_ATTEMPTS', 6))
+        # Push FCM bất đồng bộ (push_outbox)
+        self.PUSH_WORKER_ENABLED = os.getenv('PUSH_WORKER_ENABLED', 'False').lower() == 'true'
+        self.PUSH_WORKER_INTERVAL = float(os.getenv('PUSH_WORKER_INTERVAL', 5))
+        self.PUSH_BATCH_SIZE = int(os.getenv('PUSH_BATCH_SIZE', 50))
+        self.PUSH_MAX_ATTEMPTS = int(os.getenv('PUSH_MAX_ATTEMPTS', 6))
+        # Hóa đơn tháng M đến hạn vào ngày BILL_DUE_DAY của tháng M+1
+        self.BILL_DUE_DAY = int(os.getenv('BILL_DUE_DAY', 10))
+        self.BILL_IMPORT_BATCH_SIZE = int(os.getenv('BILL_IMPORT_BATCH_SIZE', 500))
+        self.OVERDUE_REMINDER_INTERVAL_DAYS = int(os.getenv('OVERDUE_REMINDER_INTERVAL_DAYS', 3))
+        # Đối soát giao dịch: vnpay | stub | none (mặc định vnpay nếu đã cấu hình VNPay)
+        self.PAYMENT_QUERY_GATEWAY = os.getenv('PAYMENT_QUERY_GATEWAY')
+        self.PAYMENT_STUB_GATEWAY_FILE = os.getenv('PAYMENT_STUB_GATEWAY_FILE')
+        self.PAYMENT_PENDING_EXPIRE_MINUTES = int(os.getenv('PAYMENT_PENDING_EXPIRE_MINUTES', 30))
+        self.PAYMENT_RECONCILE_BATCH_SIZE = int(os.getenv('PAYMENT_RECONCILE_BATCH_SIZE', 500))
+
         # NGROK settings
         self.NGROK_URL = os.getenv('NGROK_URL')
 
+        # Firebase Admin SDK (khởi tạo ở lần gửi FCM đầu tiên, xem utils/fcm.py)
+        self.FIREBASE_CREDENTIALS = os.getenv('FIREBASE_CREDENTIALS', 'firebase-adminsdk.json')
+        # Ghi log thời gian từng bước của create_app ở mức INFO
+        self.STARTUP_PROFILE = os.getenv('STARTUP_PROFILE', 'False').lower() == 'true'
+
         # Rate limiter and Redis settings
         self.REDIS_STORAGE_URI = os.getenv('REDIS_STORAGE_URI')
         if not self.REDIS_STORAGE_URI:
@@ -55,6 +146,8 @@ class Config:
         self.REDIS_CACHE_URI = os.getenv('REDIS_CACHE_URI')
         if not self.REDIS_CACHE_URI:
             raise ValueError("REDIS_CACHE_URI is not set in environment variables")
+        # Celery tạo khi cần (utils/celery_app.py); mặc định dùng chung Redis với rate limiter
+        self.CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL') or self.REDIS_STORAGE_URI
         self.RATE_LIMIT_DEFAULT = os.getenv('RATE_LIMIT_DEFAULT')
         if not self.RATE_LIMIT_DEFAULT:
             raise ValueError("RATE_LIMIT_DEFAULT is not set in environment variables")
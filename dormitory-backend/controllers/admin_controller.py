@@ -1,17 +1,15 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt
-from werkzeug.security import generate_password_hash, check_password_hash
-from extensions import db, mail
+from utils.passwords import hash_password, verify_password
+from utils.challenges import get_challenge_store, subject_key, RESET_SCOPE, CODE_MISSING, CODE_LOCKED, CODE_INVALID
+from extensions import db
 from models.admin import Admin
 from controllers.auth_controller import admin_required
-from flask_mail import Message
+from utils.email_outbox import queue_email
 import re
-from datetime import datetime, timedelta
-import secrets
 import logging
 
 # Thiết lập logger
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 admin_bp = Blueprint('admin', __name__)
@@ -116,7 +114,7 @@ def create_admin():
             full_name=full_name,
             phone=phone
         )
-        admin.password_hash = generate_password_hash(password)
+        admin.password_hash = hash_password(password)
         db.session.add(admin)
         db.session.commit()
 
@@ -240,10 +238,10 @@ def change_admin_password():
         if not admin:
             return jsonify({'message': 'Không tìm thấy quản trị viên'}), 404
 
-        if not check_password_hash(admin.password_hash, current_password):
+        if not verify_password(admin, current_password):
             return jsonify({'message': 'Mật khẩu hiện tại không đúng'}), 401
 
-        admin.password_hash = generate_password_hash(new_password)
+        admin.password_hash = hash_password(new_password)
         db.session.commit()
         logger.info("Đổi mật khẩu thành công cho admin_id %s", admin.admin_id)
         return jsonify({'message': 'Đổi mật khẩu thành công'}), 200
@@ -276,17 +274,8 @@ def request_password_reset():
         if not admin:
             return jsonify({'message': 'Không tìm thấy quản trị viên với email này'}), 404
 
-        # Tạo mã xác nhận 6 chữ số
-        reset_code = ''.join([str(secrets.randbelow(10)) for _ in range(6)])
-        expiry = datetime.utcnow() + timedelta(minutes=30)  # Mã có hiệu lực 30 phút
-
-        # Hash mã xác nhận trước khi lưu
-        hashed_code = generate_password_hash(reset_code, method='pbkdf2:sha256')
-
-        # Lưu mã đã hash và thời gian hết hạn
-        admin.reset_token = hashed_code
-        admin.reset_token_expiry = expiry
-        db.session.commit()
+        # Tạo mã xác nhận 6 chữ số (lưu bản hash trong challenge store, hiệu lực 30 phút)
+        reset_code = get_challenge_store().issue_code(RESET_SCOPE, subject_key('admin', admin.admin_id))
 
         # Kiểm tra cấu hình email
         sender = current_app.config.get('MAIL_DEFAULT_SENDER')
@@ -294,13 +283,12 @@ def request_password_reset():
             logger.error("MAIL_DEFAULT_SENDER chưa được cấu hình")
             return jsonify({'message': 'Lỗi cấu hình email server'}), 500
 
-        # Gửi email chứa mã xác nhận
-        try:
-            msg = Message(
-                subject='Mã xác nhận đặt lại mật khẩu ký túc xá',
-                sender=sender,
-                recipients=[email],
-                html="""Xin chào {full_name},
+        # Đưa email chứa mã xác nhận vào hàng đợi
+        queue_email(
+            'Mã xác nhận đặt lại mật khẩu ký túc xá',
+            [email],
+            sender=sender,
+            html="""Xin chào {full_name},
 
                 Bạn đã yêu cầu đặt lại mật khẩu. Mã xác nhận của bạn là: <b>{reset_code}</b><br><br>
 
@@ -310,17 +298,9 @@ def request_password_reset():
 
                 Trân trọng,
                 Hệ thống Ký túc xá""".format(full_name=admin.full_name or "Quản trị viên", reset_code=reset_code)
-            )
-            logger.debug("Chuẩn bị gửi email tới %s từ %s", email, sender)
-            mail.send(msg)
-            logger.info("Email với mã xác nhận đã gửi tới %s", email)
-        except Exception as e:
-            db.session.rollback()
-            logger.error("Gửi email thất bại: %s", str(e))
-            return jsonify({
-                'message': 'Tạo mã xác nhận thành công nhưng gửi email thất bại. Vui lòng thử lại sau.',
-                'error': str(e)
-            }), 201
+        )
+        db.session.commit()
+        logger.info("Email với mã xác nhận đã được đưa vào hàng đợi tới %s", email)
 
         return jsonify({'message': 'Mã xác nhận đã được gửi qua email'}), 200
 
@@ -363,20 +343,17 @@ def reset_password():
         if not admin:
             return jsonify({'message': 'Không tìm thấy quản trị viên với email này'}), 404
 
-        if not admin.reset_token or not admin.reset_token_expiry:
-            return jsonify({'message': 'Tài khoản chưa được xác minh để đặt lại mật khẩu'}), 400
-
-        if admin.reset_token_expiry < datetime.utcnow():
-            return jsonify({'message': 'Mã xác nhận đã hết hạn'}), 400
-
-        # Kiểm tra mã xác nhận nhập vào có khớp với reset_token (hashed)
-        if not check_password_hash(admin.reset_token, code):
-            return jsonify({'message': 'Mã xác nhận không chính xác'}), 400
-
-        # Đặt lại mật khẩu và xóa mã xác nhận
-        admin.password_hash = generate_password_hash(new_password)
-        admin.reset_token = None
-        admin.reset_token_expiry = None
+        # Kiểm tra mã xác nhận (mã đúng sẽ bị xóa khỏi challenge store)
+        result, remaining = get_challenge_store().verify_code(RESET_SCOPE, subject_key('admin', admin.admin_id), code)
+        if result == CODE_MISSING:
+            return jsonify({'message': 'Mã xác nhận đã hết hạn hoặc tài khoản chưa yêu cầu đặt lại mật khẩu'}), 400
+        if result == CODE_LOCKED:
+            return jsonify({'message': 'Bạn đã nhập sai mã quá 3 lần. Vui lòng yêu cầu mã xác nhận mới'}), 400
+        if result == CODE_INVALID:
+            return jsonify({'message': f'Mã xác nhận không chính xác. Bạn còn {remaining} lần thử.'}), 400
+
+        # Đặt lại mật khẩu
+        admin.password_hash = hash_password(new_password)
         db.session.commit()
 
         logger.info("Đặt lại mật khẩu thành công cho admin_id %s với email %s", admin.admin_id, email)
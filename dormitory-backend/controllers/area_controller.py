@@ -10,16 +10,14 @@ import os
 import logging
 from unidecode import unidecode
 import re
-from flask import current_app
 import uuid
 from models.user import User
 from models.contract import Contract
 from flask import send_file
-import openpyxl
 from io import BytesIO
+from utils.storage import get_storage, storage_key
 
 # Thiết lập logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 area_bp = Blueprint('area', __name__)
@@ -117,32 +115,29 @@ def update_area(area_id):
                 if len(room_name_parts) > 1 and room_name_parts[1] == old_name:
                     room.name = f"{room_name_parts[0]} - {new_name}"
 
-                # Cập nhật image_url của các hình ảnh liên quan
-                images = RoomImage.query.filter_by(room_id=room.room_id, is_deleted=False).all()
-                for image in images:
-                    # Chuẩn hóa tên phòng và tên khu vực
-                    old_roomname = normalize_name(f"{room_name_parts[0]} - {old_name}")
-                    new_roomname = normalize_name(room.name)
-
-                    # Tạo tên thư mục cũ và mới
-                    old_folder_name = old_roomname
-                    new_folder_name = new_roomname
-                    old_folder_path = os.path.join(current_app.config['ROOM_IMAGES_BASE'], old_folder_name)
-                    new_folder_path = os.path.join(current_app.config['ROOM_IMAGES_BASE'], new_folder_name)
+                # Chuẩn hóa tên phòng và tên khu vực để tạo tên thư mục cũ và mới
+                old_folder_name = normalize_name(f"{room_name_parts[0]} - {old_name}")
+                new_folder_name = normalize_name(room.name)
+                if old_folder_name == new_folder_name:
+                    continue
 
-                    # Đổi tên thư mục nếu tồn tại
-                    if os.path.exists(old_folder_path):
-                        try:
-                            os.rename(old_folder_path, new_folder_path)
-                            logger.debug("Đổi tên thư mục từ %s sang %s", old_folder_path, new_folder_path)
-                        except OSError as e:
-                            logger.error("Lỗi khi đổi tên thư mục: %s", str(e))
-                            db.session.rollback()
-                            return jsonify({'message': 'Lỗi khi đổi tên thư mục hình ảnh'}), 500
+                # Đổi tên thư mục nếu tồn tại
+                try:
+                    moved = get_storage().move_prefix(storage_key('roomimage', old_folder_name),
+                                                      storage_key('roomimage', new_folder_name))
+                    if moved:
+                        logger.debug("Đổi tên thư mục từ %s sang %s (%s file)", old_folder_name, new_folder_name, moved)
+                except OSError as e:
+                    logger.error("Lỗi khi đổi tên thư mục: %s", str(e))
+                    db.session.rollback()
+                    return jsonify({'message': 'Lỗi khi đổi tên thư mục hình ảnh'}), 500
 
-                    # Cập nhật image_url
-                    filename = os.path.basename(image.image_url)
-                    image.image_url = f"roomimage/{new_folder_name}/{filename}"
+                # Cập nhật image_url của các hình ảnh nằm trong thư mục cũ
+                images = RoomImage.query.filter_by(room_id=room.room_id, is_deleted=False).all()
+                for image in images:
+                    if image.image_url.startswith(f"{old_folder_name}/"):
+                        filename = os.path.basename(image.image_url)
+                        image.image_url = f"{new_folder_name}/{filename}"
 
             db.session.commit()
             logger.info("Cập nhật khu vực thành công: area_id=%s, new_name=%s", area_id, new_name)
@@ -243,6 +238,7 @@ def export_users_in_area(area_id):
         user_ids = {contract.user_id for contract in contracts}
         users = User.query.filter(User.user_id.in_(user_ids)).all()
         # Tạo workbook Excel
+        import openpyxl
         wb = openpyxl.Workbook()
         ws = wb.active
         ws.title = "Danh sách sinh viên"
@@ -287,6 +283,7 @@ def export_all_users_in_all_areas():
         user_ids = {contract.user_id for contract in contracts}
         users = User.query.filter(User.user_id.in_(user_ids)).all()
         # Tạo workbook Excel
+        import openpyxl
         wb = openpyxl.Workbook()
         ws = wb.active
         ws.title = "Danh sách sinh viên"
@@ -1,21 +1,22 @@
-from flask import Blueprint, request, jsonify, current_app, render_template
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import verify_jwt_in_request, create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt, set_refresh_cookies, unset_jwt_cookies, decode_token
-from werkzeug.security import check_password_hash, generate_password_hash
+from utils.passwords import hash_password, verify_password
+from utils.challenges import get_challenge_store, subject_key, RESET_SCOPE, CODE_MISSING, CODE_LOCKED, CODE_INVALID
+from utils.email_outbox import queue_email
 from models.user import User
 from models.admin import Admin
 from models.contract import Contract
 from models.token_blacklist import TokenBlacklist
 from models.refresh_tokens import RefreshToken  
-from extensions import db, mail
-from datetime import datetime, timedelta, timezone
-import secrets
+from extensions import db
+from datetime import datetime, timezone
 from functools import wraps
-from flask_mail import Message
 import re
+import uuid
 import logging
-import time
+import pendulum
+from sqlalchemy import and_, case
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 auth_bp = Blueprint('auth', __name__)
@@ -36,22 +37,40 @@ def is_strong_password(password):
         return False, "Mật khẩu phải chứa ít nhất một ký tự đặc biệt"
     return True, ""
 
+def issue_tokens(identity, user_type):
+    """Tạo access/refresh token và thêm bản ghi RefreshToken vào session (chưa commit).
+
+    jti của refresh token được sinh trước và truyền vào claims nên không cần
+    decode_token lại token vừa tạo.
+    """
+    refresh_jti = str(uuid.uuid4())
+    access_token = create_access_token(
+        identity=str(identity),
+        additional_claims={'type': user_type},
+        fresh=False,
+        expires_delta=current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
+    )
+    refresh_token = create_refresh_token(
+        identity=str(identity),
+        additional_claims={'type': user_type, 'jti': refresh_jti},
+        expires_delta=current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
+    )
+    now = datetime.now(timezone.utc)
+    db.session.add(RefreshToken(
+        jti=refresh_jti,
+        user_id=identity if user_type == 'USER' else None,
+        admin_id=identity if user_type == 'ADMIN' else None,
+        type=user_type,
+        expires_at=now + current_app.config['JWT_REFRESH_TOKEN_EXPIRES'],
+        created_at=now
+    ))
+    return access_token, refresh_token
+
 def authenticate_admin(username, password):
     """Authenticate an Admin using username."""
     admin = Admin.query.filter_by(username=username).first()
-    if admin and check_password_hash(admin.password_hash, password):
-        now = datetime.now(timezone.utc)
-        access_token = create_access_token(
-            identity=str(admin.admin_id),
-            additional_claims={'type': 'ADMIN'},
-            fresh=False,
-            expires_delta=current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
-        )
-        refresh_token = create_refresh_token(
-            identity=str(admin.admin_id),
-            additional_claims={'type': 'ADMIN'},
-            expires_delta=current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
-        )
+    if admin and verify_password(admin, password):
+        access_token, refresh_token = issue_tokens(admin.admin_id, 'ADMIN')
         return {
             'access_token': access_token,
             'id': admin.admin_id,
@@ -60,42 +79,25 @@ def authenticate_admin(username, password):
         }, 200
     return None
 
-def authenticate_user(email, password):
-    """Authenticate a User using email."""
-    user = User.query.filter_by(email=email).first()
-    if user and check_password_hash(user.password_hash, password):
-        now = datetime.now(timezone.utc)
-        access_token = create_access_token(
-            identity=str(user.user_id),
-            additional_claims={'type': 'USER'},
-            fresh=False,
-            expires_delta=current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
-        )
-        refresh_token = create_refresh_token(
-            identity=str(user.user_id),
-            additional_claims={'type': 'USER'},
-            expires_delta=current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
-        )
-        return {
-            'access_token': access_token,
-            'id': user.user_id,
-            'type': 'USER',
-            'refresh_token': refresh_token
-        }, 200
-    return None
-
-def execute_with_retry(operation, max_retries=3, delay=1):
-    """Execute a database operation with retry logic."""
-    for attempt in range(max_retries):
-        try:
-            return operation()
-        except Exception as e:
-            if "Lost connection to MySQL server" in str(e) and attempt < max_retries - 1:
-                logger.warning("Connection lost, retrying (%d/%d): %s", attempt + 1, max_retries, str(e))
-                time.sleep(delay * (2 ** attempt))
-                db.session.rollback()
-                continue
-            raise e
+def find_user_for_login(email):
+    """Lấy user và hợp đồng (ưu tiên hợp đồng còn hiệu lực hôm nay) trong một query."""
+    today = pendulum.now('Asia/Ho_Chi_Minh').date()
+    in_effect = and_(
+        Contract.status != 'TERMINATED',
+        Contract.start_date <= today,
+        Contract.end_date >= today
+    )
+    row = db.session.query(User, Contract).outerjoin(
+        Contract,
+        and_(Contract.user_id == User.user_id, Contract.is_deleted == False)
+    ).filter(
+        User.email == email,
+        User.is_deleted == False
+    ).order_by(
+        case((in_effect, 0), else_=1),
+        Contract.end_date.desc()
+    ).first()
+    return (row[0], row[1]) if row else (None, None)
 
 @auth_bp.route('/auth/admin/login', methods=['POST'])
 def admin_login():
@@ -116,20 +118,7 @@ def admin_login():
             access_token = result[0]['access_token']
             refresh_token = result[0]['refresh_token']  # Always return refresh_token
             admin_id = result[0]['id']
-            
-            # Store refresh_token in the database
-            refresh_token_decoded = decode_token(refresh_token)
-            refresh_jti = refresh_token_decoded['jti']
-            expires_at = datetime.now(timezone.utc) + current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
-            refresh_token_entry = RefreshToken(
-                jti=refresh_jti,
-                admin_id=admin_id,
-                type='ADMIN',
-                expires_at=expires_at,
-                created_at=datetime.now(timezone.utc)
-            )
-            db.session.add(refresh_token_entry)
-            execute_with_retry(lambda: db.session.commit())
+            db.session.commit()
 
             logger.info("Admin login successful: admin_id %s", admin_id)
             
@@ -176,19 +165,15 @@ def user_login():
         if not re.match(email_regex, email):
             return jsonify({'message': 'Định dạng email không hợp lệ'}), 400
         
-        user = User.query.filter_by(email=email, is_deleted=False).first()
+        user, contract = find_user_for_login(email)
         if not user:
             logger.warning("User login failed: email %s not found or deleted", email)
             return jsonify({'message': 'Invalid email'}), 401
         
-        if not check_password_hash(user.password_hash, password):
+        if not verify_password(user, password):
             logger.warning("User login failed: invalid password for email %s", email)
             return jsonify({'message': 'Invalid password'}), 401
 
-        contract = Contract.query.filter_by(
-            user_id=user.user_id,
-            is_deleted=False
-        ).first()
         if not contract:
             logger.warning("User login failed: user %s has no contract", user.email)
             return jsonify({'message': 'Bạn chưa tạo hợp đồng, chưa thể đăng nhập vào ứng dụng'}), 403
@@ -197,37 +182,11 @@ def user_login():
             logger.warning("User login failed: contract for user %s is not active, status: %s", user.email, contract.calculated_status)
             return jsonify({'message': 'Hợp đồng của bạn chưa ở trạng thái ACTIVE, không thể đăng nhập'}), 403
 
-        # Cập nhật fcm_token nếu có
-        if fcm_token:
+        # Cập nhật fcm_token (nếu có) và lưu refresh token trong cùng một commit
+        if fcm_token and user.fcm_token != fcm_token:
             user.fcm_token = fcm_token
-            db.session.commit()
-            logger.info(f"Updated FCM token for user_id={user.user_id}")
-
-        access_token = create_access_token(
-            identity=str(user.user_id),
-            additional_claims={'type': 'USER'},
-            fresh=False,
-            expires_delta=current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
-        )
-        refresh_token = create_refresh_token(  # Always create refresh_token
-            identity=str(user.user_id),
-            additional_claims={'type': 'USER'},
-            expires_delta=current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
-        )
-        
-        # Store refresh_token in the database
-        refresh_token_decoded = decode_token(refresh_token)
-        refresh_jti = refresh_token_decoded['jti']
-        expires_at = datetime.now(timezone.utc) + current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
-        refresh_token_entry = RefreshToken(
-            jti=refresh_jti,
-            user_id=user.user_id,
-            type='USER',
-            expires_at=expires_at,
-            created_at=datetime.now(timezone.utc)
-        )
-        db.session.add(refresh_token_entry)
-        execute_with_retry(lambda: db.session.commit())
+        access_token, refresh_token = issue_tokens(user.user_id, 'USER')
+        db.session.commit()
 
         logger.info("User login successful: user_id %s", user.user_id)
         
@@ -277,31 +236,9 @@ def refresh():
             if not admin:
                 return jsonify({'message': 'Quản trị viên không tồn tại'}), 404
 
-        new_access_token = create_access_token(
-            identity=user_id,
-            additional_claims={'type': user_type},
-            fresh=False,
-            expires_delta=current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
-        )
-
         refresh_token.revoked_at = datetime.now(timezone.utc)
-        new_refresh_token = create_refresh_token(
-            identity=user_id,
-            additional_claims={'type': user_type},
-            expires_delta=current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
-        )
-        new_refresh_jti = get_jwt()['jti']
-        new_expires_at = datetime.now(timezone.utc) + current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
-        new_refresh_token_entry = RefreshToken(
-            jti=new_refresh_jti,
-            user_id=user_id if user_type == 'USER' else None,
-            admin_id=user_id if user_type == 'ADMIN' else None,
-            type=user_type,
-            expires_at=new_expires_at,
-            created_at=datetime.now(timezone.utc)
-        )
-        db.session.add(new_refresh_token_entry)
-        execute_with_retry(lambda: db.session.commit())
+        new_access_token, new_refresh_token = issue_tokens(user_id, user_type)
+        db.session.commit()
 
         logger.info("Token refreshed successfully for %s_id %s", user_type.lower(), user_id)
         
@@ -343,7 +280,7 @@ def logout():
             if refresh_token_entry and not refresh_token_entry.revoked_at:
                 refresh_token_entry.revoked_at = datetime.now(timezone.utc)
         
-        execute_with_retry(lambda: db.session.commit())
+        db.session.commit()
 
         logger.info("Token blacklisted successfully: access_jti %s, refresh_jti %s", access_jti or "none", refresh_jti or "none")
         
@@ -382,39 +319,23 @@ def forgot_password():
         if not user_or_admin:
             return jsonify({'message': 'Không tìm thấy tài khoản với email này'}), 404
 
-        reset_code = ''.join([str(secrets.randbelow(10)) for _ in range(6)])
-        expiry = datetime.now(timezone.utc) + timedelta(minutes=30)
-        hashed_code = generate_password_hash(reset_code, method='pbkdf2:sha256')
-
-        user_or_admin.reset_token = hashed_code
-        user_or_admin.reset_token_expiry = expiry
-        user_or_admin.reset_attempts = 0
-
-        execute_with_retry(lambda: db.session.commit())
+        account_id = user_or_admin.admin_id if user_type == 'admin' else user_or_admin.user_id
+        reset_code = get_challenge_store().issue_code(RESET_SCOPE, subject_key(user_type, account_id))
 
         sender = current_app.config.get('MAIL_DEFAULT_SENDER')
         if not sender:
             logger.error("MAIL_DEFAULT_SENDER chưa được cấu hình")
             return jsonify({'message': 'Lỗi cấu hình email server'}), 500
 
-        try:
-            msg = Message(
-                subject='Mã xác nhận đặt lại mật khẩu ký túc xá',
-                sender=sender,
-                recipients=[email]
-            )
-            msg.html = render_template('emails/forgot_password.html', reset_code=reset_code)
-
-            logger.debug("Chuẩn bị gửi email tới %s từ %s", email, sender)
-            mail.send(msg)
-            logger.info("Email với mã xác nhận đã gửi tới %s", email)
-        except Exception as e:
-            db.session.rollback()
-            logger.error("Gửi email thất bại: %s", str(e))
-            return jsonify({
-                'message': 'Tạo mã xác nhận thành công nhưng gửi email thất bại. Vui lòng thử lại sau.',
-                'error': str(e)
-            }), 201
+        queue_email(
+            'Mã xác nhận đặt lại mật khẩu ký túc xá',
+            [email],
+            template='emails/forgot_password.html',
+            sender=sender,
+            reset_code=reset_code
+        )
+        db.session.commit()
+        logger.info("Email với mã xác nhận đã được đưa vào hàng đợi tới %s", email)
 
         return jsonify({
             'message': 'Mã xác nhận đã được gửi qua email.',
@@ -453,112 +374,43 @@ def reset_password():
         if not is_strong:
             return jsonify({'message': message}), 400
 
+        store = get_challenge_store()
         admin = Admin.query.filter_by(email=email).first()
-        if admin and admin.reset_token:
-            # Đảm bảo reset_token_expiry là offset-aware
-            expiry = admin.reset_token_expiry
-            if expiry.tzinfo is None:
-                expiry = expiry.replace(tzinfo=timezone.utc)
-            if not expiry or expiry < datetime.now(timezone.utc):
-                admin.reset_attempts = 0
-                admin.reset_token = None
-                admin.reset_token_expiry = None
-                execute_with_retry(lambda: db.session.commit())
-                return jsonify({'message': 'Mã xác nhận đã hết hạn hoặc không hợp lệ'}), 400
-            if admin.reset_attempts >= 3:
-                admin.reset_token = None
-                admin.reset_token_expiry = None
-                admin.reset_attempts = 0
-                execute_with_retry(lambda: db.session.commit())
-                logger.warning("Admin %s vượt quá số lần thử mã xác nhận", admin.admin_id)
-                return jsonify({'message': 'Bạn đã nhập sai mã quá 3 lần. Vui lòng yêu cầu mã xác nhận mới'}), 400
-            if not check_password_hash(admin.reset_token, code):
-                admin.reset_attempts += 1
-                execute_with_retry(lambda: db.session.commit())
-                logger.warning("Admin %s nhập sai mã xác nhận, lần thử %s", admin.admin_id, admin.reset_attempts)
-                return jsonify({'message': f'Mã xác nhận không chính xác. Bạn còn {3 - admin.reset_attempts} lần thử.'}), 400
-            
-            refresh_tokens = RefreshToken.query.filter_by(admin_id=admin.admin_id, type='ADMIN', revoked_at=None).all()
-            for token in refresh_tokens:
-                token.revoked_at = datetime.now(timezone.utc)
-
-            admin.password_hash = generate_password_hash(new_password)
-            admin.reset_token = None
-            admin.reset_token_expiry = None
-            admin.reset_attempts = 0
-            execute_with_retry(lambda: db.session.commit())
-            logger.info("Mật khẩu admin %s đã được đặt lại", admin.admin_id)
-
-            reset_time = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-            login_url = f"{request.host_url}login"
-            try:
-                msg = Message(
-                    subject='Đặt lại mật khẩu thành công',
-                    sender=current_app.config.get('MAIL_DEFAULT_SENDER'),
-                    recipients=[email]
-                )
-                msg.html = render_template('emails/reset_password_success.html', reset_time=reset_time, login_url=login_url)
-
-                mail.send(msg)
-                logger.info("Email thông báo đặt lại mật khẩu gửi tới %s", email)
-            except Exception as e:
-                logger.error("Gửi email thông báo thất bại: %s", str(e))
-
-            return jsonify({'message': 'Đặt lại mật khẩu thành công'}), 200
-
-        user = User.query.filter_by(email=email).first()
-        if user and user.reset_token:
-            expiry = user.reset_token_expiry
-            if expiry.tzinfo is None:
-                expiry = expiry.replace(tzinfo=timezone.utc)
-            if not expiry or expiry < datetime.now(timezone.utc):
-                user.reset_attempts = 0
-                user.reset_token = None
-                user.reset_token_expiry = None
-                execute_with_retry(lambda: db.session.commit())
-                return jsonify({'message': 'Mã xác nhận đã hết hạn hoặc không hợp lệ'}), 400
-            if user.reset_attempts >= 3:
-                user.reset_token = None
-                user.reset_token_expiry = None
-                user.reset_attempts = 0
-                execute_with_retry(lambda: db.session.commit())
-                logger.warning("User %s vượt quá số lần thử mã xác nhận", user.user_id)
-                return jsonify({'message': 'Bạn đã nhập sai mã quá 3 lần. Vui lòng yêu cầu mã xác nhận mới'}), 400
-            if not check_password_hash(user.reset_token, code):
-                user.reset_attempts += 1
-                execute_with_retry(lambda: db.session.commit())
-                logger.warning("User %s nhập sai mã xác nhận, lần thử %s", user.user_id, user.reset_attempts)
-                return jsonify({'message': f'Mã xác nhận không chính xác. Bạn còn {3 - user.reset_attempts} lần thử.'}), 400
-            
-            refresh_tokens = RefreshToken.query.filter_by(user_id=user.user_id, type='USER', revoked_at=None).all()
-            for token in refresh_tokens:
-                token.revoked_at = datetime.now(timezone.utc)
-
-            user.password_hash = generate_password_hash(new_password)
-            user.reset_token = None
-            user.reset_token_expiry = None
-            user.reset_attempts = 0
-            execute_with_retry(lambda: db.session.commit())
-            logger.info("Mật khẩu user %s đã được đặt lại", user.user_id)
-
-            reset_time = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-            login_url = f"{request.host_url}login"
-            try:
-                msg = Message(
-                    subject='Đặt lại mật khẩu thành công',
-                    sender=current_app.config.get('MAIL_DEFAULT_SENDER'),
-                    recipients=[email]
-                )
-                msg.html = render_template('emails/reset_password_success.html', reset_time=reset_time, login_url=login_url)
-
-                mail.send(msg)
-                logger.info("Email thông báo đặt lại mật khẩu gửi tới %s", email)
-            except Exception as e:
-                logger.error("Gửi email thông báo thất bại: %s", str(e))
-
-            return jsonify({'message': 'Đặt lại mật khẩu thành công'}), 200
-
-        return jsonify({'message': 'Không tìm thấy tài khoản hoặc mã xác nhận không hợp lệ'}), 400
+        user = None if admin else User.query.filter_by(email=email).first()
+        account = admin or user
+        if not account:
+            return jsonify({'message': 'Không tìm thấy tài khoản hoặc mã xác nhận không hợp lệ'}), 400
+
+        account_type = 'ADMIN' if admin else 'USER'
+        account_id = admin.admin_id if admin else user.user_id
+        result, remaining = store.verify_code(RESET_SCOPE, subject_key(account_type, account_id), code)
+        if result == CODE_MISSING:
+            return jsonify({'message': 'Mã xác nhận đã hết hạn hoặc không hợp lệ'}), 400
+        if result == CODE_LOCKED:
+            logger.warning("%s %s vượt quá số lần thử mã xác nhận", account_type.capitalize(), account_id)
+            return jsonify({'message': 'Bạn đã nhập sai mã quá 3 lần. Vui lòng yêu cầu mã xác nhận mới'}), 400
+        if result == CODE_INVALID:
+            logger.warning("%s %s nhập sai mã xác nhận, còn %s lần thử", account_type.capitalize(), account_id, remaining)
+            return jsonify({'message': f'Mã xác nhận không chính xác. Bạn còn {remaining} lần thử.'}), 400
+
+        token_filter = {'admin_id': account_id} if admin else {'user_id': account_id}
+        refresh_tokens = RefreshToken.query.filter_by(type=account_type, revoked_at=None, **token_filter).all()
+        for token in refresh_tokens:
+            token.revoked_at = datetime.now(timezone.utc)
+
+        account.password_hash = hash_password(new_password)
+        reset_time = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        queue_email(
+            'Đặt lại mật khẩu thành công',
+            [email],
+            template='emails/reset_password_success.html',
+            reset_time=reset_time,
+            login_url=f"{request.host_url}login"
+        )
+        db.session.commit()
+        logger.info("Mật khẩu %s %s đã được đặt lại", account_type.lower(), account_id)
+
+        return jsonify({'message': 'Đặt lại mật khẩu thành công'}), 200
 
     except ValueError as ve:
         logger.error("Lỗi dữ liệu trong /auth/reset-password: %s", str(ve))
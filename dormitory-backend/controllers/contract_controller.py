@@ -1,6 +1,5 @@
 from flask import Blueprint, request, jsonify, render_template, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from flask import current_app
 from extensions import db
 from models.contract import Contract
 from models.user import User
@@ -9,7 +8,7 @@ from models.notification import Notification
 from models.notification_recipient import NotificationRecipient
 from controllers.auth_controller import admin_required, user_required
 from controllers.statistics_controller import snapshot_room_status, save_user_room_snapshot
-from datetime import datetime, date, timedelta
+from datetime import datetime, date
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.exc import SQLAlchemyError
 import logging
@@ -17,13 +16,13 @@ from json import JSONEncoder
 from dateutil.parser import parse as parse_date
 from sqlalchemy.sql import func
 import pendulum
-import pdfkit
 from io import BytesIO
-from weasyprint import HTML
 
 from utils.fcm import send_fcm_notification
+from utils.contract_status import update_contract_statuses
+from utils.pagination import paginate
+from utils.availability import release_registration_slots
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 contract_bp = Blueprint('contract', __name__)
@@ -38,37 +37,9 @@ class CustomJSONEncoder(JSONEncoder):
             return str(obj)
         return super().default(obj)
 
-def update_contract_status():
+def update_contract_status(full=False):
     try:
-        with current_app.app_context():
-            now = pendulum.now('Asia/Ho_Chi_Minh').date()
-            window_start = now - timedelta(hours=2)
-            window_end = now + timedelta(hours=2)
-            contracts = Contract.query.filter(
-                (
-                    (Contract.start_date >= window_start) & (Contract.start_date <= window_end)
-                ) | (
-                    (Contract.end_date >= window_start) & (Contract.end_date <= window_end)
-                ) | (
-                    Contract.status.in_(['PENDING', 'ACTIVE'])
-                )
-            ).all()
-            updated_count = 0
-            for contract in contracts:
-                try:
-                    if not contract.start_date or not contract.end_date:
-                        logger.warning(f"Contract {contract.contract_id} has invalid start_date or end_date")
-                        continue
-                    old_status = contract.status
-                    contract.update_status()
-                    if old_status != contract.status:
-                        updated_count += 1
-                        logger.debug(f"Updated contract {contract.contract_id} status from {old_status} to {contract.status}")
-                except Exception as e:
-                    logger.error(f"Error updating contract {contract.contract_id}: {str(e)}")
-                    continue
-            db.session.commit()
-            logger.info(f"Updated status for {updated_count} contracts")
+        return update_contract_statuses(full=full)
     except Exception as e:
         db.session.rollback()
         logger.error(f"Error during contract status update: {str(e)}")
@@ -164,14 +135,13 @@ def get_all_contracts():
                 return jsonify({'message': 'Loại hợp đồng không hợp lệ'}), 400
             query = query.filter_by(contract_type=contract_type)
 
-        contracts = query.paginate(page=page, per_page=limit)
+        try:
+            contracts = paginate(query, [(Contract.contract_id, 'asc')], page=page, limit=limit,
+                                 cursor=request.args.get('cursor', type=str))
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
         logger.info(f"Retrieved {contracts.total} contracts for admin")
-        return jsonify({
-            'contracts': [contract.to_dict() for contract in contracts.items],
-            'total': contracts.total,
-            'pages': contracts.pages,
-            'current_page': contracts.page
-        }), 200
+        return jsonify(contracts.to_dict('contracts')), 200
     except Exception as e:
         logger.error(f"Error in get_all_contracts: {str(e)}")
         return jsonify({'message': 'Lỗi server khi lấy danh sách hợp đồng'}), 500
@@ -298,15 +268,15 @@ def create_contract():
             status='PENDING' if start_date > today else 'ACTIVE'
         )
         db.session.add(contract)
-
-        if contract.status == 'ACTIVE':
-            room.current_person_number += 1
-            room.status = 'OCCUPIED' if room.current_person_number >= room.capacity else 'AVAILABLE'
-            logger.debug(f"Updated current_person_number for room {room_id}: {room.current_person_number}")
-
+        # current_person_number của phòng được cập nhật khi flush (utils/occupancy.py)
         db.session.commit()
         logger.info(f"Contract created with contract_id={contract.contract_id}")
 
+        # Chỉ hợp đồng ACTIVE được tính vào current_person_number (utils/occupancy.py): lúc đó mới
+        # trả một chỗ giữ của đăng ký; hợp đồng PENDING trả khi job contract_status kích hoạt
+        if contract.status == 'ACTIVE':
+            release_registration_slots([(user.email, room_id)])
+
         try:
             notification = Notification(
                 title="Hợp đồng mới đã được tạo",
@@ -381,8 +351,6 @@ def update_contract(contract_id):
             return jsonify({'message': 'Dữ liệu JSON không hợp lệ'}), 400
 
         original_room_id = contract.room_id
-        original_status = contract.status
-        room_ids_to_update = {original_room_id}
 
         if 'email' in data:
             user = User.query.filter_by(email=data['email']).first()
@@ -399,7 +367,6 @@ def update_contract(contract_id):
                 logger.info(f"Room with name {room_name} and area_id {area_id} not found")
                 return jsonify({'message': 'Không tìm thấy phòng với tên và khu vực này'}), 404
             if room.room_id != original_room_id:
-                room_ids_to_update.add(room.room_id)
                 contract.room_id = room.room_id
 
         if 'contract_type' in data:
@@ -452,15 +419,7 @@ def update_contract(contract_id):
             logger.error(f'Failed to update status for contract {contract_id}: {str(update_error)}')
             return jsonify({'message': 'Lỗi khi cập nhật trạng thái hợp đồng', 'error': str(update_error)}), 500
 
-        for room_id in room_ids_to_update:
-            room = Room.query.with_for_update().get(room_id)
-            if contract.status == 'ACTIVE' and original_status != 'ACTIVE':
-                room.current_person_number += 1
-            elif contract.status != 'ACTIVE' and original_status == 'ACTIVE':
-                room.current_person_number = max(0, room.current_person_number - 1)
-            room.status = 'OCCUPIED' if room.current_person_number >= room.capacity else 'AVAILABLE'
-            logger.debug(f'Updated current_person_number for room {room_id}: {room.current_person_number}')
-
+        # Phòng cũ và phòng mới được tính lại số người khi flush (utils/occupancy.py)
         try:
             db.session.commit()
             logger.info(f'Contract {contract_id} updated successfully')
@@ -508,15 +467,8 @@ def delete_contract(contract_id):
         if contract.status == 'ACTIVE':
             return jsonify({'message': 'Không thể xóa hợp đồng đang ACTIVE'}), 400
 
-        room_id = contract.room_id
         db.session.delete(contract)
 
-        room = Room.query.with_for_update().get(room_id)
-        if contract.status == 'ACTIVE':
-            room.current_person_number = max(0, room.current_person_number - 1)
-            room.status = 'OCCUPIED' if room.current_person_number >= room.capacity else 'AVAILABLE'
-            logger.debug(f'Updated current_person_number for room {room_id}: {room.current_person_number}')
-
         try:
             db.session.commit()
             logger.info(f'Contract {contract_id} deleted')
@@ -561,22 +513,21 @@ def get_user_contracts():
         page = request.args.get('page', 1, type=int)
         limit = request.args.get('limit', 10, type=int)
 
-        contracts = Contract.query.filter_by(user_id=identity_dict['id']).paginate(page=page, per_page=limit)
+        try:
+            contracts = paginate(Contract.query.filter_by(user_id=identity_dict['id']), [(Contract.contract_id, 'asc')],
+                                 page=page, limit=limit, cursor=request.args.get('cursor', type=str))
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
 
         try:
-            contract_data = [contract.to_dict() for contract in contracts.items]
-            logger.debug(f'Contract data before jsonify: {contract_data}')
+            response = contracts.to_dict('contracts')
+            logger.debug(f'Contract data before jsonify: {response["contracts"]}')
         except Exception as dict_error:
             logger.error(f'Failed to serialize contracts for user {identity_dict["id"]}: {str(dict_error)}')
             return jsonify({'message': 'Lỗi khi lấy dữ liệu hợp đồng', 'error': str(dict_error)}), 500
 
         logger.info(f'Retrieved {contracts.total} contracts for user {identity_dict["id"]}')
-        return jsonify({
-            'contracts': contract_data,
-            'total': contracts.total,
-            'pages': contracts.pages,
-            'current_page': contracts.page
-        }), 200
+        return jsonify(response), 200
     except Exception as e:
         logger.error(f'Unexpected error in get_user_contracts for user: {str(e)}')
         return jsonify({'message': 'Lỗi server khi lấy danh sách hợp đồng của người dùng', 'error': str(e)}), 500
@@ -585,8 +536,9 @@ def get_user_contracts():
 @admin_required()
 def manual_update_contract_status():
     try:
-        update_contract_status()
-        return jsonify({'message': 'Cập nhật trạng thái hợp đồng thành công'}), 200
+        # Chạy tay thì quét lại toàn bộ, không dùng watermark
+        result = update_contract_status(full=True)
+        return jsonify({'message': 'Cập nhật trạng thái hợp đồng thành công', 'result': result}), 200
     except Exception as e:
         logger.error(f'Error in manual_update_contract_status: {str(e)}')
         return jsonify({'message': 'Lỗi khi cập nhật trạng thái hợp đồng', 'error': str(e)}), 500
@@ -605,7 +557,8 @@ def export_contract_pdf(contract_id):
         # Render HTML từ template
         html = render_template('contract/contract_template.html', contract=contract_data)
 
-        # Tạo PDF từ HTML
+        # Tạo PDF từ HTML (WeasyPrint nặng, chỉ import khi xuất PDF)
+        from weasyprint import HTML
         pdf = HTML(string=html).write_pdf()
 
         # Trả về file PDF
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from extensions import db
 from models.monthly_bill import MonthlyBill
@@ -11,20 +11,25 @@ from models.contract import Contract
 from models.notification import Notification
 from models.notification_recipient import NotificationRecipient
 from models.payment_transaction import PaymentTransaction
-from models.area import Area
 from controllers.auth_controller import admin_required, user_required
 from datetime import datetime, date
-from dateutil.relativedelta import relativedelta
+from sqlalchemy import exists, select
 from sqlalchemy.exc import IntegrityError
 from datetime import timedelta
 import logging
 from decimal import Decimal
 
 from utils.fcm import send_fcm_notification
-logging.basicConfig(level=logging.DEBUG)
+from utils.pagination import paginate
+from utils.room_reminders import notify_rooms
+from utils.billing import compute_amounts, detail_amount
+from utils.bill_rollover import resolved_rates
+from utils.meter_readings import SubmissionError, import_meter_readings, submit_room_readings
 
 monthly_bill_bp = Blueprint('monthly_bill', __name__)
 
+logger = logging.getLogger(__name__)
+
 # Utility function to get active room_id from user_id via Contract
 def get_active_room_id(user_id):
     contract = Contract.query.filter_by(user_id=user_id, status='ACTIVE').first()
@@ -35,13 +40,13 @@ def get_active_room_id(user_id):
 @monthly_bill_bp.route('/bill-details', methods=['POST'])
 @user_required()
 def submit_bill_detail():
-    logging.debug(f"POST /bill-details with data: {request.get_json()}")
+    logger.debug("POST /bill-details")
     try:
         identity = get_jwt_identity()
         try:
             user_id = identity['id'] if isinstance(identity, dict) else int(identity)
         except (TypeError, ValueError) as e:
-            logging.error(f"Invalid identity format: {str(e)}")
+            logger.error("Invalid identity format: %s", e)
             return jsonify({'message': 'Token không hợp lệ', 'error': str(e)}), 401
 
         # Get room_id from active contract
@@ -49,18 +54,13 @@ def submit_bill_detail():
         if not room_id:
             return jsonify({'message': 'Bạn không có hợp đồng hoạt động nào'}), 403
 
-        room = Room.query.get(room_id)
-        if not room:
+        if not db.session.query(exists().where(Room.room_id == room_id)).scalar():
             return jsonify({'message': 'Không tìm thấy phòng'}), 404
 
-        user = User.query.get(user_id)
-        if not user or not any(contract.room_id == room_id and contract.status == 'ACTIVE' for contract in user.contracts):
-            return jsonify({'message': 'Bạn không có quyền gửi chỉ số cho phòng này'}), 403
-
         try:
             data = request.get_json()
         except Exception:
-            logging.error("Invalid JSON data")
+            logger.error("Invalid JSON data")
             return jsonify({'message': 'Dữ liệu JSON không hợp lệ'}), 400
 
         bill_month = data.get('bill_month')
@@ -75,238 +75,150 @@ def submit_bill_detail():
         except ValueError:
             return jsonify({'message': 'Định dạng bill_month không hợp lệ (YYYY-MM)'}), 400
 
-        # Kiểm tra tháng hiện tại đã có bản ghi chưa
-        current_month = datetime.now().date().replace(day=1)
-        existing_current_month_detail = BillDetail.query.filter_by(
-            room_id=room_id,
-            bill_month=current_month
-        ).first()
-        if existing_current_month_detail and bill_month_date < current_month:
-            return jsonify({'message': f'Không thể gửi chỉ số cho tháng {bill_month} vì tháng hiện tại ({current_month.strftime("%Y-%m")}) đã có bản ghi'}), 409
-
-        services = Service.query.all()
-        if not services:
-            return jsonify({'message': 'Không tìm thấy dịch vụ nào'}), 404
-
-        valid_service_ids = {str(service.service_id) for service in services}
-        logging.debug(f"Valid service IDs: {valid_service_ids}")
-
-        last_day_of_bill_month = bill_month_date + relativedelta(months=1) - relativedelta(days=1)
-        logging.debug(f"Selecting rate for bill_month {bill_month_date}, last day of month: {last_day_of_bill_month}")
-
-        for service_id in readings:
-            if service_id not in valid_service_ids:
-                return jsonify({'message': f'ID dịch vụ {service_id} không hợp lệ'}), 400
-
-            rate = ServiceRate.query.filter(
-                ServiceRate.service_id == int(service_id),
-                ServiceRate.effective_date <= last_day_of_bill_month
-            ).order_by(ServiceRate.effective_date.desc()).first()
-
-            if not rate:
-                return jsonify({'message': f'Không tìm thấy mức giá hiện tại cho dịch vụ ID {service_id}'}), 404
-
-            logging.debug(f"Selected rate for service_id {service_id}: {rate.to_dict()}")
-
-            existing_detail = BillDetail.query.filter_by(
-                room_id=room_id,
-                bill_month=bill_month_date,
-                rate_id=rate.rate_id
-            ).first()
-            if existing_detail:
-                return jsonify({'message': f'Đã có người gửi chỉ số cho dịch vụ ID {service_id} trong tháng này'}), 409
+        if not isinstance(readings, dict):
+            return jsonify({'message': 'Chỉ số phải là object theo ID dịch vụ'}), 400
 
+        # Kiểm tra, ghi chỉ số và xếp hàng thông báo + push FCM cho worker (utils/meter_readings.py)
         try:
-            bill_details = []
-            previous_month = bill_month_date - relativedelta(months=1)
-
-            for service_id in readings:
-                service = Service.query.get(int(service_id))
-                if not service:
-                    return jsonify({'message': f'Không tìm thấy dịch vụ ID {service_id}'}), 404
-
-                logging.debug(f"Processing service_id: {service_id}, service name: {service.name}")
-
-                if not isinstance(readings[service_id], dict):
-                    return jsonify({'message': f'Chỉ số cho dịch vụ ID {service_id} ({service.name}) phải là một object'}), 400
-
-                current = readings[service_id].get('current')
-                if current is None:
-                    return jsonify({'message': f'Vui lòng nhập chỉ số hiện tại cho dịch vụ ID {service_id} ({service.name})'}), 400
-
-                try:
-                    current = float(current)
-                except (TypeError, ValueError):
-                    return jsonify({'message': f'Chỉ số hiện tại cho dịch vụ ID {service_id} ({service.name}) phải là số hợp lệ'}), 400
-
-                if current < 0:
-                    return jsonify({'message': f'Chỉ số hiện tại cho dịch vụ ID {service_id} ({service.name}) không được âm'}), 400
-
-                with db.session.no_autoflush:
-                    previous_detail = BillDetail.query.join(ServiceRate).filter(
-                        BillDetail.room_id == room_id,
-                        BillDetail.bill_month == previous_month,
-                        ServiceRate.service_id == service.service_id
-                    ).order_by(BillDetail.submitted_at.desc()).first()
-
-                previous = float(previous_detail.current_reading) if previous_detail else 0.0
+            detail_ids = submit_room_readings(room_id, user_id, bill_month_date, readings)
+        except SubmissionError as e:
+            return jsonify({'message': str(e)}), e.status
 
-                if current < previous:
-                    return jsonify({'message': f'Chỉ số hiện tại phải lớn hơn hoặc bằng chỉ số trước đó ({previous}) cho dịch vụ ID {service_id} ({service.name})'}), 400
+        logger.info("User %s submitted readings for room %s: details %s", user_id, room_id, detail_ids)
+        return jsonify({'message': 'Đã nộp chỉ số thành công'}), 201
 
-                rate = ServiceRate.query.filter(
-                    ServiceRate.service_id == service.service_id,
-                    ServiceRate.effective_date <= last_day_of_bill_month
-                ).order_by(ServiceRate.effective_date.desc()).first()
-
-                if not rate:
-                    return jsonify({'message': f'Không tìm thấy mức giá hiện tại cho dịch vụ ID {service_id} ({service.name})'}), 404
-
-                logging.debug(f"Final selected rate for service_id {service_id}: {rate.to_dict()}")
-
-                if service.service_id in [1, 2]:
-                    usage = current - previous
-                    price = usage * float(rate.unit_price)
-                else:
-                    price = float(rate.unit_price)
-
-                bill_detail = BillDetail(
-                    rate_id=rate.rate_id,
-                    previous_reading=previous,
-                    current_reading=current,
-                    price=price,
-                    room_id=room_id,
-                    bill_month=bill_month_date,
-                    submitted_by=user_id
-                )
-                db.session.add(bill_detail)
-                db.session.flush()  
-
-                bill_details.append(bill_detail)
-
-            db.session.commit()
-
-            try:
-                service_names = [Service.query.get(int(service_id)).name for service_id in readings]
-                notification = Notification(
-                    title="Gửi chỉ số thành công",
-                    message=f"Bạn đã gửi chỉ số cho tháng {bill_month_date.strftime('%Y-%m')} của các dịch vụ ({', '.join(service_names)}) thành công.",
-                    target_type="SYSTEM",
-                    target_id=user_id,
-                    related_entity_type="BILL_DETAIL",
-                    related_entity_id=bill_details[0].detail_id if bill_details else None,
-                    created_at=datetime.utcnow()
-                )
-                db.session.add(notification)
-                db.session.flush()
-                recipient = NotificationRecipient(
-                    notification_id=notification.id,
-                    user_id=user_id,
-                    is_read=False
-                )
-                db.session.add(recipient)
-                send_fcm_notification(
-                    user_id=user_id,
-                    title=notification.title,
-                    message=notification.message,
-                    data={
-                        'notification_id': str(notification.id),
-                        'related_entity_type': 'BILL_DETAIL',
-                        'related_entity_id': str(bill_details[0].detail_id) if bill_details else ''
-                    }
-                )
-                db.session.commit()
-                logging.info(f"Notification created for user {user_id}, notification_id={notification.id}")
-            except Exception as e:
-                db.session.rollback()
-                logging.error(f"Failed to create SYSTEM notification for user {user_id}: {str(e)}")
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Error in submit_bill_detail: %s", e)
+        return jsonify({'message': 'Lỗi khi gửi chỉ số', 'error': str(e)}), 500
 
-            return jsonify({'message': 'Đã nộp chỉ số thành công'}), 201
+@monthly_bill_bp.route('/admin/bill-details/import', methods=['POST'])
+@admin_required()
+def import_bill_details():
+    """
+    Nhập chỉ số nhiều phòng từ file CSV/XLSX với các cột room (hoặc room_id, kèm area
+    nếu tên phòng trùng), service (hoặc service_id), current_reading.
+    """
+    upload = request.files.get('file')
+    bill_month = request.form.get('bill_month')
+    dry_run = request.form.get('dry_run', 'false').lower() == 'true'
 
-        except Exception as e:
-            db.session.rollback()
-            logging.error(f"Error in submit_bill_detail: {str(e)}")
-            return jsonify({'message': 'Lỗi khi gửi chỉ số', 'error': str(e)}), 500
+    if not upload or not upload.filename:
+        return jsonify({'message': 'Vui lòng chọn file CSV hoặc XLSX'}), 400
+    if not bill_month:
+        return jsonify({'message': 'Thiếu bill_month'}), 400
+    try:
+        bill_month_date = datetime.strptime(bill_month + '-01', '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'message': 'Định dạng bill_month không hợp lệ (YYYY-MM)'}), 400
 
+    try:
+        report = import_meter_readings(
+            upload, bill_month_date, dry_run=dry_run,
+            batch_size=current_app.config.get('BILL_IMPORT_BATCH_SIZE', 500)
+        )
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
-        logging.error(f"Error in submit_bill_detail: {str(e)}")
-        return jsonify({'message': 'Lỗi khi gửi chỉ số', 'error': str(e)}), 500
+        logger.error("Error importing bill details for %s: %s", bill_month, e)
+        return jsonify({'message': 'Lỗi khi nhập chỉ số', 'error': str(e)}), 500
+
+    return jsonify({
+        'message': f"{'Kiểm tra' if dry_run else 'Đã nhập'} {report['imported'] + report['updated']}/{report['total_rows']} dòng chỉ số",
+        'bill_month': bill_month,
+        'dry_run': dry_run,
+        **report
+    }), 200
 
 @monthly_bill_bp.route('/admin/monthly-bills/bulk', methods=['POST'])
 @admin_required()
 def create_monthly_bills_bulk():
-    logging.debug(f"POST /admin/monthly-bills/bulk with data: {request.get_json()}")
+    logger.debug("POST /admin/monthly-bills/bulk")
     try:
         try:
             data = request.get_json()
         except Exception:
-            logging.error("Invalid JSON data")
+            logger.error("Invalid JSON data")
             return jsonify({'message': 'Dữ liệu JSON không hợp lệ'}), 400
 
         bill_month = data.get('bill_month')
         room_ids = data.get('room_ids')
 
         if not bill_month:
-            logging.error("Missing bill_month in request")
+            logger.error("Missing bill_month in request")
             return jsonify({'message': 'Yêu cầu bill_month'}), 400
 
         try:
             bill_month_date = datetime.strptime(bill_month + '-01', '%Y-%m-%d').date()
         except ValueError:
-            logging.error(f"Invalid bill_month format: {bill_month}")
+            logger.error("Invalid bill_month format: %s", bill_month)
             return jsonify({'message': 'Định dạng bill_month không hợp lệ (YYYY-MM)'}), 400
 
-        logging.debug(f"Processing bill_month: {bill_month_date}, room_ids: {room_ids}")
+        logger.debug("Processing bill_month: %s, room_ids: %s", bill_month_date, room_ids)
 
         if room_ids:
             rooms = Room.query.filter(Room.room_id.in_(room_ids)).all()
             if len(rooms) != len(room_ids):
                 invalid_ids = set(room_ids) - set(room.room_id for room in rooms)
-                logging.error(f"Rooms not found for IDs: {invalid_ids}")
+                logger.error("Rooms not found for IDs: %s", invalid_ids)
                 return jsonify({'message': f'Không tìm thấy phòng với ID: {invalid_ids}'}), 404
         else:
             rooms = Room.query.all()
 
         if not rooms:
-            logging.error("No rooms found")
+            logger.error("No rooms found")
             return jsonify({'message': 'Không tìm thấy phòng nào'}), 404
 
-        logging.debug(f"Found {len(rooms)} rooms to process")
+        logger.debug("Found %s rooms to process", len(rooms))
 
         new_bills = []
         errors = []
 
         today = datetime.today().date()
 
+        # rate_id -> service_id; service_id -> (rate_id, unit_price, is_metered) của mức giá hiện hành
+        rate_services = dict(db.session.execute(select(ServiceRate.rate_id, ServiceRate.service_id)).all())
+        effective = resolved_rates(today)
+        current_rates = {
+            service_id: (rate_id, unit_price, is_metered)
+            for service_id, rate_id, unit_price, is_metered in db.session.execute(
+                select(effective.c.service_id, effective.c.rate_id, ServiceRate.unit_price, Service.is_metered)
+                .join(ServiceRate, ServiceRate.rate_id == effective.c.rate_id)
+                .join(Service, Service.service_id == effective.c.service_id)
+            )
+        }
+        pending = []
+
         try:
             for room in rooms:
                 room_id = room.room_id
-                logging.debug(f"Processing room_id: {room_id}")
+                logger.debug("Processing room_id: %s", room_id)
 
                 bill_details = BillDetail.query.filter(
                     BillDetail.room_id == room_id,
                     BillDetail.bill_month == bill_month_date,
+                    BillDetail.submitted_by.isnot(None),
                     ~BillDetail.detail_id.in_(
                         db.session.query(MonthlyBill.detail_id).filter(MonthlyBill.bill_month == bill_month_date)
                     )
                 ).all()
 
                 if not bill_details:
-                    logging.debug(f"No unlinked bill details found for room_id {room_id}, bill_month {bill_month_date}")
+                    logger.debug("No unlinked bill details found for room_id %s, bill_month %s", room_id, bill_month_date)
                     errors.append({
                         'room_id': room_id,
                         'error': 'Không tìm thấy chỉ số dịch vụ chưa liên kết cho tháng này'
                     })
                     continue
 
-                logging.debug(f"Found {len(bill_details)} bill details for room_id {room_id}")
+                logger.debug("Found %s bill details for room_id %s", len(bill_details), room_id)
 
                 contract = next(
                     (c for c in room.contracts if c.status == 'ACTIVE' and c.user_id),
                     None
                 )
                 if not contract:
-                    logging.debug(f"No active contract found for room_id {room_id}")
+                    logger.debug("No active contract found for room_id %s", room_id)
                     errors.append({
                         'room_id': room_id,
                         'error': 'Không tìm thấy hợp đồng hoạt động cho phòng'
@@ -316,75 +228,71 @@ def create_monthly_bills_bulk():
                 user_id = contract.user_id
                 user = User.query.get(user_id)
                 if not user:
-                    logging.debug(f"User not found for user_id {user_id}")
+                    logger.debug("User not found for user_id %s", user_id)
                     errors.append({
                         'room_id': room_id,
                         'error': f'Không tìm thấy người dùng với ID {user_id}'
                     })
                     continue
 
-                logging.debug(f"Processing for user_id: {user_id}")
+                logger.debug("Processing for user_id: %s", user_id)
 
                 for detail in bill_details:
-                    service_rate = ServiceRate.query.get(detail.rate_id)
-                    if not service_rate:
-                        logging.debug(f"Service rate not found for detail_id {detail.detail_id}")
+                    if detail.rate_id not in rate_services:
+                        logger.debug("Service rate not found for detail_id %s", detail.detail_id)
                         errors.append({
                             'room_id': room_id,
                             'error': f'Không tìm thấy mức giá liên quan đến chi tiết hóa đơn với detail_id {detail.detail_id}'
                         })
                         continue
+                    pending.append((room_id, user_id, detail))
+
+            # Tính lại giá theo mức giá hiện hành cho mọi chỉ số của tháng trong một lượt;
+            # dịch vụ chưa có mức giá hiện hành giữ nguyên giá cũ
+            repriced = [
+                (detail, current_rates[rate_services[detail.rate_id]])
+                for _, _, detail in pending if rate_services[detail.rate_id] in current_rates
+            ]
+            _, amounts = compute_amounts(
+                [detail.previous_reading for detail, _ in repriced],
+                [detail.current_reading for detail, _ in repriced],
+                [unit_price for _, (_, unit_price, _) in repriced],
+                [is_metered for _, (_, _, is_metered) in repriced]
+            )
+            for (detail, (rate_id, _, _)), amount in zip(repriced, amounts):
+                detail.price = amount
+                detail.rate_id = rate_id
+                logger.debug("Updated bill detail %s with price %s", detail.detail_id, detail.price)
 
-                    service = Service.query.get(service_rate.service_id)
-                    if not service:
-                        logging.debug(f"Service not found for service_id {service_rate.service_id}")
-                        errors.append({
-                            'room_id': room_id,
-                            'error': f'Không tìm thấy dịch vụ liên quan đến chi tiết hóa đơn với detail_id {detail.detail_id}'
-                        })
-                        continue
-
-                    rate = ServiceRate.query.filter(
-                        ServiceRate.service_id == service.service_id,
-                        ServiceRate.effective_date <= today
-                    ).order_by(ServiceRate.effective_date.desc()).first()
-
-                    if rate:
-                        usage = float(detail.current_reading) - float(detail.previous_reading)
-                        unit_price = float(rate.unit_price)
-                        detail.price = usage * unit_price
-                        detail.rate_id = rate.rate_id
-                        db.session.add(detail)
-                        logging.debug(f"Updated bill detail {detail.detail_id} with price {detail.price}")
-
-                    existing_bill = MonthlyBill.query.filter_by(
-                        room_id=room_id,
-                        bill_month=bill_month_date,
-                        detail_id=detail.detail_id
-                    ).first()
-                    if existing_bill:
-                        logging.debug(f"Bill already exists for detail_id {detail.detail_id}, room_id {room_id}, bill_month {bill_month_date}")
-                        errors.append({
-                            'room_id': room_id,
-                            'error': f'Hóa đơn đã được tạo cho chỉ số với detail_id {detail.detail_id} trong tháng {bill_month_date.strftime("%Y-%m")}'
-                        })
-                        continue
+            for room_id, user_id, detail in pending:
+                existing_bill = MonthlyBill.query.filter_by(
+                    room_id=room_id,
+                    bill_month=bill_month_date,
+                    detail_id=detail.detail_id
+                ).first()
+                if existing_bill:
+                    logger.debug("Bill already exists for detail_id %s, room_id %s, bill_month %s", detail.detail_id, room_id, bill_month_date)
+                    errors.append({
+                        'room_id': room_id,
+                        'error': f'Hóa đơn đã được tạo cho chỉ số với detail_id {detail.detail_id} trong tháng {bill_month_date.strftime("%Y-%m")}'
+                    })
+                    continue
 
-                    bill = MonthlyBill(
-                        user_id=user_id,
-                        detail_id=detail.detail_id,  # Lúc này detail_id đã đúng
-                        room_id=room_id,
-                        bill_month=bill_month_date,
-                        total_amount=float(detail.price),
-                        payment_method_allowed='VNPAY'
-                    )
-                    db.session.add(bill)
-                    db.session.flush()
-                    new_bills.append(bill)
-                    logging.debug(f"Created new bill with bill_id {bill.bill_id} for room_id {room_id}")
+                bill = MonthlyBill(
+                    user_id=user_id,
+                    detail_id=detail.detail_id,
+                    room_id=room_id,
+                    bill_month=bill_month_date,
+                    total_amount=detail.price,
+                    payment_method_allowed='VNPAY'
+                )
+                db.session.add(bill)
+                new_bills.append(bill)
+            db.session.flush()
+            logger.debug("Created %s bills for bill_month %s", len(new_bills), bill_month_date)
 
             db.session.commit()
-            logging.info(f"Created {len(new_bills)} new bills")
+            logger.info("Created %s new bills", len(new_bills))
 
             # Send notifications for each bill to all users in the room
             for bill in new_bills:
@@ -397,10 +305,10 @@ def create_monthly_bills_bulk():
                     # Find all users who have ever had a contract for the room (active or inactive)
                     contracts = Contract.query.filter_by(room_id=bill.room_id).all()
                     user_ids = list(set(contract.user_id for contract in contracts if contract.user_id))
-                    logging.debug(f"Found {len(user_ids)} users (past or present) for room_id {bill.room_id}: {user_ids}")
+                    logger.debug("Found %s users (past or present) for room_id %s: %s", len(user_ids), bill.room_id, user_ids)
 
                     if not user_ids:
-                        logging.warning(f"No users found for room {bill.room_id} for bill {bill.bill_id}")
+                        logger.warning("No users found for room %s for bill %s", bill.room_id, bill.bill_id)
                         continue
 
                     # Create a single notification for the bill, targeting the room
@@ -415,7 +323,7 @@ def create_monthly_bills_bulk():
                     )
                     db.session.add(notification)
                     db.session.flush()
-                    logging.debug(f"Notification created for bill {bill.bill_id}, notification_id={notification.id}")
+                    logger.debug("Notification created for bill %s, notification_id=%s", bill.bill_id, notification.id)
 
                     # Create NotificationRecipient records and send FCM notifications for all users
                     for user_id in user_ids:
@@ -436,15 +344,15 @@ def create_monthly_bills_bulk():
                                     'related_entity_id': str(bill.bill_id)
                                 }
                             )
-                            logging.debug(f"FCM notification sent to user {user_id} for notification_id {notification.id}")
+                            logger.debug("FCM notification sent to user %s for notification_id %s", user_id, notification.id)
                         except Exception as e:
-                            logging.error(f"Failed to send FCM notification to user {user_id}: {str(e)}")
+                            logger.error("Failed to send FCM notification to user %s: %s", user_id, e)
 
                     db.session.commit()
-                    logging.info(f"Notification created for bill {bill.bill_id} and sent to users {user_ids}")
+                    logger.info("Notification created for bill %s and sent to users %s", bill.bill_id, user_ids)
                 except Exception as e:
                     db.session.rollback()
-                    logging.error(f"Failed to create notification for bill {bill.bill_id} for room {bill.room_id}: {str(e)}")
+                    logger.error("Failed to create notification for bill %s for room %s: %s", bill.bill_id, bill.room_id, e)
                     continue  # Continue without failing the request
 
             results = [bill.to_dict() for bill in new_bills]
@@ -453,22 +361,22 @@ def create_monthly_bills_bulk():
                 'errors': errors,
                 'message': 'Tạo hóa đơn hàng tháng đã hoàn tất' if results else 'Không có hóa đơn nào được tạo do không tìm thấy chỉ số phù hợp hoặc đã tồn tại hóa đơn'
             }
-            logging.info(f"Response: {response}")
+            logger.info("Bulk bills for %s: created %s, errors %s", bill_month_date, [bill.bill_id for bill in new_bills], len(errors))
             return jsonify(response), 201 if results else 400
 
         except Exception as e:
             db.session.rollback()
-            logging.error(f"Error in create_monthly_bills_bulk: {str(e)}")
+            logger.error("Error in create_monthly_bills_bulk: %s", e)
             return jsonify({'message': 'Lỗi khi tạo hóa đơn', 'error': str(e)}), 500
 
     except Exception as e:
-        logging.error(f"Error in create_monthly_bills_bulk: {str(e)}")
+        logger.error("Error in create_monthly_bills_bulk: %s", e)
         return jsonify({'message': 'Lỗi khi tạo hóa đơn', 'error': str(e)}), 500
 
 @monthly_bill_bp.route('/admin/bill-details', methods=['GET'])
 @admin_required()
 def get_all_bill_details():
-    logging.debug("GET /admin/bill-details with params: %s", request.args)
+    logger.debug("GET /admin/bill-details with params: %s", request.args)
     try:
         page = request.args.get('page', 1, type=int)
         limit = request.args.get('limit', 10, type=int)
@@ -519,7 +427,7 @@ def get_all_bill_details():
                 if not rate:
                     continue
                 bd = bill_detail_map.get((room.room_id, rate.rate_id))
-                if bd:
+                if bd and bd.submitted_by is not None:
                     detail_dict = bd.to_dict()
                     detail_dict['submitted'] = True
                     # Kiểm tra trạng thái thanh toán
@@ -572,40 +480,40 @@ def get_all_bill_details():
         }), 200
 
     except Exception as e:
-        logging.error(f"Error in get_all_bill_details: {str(e)}")
+        logger.error("Error in get_all_bill_details: %s", e)
         return jsonify({'message': 'Lỗi khi lấy danh sách chỉ số', 'error': str(e)}), 500
 
 @monthly_bill_bp.route('/admin/bill-details/<int:detail_id>', methods=['GET'])
 @admin_required()
 def get_bill_detail(detail_id):
-    logging.debug(f"GET /admin/bill-details/{detail_id}")
+    logger.debug("GET /admin/bill-details/%s", detail_id)
     try:
         bill_detail = BillDetail.query.get(detail_id)
         if not bill_detail:
-            logging.error(f"Bill detail not found for detail_id {detail_id}")
+            logger.error("Bill detail not found for detail_id %s", detail_id)
             return jsonify({'message': f'Không tìm thấy chi tiết hóa đơn với ID {detail_id}'}), 404
 
-        logging.debug(f"Returning bill detail: {bill_detail.to_dict()}")
+        logger.debug("Returning bill detail %s", detail_id)
         return jsonify(bill_detail.to_dict()), 200
 
     except Exception as e:
-        logging.error(f"Error in get_bill_detail: {str(e)}")
+        logger.error("Error in get_bill_detail: %s", e)
         return jsonify({'message': 'Lỗi khi lấy chi tiết hóa đơn', 'error': str(e)}), 500
 
 @monthly_bill_bp.route('/admin/bill-details/<int:detail_id>', methods=['PUT'])
 @admin_required()
 def update_bill_detail(detail_id):
-    logging.debug(f"PUT /admin/bill-details/{detail_id} with data: {request.get_json()}")
+    logger.debug("PUT /admin/bill-details/%s", detail_id)
     try:
         bill_detail = BillDetail.query.get(detail_id)
         if not bill_detail:
-            logging.error(f"Bill detail not found for detail_id {detail_id}")
+            logger.error("Bill detail not found for detail_id %s", detail_id)
             return jsonify({'message': f'Không tìm thấy chi tiết hóa đơn với ID {detail_id}'}), 404
 
         try:
             data = request.get_json()
         except Exception:
-            logging.error("Invalid JSON data")
+            logger.error("Invalid JSON data")
             return jsonify({'message': 'Dữ liệu JSON không hợp lệ'}), 400
 
         if 'current_reading' in data:
@@ -617,18 +525,18 @@ def update_bill_detail(detail_id):
                     return jsonify({'message': 'Chỉ số hiện tại phải lớn hơn hoặc bằng chỉ số trước đó'}), 400
                 bill_detail.current_reading = current_reading
 
-                usage = bill_detail.current_reading - bill_detail.previous_reading
                 rate = ServiceRate.query.get(bill_detail.rate_id)
                 if not rate:
-                    logging.error(f"Service rate not found for rate_id {bill_detail.rate_id}")
+                    logger.error("Service rate not found for rate_id %s", bill_detail.rate_id)
                     return jsonify({'message': 'Không tìm thấy mức giá liên quan đến chi tiết hóa đơn'}), 404
-                bill_detail.price = usage * float(rate.unit_price)
+                bill_detail.price = detail_amount(bill_detail.previous_reading, bill_detail.current_reading,
+                                                  rate.unit_price, rate.service.is_metered)
 
                 monthly_bill = MonthlyBill.query.filter_by(detail_id=detail_id).first()
                 if monthly_bill:
                     monthly_bill.total_amount = bill_detail.price
             except (TypeError, ValueError):
-                logging.error(f"Invalid current_reading: {data['current_reading']}")
+                logger.error("Invalid current_reading: %s", data['current_reading'])
                 return jsonify({'message': 'Chỉ số hiện tại phải là số hợp lệ'}), 400
 
         if 'previous_reading' in data:
@@ -640,18 +548,18 @@ def update_bill_detail(detail_id):
                     return jsonify({'message': 'Chỉ số hiện tại phải lớn hơn hoặc bằng chỉ số trước đó'}), 400
                 bill_detail.previous_reading = previous_reading
 
-                usage = bill_detail.current_reading - bill_detail.previous_reading
                 rate = ServiceRate.query.get(bill_detail.rate_id)
                 if not rate:
-                    logging.error(f"Service rate not found for rate_id {bill_detail.rate_id}")
+                    logger.error("Service rate not found for rate_id %s", bill_detail.rate_id)
                     return jsonify({'message': 'Không tìm thấy mức giá liên quan đến chi tiết hóa đơn'}), 404
-                bill_detail.price = usage * float(rate.unit_price)
+                bill_detail.price = detail_amount(bill_detail.previous_reading, bill_detail.current_reading,
+                                                  rate.unit_price, rate.service.is_metered)
 
                 monthly_bill = MonthlyBill.query.filter_by(detail_id=detail_id).first()
                 if monthly_bill:
                     monthly_bill.total_amount = bill_detail.price
             except (TypeError, ValueError):
-                logging.error(f"Invalid previous_reading: {data['previous_reading']}")
+                logger.error("Invalid previous_reading: %s", data['previous_reading'])
                 return jsonify({'message': 'Chỉ số trước đó phải là số hợp lệ'}), 400
 
         if 'price' in data:
@@ -665,55 +573,55 @@ def update_bill_detail(detail_id):
                 if monthly_bill:
                     monthly_bill.total_amount = price
             except (TypeError, ValueError):
-                logging.error(f"Invalid price: {data['price']}")
+                logger.error("Invalid price: %s", data['price'])
                 return jsonify({'message': 'Giá phải là số hợp lệ'}), 400
 
         db.session.commit()
-        logging.info(f"Updated BillDetail with ID {detail_id}")
+        logger.info("Updated BillDetail with ID %s", detail_id)
         return jsonify(bill_detail.to_dict()), 200
 
     except IntegrityError as e:
         db.session.rollback()
-        logging.error(f"IntegrityError in update_bill_detail: {str(e)}")
+        logger.error("IntegrityError in update_bill_detail: %s", e)
         return jsonify({'message': 'Lỗi khi cập nhật: Có bản ghi liên quan không thể cập nhật do ràng buộc khóa ngoại'}), 409
     except Exception as e:
         db.session.rollback()
-        logging.error(f"Error in update_bill_detail: {str(e)}")
+        logger.error("Error in update_bill_detail: %s", e)
         return jsonify({'message': 'Lỗi khi cập nhật chi tiết hóa đơn', 'error': str(e)}), 500
 
 @monthly_bill_bp.route('/admin/bill-details/<int:detail_id>', methods=['DELETE'])
 @admin_required()
 def delete_bill_detail(detail_id):
-    logging.debug(f"DELETE /admin/bill-details/{detail_id}")
+    logger.debug("DELETE /admin/bill-details/%s", detail_id)
     try:
         bill_detail = BillDetail.query.get(detail_id)
         if not bill_detail:
-            logging.error(f"Bill detail not found for detail_id {detail_id}")
+            logger.error("Bill detail not found for detail_id %s", detail_id)
             return jsonify({'message': f'Không tìm thấy chi tiết hóa đơn với ID {detail_id}'}), 404
 
         monthly_bill = MonthlyBill.query.filter_by(detail_id=detail_id).first()
         if monthly_bill:
-            logging.error(f"Cannot delete bill detail {detail_id} as it is linked to a monthly bill")
+            logger.error("Cannot delete bill detail %s as it is linked to a monthly bill", detail_id)
             return jsonify({'message': 'Không thể xóa chi tiết hóa đơn vì đã được liên kết với một hóa đơn hàng tháng'}), 409
 
         db.session.delete(bill_detail)
         db.session.commit()
-        logging.info(f"Deleted BillDetail with ID {detail_id}")
+        logger.info("Deleted BillDetail with ID %s", detail_id)
         return jsonify({'message': f'Đã xóa chi tiết hóa đơn với ID {detail_id}'}), 200
 
     except IntegrityError as e:
         db.session.rollback()
-        logging.error(f"IntegrityError in delete_bill_detail: {str(e)}")
+        logger.error("IntegrityError in delete_bill_detail: %s", e)
         return jsonify({'message': 'Lỗi khi xóa: Có bản ghi liên quan không thể xóa do ràng buộc khóa ngoại'}), 409
     except Exception as e:
         db.session.rollback()
-        logging.error(f"Error in delete_bill_detail: {str(e)}")
+        logger.error("Error in delete_bill_detail: %s", e)
         return jsonify({'message': 'Lỗi khi xóa chi tiết hóa đơn', 'error': str(e)}), 500
 
 @monthly_bill_bp.route('/admin/monthly-bills', methods=['GET'])
 @admin_required()
 def get_all_monthly_bills():
-    logging.debug("GET /admin/monthly-bills with params: %s", request.args)
+    logger.debug("GET /admin/monthly-bills with params: %s", request.args)
     try:
         page = request.args.get('page', 1, type=int)
         limit = request.args.get('limit', 10, type=int)
@@ -762,7 +670,10 @@ def get_all_monthly_bills():
             elif bill_status == 'NOT_CREATED':
                 # Lấy các BillDetail chưa có MonthlyBill
                 subquery = db.session.query(MonthlyBill.detail_id)
-                bill_details = BillDetail.query.filter(~BillDetail.detail_id.in_(subquery))
+                bill_details = BillDetail.query.filter(
+                    BillDetail.submitted_by.isnot(None),
+                    ~BillDetail.detail_id.in_(subquery)
+                )
                 # Có thể trả về riêng nếu cần
                 return jsonify({
                     'not_created_bill_details': [bd.to_dict() for bd in bill_details]
@@ -779,43 +690,41 @@ def get_all_monthly_bills():
                 )
             )
 
-        total = query.count()
-        bills = query.order_by(MonthlyBill.created_at.desc()) \
-                     .offset((page - 1) * limit).limit(limit).all()
+        # Tổng số dòng của join 5 bảng được cache theo bộ lọc; trang kế tiếp dùng cursor
+        try:
+            bills = paginate(query, [(MonthlyBill.created_at, 'desc'), (MonthlyBill.bill_id, 'desc')],
+                             page=page, limit=limit, cursor=request.args.get('cursor', type=str))
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
 
-        logging.debug(f"Returning {len(bills)} monthly bills (filtered)")
-        return jsonify({
-            'bills': [bill.to_dict() for bill in bills] if bills else [],
-            'total': total,
-            'pages': (total + limit - 1) // limit,
-            'current_page': page
-        }), 200
+        logger.debug("Returning %s monthly bills (filtered)", len(bills.items))
+        return jsonify(bills.to_dict('bills')), 200
 
     except Exception as e:
-        logging.error(f"Error in get_all_monthly_bills: {str(e)}")
+        logger.error("Error in get_all_monthly_bills: %s", e)
         return jsonify({'message': 'Lỗi khi lấy danh sách hóa đơn', 'error': str(e)}), 500
 
 @monthly_bill_bp.route('/admin/monthly-bills/<int:bill_id>', methods=['GET'])
 @admin_required()
 def get_monthly_bill(bill_id):
-    logging.debug(f"GET /admin/monthly-bills/{bill_id}")
+    logger.debug("GET /admin/monthly-bills/%s", bill_id)
     try:
         monthly_bill = MonthlyBill.query.get(bill_id)
         if not monthly_bill:
-            logging.error(f"Monthly bill not found for bill_id {bill_id}")
+            logger.error("Monthly bill not found for bill_id %s", bill_id)
             return jsonify({'message': f'Không tìm thấy hóa đơn với ID {bill_id}'}), 404
 
-        logging.debug(f"Returning monthly bill: {monthly_bill.to_dict()}")
+        logger.debug("Returning monthly bill %s", bill_id)
         return jsonify(monthly_bill.to_dict()), 200
 
     except Exception as e:
-        logging.error(f"Error in get_monthly_bill: {str(e)}")
+        logger.error("Error in get_monthly_bill: %s", e)
         return jsonify({'message': 'Lỗi khi lấy hóa đơn', 'error': str(e)}), 500
 
 @monthly_bill_bp.route('/my-bills', methods=['GET'])
 @jwt_required()
 def get_my_bills():
-    logging.debug(f"GET /my-bills with params: {request.args}")
+    """Lịch sử hóa đơn của phòng: một trang hóa đơn (kèm chi tiết, đơn giá, dịch vụ) và tổng hợp theo trạng thái."""
     try:
         identity = get_jwt_identity()
         try:
@@ -826,32 +735,12 @@ def get_my_bills():
                 user_id = int(identity)
                 user_type = get_jwt().get('type', 'USER')
         except (TypeError, ValueError) as e:
-            logging.error(f"Invalid identity format: {str(e)}")
+            logger.error("Invalid identity format: %s", e)
             return jsonify({'message': 'Token không hợp lệ', 'error': str(e)}), 401
 
         if user_type not in ['USER', 'ADMIN']:
             return jsonify({'message': 'Yêu cầu quyền người dùng hoặc admin'}), 403
 
-        # Get room_id from active contract
-        room_id = get_active_room_id(user_id)
-        if not room_id:
-            return jsonify({'message': 'Bạn không có hợp đồng hoạt động nào'}), 403
-
-        room = Room.query.get(room_id)
-        if not room:
-            logging.error(f"Room not found for room_id {room_id}")
-            return jsonify({'message': 'Không tìm thấy phòng'}), 404
-
-        if user_type != 'ADMIN':
-            user = User.query.filter_by(user_id=user_id, is_deleted=False).first()
-            if not user:
-                logging.error(f"User not found for user_id {user_id}")
-                return jsonify({'message': 'Không tìm thấy người dùng hoặc người dùng đã bị xóa'}), 404
-
-            if not any(contract.room_id == room_id and contract.status == 'ACTIVE' for contract in user.contracts):
-                logging.error(f"User {user_id} not authorized for room_id {room_id}")
-                return jsonify({'message': 'Bạn không có quyền xem hóa đơn của phòng này'}), 403
-
         page = request.args.get('page', 1, type=int)
         limit = request.args.get('limit', 10, type=int)
         bill_month = request.args.get('bill_month', type=str)
@@ -860,78 +749,113 @@ def get_my_bills():
         if page <= 0 or limit <= 0:
             return jsonify({'message': 'Page và limit phải lớn hơn 0'}), 400
 
-        query = MonthlyBill.query.filter_by(room_id=room_id)
+        bill_month_date = None
         if bill_month:
             try:
                 bill_month_date = datetime.strptime(bill_month + '-01', '%Y-%m-%d').date()
-                query = query.filter_by(bill_month=bill_month_date)
             except ValueError:
-                logging.error(f"Invalid bill_month format: {bill_month}")
+                logger.error("Invalid bill_month format: %s", bill_month)
                 return jsonify({'message': 'Định dạng bill_month không hợp lệ (YYYY-MM)'}), 400
 
+        allowed_statuses = ['PENDING', 'PAID', 'FAILED', 'OVERDUE', 'NOT_PAID']
         if payment_status:
-            allowed_statuses = ['PENDING', 'PAID', 'FAILED', 'OVERDUE', 'NOT_PAID']
-            if payment_status.upper() not in allowed_statuses:
-                logging.error(f"Invalid payment_status: {payment_status}")
+            payment_status = payment_status.upper()
+            if payment_status not in allowed_statuses:
+                logger.error("Invalid payment_status: %s", payment_status)
                 return jsonify({'message': f'Trạng thái thanh toán không hợp lệ. Phải là một trong: {allowed_statuses}'}), 400
-            if payment_status.upper() == 'NOT_PAID':
-                query = query.filter(MonthlyBill.payment_status != 'PAID')
-            else:
-                query = query.filter_by(payment_status=payment_status.upper())
-
-        query = query.order_by(MonthlyBill.created_at.desc())
-
-        sql_query = str(query)
-        logging.debug(f"SQL Query: {sql_query}")
 
-        total_bills = query.count()
-        logging.debug(f"Total bills before pagination: {total_bills}")
-
-        all_bills = query.all()
-        logging.debug(f"All bills before pagination: {[bill.to_dict() for bill in all_bills]}")
-
-        offset = (page - 1) * limit
-        bills = query.offset(offset).limit(limit).all()
-        total_pages = (total_bills + limit - 1) // limit if total_bills > 0 else 1
+        # Phòng lấy từ hợp đồng ACTIVE của chính người dùng nên không cần kiểm tra quyền lại
+        room_id = get_active_room_id(user_id)
+        if not room_id:
+            return jsonify({'message': 'Bạn không có hợp đồng hoạt động nào'}), 403
 
-        logging.debug(f"Bills after pagination: {len(bills)}")
-        logging.debug(f"Bills after pagination (details): {[bill.to_dict() for bill in bills]}")
+        room = Room.query.get(room_id)
+        if not room:
+            logger.error("Room not found for room_id %s", room_id)
+            return jsonify({'message': 'Không tìm thấy phòng'}), 404
 
-        if not bills:
-            logging.debug("No bills found after pagination")
-            return jsonify({
-                'message': 'Không tìm thấy hóa đơn nào',
-                'bills': [],
-                'total': 0,
-                'pages': 0,
-                'current_page': page
-            }), 404
+        if user_type != 'ADMIN':
+            if not User.query.filter_by(user_id=user_id, is_deleted=False).count():
+                logger.error("User not found for user_id %s", user_id)
+                return jsonify({'message': 'Không tìm thấy người dùng hoặc người dùng đã bị xóa'}), 404
 
-        return jsonify({
-            'bills': [bill.to_dict() for bill in bills],
-            'total': total_bills,
-            'pages': total_pages,
-            'current_page': page
-        }), 200
+        # Tổng hợp theo trạng thái bằng một câu GROUP BY (trong tháng được chọn nếu có)
+        summary_query = db.session.query(
+            MonthlyBill.payment_status,
+            db.func.count(MonthlyBill.bill_id),
+            db.func.coalesce(db.func.sum(MonthlyBill.total_amount), 0)
+        ).filter(MonthlyBill.room_id == room_id)
+        if bill_month_date:
+            summary_query = summary_query.filter(MonthlyBill.bill_month == bill_month_date)
+        by_status = {
+            status: {'count': count, 'total_amount': Decimal(str(amount))}
+            for status, count, amount in summary_query.group_by(MonthlyBill.payment_status).all()
+        }
+        summary = {
+            'room_id': room.room_id,
+            'room_name': room.name,
+            'bill_month': bill_month,
+            'by_status': {
+                status: {'count': value['count'], 'total_amount': str(value['total_amount'])}
+                for status, value in by_status.items()
+            },
+            'total_bills': sum(value['count'] for value in by_status.values()),
+            'total_amount': str(sum((value['total_amount'] for value in by_status.values()), Decimal('0'))),
+            'unpaid_amount': str(sum(
+                (value['total_amount'] for status, value in by_status.items() if status != 'PAID'), Decimal('0')
+            ))
+        }
+
+        query = MonthlyBill.query.options(
+            db.joinedload(MonthlyBill.user),
+            db.joinedload(MonthlyBill.room),
+            db.joinedload(MonthlyBill.bill_detail).joinedload(BillDetail.rate).joinedload(ServiceRate.service)
+        ).filter(MonthlyBill.room_id == room_id)
+        if bill_month_date:
+            query = query.filter(MonthlyBill.bill_month == bill_month_date)
+        if payment_status == 'NOT_PAID':
+            query = query.filter(MonthlyBill.payment_status != 'PAID')
+        elif payment_status:
+            query = query.filter(MonthlyBill.payment_status == payment_status)
+
+        # Tổng số dòng suy ra từ bảng tổng hợp, không cần COUNT riêng
+        try:
+            bills = paginate(query, [(MonthlyBill.created_at, 'desc'), (MonthlyBill.bill_id, 'desc')],
+                             page=page, limit=limit, cursor=request.args.get('cursor', type=str), count='none')
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        bills.total = sum(
+            value['count'] for status, value in by_status.items()
+            if not payment_status
+            or (payment_status == 'NOT_PAID' and status != 'PAID')
+            or status == payment_status
+        )
+
+        response = bills.to_dict('bills')
+        response['summary'] = summary
+        if not bills.items:
+            response['message'] = 'Không tìm thấy hóa đơn nào'
+            return jsonify(response), 404
+        return jsonify(response), 200
 
     except Exception as e:
-        logging.error(f"Error in get_my_bills: {str(e)}")
+        logger.error("Error in get_my_bills: %s", e)
         return jsonify({'message': 'Lỗi khi lấy danh sách hóa đơn', 'error': str(e)}), 500
 
 @monthly_bill_bp.route('/admin/monthly-bills/<int:bill_id>', methods=['PUT'])
 @admin_required()
 def update_monthly_bill(bill_id):
-    logging.debug(f"PUT /admin/monthly-bills/{bill_id} with data: {request.get_json()}")
+    logger.debug("PUT /admin/monthly-bills/%s", bill_id)
     try:
         monthly_bill = MonthlyBill.query.get(bill_id)
         if not monthly_bill:
-            logging.error(f"Monthly bill not found for bill_id {bill_id}")
+            logger.error("Monthly bill not found for bill_id %s", bill_id)
             return jsonify({'message': f'Không tìm thấy hóa đơn với ID {bill_id}'}), 404
 
         try:
             data = request.get_json()
         except Exception:
-            logging.error("Invalid JSON data")
+            logger.error("Invalid JSON data")
             return jsonify({'message': 'Dữ liệu JSON không hợp lệ'}), 400
 
         if 'total_amount' in data:
@@ -941,14 +865,14 @@ def update_monthly_bill(bill_id):
                     return jsonify({'message': 'Tổng tiền không được âm'}), 400
                 monthly_bill.total_amount = total_amount
             except (TypeError, ValueError):
-                logging.error(f"Invalid total_amount: {data['total_amount']}")
+                logger.error("Invalid total_amount: %s", data['total_amount'])
                 return jsonify({'message': 'Tổng tiền phải là số hợp lệ'}), 400
 
         if 'payment_status' in data:
             allowed_statuses = ['PENDING', 'PAID', 'FAILED', 'OVERDUE']
             payment_status = data['payment_status']
             if payment_status not in allowed_statuses:
-                logging.error(f"Invalid payment_status: {payment_status}")
+                logger.error("Invalid payment_status: %s", payment_status)
                 return jsonify({'message': f'Trạng thái thanh toán không hợp lệ. Phải là một trong: {allowed_statuses}'}), 400
             monthly_bill.payment_status = payment_status
 
@@ -962,30 +886,30 @@ def update_monthly_bill(bill_id):
             monthly_bill.transaction_reference = data['transaction_reference']
 
         db.session.commit()
-        logging.info(f"Updated MonthlyBill with ID {bill_id}")
+        logger.info("Updated MonthlyBill with ID %s", bill_id)
         return jsonify(monthly_bill.to_dict()), 200
 
     except IntegrityError as e:
         db.session.rollback()
-        logging.error(f"IntegrityError in update_monthly_bill: {str(e)}")
+        logger.error("IntegrityError in update_monthly_bill: %s", e)
         return jsonify({'message': 'Lỗi khi cập nhật: Có bản ghi liên quan không thể cập nhật do ràng buộc khóa ngoại'}), 409
     except Exception as e:
         db.session.rollback()
-        logging.error(f"Error in update_monthly_bill: {str(e)}")
+        logger.error("Error in update_monthly_bill: %s", e)
         return jsonify({'message': 'Lỗi khi cập nhật hóa đơn', 'error': str(e)}), 500
 
 @monthly_bill_bp.route('/admin/monthly-bills/<int:bill_id>', methods=['DELETE'])
 @admin_required()
 def delete_monthly_bill(bill_id):
-    logging.debug(f"DELETE /admin/monthly-bills/{bill_id}")
+    logger.debug("DELETE /admin/monthly-bills/%s", bill_id)
     try:
         monthly_bill = MonthlyBill.query.get(bill_id)
         if not monthly_bill:
-            logging.error(f"Monthly bill not found for bill_id {bill_id}")
+            logger.error("Monthly bill not found for bill_id %s", bill_id)
             return jsonify({'message': f'Không tìm thấy hóa đơn với ID {bill_id}'}), 404
 
         if monthly_bill.payment_status == 'PAID':
-            logging.error(f"Cannot delete paid bill {bill_id}")
+            logger.error("Cannot delete paid bill %s", bill_id)
             return jsonify({'message': 'Không thể xóa hóa đơn đã thanh toán'}), 409
 
         # Xoá các payment transaction có bill_id trùng và trạng thái PENDING
@@ -993,22 +917,22 @@ def delete_monthly_bill(bill_id):
 
         db.session.delete(monthly_bill)
         db.session.commit()
-        logging.info(f"Deleted MonthlyBill with ID {bill_id}")
+        logger.info("Deleted MonthlyBill with ID %s", bill_id)
         return jsonify({'message': f'Đã xóa hóa đơn với ID {bill_id}'}), 200
 
     except IntegrityError as e:
         db.session.rollback()
-        logging.error(f"IntegrityError in delete_monthly_bill: {str(e)}")
+        logger.error("IntegrityError in delete_monthly_bill: %s", e)
         return jsonify({'message': 'Lỗi khi xóa: Có bản ghi liên quan không thể xóa do ràng buộc khóa ngoại'}), 409
     except Exception as e:
         db.session.rollback()
-        logging.error(f"Error in delete_monthly_bill: {str(e)}")
+        logger.error("Error in delete_monthly_bill: %s", e)
         return jsonify({'message': 'Lỗi khi xóa hóa đơn', 'error': str(e)}), 500
 
 @monthly_bill_bp.route('/my-bill-details', methods=['GET'])
 @jwt_required()
 def get_my_bill_details():
-    logging.debug(f"GET /my-bill-details")
+    logger.debug("GET /my-bill-details")
     try:
         identity = get_jwt_identity()
         try:
@@ -1019,7 +943,7 @@ def get_my_bill_details():
                 user_id = int(identity)
                 user_type = get_jwt().get('type', 'USER')
         except (TypeError, ValueError) as e:
-            logging.error(f"Invalid identity format: {str(e)}")
+            logger.error("Invalid identity format: %s", e)
             return jsonify({'message': 'Token không hợp lệ', 'error': str(e)}), 401
 
         if user_type not in ['USER', 'ADMIN']:
@@ -1032,45 +956,46 @@ def get_my_bill_details():
 
         room = Room.query.get(room_id)
         if not room:
-            logging.error(f"Room not found for room_id {room_id}")
+            logger.error("Room not found for room_id %s", room_id)
             return jsonify({'message': 'Không tìm thấy phòng'}), 404
 
         if user_type != 'ADMIN':
             user = User.query.filter_by(user_id=user_id, is_deleted=False).first()
             if not user:
-                logging.error(f"User not found for user_id {user_id}")
+                logger.error("User not found for user_id %s", user_id)
                 return jsonify({'message': 'Không tìm thấy người dùng hoặc người dùng đã bị xóa'}), 404
 
             if not any(contract.room_id == room_id and contract.status == 'ACTIVE' for contract in user.contracts):
-                logging.error(f"User {user_id} not authorized for room_id {room_id}")
+                logger.error("User %s not authorized for room_id %s", user_id, room_id)
                 return jsonify({'message': 'Bạn không có quyền xem chỉ số của phòng này'}), 403
 
-        bill_details = BillDetail.query.filter_by(
-            room_id=room_id
+        bill_details = BillDetail.query.filter(
+            BillDetail.room_id == room_id,
+            BillDetail.submitted_by.isnot(None)
         ).all()
 
-        logging.debug(f"Returning {len(bill_details)} bill details for room_id {room_id}")
+        logger.debug("Returning %s bill details for room_id %s", len(bill_details), room_id)
         return jsonify([detail.to_dict() for detail in bill_details]), 200
 
     except Exception as e:
-        logging.error(f"Error in get_my_bill_details: {str(e)}")
+        logger.error("Error in get_my_bill_details: %s", e)
         return jsonify({'message': 'Lỗi khi lấy danh sách chỉ số', 'error': str(e)}), 500
 
 @monthly_bill_bp.route('/admin/paid-bills', methods=['DELETE'])
 @admin_required()
 def delete_paid_bills():
-    logging.debug("DELETE /admin/paid-bills")
+    logger.debug("DELETE /admin/paid-bills")
     try:
         try:
             data = request.get_json() or {}
         except Exception:
-            logging.error("Invalid JSON data")
+            logger.error("Invalid JSON data")
             return jsonify({'message': 'Dữ liệu JSON không hợp lệ'}), 400
 
         bill_ids = data.get('bill_ids')
 
         if not bill_ids or not isinstance(bill_ids, list):
-            logging.error("Invalid or missing bill_ids")
+            logger.error("Invalid or missing bill_ids")
             return jsonify({'message': 'Yêu cầu danh sách bill_ids hợp lệ'}), 400
 
         paid_bills = MonthlyBill.query.filter(
@@ -1079,14 +1004,14 @@ def delete_paid_bills():
         ).all()
 
         if not paid_bills:
-            logging.debug("No paid bills found for provided bill_ids")
+            logger.debug("No paid bills found for provided bill_ids")
             return jsonify({'message': 'Không tìm thấy hóa đơn nào đã thanh toán trong danh sách cung cấp'}), 404
 
         provided_ids = set(bill_ids)
         found_ids = set(bill.bill_id for bill in paid_bills)
         missing_ids = provided_ids - found_ids
         if missing_ids:
-            logging.debug(f"Bills not found for IDs: {missing_ids}")
+            logger.debug("Bills not found for IDs: %s", missing_ids)
             return jsonify({'message': f'Không tìm thấy hóa đơn với ID: {missing_ids}'}), 404
 
         deleted_bill_ids = []
@@ -1104,10 +1029,10 @@ def delete_paid_bills():
                     deleted_detail_ids.append(detail_id)
                     db.session.delete(bill_detail)
                 else:
-                    logging.warning(f"BillDetail with ID {detail_id} not found for MonthlyBill {bill.bill_id}")
+                    logger.warning("BillDetail with ID %s not found for MonthlyBill %s", detail_id, bill.bill_id)
 
             db.session.commit()
-            logging.info(f"Deleted MonthlyBills: {deleted_bill_ids}, BillDetails: {deleted_detail_ids}")
+            logger.info("Deleted MonthlyBills: %s, BillDetails: %s", deleted_bill_ids, deleted_detail_ids)
             return jsonify({
                 'message': 'Đã xóa các hóa đơn và chi tiết hóa đơn đã thanh toán',
                 'deleted_monthly_bills': deleted_bill_ids,
@@ -1116,15 +1041,15 @@ def delete_paid_bills():
 
         except IntegrityError as e:
             db.session.rollback()
-            logging.error(f"IntegrityError in delete_paid_bills: {str(e)}")
+            logger.error("IntegrityError in delete_paid_bills: %s", e)
             return jsonify({'message': 'Lỗi khi xóa: Có bản ghi liên quan không thể xóa do ràng buộc khóa ngoại'}), 409
         except Exception as e:
             db.session.rollback()
-            logging.error(f"Error in delete_paid_bills: {str(e)}")
+            logger.error("Error in delete_paid_bills: %s", e)
             return jsonify({'message': 'Lỗi khi xóa hóa đơn', 'error': str(e)}), 500
 
     except Exception as e:
-        logging.error(f"Error in delete_paid_bills: {str(e)}")
+        logger.error("Error in delete_paid_bills: %s", e)
         return jsonify({'message': 'Lỗi khi xóa hóa đơn', 'error': str(e)}), 500
 
 @monthly_bill_bp.route('/bill-details/room/<int:room_id>', methods=['GET'])
@@ -1171,6 +1096,7 @@ def get_room_bill_details(room_id):
     bill_details = BillDetail.query.filter(
         BillDetail.room_id == room_id,
         BillDetail.rate_id.in_(rate_ids),
+        BillDetail.submitted_by.isnot(None),
         db.extract('year', BillDetail.bill_month) == year
     ).all()
 
@@ -1204,88 +1130,31 @@ def notify_remind_bill_detail():
     except ValueError:
         return jsonify({'message': 'Định dạng bill_month không hợp lệ (YYYY-MM)'}), 400
 
-    # Lấy tất cả phòng không bị xóa
-    all_rooms = Room.query.filter_by(is_deleted=False).all()
-    room_map = {room.room_id: room for room in all_rooms}
-
-    # Lấy các phòng đã có bill detail trong tháng này
-    rooms_with_bill_detail = db.session.query(BillDetail.room_id).filter(
-        BillDetail.bill_month == bill_month_date
-    ).distinct().all()
-    rooms_with_bill_detail_ids = [r[0] for r in rooms_with_bill_detail]
-
-    # Tìm các phòng chưa có bill detail
-    rooms_without_bill_detail = [room_id for room_id in room_map.keys() if room_id not in rooms_with_bill_detail_ids]
-
-    if not rooms_without_bill_detail:
+    # Anti-join: phòng chưa có chỉ số đã nộp (submitted_by khác NULL) trong tháng này
+    missing_rooms = select(Room.room_id).where(
+        Room.is_deleted == False,
+        ~exists().where(
+            BillDetail.room_id == Room.room_id,
+            BillDetail.bill_month == bill_month_date,
+            BillDetail.submitted_by.isnot(None)
+        )
+    )
+    if not db.session.execute(missing_rooms.limit(1)).first():
         return jsonify({'message': 'Tất cả các phòng đã nộp chỉ số cho tháng này'}), 200
 
-    notified_rooms = []
-    
-    for room_id in rooms_without_bill_detail:
-        # Always reset session state at the start of each iteration
+    try:
+        # Chỉ phòng có người ở (hợp đồng ACTIVE) nhận thông báo; tạo theo tập hợp
+        notified_rooms = notify_rooms(
+            missing_rooms,
+            "Nhắc nhở nộp chỉ số dịch vụ",
+            f"chưa nộp chỉ số dịch vụ cho tháng {bill_month}. Vui lòng nộp chỉ số sớm nhất.",
+            'BILL_DETAIL'
+        )
+        db.session.commit()
+    except Exception as e:
         db.session.rollback()
-        db.session.remove()
-        try:
-            # Always re-query the room and area after session reset
-            room = db.session.query(Room).filter_by(room_id=room_id).first()
-            if not room:
-                continue
-            area_name = room.area.name if room.area else "Không xác định"
-            room_name = room.name
-            
-            # Chỉ gửi cho người dùng có hợp đồng ACTIVE với phòng này
-            active_contracts = Contract.query.filter_by(
-                room_id=room_id, 
-                status='ACTIVE',
-                is_deleted=False
-            ).all()
-            
-            active_user_ids = [c.user_id for c in active_contracts if c.user_id]
-            
-            if not active_user_ids:
-                # Nếu không có người dùng nào đang active, bỏ qua phòng này
-                continue
-            
-            # Tạo thông báo mới
-            notification = Notification(
-                title="Nhắc nhở nộp chỉ số dịch vụ",
-                message=f"Phòng {room_name} - Khu {area_name} chưa nộp chỉ số dịch vụ cho tháng {bill_month}. Vui lòng nộp chỉ số sớm nhất.",
-                target_type="ROOM",
-                target_id=room_id,
-                related_entity_type="BILL_DETAIL",
-                related_entity_id=None,
-                created_at=datetime.utcnow()
-            )
-            db.session.add(notification)
-            db.session.flush()  # Use flush to get notification.id before commit
-            notification_id = notification.id
-            print(f"Created notification with ID: {notification_id} for room {room_id}")
-            
-            # Tạo recipients
-            for user_id in active_user_ids:
-                recipient = NotificationRecipient(
-                    notification_id=notification_id,
-                    user_id=user_id,
-                    is_read=False
-                )
-                db.session.add(recipient)
-            
-            db.session.commit()
-            
-            notified_rooms.append({
-                'room_id': room_id,
-                'room_name': room_name,
-                'area_name': area_name,
-                'notification_id': notification_id,
-                'notified_users': active_user_ids
-            })
-            
-        except Exception as e:
-            db.session.rollback()
-            db.session.remove()
-            print(f"Error processing room {room_id}: {str(e)}")
-            # Tiếp tục với phòng tiếp theo
+        logger.error("Error sending bill detail reminders for %s: %s", bill_month, e)
+        return jsonify({'message': 'Lỗi khi gửi nhắc nhở nộp chỉ số', 'error': str(e)}), 500
 
     return jsonify({
         'message': f'Đã gửi nhắc nhở nộp chỉ số cho {len(notified_rooms)} phòng',
@@ -1310,88 +1179,29 @@ def notify_remind_payment():
     except ValueError:
         return jsonify({'message': 'Định dạng bill_month không hợp lệ (YYYY-MM)'}), 400
 
-    # Lấy tất cả phòng có hóa đơn chưa thanh toán trong tháng này kèm theo thông tin phòng
-    unpaid_bills = db.session.query(MonthlyBill, Room, Area)\
-        .join(Room, MonthlyBill.room_id == Room.room_id)\
-        .join(Area, Room.area_id == Area.area_id)\
-        .filter(
-            MonthlyBill.bill_month == bill_month_date,
-            MonthlyBill.payment_status != 'PAID'
-        ).distinct().all()
-    
-    if not unpaid_bills:
+    # Các phòng có hóa đơn chưa thanh toán trong tháng này
+    unpaid_rooms = select(MonthlyBill.room_id).where(
+        MonthlyBill.bill_month == bill_month_date,
+        MonthlyBill.payment_status != 'PAID'
+    ).distinct()
+    if not db.session.execute(unpaid_rooms.limit(1)).first():
         return jsonify({'message': 'Không có phòng nào chưa thanh toán hóa đơn tháng này'}), 200
 
-    notified_rooms = []
-    # Nhóm theo phòng để tránh gửi nhiều thông báo cho cùng một phòng
-    room_bills = {}
-    for bill, room, area in unpaid_bills:
-        if room.room_id not in room_bills:
-            room_bills[room.room_id] = {
-                'room': room,
-                'area': area,
-                'bills': []
-            }
-        room_bills[room.room_id]['bills'].append(bill)
-    
-    for room_id, data in room_bills.items():
-        # Always reset session state at the start of each iteration
+    try:
+        # Thông báo, recipient và push cho mọi phòng bằng vài câu lệnh theo tập hợp
+        notified_rooms = notify_rooms(
+            unpaid_rooms,
+            "Nhắc nhở thanh toán hóa đơn",
+            f"chưa thanh toán hóa đơn tháng {bill_month}. Vui lòng thanh toán sớm nhất.",
+            'MONTHLY_BILL'
+        )
+        db.session.commit()
+    except Exception as e:
         db.session.rollback()
-        db.session.remove()
-        try:
-            room = data['room']
-            area = data['area']
-            room_name = room.name
-            area_name = area.name if area else "Không xác định"
-            
-            # Tìm danh sách users có hợp đồng ACTIVE với phòng này
-            active_contracts = Contract.query.filter_by(
-                room_id=room_id, 
-                status='ACTIVE',
-                is_deleted=False
-            ).all()
-            
-            active_user_ids = [c.user_id for c in active_contracts if c.user_id]
-            
-            if not active_user_ids:
-                continue
-            
-            # Tạo thông báo mới
-            notification = Notification(
-                title="Nhắc nhở thanh toán hóa đơn",
-                message=f"Phòng {room_name} - Khu {area_name} chưa thanh toán hóa đơn tháng {bill_month}. Vui lòng thanh toán sớm nhất.",
-                target_type="ROOM",
-                target_id=room_id,
-                related_entity_type="MONTHLY_BILL",
-                related_entity_id=None,
-                created_at=datetime.utcnow()
-            )
-            db.session.add(notification)
-            db.session.flush()  # Use flush to get notification.id before commit
-            notification_id = notification.id
-            print(f"Created notification with ID: {notification_id} for room {room_id}")
-            
-            # Tạo recipients
-            for user_id in active_user_ids:
-                recipient = NotificationRecipient(
-                    notification_id=notification_id,
-                    user_id=user_id,
-                    is_read=False
-                )
-                db.session.add(recipient)
-            
-            db.session.commit()
-            
-            notified_rooms.append({
-                'room_id': room_id,
-                'room_name': room_name,
-                'area_name': area_name,
-                'notification_id': notification_id,
-                'notified_users': active_user_ids
-            })
-            
-        except Exception as e:
-            db.session.rollback()
-            db.session.remove()
-            print(f"Error processing room {room_id}: {str(e)}")
-            # Tiếp tục với phòng tiếp theo
\ No newline at end of file
+        logger.error("Error sending payment reminders for %s: %s", bill_month, e)
+        return jsonify({'message': 'Lỗi khi gửi nhắc nhở thanh toán', 'error': str(e)}), 500
+
+    return jsonify({
+        'message': f'Đã gửi nhắc nhở thanh toán cho {len(notified_rooms)} phòng',
+        'notified_rooms': notified_rooms
+    }), 200
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt
 from extensions import db
 from models.notification import Notification
@@ -12,11 +12,15 @@ import os
 from werkzeug.utils import secure_filename
 import logging
 import re
+import uuid
 from datetime import datetime
 import bleach
 import imghdr
 from PIL import Image
 from utils.fcm import send_fcm_notification
+from utils.storage import get_storage, storage_key
+from utils.uploads import StreamingUpload, UploadPolicy, UploadError
+from utils.search import search, search_response
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +38,18 @@ MAX_DOCUMENT_SIZE = 50 * 1024 * 1024  # 50MB mỗi tài liệu
 MAX_TOTAL_SIZE = 1000 * 1024 * 1024  # 1000MB tổng kích thước
 MAX_MESSAGE_LENGTH = 5000  # Tối đa 5000 ký tự cho message
 
+NOTIFICATION_UPLOAD_POLICY = UploadPolicy(
+    ALLOWED_EXTENSIONS,
+    MAX_DOCUMENT_SIZE,
+    max_files=MAX_FILES,
+    max_total_size=MAX_TOTAL_SIZE,
+    size_limits={
+        **{ext: MAX_IMAGE_SIZE for ext in IMAGE_EXTENSIONS},
+        **{ext: MAX_VIDEO_SIZE for ext in VIDEO_EXTENSIONS}
+    },
+    fail_fast=False
+)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -45,14 +61,16 @@ def get_file_type(filename):
         return 'document'
     return 'image'
 
-def generate_filename(created_at, notification_id, extension, folder):
+def generate_filename(created_at, notification_id, extension):
     date_str = created_at.strftime('%Y%m%d_%H%M%S')
     filename = f"notification_{date_str}_{notification_id}.{extension.lower()}"
-    counter = 1
-    while os.path.exists(os.path.join(folder, filename)):
-        filename = f"notification_{date_str}_{notification_id}_{counter}.{extension.lower()}"
-        counter += 1
-    return filename
+    key = get_storage().unique_key('notification_media', filename)
+    return key.split('/', 1)[1]
+
+def notification_media_name(uploaded):
+    # Tên file được tạo trước khi có notification_id vì file được ghi ngay khi đọc request
+    date_str = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+    return f"notification_{date_str}_{uuid.uuid4().hex[:8]}.{uploaded.extension}"
 
 def send_fcm_notification_to_multiple(user_ids, title, message, data=None):
     for user_id in user_ids:
@@ -183,17 +201,19 @@ def get_notification_recipients(notification_id):
 @notification_bp.route('/admin/notifications', methods=['POST'])
 @admin_required()
 def create_notification():
+    upload = StreamingUpload('notification_media', NOTIFICATION_UPLOAD_POLICY, file_fields=('media',),
+                             name_func=notification_media_name)
     try:
-        UPLOAD_FOLDER = current_app.config['NOTIFICATION_MEDIA_BASE'].strip()
-        if not os.access(UPLOAD_FOLDER, os.W_OK):
-            logger.error(f"Không có quyền ghi vào thư mục: {UPLOAD_FOLDER}")
-            return jsonify({'message': 'Không có quyền ghi vào thư mục lưu trữ'}), 500
-
-        if not request.content_type.startswith('multipart/form-data'):
+        if not request.content_type or not request.content_type.startswith('multipart/form-data'):
             logger.warning("Yêu cầu không phải multipart/form-data")
             return jsonify({'message': 'Yêu cầu multipart/form-data'}), 400
 
-        data = request.form
+        # File được kiểm tra magic bytes/kích thước và ghi thẳng vào storage trong lúc đọc request
+        try:
+            data = upload.receive()
+        except UploadError as e:
+            logger.warning("Upload không hợp lệ: %s", e.message)
+            return jsonify({'message': e.message}), e.status_code
         title = data.get('title')
         message = data.get('message')
         target_type = data.get('target_type')
@@ -275,99 +295,38 @@ def create_notification():
         notification_id = notification.id
         logger.info(f"Created notification with ID: {notification_id}")
 
-        files = request.files.getlist('media')
-        logger.info(f"Received {len(files)} files to upload")
-        if len(files) > MAX_FILES:
-            logger.warning("Số lượng file vượt quá giới hạn: count=%s, max=%s", len(files), MAX_FILES)
-            return jsonify({'message': f'Tối đa {MAX_FILES} file được phép upload'}), 400
-
-        total_size = 0
-        for file in files:
-            file.seek(0, os.SEEK_END)
-            total_size += file.tell()
-            file.seek(0)
-        if total_size > MAX_TOTAL_SIZE:
-            logger.warning("Tổng kích thước file quá lớn: total=%s, max=%s", total_size, MAX_TOTAL_SIZE)
-            return jsonify({'message': f'Tổng kích thước file vượt quá {MAX_TOTAL_SIZE // (1024 * 1024)}MB'}), 400
+        logger.info(f"Received {len(upload.files)} files to upload")
 
         uploaded_media = []
-        failed_uploads = []
+        failed_uploads = [{'index': f.index, 'error': f.error} for f in upload.failed]
         base_url = request.host_url.rstrip('/')
         image_count = 0
         video_count = 0
         document_count = 0
 
-        for index, file in enumerate(files):
-            logger.debug(f"Processing file {index}: {file.filename}")
-            if file.filename == '':
-                logger.warning("File không có tên: index=%s", index)
-                failed_uploads.append({'index': index, 'error': 'File không có tên'})
-                continue
-
-            if not allowed_file(file.filename):
-                logger.warning("Định dạng file không hỗ trợ: filename=%s", file.filename)
-                failed_uploads.append({'index': index, 'error': f'File {file.filename} có định dạng không hỗ trợ. Chỉ chấp nhận: {", ".join(ALLOWED_EXTENSIONS)}'})
-                continue
-
-            file.seek(0, os.SEEK_END)
-            file_size = file.tell()
-            file.seek(0)
-            file_type = get_file_type(file.filename)
-            logger.debug(f"File {file.filename}: type={file_type}, size={file_size}")
+        for uploaded in upload.saved:
+            index = uploaded.index
+            file_type = uploaded.file_type
+            logger.debug(f"File {uploaded.filename}: type={file_type}, size={uploaded.size}")
 
             if file_type == 'image':
-                if file_size > MAX_IMAGE_SIZE:
-                    logger.warning("Ảnh quá lớn: filename=%s, size=%s, max=%s", file.filename, file_size, MAX_IMAGE_SIZE)
-                    failed_uploads.append({'index': index, 'error': f'Ảnh {file.filename} quá lớn. Tối đa {MAX_IMAGE_SIZE // (1024 * 1024)}MB'})
-                    continue
-                try:
-                    image = Image.open(file)
-                    image.verify()
-                    file.seek(0)
-                    logger.debug(f"Image verification passed for {file.filename}")
-                except Exception as e:
-                    logger.error(f"File hình ảnh không hợp lệ: filename={file.filename}, error={str(e)}")
-                    failed_uploads.append({'index': index, 'error': f'File hình ảnh {file.filename} không hợp lệ: {str(e)}'})
-                    continue
                 image_count += 1
                 if image_count > MAX_IMAGES:
                     logger.warning("Số lượng ảnh vượt quá giới hạn: count=%s, max=%s", image_count, MAX_IMAGES)
+                    upload.remove(uploaded)
                     failed_uploads.append({'index': index, 'error': f'Tối đa {MAX_IMAGES} ảnh được phép upload'})
                     continue
             elif file_type == 'video':
-                if file_size > MAX_VIDEO_SIZE:
-                    logger.warning("Video quá lớn: filename=%s, size=%s, max=%s", file.filename, file_size, MAX_VIDEO_SIZE)
-                    failed_uploads.append({'index': index, 'error': f'Video {file.filename} quá lớn. Tối đa {MAX_VIDEO_SIZE // (1024 * 1024)}MB'})
-                    continue
                 video_count += 1
             else:  # document
-                if file_size > MAX_DOCUMENT_SIZE:
-                    logger.warning("Tài liệu quá lớn: filename=%s, size=%s, max=%s", file.filename, file_size, MAX_DOCUMENT_SIZE)
-                    failed_uploads.append({'index': index, 'error': f'Tài liệu {file.filename} quá lớn. Tối đa {MAX_DOCUMENT_SIZE // (1024 * 1024)}MB'})
-                    continue
                 document_count += 1
                 if document_count > MAX_DOCUMENTS:
                     logger.warning("Số lượng tài liệu vượt quá giới hạn: count=%s, max=%s", document_count, MAX_DOCUMENTS)
+                    upload.remove(uploaded)
                     failed_uploads.append({'index': index, 'error': f'Tối đa {MAX_DOCUMENTS} tài liệu được phép upload'})
                     continue
 
-            extension = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
-            filename = generate_filename(notification.created_at, notification_id, extension, UPLOAD_FOLDER)
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-            logger.debug(f"Attempting to save file {filename} at {file_path}")
-
-            try:
-                file.save(file_path)
-                if os.path.exists(file_path):
-                    logger.debug("Lưu file media thành công tại: %s", file_path)
-                else:
-                    logger.error("File không tồn tại sau khi lưu: %s", file_path)
-            except OSError as e:
-                logger.error("Lỗi khi lưu file media: filename=%s, error=%s", filename, str(e))
-                failed_uploads.append({'index': index, 'error': f'Lỗi khi lưu file {filename}'})
-                continue
-
-            media_url = filename
+            media_url = uploaded.stored_name
             sort_order = data.get(f'sort_order_{index}', str(index))
             try:
                 sort_order = int(sort_order)
@@ -381,14 +340,14 @@ def create_notification():
                 is_primary=(index == 0),
                 sort_order=sort_order,
                 file_type=file_type,
-                file_size=file_size,
+                file_size=uploaded.size,
                 uploaded_at=datetime.utcnow()
             )
             db.session.add(media)
             uploaded_media.append({
-                'filename': filename,
+                'filename': media_url,
                 'type': file_type,
-                'size': file_size,
+                'size': uploaded.size,
                 'sort_order': sort_order,
                 'media_url': f"{base_url}/api/notification_media/{media_url}"
             })
@@ -422,6 +381,7 @@ def create_notification():
 
         try:
             db.session.commit()
+            upload.keep()
             logger.info("Tạo thông báo và lưu %s file media thành công: notification_id=%s", len(uploaded_media), notification.id)
             if target_type in ['USER', 'SYSTEM']:
                 send_fcm_notification(
@@ -452,25 +412,20 @@ def create_notification():
         except Exception as e:
             db.session.rollback()
             logger.error("Lỗi khi lưu thông báo: %s", str(e))
-            for media in uploaded_media:
-                file_path = os.path.join(UPLOAD_FOLDER, media['filename'])
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info("Xóa file media do rollback: %s", file_path)
             return jsonify({'message': 'Lỗi khi lưu thông báo, vui lòng thử lại', 'failed_uploads': failed_uploads}), 500
 
     except Exception as e:
         logger.error("Lỗi server khi xử lý yêu cầu: %s", str(e))
         return jsonify({'message': 'Lỗi server nội bộ, vui lòng thử lại sau'}), 500
+    finally:
+        # Xóa file media đã ghi nếu thông báo không được lưu
+        upload.discard()
 
 @notification_bp.route('/admin/notifications/<int:notification_id>', methods=['PUT'])
 @admin_required()
 def update_notification(notification_id):
     try:
-        UPLOAD_FOLDER = current_app.config['NOTIFICATION_MEDIA_BASE'].strip()
-        if not os.access(UPLOAD_FOLDER, os.W_OK):
-            logger.error(f"Không có quyền ghi vào thư mục: {UPLOAD_FOLDER}")
-            return jsonify({'message': 'Không có quyền ghi vào thư mục lưu trữ'}), 500
+        storage = get_storage()
 
         notification = Notification.query.get(notification_id)
         if not notification:
@@ -637,16 +592,13 @@ def update_notification(notification_id):
                     continue
 
             extension = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
-            filename = generate_filename(notification.created_at, notification_id, extension, UPLOAD_FOLDER)
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-            logger.debug(f"Attempting to save file {filename} at {file_path}")
+            filename = generate_filename(notification.created_at, notification_id, extension)
+            key = storage_key('notification_media', filename)
+            logger.debug(f"Attempting to save file {filename} at {key}")
 
             try:
-                file.save(file_path)
-                if os.path.exists(file_path):
-                    logger.debug("Lưu file media thành công tại: %s", file_path)
-                else:
-                    logger.error("File không tồn tại sau khi lưu: %s", file_path)
+                storage.put(key, file.stream, content_type=file.mimetype)
+                logger.debug("Lưu file media thành công tại: %s", key)
             except OSError as e:
                 logger.error("Lỗi khi lưu file media: filename=%s, error=%s", filename, str(e))
                 failed_uploads.append({'index': index, 'error': f'Lỗi khi lưu file {filename}'})
@@ -689,10 +641,9 @@ def update_notification(notification_id):
             db.session.rollback()
             logger.error("Lỗi khi cập nhật thông báo: %s", str(e))
             for media in uploaded_media:
-                file_path = os.path.join(UPLOAD_FOLDER, media['filename'])
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info("Xóa file media do rollback: %s", file_path)
+                key = storage_key('notification_media', media['filename'])
+                if storage.delete(key):
+                    logger.info("Xóa file media do rollback: %s", key)
             return jsonify({'message': 'Lỗi khi cập nhật thông báo, vui lòng thử lại', 'failed_uploads': failed_uploads}), 500
 
     except Exception as e:
@@ -742,24 +693,35 @@ def search_notifications():
     page = request.args.get('page', 1, type=int)
     limit = request.args.get('limit', 10, type=int)
     keyword = request.args.get('keyword')
+    cursor = request.args.get('cursor', type=str)
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
 
     query = Notification.query.filter_by(is_deleted=False).filter(Notification.target_type != 'SYSTEM')
 
-    if keyword:
-        query = query.filter(
-            (Notification.title.ilike(f'%{keyword}%')) |
-            (Notification.message.ilike(f'%{keyword}%'))
-        )
     if start_date:
         query = query.filter(Notification.created_at >= start_date)
     if end_date:
         query = query.filter(Notification.created_at <= end_date)
 
-    notifications = query.paginate(page=page, per_page=limit)
+    if keyword and keyword.strip():
+        try:
+            result = search(query, 'notification', keyword, limit, page=page, cursor=cursor)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        items = result.items
+        pagination = search_response(result)
+    else:
+        notifications = query.paginate(page=page, per_page=limit)
+        items = notifications.items
+        pagination = {
+            'total': notifications.total,
+            'pages': notifications.pages,
+            'current_page': notifications.page
+        }
+
     notifications_list = []
-    for notification in notifications.items:
+    for notification in items:
         media_query = NotificationMedia.query.filter_by(
             notification_id=notification.id,
             is_deleted=False
@@ -774,7 +736,5 @@ def search_notifications():
     logger.info(f"Search notifications fetched: {len(notifications_list)} items")
     return jsonify({
         'notifications': notifications_list,
-        'total': notifications.total,
-        'pages': notifications.pages,
-        'current_page': notifications.page
+        **pagination
     }), 200
\ No newline at end of file
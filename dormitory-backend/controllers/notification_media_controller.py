@@ -1,5 +1,5 @@
 # notification_media_controller.py
-from flask import Blueprint, request, jsonify, send_from_directory, current_app
+from flask import Blueprint, request, jsonify
 from flask_jwt_extended import get_jwt, jwt_required
 from extensions import db
 from models.notification import Notification
@@ -15,9 +15,9 @@ import logging
 import re
 from unidecode import unidecode
 import mimetypes
+from utils.storage import get_storage, storage_key
 
 # Thiết lập logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 notification_media_bp = Blueprint('notification_media', __name__)
@@ -53,11 +53,8 @@ def generate_filename(notification_type_name, created_at, extension, folder):
     base_name = re.sub(r'[^\w]', '', unidecode(notification_type_name)).lower()
     date_str = created_at.strftime('%Y%m%d')
     filename = f"{base_name}_{date_str}.{extension.lower()}"
-    counter = 1
-    while os.path.exists(os.path.join(folder, filename)):
-        filename = f"{base_name}_{date_str}_{counter}.{extension.lower()}"
-        counter += 1
-    return filename
+    key = get_storage().unique_key(storage_key('notification_media', folder), filename)
+    return key.rsplit('/', 1)[1]
 
 def clean_deleted_media_notification_id():
     """
@@ -139,23 +136,11 @@ def get_notification_media(notification_id):
 @notification_media_bp.route('/notification_media/<path:filename>', methods=['GET'])
 def serve_notification_media(filename):
     try:
-        upload_folder = current_app.config.get('NOTIFICATION_MEDIA_BASE', 'Uploads/notification_media')
-        
-        # Kiểm tra đường dẫn file
-        full_path = os.path.join(upload_folder, filename)
-        logger.info(f"Serving media: {filename}, full path: {full_path}")
-
-        if not os.path.exists(full_path):
-            logger.error(f"Media file not found at: {full_path}")
-            return jsonify({'message': f'Tệp media không tồn tại tại: {full_path}'}), 404
-
-        # Kiểm tra quyền đọc file
-        if not os.access(full_path, os.R_OK):
-            logger.error(f"File is not readable: {full_path}")
-            return jsonify({'message': f'Không thể đọc file media: {filename}'}), 500
+        key = storage_key('notification_media', filename)
+        logger.info(f"Serving media: {filename}, key: {key}")
 
         # Xác định Content-Type dựa trên phần mở rộng file
-        content_type, _ = mimetypes.guess_type(full_path)
+        content_type, _ = mimetypes.guess_type(filename)
         if not content_type:
             ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
             content_type = {
@@ -171,13 +156,16 @@ def serve_notification_media(filename):
             logger.warning(f"Could not determine Content-Type for {filename}, defaulting to {content_type}")
 
         # Serve file
-        response = send_from_directory(upload_folder, filename)
-        response.headers['Content-Type'] = content_type
+        as_attachment = content_type.startswith('application')
+        try:
+            response = get_storage().send(key, mimetype=content_type, as_attachment=as_attachment,
+                                          download_name=os.path.basename(filename) if as_attachment else None)
+        except FileNotFoundError:
+            logger.error(f"Media file not found: {key}")
+            return jsonify({'message': f'Tệp media không tồn tại: {filename}'}), 404
         if content_type.startswith('video'):
             response.headers['Content-Disposition'] = 'inline'
             response.headers['Accept-Ranges'] = 'bytes'
-        elif content_type.startswith('application'):
-            response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
         response.headers['Access-Control-Allow-Origin'] = '*'
         response.headers['Access-Control-Allow-Methods'] = 'GET'
         response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
@@ -247,8 +235,7 @@ def add_notification_media(notification_id):
         media_list = []
         saved_files = []
 
-        upload_folder = current_app.config.get('NOTIFICATION_MEDIA_BASE', 'Uploads/notification_media')
-        os.makedirs(upload_folder, exist_ok=True)
+        storage = get_storage()
 
         # Lấy thông tin admin từ JWT
         claims = get_jwt()
@@ -257,8 +244,6 @@ def add_notification_media(notification_id):
 
         # Tạo thư mục con dựa trên notification_id, target_type và admin_name
         folder_name = f"{notification_id}_{notification.target_type}_{admin_name}"
-        media_folder = os.path.join(upload_folder, folder_name)
-        os.makedirs(media_folder, exist_ok=True)
 
         # Kiểm tra tổng kích thước file
         total_size = 0
@@ -313,10 +298,10 @@ def add_notification_media(notification_id):
                 filename = secure_filename(file.filename)
                 ext = filename.rsplit('.', 1)[1].lower()
                 notification_type_name = "notification"
-                unique_filename = generate_filename(notification_type_name, notification.created_at, ext, media_folder)
-                file_path = os.path.join(media_folder, unique_filename)
-                file.save(file_path)
-                saved_files.append(file_path)
+                unique_filename = generate_filename(notification_type_name, notification.created_at, ext, folder_name)
+                key = storage_key('notification_media', folder_name, unique_filename)
+                storage.put(key, file.stream, content_type=file.mimetype)
+                saved_files.append(key)
 
                 # Lưu media_url bao gồm thư mục con
                 relative_path = f"{folder_name}/{unique_filename}"
@@ -341,13 +326,12 @@ def add_notification_media(notification_id):
 
     except Exception as e:
         db.session.rollback()
-        for file_path in saved_files:
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                    logger.info(f"Cleaned up file: {file_path}")
-                except OSError:
-                    logger.warning(f"Failed to clean up file: {file_path}")
+        for key in saved_files:
+            try:
+                get_storage().delete(key)
+                logger.info(f"Cleaned up file: {key}")
+            except Exception:
+                logger.warning(f"Failed to clean up file: {key}")
         logger.error(f"Error adding media for notification {notification_id}: {str(e)}")
         return jsonify({'message': 'Lỗi server không xác định'}), 500
 
@@ -395,10 +379,9 @@ def delete_notification_media(media_id):
         media.deleted_at = datetime.utcnow()
         media.notification_id = None  # Đặt notification_id thành NULL
 
-        file_path = os.path.join(current_app.config.get('NOTIFICATION_MEDIA_BASE', 'Uploads/notification_media'), media.media_url)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            logger.info(f"Deleted file: {file_path}")
+        key = storage_key('notification_media', media.media_url)
+        if get_storage().delete(key):
+            logger.info(f"Deleted file: {key}")
 
         if media.is_primary:
             next_media = NotificationMedia.query.filter_by(notification_id=media.notification_id, is_deleted=False).order_by(NotificationMedia.sort_order).first()
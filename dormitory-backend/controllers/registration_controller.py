@@ -1,16 +1,16 @@
-from flask import Blueprint, request, jsonify,current_app
+from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
-from extensions  import db, mail
+from extensions  import db
 from models.register import Register
 from models.room import Room
-from models.contract import Contract
 from controllers.auth_controller import admin_required
 from datetime import datetime, timedelta
-from flask_mail import Message
+from utils.email_outbox import queue_email
+from utils.search import search, search_response
+from utils.availability import hold_room_slots, registration_hold_id, release_holds
 from dateutil.parser import parse
 import logging
 import re
-from flask import render_template
 registration_bp = Blueprint('registration', __name__)
 logger = logging.getLogger(__name__)
 # Tạo yêu cầu đăng ký phòng (public, không cần xác thực)
@@ -39,18 +39,6 @@ def create_registration():
         if not room:
             return jsonify({'message': 'Không tìm thấy phòng'}), 404
 
-        current_date = datetime.now().date()
-        active_contracts = Contract.query.filter(
-            Contract.room_id == room_id,
-            Contract.status == 'ACTIVE',
-            Contract.start_date <= current_date,
-            Contract.end_date >= current_date
-        ).count()
-
-        available_slots = room.capacity - active_contracts
-        if number_of_people > available_slots:
-            return jsonify({'message': 'Phòng không đủ chỗ cho số người đăng ký'}), 400
-
         existing_registration = Register.query.filter_by(email=email).filter(
             Register.status.in_(['PENDING', 'APPROVED'])
         ).first()
@@ -67,34 +55,28 @@ def create_registration():
             number_of_people=number_of_people
         )
         db.session.add(registration)
-        db.session.commit()
+        db.session.flush()
 
+        # Giữ chỗ trong availability index (nguyên tử, tự hết hạn sau AVAILABILITY_HOLD_TTL)
+        hold_id = registration_hold_id(registration.registration_id)
+        if not hold_room_slots(room, hold_id, int(number_of_people)):
+            db.session.rollback()
+            return jsonify({'message': 'Phòng không đủ chỗ cho số người đăng ký'}), 400
+        queue_email(
+            'Xác nhận đăng ký phòng ký túc xá',
+            [email],
+            template='emails/registration_confirmation.html',
+            name_student=name_student,
+            email=email,
+            phone_number=phone_number,
+            room_name=room.name,
+            number_of_people=number_of_people
+        )
         try:
-            sender = current_app.config.get('MAIL_DEFAULT_SENDER')
-            if not sender:
-                raise ValueError("MAIL_DEFAULT_SENDER chưa được cấu hình")
-
-            msg = Message(
-                subject='Xác nhận đăng ký phòng ký túc xá',
-                sender=sender,
-                recipients=[email]
-            )
-            msg.html = render_template(
-                'emails/registration_confirmation.html',
-                name_student=name_student,
-                email=email,
-                phone_number=phone_number,
-                room_name=room.name,
-                number_of_people=number_of_people
-            )
-            mail.send(msg)
-            logger.info("Gửi email xác nhận đăng ký thành công tới %s", email)
-        except Exception as e:
-            logger.error("Gửi email xác nhận thất bại tới %s: %s", email, str(e))
-            return jsonify({
-                'message': 'Đăng ký thành công nhưng không thể gửi email xác nhận. Vui lòng liên hệ quản trị viên.',
-                'registration': registration.to_dict()
-            }), 201
+            db.session.commit()
+        except Exception:
+            release_holds([hold_id])
+            raise
 
         logger.info("Tạo đăng ký thành công cho email %s", email)
         return jsonify({
@@ -121,6 +103,7 @@ def get_all_registrations():
     room_id = request.args.get('room_id', type=int)
     name_student = request.args.get('name_student', type=str)
     meeting_datetime = request.args.get('meeting_datetime', type=str)
+    cursor = request.args.get('cursor', type=str)
 
     # Bắt đầu với query cơ bản, chỉ lấy các đăng ký chưa bị xóa mềm
     query = Register.query.filter_by(is_deleted=False)
@@ -130,8 +113,6 @@ def get_all_registrations():
         query = query.filter_by(status=status.upper())
     if room_id:
         query = query.filter_by(room_id=room_id)
-    if name_student:
-        query = query.filter(Register.name_student.ilike(f"%{name_student}%"))
     if meeting_datetime:
         try:
             meeting_date = datetime.strptime(meeting_datetime, '%Y-%m-%d').date()
@@ -139,6 +120,17 @@ def get_all_registrations():
         except ValueError:
             return jsonify({'message': 'Định dạng ngày không hợp lệ, sử dụng YYYY-MM-DD'}), 400
 
+    # Tìm theo tên (không dấu) qua search index, xếp hạng theo độ khớp
+    if name_student and name_student.strip():
+        try:
+            result = search(query, 'registration', name_student, limit, page=page, cursor=cursor)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        return jsonify({
+            'registrations': [registration.to_dict() for registration in result.items],
+            **search_response(result)
+        }), 200
+
     # Phân trang và lấy kết quả
     registrations = query.paginate(page=page, per_page=limit)
 
@@ -157,8 +149,6 @@ def get_registration_by_id(registration_id):
     registration = Register.query.filter_by(registration_id=registration_id, is_deleted=False).first()
     if not registration:
         return jsonify({'message': 'Không tìm thấy yêu cầu đăng ký hoặc đã bị xóa'}), 404
-    data = registration.to_dict()
-    print(f"Response data: {data}")
     return jsonify(registration.to_dict()), 200
 
 # Phê duyệt hoặc từ chối yêu cầu đăng ký (Admin)
@@ -188,48 +178,27 @@ def update_registration_status(registration_id):
     registration.status = new_status
     registration.rejection_reason = rejection_reason if new_status == 'REJECTED' else None
     registration.processed_at = datetime.utcnow()
-    db.session.commit()
-
-    try:
-        sender = current_app.config.get('MAIL_DEFAULT_SENDER')
-        if not sender:
-            raise ValueError("MAIL_DEFAULT_SENDER chưa được cấu hình")
-
-        msg = Message(
-            sender=sender,
-            recipients=[registration.email]
+    if new_status == 'APPROVED':
+        queue_email(
+            'Thông báo phê duyệt đăng ký phòng ký túc xá',
+            [registration.email],
+            template='emails/registration_approved.html',
+            name_student=registration.name_student,
+            number_of_people=registration.number_of_people
         )
-        if new_status == 'APPROVED':
-            msg.subject = 'Thông báo phê duyệt đăng ký phòng ký túc xá'
-            msg.html = render_template(
-                'emails/registration_approved.html',
-                name_student=registration.name_student,
-                number_of_people=registration.number_of_people
-            )
-
-        else:  # REJECTED
-            msg.subject = 'Thông báo từ chối đăng ký phòng ký túc xá'
-            msg.html = render_template(
-                'emails/registration_rejected.html',
-                name_student=registration.name_student,
-                number_of_people=registration.number_of_people,
-                rejection_reason=rejection_reason
-            )
-            msg.body = render_template(
-                'emails/registration_rejected.txt',
-                name_student=registration.name_student,
-                number_of_people=registration.number_of_people,
-                rejection_reason=rejection_reason
-            )
-
-        mail.send(msg)
-        logger.info("Gửi email thông báo trạng thái %s tới %s", new_status, registration.email)
-    except Exception as e:
-        logger.error("Gửi email thất bại tới %s: %s", registration.email, str(e))
-        return jsonify({
-            'message': 'Cập nhật trạng thái thành công nhưng không thể gửi email thông báo. Vui lòng liên hệ quản trị viên.',
-            'registration': registration.to_dict()
-        }), 200
+    else:  # REJECTED
+        queue_email(
+            'Thông báo từ chối đăng ký phòng ký túc xá',
+            [registration.email],
+            template='emails/registration_rejected.html',
+            name_student=registration.name_student,
+            number_of_people=registration.number_of_people,
+            rejection_reason=rejection_reason
+        )
+    db.session.commit()
+    if new_status == 'REJECTED':
+        release_holds([registration_hold_id(registration_id)])
+    logger.info("Đưa email thông báo trạng thái %s tới %s vào hàng đợi", new_status, registration.email)
 
     return jsonify({
         'message': 'Cập nhật trạng thái thành công và email thông báo đã được gửi.',
@@ -267,16 +236,11 @@ def set_meeting_datetime(registration_id):
     registration.meeting_datetime = meeting_datetime
     registration.meeting_location = meeting_location
     room = Room.query.get(registration.room_id)
-    db.session.commit()
-
     try:
-        msg = Message(
-            subject='Thông báo thời gian gặp mặt để hoàn tất đăng ký phòng',
-            sender=current_app.config.get('MAIL_DEFAULT_SENDER'),
-            recipients=[registration.email]
-        )
-        msg.html = render_template(
-            'emails/meeting_notification.html',
+        queue_email(
+            'Thông báo thời gian gặp mặt để hoàn tất đăng ký phòng',
+            [registration.email],
+            template='emails/meeting_notification.html',
             name_student=registration.name_student,
             room_name=room.name,
             number_of_people=registration.number_of_people,
@@ -284,14 +248,14 @@ def set_meeting_datetime(registration_id):
             meeting_location=meeting_location,
             phone_number=registration.phone_number
         )
-        mail.send(msg)
+        db.session.commit()
         return jsonify({
             'message': 'Thiết lập thời gian và địa điểm gặp mặt thành công, email thông báo đã được gửi',
             'registration': registration.to_dict()
         }), 200
     except Exception as e:
         db.session.rollback()
-        return jsonify({'message': 'Không thể gửi email, vui lòng thử lại sau', 'error': str(e)}), 500
+        return jsonify({'message': 'Không thể thiết lập thời gian gặp mặt, vui lòng thử lại sau', 'error': str(e)}), 500
 
 @registration_bp.route('/registrations/batch', methods=['DELETE'])
 @admin_required()
@@ -356,6 +320,7 @@ def delete_registrations_batch():
             deleted_ids.append(reg_id)
 
         db.session.commit()
+        release_holds([registration_hold_id(reg_id) for reg_id in deleted_ids])
 
         # Trả về kết quả
         response = {
@@ -13,16 +13,15 @@ from models.notification_recipient import NotificationRecipient
 from controllers.auth_controller import admin_required, user_required
 from datetime import datetime
 from sqlalchemy.exc import IntegrityError, DataError, SQLAlchemyError
-import os
 from werkzeug.utils import secure_filename
-import uuid
 import re
 from unidecode import unidecode
 from werkzeug.exceptions import RequestEntityTooLarge
 
 from utils.fcm import send_fcm_notification
+from utils.uploads import StreamingUpload, UploadPolicy, UploadError
+from utils.pagination import paginate
 # Thiết lập logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 report_bp = Blueprint('report', __name__)
@@ -37,6 +36,7 @@ VIDEO_EXTENSIONS = {'mp4', 'mov', 'avi'}
 MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB mỗi file
 MAX_FILES_PER_REQUEST = 10  # Tối đa 10 file mỗi yêu cầu
 MAX_TOTAL_SIZE = 1000 * 1024 * 1024  # 1000MB tổng kích thước
+REPORT_UPLOAD_POLICY = UploadPolicy(ALLOWED_EXTENSIONS, MAX_FILE_SIZE, max_files=MAX_FILES_PER_REQUEST, max_total_size=MAX_TOTAL_SIZE)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -139,18 +139,19 @@ def get_all_reports():
         if report_type_id:
             query = query.filter_by(report_type_id=report_type_id)
 
-        reports = query.paginate(page=page, per_page=limit, error_out=False)
-        if not reports.items and page > 1:
+        try:
+            reports = paginate(query, [(Report.report_id, 'asc')], page=page, limit=limit,
+                               cursor=request.args.get('cursor', type=str), count='estimate')
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        # Tổng ước lượng (total_is_estimate) có thể lớn hơn số dòng thật: trang rỗng
+        # khi đó trả về danh sách rỗng thay vì 404
+        if not reports.items and reports.page and reports.page > 1 and not reports.estimated:
             logger.warning("Trang không tồn tại: page=%s", page)
             return jsonify({'message': 'Trang không tồn tại'}), 404
 
         logger.info("Lấy danh sách báo cáo thành công: total=%s", reports.total)
-        return jsonify({
-            'reports': [report.to_dict() for report in reports.items],
-            'total': reports.total,
-            'pages': reports.pages,
-            'current_page': reports.page
-        }), 200
+        return jsonify(reports.to_dict('reports')), 200
 
     except Exception as e:
         logger.error("Lỗi server khi lấy danh sách báo cáo: %s", str(e))
@@ -195,18 +196,17 @@ def get_my_reports():
         if status:
             query = query.filter_by(status=status)
 
-        reports = query.paginate(page=page, per_page=limit, error_out=False)
-        if not reports.items and page > 1:
+        try:
+            reports = paginate(query, [(Report.report_id, 'asc')], page=page, limit=limit,
+                               cursor=request.args.get('cursor', type=str))
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        if not reports.items and reports.page and reports.page > 1:
             logger.warning("Trang không tồn tại: page=%s", page)
             return jsonify({'message': 'Trang không tồn tại'}), 404
 
         logger.info("Lấy danh sách báo cáo của user_id=%s thành công: total=%s", user_id, reports.total)
-        return jsonify({
-            'reports': [report.to_dict() for report in reports.items],
-            'total': reports.total,
-            'pages': reports.pages,
-            'current_page': reports.page
-        }), 200
+        return jsonify(reports.to_dict('reports')), 200
 
     except Exception as e:
         logger.error("Lỗi server khi lấy báo cáo của người dùng: %s", str(e))
@@ -217,6 +217,7 @@ def get_my_reports():
 @jwt_required()
 @user_required()
 def create_report():
+    upload = StreamingUpload('report_images', REPORT_UPLOAD_POLICY, file_fields=('images',))
     try:
         identity = get_jwt_identity()
         claims = get_jwt()
@@ -232,11 +233,17 @@ def create_report():
 
         logger.info("Bắt đầu tạo báo cáo cho user_id=%s", user_id)
 
-        if not request.content_type.startswith('multipart/form-data'):
+        if not request.content_type or not request.content_type.startswith('multipart/form-data'):
             logger.warning("Yêu cầu không phải multipart/form-data")
             return jsonify({'message': 'Yêu cầu multipart/form-data'}), 400
 
-        data = request.form
+        # File được kiểm tra và ghi thẳng vào storage trong lúc đọc request
+        try:
+            data = upload.receive()
+        except UploadError as e:
+            logger.warning("Upload không hợp lệ cho user_id=%s: %s", user_id, e.message)
+            return jsonify({'message': e.message}), e.status_code
+
         report_type_id = data.get('report_type_id', type=int)
         content = data.get('content')
         title = data.get('title')
@@ -295,72 +302,20 @@ def create_report():
         db.session.add(report)
         db.session.flush()
 
-        files = request.files.getlist('images')
-        if not files or all(file.filename == '' for file in files):
+        if not upload.saved:
             logger.warning("Không có file media hợp lệ: report_id=%s", report.report_id)
 
         uploaded_images = []
-        saved_files = []
-
-        if files:
-            if len(files) > MAX_FILES_PER_REQUEST:
-                logger.warning("Số lượng file vượt quá giới hạn: count=%s, max=%s, report_id=%s", len(files), MAX_FILES_PER_REQUEST, report.report_id)
-                return jsonify({'message': f'Tối đa {MAX_FILES_PER_REQUEST} file mỗi yêu cầu'}), 400
-
-            total_size = 0
-            for file in files:
-                file.seek(0, os.SEEK_END)
-                total_size += file.tell()
-                file.seek(0)
-            if total_size > MAX_TOTAL_SIZE:
-                logger.warning("Tổng kích thước file quá lớn: total=%s, max=%s, report_id=%s", total_size, MAX_TOTAL_SIZE, report.report_id)
-                return jsonify({'message': f'Tổng kích thước file vượt quá {MAX_TOTAL_SIZE // (1024 * 1024)}MB'}), 400
-
-            report_folder = os.path.join(current_app.config['REPORT_IMAGES_FOLDER'])
-            os.makedirs(report_folder, exist_ok=True)
-            logger.debug("Tạo thư mục media: %s", report_folder)
-
-            for index, file in enumerate(files):
-                if file.filename == '':
-                    logger.warning("File không có tên: index=%s, report_id=%s", index, report.report_id)
-                    continue
-
-                if not allowed_file(file.filename):
-                    logger.warning("Định dạng file không hỗ trợ: filename=%s, report_id=%s", file.filename, report.report_id)
-                    return jsonify({'message': f'File {file.filename} có định dạng không hỗ trợ. Chỉ chấp nhận: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
-
-                file.seek(0, os.SEEK_END)
-                file_size = file.tell()
-                file.seek(0)
-                if file_size > MAX_FILE_SIZE:
-                    file_type = get_file_type(file.filename)
-                    logger.warning("File %s quá lớn: filename=%s, size=%s, max=%s, report_id=%s", file_type, file.filename, file_size, MAX_FILE_SIZE, report.report_id)
-                    return jsonify({'message': f'File {file.filename} ({file_type}) quá lớn. Tối đa {MAX_FILE_SIZE // (1024 * 1024)}MB'}), 400
-
-                extension = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
-                filename = f"{uuid.uuid4().hex}.{extension}"
-                file_path = os.path.join(report_folder, filename)
-
-                try:
-                    file.save(file_path)
-                    logger.debug("Lưu file media tại: %s", file_path)
-                except OSError as e:
-                    logger.error("Lỗi khi lưu file media: filename=%s, error=%s", filename, str(e))
-                    return jsonify({'message': f'Lỗi khi lưu file {filename}'}), 500
-
-                saved_files.append(file_path)
-                relative_path = filename
-                file_type = get_file_type(filename)
-
-                report_image = ReportImage(
-                    report_id=report.report_id,
-                    image_url=relative_path,
-                    file_type=file_type,
-                    alt_text=data.get(f'alt_text_{index}', ''),
-                    uploaded_at=datetime.utcnow()
-                )
-                db.session.add(report_image)
-                uploaded_images.append(report_image)
+        for uploaded in upload.saved:
+            report_image = ReportImage(
+                report_id=report.report_id,
+                image_url=uploaded.stored_name,
+                file_type=get_file_type(uploaded.stored_name),
+                alt_text=data.get(f'alt_text_{uploaded.index}', ''),
+                uploaded_at=datetime.utcnow()
+            )
+            db.session.add(report_image)
+            uploaded_images.append(report_image)
 
         # Create notification within the same transaction
         try:
@@ -402,15 +357,12 @@ def create_report():
                 }
             )
             db.session.commit()
+            upload.keep()
             logger.info(f"Report created: report_id={report.report_id}, media_count={len(uploaded_images)}, notification_id={notification.id}")
             return jsonify(report.to_dict()), 201
 
         except Exception as e:
             db.session.rollback()
-            for file_path in saved_files:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info(f"Cleaned up file: {file_path}")
             logger.error(f"Failed to create report or notification for user {user_id}, report {report.report_id}: {str(e)}")
             return jsonify({'message': f'Lỗi khi tạo báo cáo hoặc thông báo: {str(e)}'}), 500
 
@@ -421,6 +373,9 @@ def create_report():
         db.session.rollback()
         logger.error("Lỗi server khi xử lý yêu cầu tạo báo cáo: %s", str(e))
         return jsonify({'message': 'Lỗi server nội bộ, vui lòng thử lại sau'}), 500
+    finally:
+        # Xóa các file đã ghi nếu báo cáo không được lưu
+        upload.discard()
 
 # Cập nhật thông tin báo cáo (Admin)
 @report_bp.route('/admin/reports/<int:report_id>', methods=['PUT'])
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify, send_from_directory
+from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from extensions import db
 from flask import current_app
@@ -10,6 +10,7 @@ import uuid
 import logging
 from datetime import datetime
 from werkzeug.exceptions import RequestEntityTooLarge
+from utils.storage import get_storage, storage_key
 
 # Thiết lập logging
 logger = logging.getLogger(__name__)
@@ -88,10 +89,7 @@ def create_report_image(report_id):
         uploaded_images = []
         saved_files = []
 
-        # Tạo thư mục lưu trữ ảnh
-        upload_folder = os.path.join(current_app.config['REPORT_IMAGES_FOLDER'])
-        os.makedirs(upload_folder, exist_ok=True)
-        logger.debug("Tạo thư mục media: %s", upload_folder)
+        storage = get_storage()
 
         for file in files:
             if file.filename == '':
@@ -114,12 +112,12 @@ def create_report_image(report_id):
             # Tạo tên file duy nhất bằng uuid
             ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
             filename = f"{uuid.uuid4().hex}.{ext}"
-            file_path = os.path.join(upload_folder, filename)
+            key = storage_key('report_images', filename)
 
             # Lưu file
-            file.save(file_path)
-            saved_files.append(file_path)
-            logger.debug("Lưu file media tại: %s", file_path)
+            storage.put(key, file.stream, content_type=file.mimetype)
+            saved_files.append(key)
+            logger.debug("Lưu file media tại: %s", key)
 
             # Xác định loại file
             file_type = get_file_type(filename)
@@ -146,10 +144,9 @@ def create_report_image(report_id):
         except Exception as e:
             db.session.rollback()
             logger.error("Lỗi khi lưu media vào cơ sở dữ liệu: %s", str(e))
-            for file_path in saved_files:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info("Xóa file media do rollback: %s", file_path)
+            for key in saved_files:
+                if storage.delete(key):
+                    logger.info("Xóa file media do rollback: %s", key)
             return jsonify({'message': 'Lỗi khi lưu media, vui lòng thử lại'}), 500
 
     except RequestEntityTooLarge:
@@ -201,8 +198,8 @@ def get_report_images(report_id):
 @report_image_bp.route('/reportimage/<path:filename>')
 def serve_image(filename):
     try:
-        full_path = os.path.join(current_app.config['REPORT_IMAGES_FOLDER'], filename)
-        logger.info(f"Serving image: {filename}, full path: {full_path}")
+        key = storage_key('report_images', filename)
+        logger.info(f"Serving image: {filename}, key: {key}")
 
         # Kiểm tra file tồn tại trong database
         media = ReportImage.query.filter_by(image_url=filename, is_deleted=False).first()
@@ -210,11 +207,12 @@ def serve_image(filename):
             logger.warning(f"Media not found or deleted: {filename}")
             return jsonify({'message': 'Không tìm thấy file media hoặc file đã bị xóa'}), 404
 
-        if not os.path.exists(full_path):
-            logger.error(f"Image file not found at: {full_path}")
-            return jsonify({'message': f'Tệp hình ảnh không tồn tại tại: {full_path}'}), 404
+        try:
+            response = get_storage().send(key)
+        except FileNotFoundError:
+            logger.error(f"Image file not found: {key}")
+            return jsonify({'message': f'Tệp hình ảnh không tồn tại: {filename}'}), 404
 
-        response = send_from_directory(current_app.config['REPORT_IMAGES_FOLDER'], filename)
         # Thêm header CORS
         response.headers['Access-Control-Allow-Origin'] = '*'
         response.headers['Access-Control-Allow-Methods'] = 'GET'
@@ -2,9 +2,8 @@ from flask import Blueprint, request, jsonify
 from extensions  import db
 from models.report_type import ReportType
 from controllers.auth_controller import admin_required
-import os
-from flask import current_app
 from werkzeug.utils import secure_filename
+from utils.storage import get_storage, storage_key
 report_type_bp = Blueprint('report_type', __name__)
 
 # Lấy danh sách tất cả loại báo cáo (Public)
@@ -53,20 +52,7 @@ def create_report_type():
             db.session.rollback()
             return jsonify({'message': 'Lỗi khi tạo loại báo cáo', 'error': str(e)}), 500
 
-        # Tạo thư mục với tên report_<name>
-        folder_name = f"report_{name}"
-        # Thay thế các ký tự không hợp lệ trong tên thư mục
-        folder_name = "".join(c if c.isalnum() or c == '_' else '_' for c in folder_name)
-        report_type_folder = os.path.join(
-            current_app.config['REPORT_IMAGES_FOLDER'],
-            'report_types',
-            folder_name
-        )
-        if not os.path.exists(report_type_folder):
-            try:
-                os.makedirs(report_type_folder)
-            except Exception as e:
-                return jsonify({'message': 'Không thể tạo thư mục cho loại báo cáo', 'error': str(e)}), 500
+        # Thư mục report_images/report_types/report_<name> được storage tự tạo khi ghi file đầu tiên
 
         return jsonify(report_type.to_dict()), 201
 
@@ -105,26 +91,17 @@ def update_report_type(report_type_id):
         if old_name != new_name:
             old_folder_name = f"report_{old_name}"
             old_folder_name = "".join(c if c.isalnum() or c == '_' else '_' for c in old_folder_name)
-            old_folder = os.path.join(
-                current_app.config['REPORT_IMAGES_FOLDER'],
-                'report_types',
-                old_folder_name
-            )
+            old_folder = storage_key('report_images', 'report_types', old_folder_name)
 
             new_folder_name = f"report_{new_name}"
             new_folder_name = "".join(c if c.isalnum() or c == '_' else '_' for c in new_folder_name)
-            new_folder = os.path.join(
-                current_app.config['REPORT_IMAGES_FOLDER'],
-                'report_types',
-                new_folder_name
-            )
+            new_folder = storage_key('report_images', 'report_types', new_folder_name)
 
             # Đổi tên thư mục nếu thư mục cũ tồn tại
-            if os.path.exists(old_folder):
-                try:
-                    os.rename(old_folder, new_folder)
-                except Exception as e:
-                    return jsonify({'message': 'Không thể đổi tên thư mục cho loại báo cáo', 'error': str(e)}), 500
+            try:
+                get_storage().move_prefix(old_folder, new_folder)
+            except Exception as e:
+                return jsonify({'message': 'Không thể đổi tên thư mục cho loại báo cáo', 'error': str(e)}), 500
 
         try:
             db.session.commit()
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify, current_app, send_file
+from flask import Blueprint, request, jsonify, send_file
 from extensions import db
 from models.room import Room
 from models.contract import Contract
@@ -8,7 +8,6 @@ from models.area import Area
 from models.roomimage import RoomImage
 from controllers.auth_controller import admin_required
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from sqlalchemy import func
 import logging
 import os
 from werkzeug.utils import secure_filename
@@ -17,10 +16,11 @@ import uuid
 from unidecode import unidecode
 import re
 from io import BytesIO
-import openpyxl
+from utils.storage import get_storage, storage_key, trash_key
+from utils.search import search, search_response
+from utils.availability import available_room_ids
 
 # Thiết lập logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 room_bp = Blueprint('room', __name__)
@@ -31,61 +31,17 @@ def normalize_name(name):
     normalized = re.sub(r'[^a-zA-Z0-9]', '_', normalized)
     return normalized
 
-def update_current_person_number(room_id=None):
-    """Cập nhật current_person_number hiệu quả cho một phòng hoặc tất cả phòng."""
-    try:
-        contract_counts = db.session.query(
-            Contract.room_id,
-            func.count().label('active_count')
-        ).filter(
-            Contract.status == 'ACTIVE'
-        ).group_by(
-            Contract.room_id
-        ).subquery()
-
-        if room_id:
-            rooms_query = Room.query.filter_by(room_id=room_id)
-        else:
-            rooms_query = Room.query
-
-        for room in rooms_query:
-            active_count = db.session.query(contract_counts.c.active_count).filter(contract_counts.c.room_id == room.room_id).scalar() or 0
-            room.current_person_number = active_count
-            old_status = room.status
-            if room.status not in ['MAINTENANCE', 'DISABLED']:
-                room.status = 'OCCUPIED' if active_count >= room.capacity else 'AVAILABLE'
-                if old_status != room.status:
-                    logger.info(f"Room {room.room_id}: Changed status from {old_status} to {room.status}")
-            else:
-                logger.info(f"Room {room.room_id}: Skipped status update (current status: {room.status})")
-
-        db.session.commit()
-        logger.info(f"Updated current_person_number for {'room ' + str(room_id) if room_id else 'all rooms'}")
-        return True
-    except SQLAlchemyError as e:
-        db.session.rollback()
-        logger.error(f"Database error updating current_person_number: {str(e)}")
-        return False
-    except Exception as e:
-        db.session.rollback()
-        logger.error(f"Unexpected error updating current_person_number: {str(e)}")
-        return False
-
 # Lấy danh sách tất cả phòng (public, user, admin)
 @room_bp.route('/rooms', methods=['GET'])
 def get_rooms():
+    # Chỉ đọc: current_person_number được duy trì khi hợp đồng thay đổi (utils/occupancy.py)
     try:
-        if not update_current_person_number():
-            return jsonify({'message': 'Lỗi khi cập nhật số lượng người trong phòng'}), 500
-
         # Thêm xử lý tìm kiếm user
         search_user = request.args.get('search_user', '').strip()
         if search_user:
-            user = User.query.filter(
-                (User.fullname.ilike(f'%{search_user}%')) |
-                (User.email.ilike(f'%{search_user}%')) |
-                (User.student_code.ilike(f'%{search_user}%'))
-            ).first()
+            # Lấy người dùng khớp nhất (không dấu) từ search index
+            matched = search(User.query.filter_by(is_deleted=False), 'user', search_user, 1)
+            user = matched.items[0] if matched.items else None
             if not user:
                 return jsonify({'rooms': [], 'total': 0, 'pages': 0, 'current_page': 1}), 200
 
@@ -112,10 +68,11 @@ def get_rooms():
         min_price = request.args.get('min_price', type=float)
         max_price = request.args.get('max_price', type=float)
         available = request.args.get('available', type=bool)
-        search = request.args.get('search', '')
+        keyword = request.args.get('search', '').strip()
+        cursor = request.args.get('cursor', type=str)
         area_id = request.args.get('area_id', type=int)
 
-        query = Room.query.filter_by(is_deleted=False)
+        query = Room.query.options(db.joinedload(Room.area)).filter_by(is_deleted=False)
         if min_capacity:
             query = query.filter(Room.capacity >= min_capacity)
         if max_capacity:
@@ -125,11 +82,23 @@ def get_rooms():
         if max_price:
             query = query.filter(Room.price <= max_price)
         if available:
-            query = query.filter(Room.current_person_number < Room.capacity)
-        if search:
-            query = query.filter(Room.name.ilike(f'%{search}%') | Room.description.ilike(f'%{search}%'))
+            # Tập phòng còn chỗ (đã trừ chỗ đang giữ cho đăng ký) từ availability index
+            room_ids = available_room_ids(area_id, min_capacity, max_capacity)
+            if room_ids is None:
+                query = query.filter(Room.current_person_number < Room.capacity)
+            else:
+                query = query.filter(Room.room_id.in_(room_ids))
         if area_id:
             query = query.filter(Room.area_id == area_id)
+        if keyword:
+            try:
+                result = search(query, 'room', keyword, limit, page=page, cursor=cursor)
+            except ValueError as e:
+                return jsonify({'message': str(e)}), 400
+            return jsonify({
+                'rooms': [room.to_dict() for room in result.items],
+                **search_response(result)
+            }), 200
 
         rooms = query.paginate(page=page, per_page=limit)
         return jsonify({
@@ -146,10 +115,7 @@ def get_rooms():
 @room_bp.route('/rooms/<int:room_id>', methods=['GET'])
 def get_room_by_id(room_id):
     try:
-        if not update_current_person_number(room_id):
-            return jsonify({'message': 'Không tìm thấy phòng hoặc lỗi khi cập nhật số lượng người'}), 404
-
-        room = Room.query.filter_by(room_id=room_id, is_deleted=False).first()
+        room = Room.query.options(db.joinedload(Room.area)).filter_by(room_id=room_id, is_deleted=False).first()
         if room:
             return jsonify(room.to_dict()), 200
         return jsonify({'message': 'Không tìm thấy phòng'}), 404
@@ -217,9 +183,7 @@ def create_room():
                 logger.warning(f"Too many media files uploaded: {len(files)} > {max_media}")
                 return jsonify({'message': f'Chỉ được tải lên tối đa {max_media} file'}), 400
 
-            # Tạo thư mục lưu trữ media
-            upload_folder = os.path.join(current_app.config['ROOM_IMAGES_BASE'])
-            os.makedirs(upload_folder, exist_ok=True)
+            storage = get_storage()
 
             # Kiểm tra file media
             for file in files:
@@ -243,13 +207,9 @@ def create_room():
             for index, file in enumerate(files):
                 ext = file.filename.rsplit('.', 1)[1].lower()
                 filename = f"{uuid.uuid4().hex}.{ext}"
-                file_path = os.path.join(upload_folder, filename)
-                file.seek(0, os.SEEK_END)
-                file_size = file.tell()
-                file.seek(0)
-
-                file.save(file_path)
-                saved_files.append(file_path)
+                key = storage_key('roomimage', filename)
+                file_size = storage.put(key, file.stream, content_type=file.mimetype)
+                saved_files.append(key)
 
                 is_primary = data.get(f'is_primary_{index}', False, type=bool)
                 if is_primary and not primary_set:
@@ -278,17 +238,15 @@ def create_room():
             return jsonify(room.to_dict()), 201
         except SQLAlchemyError as e:
             db.session.rollback()
-            for file_path in saved_files:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info(f"Cleaned up file: {file_path}")
+            for key in saved_files:
+                get_storage().delete(key)
+                logger.info(f"Cleaned up file: {key}")
             logger.error(f"Database error creating room: {str(e)}")
             return jsonify({'message': 'Lỗi cơ sở dữ liệu khi tạo phòng'}), 500
         except OSError as e:
             db.session.rollback()
-            for file_path in saved_files:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
+            for key in saved_files:
+                get_storage().delete(key)
             logger.error(f"File system error creating room: {str(e)}")
             return jsonify({'message': 'Lỗi hệ thống khi lưu file media'}), 500
 
@@ -354,25 +312,18 @@ def update_room(room_id):
                 RoomImage.room_id == room_id,
                 RoomImage.is_deleted == False
             ).all()
-            roomname = f"{room.name} - {area.name}"
-            roomname = "".join(c if c.isalnum() or c in (' ', '-') else '_' for c in roomname)
-            trash_folder = os.path.join(current_app.config['UPLOAD_BASE'], 'trash', 'roomimage', roomname)
-            os.makedirs(trash_folder, exist_ok=True)
-
+            storage = get_storage()
             for media in media_to_delete:
                 media.is_deleted = True
                 media.deleted_at = datetime.utcnow()
-                absolute_path = os.path.join(current_app.config['ROOM_IMAGES_BASE'], media.image_url)
-                if os.path.exists(absolute_path):
-                    trash_filename = f"{uuid.uuid4().hex}_{os.path.basename(media.image_url)}"
-                    trash_path = os.path.join(trash_folder, trash_filename)
-                    try:
-                        os.rename(absolute_path, trash_path)
-                        logger.info(f"Moved media {media.image_url} to trash: {trash_path}")
-                    except OSError as e:
-                        logger.warning(f"Failed to move media to trash: {media.image_url}, error: {str(e)}")
-                else:
-                    logger.warning(f"Media file not found: {absolute_path}")
+                key = storage_key('roomimage', media.image_url)
+                try:
+                    if storage.move(key, trash_key(key)):
+                        logger.info(f"Moved media {media.image_url} to trash: {trash_key(key)}")
+                    else:
+                        logger.warning(f"Media file not found: {key}")
+                except OSError as e:
+                    logger.warning(f"Failed to move media to trash: {media.image_url}, error: {str(e)}")
                 logger.debug("Soft delete media: image_id=%s", media.image_id)
 
         # Xử lý thêm media mới
@@ -392,10 +343,7 @@ def update_room(room_id):
         uploaded_media = []
 
         if files:
-            roomname = f"{room.name} - {area.name}"
-            roomname = "".join(c if c.isalnum() or c in (' ', '-') else '_' for c in roomname)
-            upload_folder = os.path.join(current_app.config['ROOM_IMAGES_BASE'])
-            os.makedirs(upload_folder, exist_ok=True)
+            storage = get_storage()
 
             for file in files:
                 if not file or not file.filename:
@@ -417,13 +365,9 @@ def update_room(room_id):
             for index, file in enumerate(files):
                 ext = file.filename.rsplit('.', 1)[1].lower()
                 filename = f"{uuid.uuid4().hex}.{ext}"
-                file_path = os.path.join(upload_folder, filename)
-                file.seek(0, os.SEEK_END)
-                file_size = file.tell()
-                file.seek(0)
-
-                file.save(file_path)
-                saved_files.append(file_path)
+                key = storage_key('roomimage', filename)
+                file_size = storage.put(key, file.stream, content_type=file.mimetype)
+                saved_files.append(key)
 
                 is_primary = data.get(f'is_primary_{index}', False, type=bool)
                 if is_primary and not primary_set:
@@ -452,17 +396,15 @@ def update_room(room_id):
             return jsonify(room.to_dict()), 200
         except SQLAlchemyError as e:
             db.session.rollback()
-            for file_path in saved_files:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info(f"Cleaned up file: {file_path}")
+            for key in saved_files:
+                get_storage().delete(key)
+                logger.info(f"Cleaned up file: {key}")
             logger.error(f"Database error updating room {room_id}: {str(e)}")
             return jsonify({'message': 'Lỗi cơ sở dữ liệu khi cập nhật phòng'}), 500
         except OSError as e:
             db.session.rollback()
-            for file_path in saved_files:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
+            for key in saved_files:
+                get_storage().delete(key)
             logger.error(f"File system error updating room {room_id}: {str(e)}")
             return jsonify({'message': 'Lỗi hệ thống khi lưu file media'}), 500
 
@@ -514,6 +456,7 @@ def export_users_in_room(room_id):
         user_ids = [contract.user_id for contract in contracts]
         users = User.query.filter(User.user_id.in_(user_ids)).all()
         # Tạo workbook Excel
+        import openpyxl
         wb = openpyxl.Workbook()
         ws = wb.active
         ws.title = "Danh sách sinh viên"
@@ -1,25 +1,30 @@
-from flask import Blueprint, request, jsonify, send_from_directory
+from flask import Blueprint, request, jsonify
 from extensions import db
 from models.roomimage import RoomImage
 from models.room import Room
 from models.area import Area
 from controllers.auth_controller import admin_required
 from sqlalchemy.exc import SQLAlchemyError
-import os
 import logging
 from werkzeug.utils import secure_filename
-from flask import current_app
 from datetime import datetime
-import uuid
 from unidecode import unidecode
 import re
+from utils.storage import get_storage, storage_key, trash_key
+from utils.uploads import StreamingUpload, UploadPolicy, UploadError
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 roomimage_bp = Blueprint('roomimage', __name__)
 
+# Upload limits for room media
+ROOM_MEDIA_UPLOAD_POLICY = UploadPolicy(
+    {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'avi'},
+    100 * 1024 * 1024,  # 100MB
+    max_files=20
+)
+
 # Normalize name (remove Vietnamese accents and special characters)
 def normalize_name(name):
     normalized = unidecode(name)
@@ -30,6 +35,7 @@ def normalize_name(name):
 @roomimage_bp.route('/admin/rooms/<int:room_id>/images', methods=['POST'])
 @admin_required()
 def upload_room_images(room_id):
+    upload = StreamingUpload('roomimage', ROOM_MEDIA_UPLOAD_POLICY, file_fields=('images',))
     try:
         # Check if room exists
         room = Room.query.get(room_id)
@@ -43,74 +49,34 @@ def upload_room_images(room_id):
             logger.warning(f"Area {room.area_id} not found for room {room_id}")
             return jsonify({'message': 'Area not found for room'}), 404
 
-        # Create media storage directory
-        upload_folder = os.path.join(current_app.config['ROOM_IMAGES_BASE'])
-        os.makedirs(upload_folder, exist_ok=True)
+        # Stream media files straight to storage, validating type and size on the fly
+        try:
+            form = upload.receive()
+        except UploadError as e:
+            logger.warning(f"Rejected upload for room {room_id}: {e.message}")
+            return jsonify({'message': e.message}), e.status_code
 
-        # Check for media files
-        if 'images' not in request.files:
+        if not upload.saved:
             logger.warning("No media in request")
             return jsonify({'message': 'No media files provided (key: images)'}), 400
 
-        files = request.files.getlist('images')
-        if not files or all(file.filename == '' for file in files):
-            logger.warning("Empty or invalid media files")
-            return jsonify({'message': 'No valid media files provided'}), 400
-
         # Log received data
-        logger.info(f"Received {len(files)} files for room {room_id}")
-        logger.info(f"Form data: {request.form.to_dict()}")
-
-        # Limit number of media
-        max_media = 20
-        if len(files) > max_media:
-            logger.warning(f"Too many media files uploaded: {len(files)} > {max_media}")
-            return jsonify({'message': f'Maximum {max_media} files allowed at once'}), 400
+        logger.info(f"Received {len(upload.saved)} files for room {room_id}")
+        logger.info(f"Form data: {form.to_dict()}")
 
         media_list = []
-        allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'avi'}
-        max_file_size = 100 * 1024 * 1024  # 100MB
-        saved_files = []  # Track saved files for cleanup on error
-
-        # Validate and process all files
-        for i, file in enumerate(files):
-            if not file or not file.filename:
-                logger.warning(f"Empty file at index {i}")
-                return jsonify({'message': 'List contains empty file'}), 400
-
-            # Check file extension
-            if '.' not in file.filename or file.filename.rsplit('.', 1)[1].lower() not in allowed_extensions:
-                logger.warning(f"Invalid file extension: {file.filename}")
-                return jsonify({'message': f'File {file.filename}: Only png, jpg, jpeg, gif, mp4, avi supported'}), 400
-
-            # Check file size
-            file.seek(0, os.SEEK_END)
-            file_size = file.tell()
-            if file_size > max_file_size:
-                logger.warning(f"File too large: {file.filename}, size: {file_size}")
-                return jsonify({'message': f'File {file.filename}: Exceeds 100MB limit'}), 400
-            file.seek(0)
-
-            # Generate unique filename
-            ext = file.filename.rsplit('.', 1)[1].lower()
-            filename = f"{uuid.uuid4().hex}.{ext}"
-            file_path = os.path.join(upload_folder, filename)
-
-            # Save file
-            file.save(file_path)
-            saved_files.append(file_path)
-            logger.info(f"Saved file: {file_path}")
-
+        primary_set = False
+        for uploaded in upload.saved:
+            i = uploaded.index
             # Get is_primary from form data
-            is_primary = request.form.get(f'is_primary[{i}]', 'False', type=str).lower() == 'true'
-            alt_text = request.form.get(f'alt_text[{i}]', '')
-            sort_order = request.form.get(f'sort_order[{i}]', 0, type=int)
+            is_primary = form.get(f'is_primary[{i}]', 'False', type=str).lower() == 'true'
+            alt_text = form.get(f'alt_text[{i}]', '')
+            sort_order = form.get(f'sort_order[{i}]', 0, type=int)
 
             # Log received values
             logger.info(f"Media {i}: is_primary={is_primary}, alt_text={alt_text}, sort_order={sort_order}")
 
             # Set other files to non-primary if this is primary
-            primary_set = False
             if is_primary and not primary_set:
                 RoomImage.query.filter_by(room_id=room_id, is_primary=True).update({'is_primary': False})
                 primary_set = True
@@ -118,15 +84,14 @@ def upload_room_images(room_id):
                 logger.warning(f"Multiple primary media attempted for room {room_id}")
                 is_primary = False
 
-            file_type = 'video' if ext in {'mp4', 'avi'} else 'image'
             media = RoomImage(
                 room_id=room_id,
-                image_url=filename,
+                image_url=uploaded.stored_name,
                 alt_text=alt_text,
                 is_primary=is_primary,
                 sort_order=sort_order,
-                file_type=file_type,
-                file_size=file_size
+                file_type=uploaded.file_type,
+                file_size=uploaded.size
             )
             db.session.add(media)
             media_list.append(media)
@@ -134,28 +99,16 @@ def upload_room_images(room_id):
 
         # Commit all changes
         db.session.commit()
+        upload.keep()
         logger.info(f"Committed {len(media_list)} media files for room {room_id} to database")
         return jsonify([media.to_dict() for media in media_list]), 201
 
     except SQLAlchemyError as e:
         db.session.rollback()
-        for file_path in saved_files:
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                    logger.info(f"Cleaned up file: {file_path}")
-                except OSError:
-                    logger.warning(f"Failed to clean up file: {file_path}")
         logger.error(f"Database error uploading media for room {room_id}: {str(e)}")
         return jsonify({'message': 'Database error saving media'}), 500
     except OSError as e:
         db.session.rollback()
-        for file_path in saved_files:
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                except OSError:
-                    pass
         logger.error(f"File system error uploading media for room {room_id}: {str(e)}")
         return jsonify({'message': 'System error saving files'}), 500
     except ValueError as e:
@@ -163,14 +116,11 @@ def upload_room_images(room_id):
         return jsonify({'message': str(e)}), 400
     except Exception as e:
         db.session.rollback()
-        for file_path in saved_files:
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                except OSError:
-                    pass
         logger.error(f"Unexpected error uploading media for room {room_id}: {str(e)}")
         return jsonify({'message': 'Unknown server error'}), 500
+    finally:
+        # Remove stored files unless the database commit succeeded
+        upload.discard()
 
 # Get room media list (Public)
 @roomimage_bp.route('/rooms/<int:room_id>/images', methods=['GET'])
@@ -194,19 +144,20 @@ def get_room_images(room_id):
 @roomimage_bp.route('/roomimage/<filename>', methods=['GET'])
 def serve_image(filename):
     try:
-        full_path = os.path.join(current_app.config['ROOM_IMAGES_BASE'], filename)
-        logger.info(f"Serving media: {filename}, full path: {full_path}")
+        key = storage_key('roomimage', filename)
+        logger.info(f"Serving media: {filename}, key: {key}")
 
         media = RoomImage.query.filter_by(image_url=filename, is_deleted=False).first()
         if not media:
             logger.warning(f"Media not found or deleted: {filename}")
             return jsonify({'message': 'Media file not found or deleted'}), 404
 
-        if not os.path.exists(full_path):
-            logger.error(f"Media file not found: {full_path}")
-            return jsonify({'message': f'Media file does not exist at: {full_path}'}), 404
+        try:
+            response = get_storage().send(key)
+        except FileNotFoundError:
+            logger.error(f"Media file not found: {key}")
+            return jsonify({'message': f'Media file does not exist: {filename}'}), 404
 
-        response = send_from_directory(current_app.config['ROOM_IMAGES_BASE'], filename)
         if media.file_type == 'video':
             response.headers['Content-Disposition'] = 'inline'
             response.headers['Accept-Ranges'] = 'bytes'
@@ -283,32 +234,12 @@ def delete_room_image(room_id, image_id):
         media.deleted_at = datetime.utcnow()
         logger.info(f"Marked media {image_id} as soft deleted for room {room_id}")
 
-        # Move file to trash
-        roomname = f"{room.name} - {area.name}"
-        logger.info(f"Room name: {room.name}, Area name: {area.name}, Combined: {roomname}")
-        roomname = normalize_name(roomname)
-        logger.info(f"Normalized roomname: {roomname}")
-
-        # Log configuration
-        upload_base = current_app.config.get('UPLOAD_BASE', 'Not configured')
-        room_images_base = current_app.config.get('ROOM_IMAGES_BASE', 'Not configured')
-        logger.info(f"UPLOAD_BASE: {upload_base}")
-        logger.info(f"ROOM_IMAGES_BASE: {room_images_base}")
-
-        trash_folder = os.path.join(current_app.config['UPLOAD_BASE'], 'trash', 'roomimage', roomname)
-        logger.info(f"Creating trash folder: {trash_folder}")
-        os.makedirs(trash_folder, exist_ok=True)
-
-        absolute_path = os.path.join(current_app.config['ROOM_IMAGES_BASE'], media.image_url)
-        logger.info(f"Absolute path of media: {absolute_path}")
-        if os.path.exists(absolute_path):
-            trash_filename = f"{uuid.uuid4().hex}_{media.image_url}"
-            trash_path = os.path.join(trash_folder, trash_filename)
-            logger.info(f"Renaming {absolute_path} to {trash_path}")
-            os.rename(absolute_path, trash_path)
-            logger.info(f"Moved media {media.image_url} to trash: {trash_path}")
+        # Move file to trash (scheduler sẽ xóa vĩnh viễn theo cùng key)
+        key = storage_key('roomimage', media.image_url)
+        if get_storage().move(key, trash_key(key)):
+            logger.info(f"Moved media {media.image_url} to trash: {trash_key(key)}")
         else:
-            logger.warning(f"Media file not found: {absolute_path}")
+            logger.warning(f"Media file not found: {key}")
 
         # Commit changes to database
         db.session.commit()
@@ -379,30 +310,17 @@ def delete_room_images_batch(room_id):
             logger.warning(f"Some image IDs are invalid or already deleted: {image_ids}")
 
         # Mark as soft deleted and move files
-        roomname = f"{room.name} - {area.name}"
-        logger.info(f"Room name: {room.name}, Area name: {area.name}, Combined: {roomname}")
-        roomname = normalize_name(roomname)
-        logger.info(f"Normalized roomname: {roomname}")
-
-        trash_folder = os.path.join(current_app.config['UPLOAD_BASE'], 'trash', 'roomimage', roomname)
-        logger.info(f"Creating trash folder: {trash_folder}")
-        os.makedirs(trash_folder, exist_ok=True)
-
+        storage = get_storage()
         for media in media_items:
             media.is_deleted = True
             media.deleted_at = datetime.utcnow()
             logger.info(f"Marked media {media.image_id} as soft deleted for room {room_id}")
 
-            absolute_path = os.path.join(current_app.config['ROOM_IMAGES_BASE'], media.image_url)
-            logger.info(f"Absolute path of media: {absolute_path}")
-            if os.path.exists(absolute_path):
-                trash_filename = f"{uuid.uuid4().hex}_{media.image_url}"
-                trash_path = os.path.join(trash_folder, trash_filename)
-                logger.info(f"Renaming {absolute_path} to {trash_path}")
-                os.rename(absolute_path, trash_path)
-                logger.info(f"Moved media {media.image_url} to trash: {trash_path}")
+            key = storage_key('roomimage', media.image_url)
+            if storage.move(key, trash_key(key)):
+                logger.info(f"Moved media {media.image_url} to trash: {trash_key(key)}")
             else:
-                logger.warning(f"Media file not found: {absolute_path}")
+                logger.warning(f"Media file not found: {key}")
 
         db.session.commit()
         logger.info(f"Soft deleted {len(media_items)} media for room {room_id}")
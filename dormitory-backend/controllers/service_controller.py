@@ -40,6 +40,7 @@ def create_service():
 
     name = data.get('name')
     unit = data.get('unit')
+    is_metered = data.get('is_metered', False)
 
     if not name or not name.strip():
         return jsonify({'message': 'Tên dịch vụ không được để trống'}), 400
@@ -49,6 +50,8 @@ def create_service():
         return jsonify({'message': 'Tên dịch vụ không được vượt quá 100 ký tự'}), 400
     if len(unit) > 10:
         return jsonify({'message': 'Đơn vị không được vượt quá 10 ký tự'}), 400
+    if not isinstance(is_metered, bool):
+        return jsonify({'message': 'is_metered phải là true hoặc false'}), 400
 
     if Service.query.filter_by(name=name).first():
         return jsonify({'message': 'Tên dịch vụ đã tồn tại'}), 400
@@ -56,7 +59,8 @@ def create_service():
     try:
         service = Service(
             name=name,
-            unit=unit
+            unit=unit,
+            is_metered=is_metered
         )
         db.session.add(service)
         db.session.commit()
@@ -80,6 +84,7 @@ def update_service(service_id):
 
     new_name = data.get('name', service.name)
     new_unit = data.get('unit', service.unit)
+    new_is_metered = data.get('is_metered', service.is_metered)
 
     if new_name and not new_name.strip():
         return jsonify({'message': 'Tên dịch vụ không được để trống'}), 400
@@ -89,6 +94,8 @@ def update_service(service_id):
         return jsonify({'message': 'Tên dịch vụ không được vượt quá 100 ký tự'}), 400
     if len(new_unit) > 10:
         return jsonify({'message': 'Đơn vị không được vượt quá 10 ký tự'}), 400
+    if not isinstance(new_is_metered, bool):
+        return jsonify({'message': 'is_metered phải là true hoặc false'}), 400
 
     if new_name != service.name:
         existing_service = Service.query.filter_by(name=new_name).first()
@@ -98,6 +105,7 @@ def update_service(service_id):
     try:
         service.name = new_name
         service.unit = new_unit
+        service.is_metered = new_is_metered
         db.session.commit()
         return jsonify(service.to_dict()), 200
     except Exception as e:
@@ -124,9 +132,11 @@ def delete_service(service_id):
     # Lấy tất cả rate_id của service này
     rate_ids = [rate.rate_id for rate in ServiceRate.query.filter_by(service_id=service_id).all()]
     if rate_ids:
-        # Tìm bill detail chưa được liên kết với monthly bill
+        # Tìm bill detail đã nộp chỉ số nhưng chưa được liên kết với monthly bill
+        # (bản ghi tạo sẵn chưa nộp bị xóa cùng mức giá, không tính là đang dùng)
         unlinked_bill_detail = BillDetail.query.filter(
             BillDetail.rate_id.in_(rate_ids),
+            BillDetail.submitted_by.isnot(None),
             ~BillDetail.detail_id.in_(
                 db.session.query(MonthlyBill.detail_id)
             )
@@ -2,12 +2,13 @@ from flask import Blueprint, request, jsonify
 from extensions import db
 from models.service import Service
 from models.service_rate import ServiceRate
+from models.bill_detail import BillDetail
 from controllers.auth_controller import admin_required
 from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
+from utils.bill_rollover import delete_unsubmitted_details
 import logging
 
-logging.basicConfig(level=logging.INFO)
 
 service_rate_bp = Blueprint('service_rate', __name__)
 
@@ -168,6 +169,12 @@ def delete_service_rate(rate_id):
             return jsonify({'message': f'Không tìm thấy mức giá với ID {rate_id}'}), 404
 
         try:
+            # Bản ghi tạo sẵn đầu tháng chưa nộp chỉ số được xóa cùng mức giá
+            delete_unsubmitted_details([rate_id])
+            # Chỉ số đã nộp hoặc đã lên hóa đơn giữ mức giá đã dùng để tính tiền: không cho xóa
+            if BillDetail.query.filter_by(rate_id=rate_id).first():
+                db.session.rollback()
+                return jsonify({'message': 'Không thể xóa mức giá vì đã có chỉ số dịch vụ sử dụng mức giá này'}), 400
             db.session.delete(rate)
             db.session.commit()
             return '', 204
@@ -17,7 +17,6 @@ from models.user_room_history import UserRoomHistory
 from controllers.auth_controller import admin_required
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 statistics_bp = Blueprint('statistics', __name__)
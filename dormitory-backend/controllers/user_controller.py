@@ -1,33 +1,40 @@
-from flask import Blueprint, request, jsonify, current_app, send_from_directory, render_template
+from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from extensions import db, mail, limiter
+from extensions import db, limiter
 from models.user import User
 from models.token_blacklist import TokenBlacklist
 from models.refresh_tokens import RefreshToken  # Import the new RefreshToken model
 from models.notification import Notification
 from models.notification_recipient import NotificationRecipient
 from controllers.auth_controller import admin_required, user_required
-from werkzeug.security import generate_password_hash, check_password_hash
-from flask_mail import Message
+from utils.passwords import hash_password, verify_password
+from utils.challenges import get_challenge_store, subject_key, PASSWORD_CHANGE_SCOPE
+from utils.email_outbox import queue_email
+from utils.search import search, search_response
+from utils.pagination import paginate
 from pydantic import BaseModel, EmailStr, validator, field_validator
 from typing import Optional
 import os
 from werkzeug.utils import secure_filename
 import logging
-from datetime import datetime, timedelta, date
+from datetime import datetime, date
 import secrets
 from PIL import Image
 from sqlalchemy.exc import SQLAlchemyError
-import shutil
 import re
+from io import BytesIO
 from utils.fcm import send_fcm_notification
+from utils.storage import get_storage, storage_key, trash_key, avatar_key_from_url
 # Thiết lập logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Khởi tạo Blueprint
 user_bp = Blueprint('user', __name__)
 
+# Giới hạn nhập sai mật khẩu cũ khi đổi mật khẩu
+MAX_PASSWORD_CHANGE_ATTEMPTS = 5
+PASSWORD_CHANGE_LOCK_SECONDS = 15 * 60
+
 # Validation schemas
 class UserCreateSchema(BaseModel):
     email: EmailStr
@@ -135,17 +142,15 @@ ALLOWED_MIME_TYPES = {
     'image/heic', 'image/heif'
 }
 
-def move_to_trash(file_path):
-    """Di chuyển file vào thư mục trash."""
-    if not os.path.exists(file_path):
-        return
-    filename = os.path.basename(file_path)
-    trash_path = os.path.join(current_app.config['TRASH_BASE'], f"{datetime.utcnow().timestamp()}_{filename}")
+def move_to_trash(key):
+    """Di chuyển file vào thư mục trash (trash/<key>)."""
     try:
-        shutil.move(file_path, trash_path)
-        logger.info(f"Moved file {file_path} to trash: {trash_path}")
+        if get_storage().move(key, trash_key(key)):
+            logger.info(f"Moved file {key} to trash: {trash_key(key)}")
+            return True
     except Exception as e:
         logger.error(f"Error moving file to trash: {str(e)}")
+    return False
 
 # API Endpoints
 @user_bp.route('/users', methods=['GET'])
@@ -160,35 +165,34 @@ def get_all_users():
         phone = request.args.get('phone', type=str)
         class_name = request.args.get('class_name', type=str)
         keyword = request.args.get('keyword', type=str)
+        cursor = request.args.get('cursor', type=str)
 
         query = User.query.filter_by(is_deleted=False)
-        if keyword:
-            keyword = keyword.strip()
-            query = query.filter(
-                db.or_(
-                    User.email.ilike(f'%{keyword}%'),
-                    User.fullname.ilike(f'%{keyword}%'),
-                    User.phone.ilike(f'%{keyword}%'),
-                    User.class_name.ilike(f'%{keyword}%')
-                )
-            )
-        else:
-            if email:
-                query = query.filter(User.email.ilike(f'%{email}%'))
-            if fullname:
-                query = query.filter(User.fullname.ilike(f'%{fullname}%'))
-            if phone:
-                query = query.filter(User.phone.ilike(f'%{phone}%'))
-            if class_name:
-                query = query.filter(User.class_name.ilike(f'%{class_name}%'))
-
-        users = query.paginate(page=page, per_page=limit)
-        return jsonify({
-            'users': [user.to_dict() for user in users.items if user.to_dict()],
-            'total': users.total,
-            'pages': users.pages,
-            'current_page': users.page
-        }), 200
+        if keyword and keyword.strip():
+            # Tìm không dấu qua search index, xếp hạng theo độ khớp
+            try:
+                result = search(query, 'user', keyword, limit, page=page, cursor=cursor)
+            except ValueError as e:
+                return jsonify({'message': str(e)}), 400
+            return jsonify({
+                'users': [user.to_dict() for user in result.items],
+                **search_response(result)
+            }), 200
+
+        if email:
+            query = query.filter(User.email.ilike(f'%{email}%'))
+        if fullname:
+            query = query.filter(User.fullname.ilike(f'%{fullname}%'))
+        if phone:
+            query = query.filter(User.phone.ilike(f'%{phone}%'))
+        if class_name:
+            query = query.filter(User.class_name.ilike(f'%{class_name}%'))
+
+        try:
+            users = paginate(query, [(User.user_id, 'asc')], page=page, limit=limit, cursor=cursor)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        return jsonify(users.to_dict('users')), 200
     except SQLAlchemyError as e:
         logger.error(f"Database error fetching users: {str(e)}")
         return jsonify({'message': 'Lỗi database'}), 500
@@ -227,7 +231,7 @@ def create_user():
             return jsonify({'message': 'Mã số sinh viên đã được sử dụng'}), 400
 
         raw_password = secrets.token_urlsafe(12)
-        password_hash = generate_password_hash(raw_password)
+        password_hash = hash_password(raw_password)
 
         user = User(
             email=data.email,
@@ -239,6 +243,14 @@ def create_user():
             version=1
         )
         db.session.add(user)
+        queue_email(
+            'Chào mừng đến với Hệ thống Ký túc xá',
+            [data.email],
+            template='emails/welcome_email.html',
+            fullname=data.fullname,
+            email=data.email,
+            password=raw_password
+        )
         db.session.commit()
         logger.debug("User created with ID: %s", user.user_id)
 
@@ -266,29 +278,6 @@ def create_user():
             db.session.rollback()
             logger.error(f"Failed to create SYSTEM notification for user {user.user_id}: {str(e)}")
 
-        msg = Message(
-            subject='Chào mừng đến với Hệ thống Ký túc xá',
-            sender=current_app.config.get('MAIL_DEFAULT_SENDER', 'no-reply@dormitory.com'),
-            recipients=[data.email]
-        )
-        msg.html = render_template(
-            'emails/welcome_email.html',
-            fullname=data.fullname,
-            email=data.email,
-            password=raw_password
-        )
-        try:
-            mail.send(msg)
-            logger.debug("Email sent to %s", data.email)
-        except Exception as e:
-            logger.error(f"Email sending failed: {str(e)}")
-            return jsonify({
-                'message': 'Tạo tài khoản thành công nhưng không thể gửi email. Vui lòng cung cấp thông tin đăng nhập cho người dùng.',
-                'user': user.to_dict(),
-                'email': data.email,
-                'password': raw_password
-            }), 201
-
         return jsonify({
             'message': 'Tạo tài khoản thành công! Thông tin đăng nhập đã được gửi qua email.',
             'user': user.to_dict()
@@ -493,30 +482,27 @@ def change_password():
             logger.warning(f"User not found: user_id={user_id}")
             return jsonify({'message': 'Không tìm thấy người dùng'}), 404
 
-        # Kiểm tra số lần thử sai
-        if user.reset_attempts >= 5:
-            if user.reset_token_expiry and user.reset_token_expiry > datetime.utcnow():
-                logger.warning(f"Account locked for user {user.email}: too many attempts")
-                return jsonify({'message': 'Tài khoản tạm khóa do quá số lần thử. Vui lòng thử lại sau.'}), 429
-            else:
-                user.reset_attempts = 0  # Reset sau khi khóa hết hạn
-
         data = PasswordChangeSchema(**request.get_json())
 
+        # Đếm lần thử trước khi kiểm tra mật khẩu (bộ đếm có TTL, khóa 15 phút kể từ lần thử cuối);
+        # tăng trước nên các request song song không vượt được số lần cho phép
+        store = get_challenge_store()
+        subject = subject_key('user', user.user_id)
+        attempts = store.incr_attempts(PASSWORD_CHANGE_SCOPE, subject, PASSWORD_CHANGE_LOCK_SECONDS)
+        if attempts > MAX_PASSWORD_CHANGE_ATTEMPTS:
+            logger.warning(f"Account locked for user {user.email}: too many attempts")
+            return jsonify({'message': 'Tài khoản tạm khóa do quá số lần thử. Vui lòng thử lại sau.'}), 429
+
         # Kiểm tra mật khẩu cũ
-        if not check_password_hash(user.password_hash, data.old_password):
-            user.reset_attempts += 1
-            user.reset_token_expiry = datetime.utcnow() + timedelta(minutes=15)  # Khóa 15 phút
-            db.session.commit()
-            remaining_attempts = 5 - user.reset_attempts
-            logger.warning(f"Failed password attempt for user {user.email}, attempts: {user.reset_attempts}, IP: {request.remote_addr}")
+        if not verify_password(user, data.old_password):
+            remaining_attempts = max(0, MAX_PASSWORD_CHANGE_ATTEMPTS - attempts)
+            logger.warning(f"Failed password attempt for user {user.email}, attempts: {attempts}, IP: {request.remote_addr}")
             return jsonify({
                 'message': f'Mật khẩu cũ không đúng. Bạn còn {remaining_attempts} lần thử.'
             }), 401
 
         # Reset attempts sau khi xác thực đúng
-        user.reset_attempts = 0
-        user.reset_token_expiry = None
+        store.clear(PASSWORD_CHANGE_SCOPE, subject)
 
         # Kiểm tra độ mạnh mật khẩu mới
         password_pattern = r'^(?=.*[a-z])(?=.*[A-Z])(?=.*\d)(?=.*[@$!%*?&])[A-Za-z\d@$!%*?&]{12,}$'
@@ -543,29 +529,19 @@ def change_password():
         db.session.add(blacklisted_token)
 
         # Hash mật khẩu mới
-        user.password_hash = generate_password_hash(data.new_password)
+        user.password_hash = hash_password(data.new_password)
         user.version += 1
 
-        db.session.commit()
-        logger.info(f"Password changed successfully for user {user.email}, token blacklisted, IP: {request.remote_addr}")
-
-        # Gửi email thông báo
-        change_time = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-        msg = Message(
-            subject='Thông báo thay đổi mật khẩu',
-            sender=current_app.config.get('MAIL_DEFAULT_SENDER', 'no-reply@dormitory.com'),
-            recipients=[user.email]
-        )
-        msg.html = render_template(
-            'emails/password_changed.html',
+        # Gửi email thông báo (cùng transaction với việc đổi mật khẩu)
+        queue_email(
+            'Thông báo thay đổi mật khẩu',
+            [user.email],
+            template='emails/password_changed.html',
             fullname=user.fullname,
-            change_time=change_time
+            change_time=datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
         )
-        try:
-            mail.send(msg)
-            logger.debug(f"Notification email sent to {user.email}")
-        except Exception as e:
-            logger.error(f"Failed to send notification email to {user.email}: {str(e)}")
+        db.session.commit()
+        logger.info(f"Password changed successfully for user {user.email}, token blacklisted, IP: {request.remote_addr}")
 
         return jsonify({'message': 'Đổi mật khẩu thành công, vui lòng đăng nhập lại'}), 200
     except ValueError as e:
@@ -605,24 +581,16 @@ def update_user_avatar():
 
         # Xử lý ảnh cũ nếu có
         if user.avatar_url:
-            old_file_path = os.path.join(current_app.config['UPLOAD_BASE'], user.avatar_url.lstrip('/'))
-            try:
-                if os.path.exists(old_file_path):
-                    move_to_trash(old_file_path)
-                    logger.debug(f"Moved old avatar to trash: {old_file_path}")
-                else:
-                    logger.warning(f"Old avatar file not found: {old_file_path}")
-            except Exception as e:
-                logger.error(f"Error moving old avatar to trash: {str(e)}")
-
-        # Lưu ảnh trực tiếp vào thư mục gốc của avatar
-        avatar_dir = current_app.config['AVATAR_UPLOAD_FOLDER']
-        logger.debug(f"Avatar directory: {avatar_dir}")
+            old_key = avatar_key_from_url(user.avatar_url)
+            if move_to_trash(old_key):
+                logger.debug(f"Moved old avatar to trash: {old_key}")
+            else:
+                logger.warning(f"Old avatar file not found: {old_key}")
 
         # Tạo tên file duy nhất
         filename = secure_filename(f"avatar_{user_id}_{datetime.utcnow().timestamp()}.jpg")
-        file_path = os.path.join(avatar_dir, filename)
-        logger.debug(f"File path: {file_path}")
+        key = storage_key('avatars', filename)
+        logger.debug(f"Avatar key: {key}")
 
         # Resize và lưu ảnh
         logger.debug("Opening image with PIL")
@@ -636,8 +604,11 @@ def update_user_avatar():
 
         logger.debug("Resizing image")
         img.thumbnail((200, 200))
-        logger.debug(f"Saving image to {file_path}")
-        img.save(file_path, 'JPEG', quality=85)
+        logger.debug(f"Saving image to {key}")
+        buffer = BytesIO()
+        img.save(buffer, 'JPEG', quality=85)
+        buffer.seek(0)
+        get_storage().put(key, buffer, content_type='image/jpeg')
 
         # Tạo URL công khai
         base_url = request.host_url.rstrip('/')
@@ -700,24 +671,16 @@ def update_user_avatar_admin(user_id):
 
         # Xử lý ảnh cũ nếu có
         if user.avatar_url:
-            old_file_path = os.path.join(current_app.config['UPLOAD_BASE'], user.avatar_url.lstrip('/'))
-            try:
-                if os.path.exists(old_file_path):
-                    move_to_trash(old_file_path)
-                    logger.debug(f"Moved old avatar to trash: {old_file_path}")
-                else:
-                    logger.warning(f"Old avatar file not found: {old_file_path}")
-            except Exception as e:
-                logger.error(f"Error moving old avatar to trash: {str(e)}")
-
-        # Lưu ảnh trực tiếp vào thư mục gốc của avatar
-        avatar_dir = current_app.config['AVATAR_UPLOAD_FOLDER']
-        logger.debug(f"Avatar directory: {avatar_dir}")
+            old_key = avatar_key_from_url(user.avatar_url)
+            if move_to_trash(old_key):
+                logger.debug(f"Moved old avatar to trash: {old_key}")
+            else:
+                logger.warning(f"Old avatar file not found: {old_key}")
 
         # Tạo tên file duy nhất
         filename = secure_filename(f"avatar_{user_id}_{datetime.utcnow().timestamp()}.jpg")
-        file_path = os.path.join(avatar_dir, filename)
-        logger.debug(f"File path: {file_path}")
+        key = storage_key('avatars', filename)
+        logger.debug(f"Avatar key: {key}")
 
         # Resize và lưu ảnh
         logger.debug("Opening image with PIL")
@@ -731,8 +694,11 @@ def update_user_avatar_admin(user_id):
 
         logger.debug("Resizing image")
         img.thumbnail((200, 200))
-        logger.debug(f"Saving image to {file_path}")
-        img.save(file_path, 'JPEG', quality=85)
+        logger.debug(f"Saving image to {key}")
+        buffer = BytesIO()
+        img.save(buffer, 'JPEG', quality=85)
+        buffer.seek(0)
+        get_storage().put(key, buffer, content_type='image/jpeg')
 
         # Tạo URL công khai
         base_url = request.host_url.rstrip('/')
@@ -761,11 +727,11 @@ def serve_avatar(filename):
     """Phục vụ ảnh đại diện từ thư mục avatars."""
     try:
         logger.debug(f"Serving avatar: {filename}")
-        avatar_dir = current_app.config['AVATAR_UPLOAD_FOLDER']
-        if not os.path.exists(os.path.join(avatar_dir, filename)):
+        try:
+            return get_storage().send(storage_key('avatars', filename))
+        except FileNotFoundError:
             logger.warning(f"Avatar file not found: {filename}")
             return jsonify({'message': 'Không tìm thấy ảnh'}), 404
-        return send_from_directory(avatar_dir, filename)
     except Exception as e:
         logger.error(f"Error serving avatar {filename}: {str(e)}")
         return jsonify({'message': 'Lỗi đọc ảnh'}), 500
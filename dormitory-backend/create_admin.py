@@ -1,7 +1,7 @@
 from flask import Flask
 from extensions import db
 from models.admin import Admin
-from werkzeug.security import generate_password_hash
+from utils.passwords import hash_password
 
 # Khởi tạo ứng dụng Flask
 app = Flask(__name__)
@@ -14,7 +14,7 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
 def create_admin(username, password, full_name, email, phone):
-    hashed_password = generate_password_hash(password)
+    hashed_password = hash_password(password)
     new_admin = Admin(
         username=username,
         password_hash=hashed_password,
@@ -0,0 +1,69 @@
+import sys
+import csv
+import time
+import argparse
+import statistics
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+def load_accounts(path):
+    """CSV gồm 2 cột email,password (không có header)."""
+    with open(path, newline='', encoding='utf-8') as f:
+        return [(row[0].strip(), row[1].strip()) for row in csv.reader(f) if len(row) >= 2]
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+def run_login_load_test(base_url, accounts, total, concurrency, fcm_token=None, timeout=30):
+    url = base_url.rstrip('/') + '/api/auth/user/login'
+    session_pool = {}
+
+    def login(i):
+        # Mỗi thread dùng một requests.Session để tái sử dụng kết nối
+        session = session_pool.setdefault(i % concurrency, requests.Session())
+        email, password = accounts[i % len(accounts)]
+        payload = {'email': email, 'password': password}
+        if fcm_token:
+            payload['fcm_token'] = f"{fcm_token}-{i}"
+        started = time.perf_counter()
+        try:
+            status = session.post(url, json=payload, timeout=timeout).status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        return status, (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(login, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for _, latency in results]
+    statuses = Counter(status for status, _ in results)
+    print(f"Requests:     {total} ({concurrency} concurrent) in {elapsed:.2f}s")
+    print(f"Throughput:   {total / elapsed:.1f} req/s")
+    print(f"Latency (ms): mean={statistics.mean(latencies):.1f} p50={percentile(latencies, 50):.1f} "
+          f"p95={percentile(latencies, 95):.1f} p99={percentile(latencies, 99):.1f} max={max(latencies):.1f}")
+    print(f"Status:       {dict(statuses)}")
+    return statuses.get(200, 0) == total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test POST /api/auth/user/login")
+    parser.add_argument('--url', default='http://localhost:5000', help="Base URL of the API (default: http://localhost:5000)")
+    parser.add_argument('--accounts', required=True, help="CSV file with email,password rows")
+    parser.add_argument('--requests', type=int, default=1000, help="Total number of logins (default: 1000)")
+    parser.add_argument('--concurrency', type=int, default=50, help="Concurrent clients (default: 50)")
+    parser.add_argument('--fcm-token', help="Send a fcm_token prefix with each login")
+    args = parser.parse_args()
+
+    accounts = load_accounts(args.accounts)
+    if not accounts:
+        print("No accounts found in", args.accounts)
+        sys.exit(1)
+    ok = run_login_load_test(args.url, accounts, args.requests, args.concurrency, fcm_token=args.fcm_token)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,92 @@
+import sys
+import csv
+import time
+import argparse
+import statistics
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+def load_accounts(path):
+    """CSV gồm email,password[,bill_id] (không có header)."""
+    with open(path, newline='', encoding='utf-8') as f:
+        return [
+            (row[0].strip(), row[1].strip(), row[2].strip() if len(row) > 2 and row[2].strip() else None)
+            for row in csv.reader(f) if len(row) >= 2
+        ]
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+def prepare_students(base_url, accounts, timeout=30):
+    """Đăng nhập từng sinh viên và tìm hóa đơn chưa thanh toán nếu CSV không ghi bill_id."""
+    students = []
+    for email, password, bill_id in accounts:
+        session = requests.Session()
+        response = session.post(base_url + '/api/auth/user/login', json={'email': email, 'password': password}, timeout=timeout)
+        if response.status_code != 200:
+            print(f"Login failed for {email}: {response.status_code}")
+            continue
+        session.headers['Authorization'] = f"Bearer {response.json()['access_token']}"
+        if not bill_id:
+            response = session.get(base_url + '/api/my-bills', params={'payment_status': 'NOT_PAID', 'limit': 1}, timeout=timeout)
+            bills = response.json().get('bills', []) if response.status_code == 200 else []
+            if not bills:
+                print(f"No unpaid bill for {email}")
+                continue
+            bill_id = bills[0]['bill_id']
+        students.append((email, session, int(bill_id)))
+    return students
+
+def run_payment_load_test(base_url, students, rounds, concurrency, timeout=30):
+    """Mỗi sinh viên bấm thanh toán ``rounds`` lần, tất cả cùng lúc như ngày hạn đóng tiền."""
+    url = base_url + '/api/payment-transactions'
+
+    def pay(i):
+        _, session, bill_id = students[i % len(students)]
+        started = time.perf_counter()
+        try:
+            status = session.post(url, json={'bill_id': bill_id, 'payment_method': 'VNPAY'}, timeout=timeout).status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        return status, (time.perf_counter() - started) * 1000
+
+    total = len(students) * rounds
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(pay, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for _, latency in results]
+    statuses = Counter(status for status, _ in results)
+    print(f"Students:     {len(students)} x {rounds} rounds")
+    print(f"Requests:     {total} ({concurrency} concurrent) in {elapsed:.2f}s")
+    print(f"Throughput:   {total / elapsed:.1f} req/s")
+    print(f"Latency (ms): mean={statistics.mean(latencies):.1f} p50={percentile(latencies, 50):.1f} "
+          f"p95={percentile(latencies, 95):.1f} p99={percentile(latencies, 99):.1f} max={max(latencies):.1f}")
+    print(f"Status:       {dict(statuses)}")
+    return statuses.get(200, 0) == total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test POST /api/payment-transactions at the monthly payment deadline")
+    parser.add_argument('--url', default='http://localhost:5000', help="Base URL of the API (default: http://localhost:5000)")
+    parser.add_argument('--accounts', required=True, help="CSV file with email,password[,bill_id] rows")
+    parser.add_argument('--rounds', type=int, default=3, help="Payment attempts per student, e.g. retries after closing VNPay (default: 3)")
+    parser.add_argument('--concurrency', type=int, default=50, help="Concurrent clients (default: 50)")
+    args = parser.parse_args()
+
+    accounts = load_accounts(args.accounts)
+    if not accounts:
+        print("No accounts found in", args.accounts)
+        sys.exit(1)
+    students = prepare_students(args.url.rstrip('/'), accounts)
+    if not students:
+        print("No student with an unpaid bill could be prepared")
+        sys.exit(1)
+    ok = run_payment_load_test(args.url.rstrip('/'), students, args.rounds, args.concurrency)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,43 @@
+"""add purge checkpoints and deleted_at for rooms/contracts
+
+Revision ID: 3f9a1c2b7d4e
+Revises: 0dfd00cdd561
+Create Date: 2026-10-19 02:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c2b7d4e'
+down_revision = '0dfd00cdd561'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('rooms', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+
+    with op.batch_alter_table('contracts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+
+    op.create_table(
+        'purge_checkpoints',
+        sa.Column('target', sa.String(length=64), nullable=False),
+        sa.Column('last_id', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('rows_deleted', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('files_deleted', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('target')
+    )
+
+def downgrade():
+    op.drop_table('purge_checkpoints')
+
+    with op.batch_alter_table('contracts', schema=None) as batch_op:
+        batch_op.drop_column('deleted_at')
+
+    with op.batch_alter_table('rooms', schema=None) as batch_op:
+        batch_op.drop_column('deleted_at')
@@ -0,0 +1,38 @@
+"""add job_runs table for scheduler run history
+
+Revision ID: 8b2e4f6a1c3d
+Revises: 3f9a1c2b7d4e
+Create Date: 2026-10-19 03:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4f6a1c3d'
+down_revision = '3f9a1c2b7d4e'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'job_runs',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('job_name', sa.String(length=100), nullable=False),
+        sa.Column('triggered_by', sa.Enum('SCHEDULER', 'MANUAL'), nullable=False),
+        sa.Column('status', sa.Enum('RUNNING', 'SUCCESS', 'FAILED', 'SKIPPED'), nullable=False),
+        sa.Column('host', sa.String(length=255), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('duration_ms', sa.Integer(), nullable=True),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('job_runs', schema=None) as batch_op:
+        batch_op.create_index('idx_job_runs_job_started', ['job_name', 'started_at'], unique=False)
+
+def downgrade():
+    with op.batch_alter_table('job_runs', schema=None) as batch_op:
+        batch_op.drop_index('idx_job_runs_job_started')
+    op.drop_table('job_runs')
@@ -0,0 +1,63 @@
+"""add payment_events log and payment_notification_tasks
+
+Revision ID: a7c3e9f1b5d2
+Revises: f2b6d8e0a4c1
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9f1b5d2'
+down_revision = 'f2b6d8e0a4c1'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'payment_events',
+        sa.Column('event_id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('gateway', sa.String(length=20), nullable=False),
+        sa.Column('dedupe_key', sa.String(length=191), nullable=False),
+        sa.Column('transaction_id', sa.BigInteger(), nullable=True),
+        sa.Column('gateway_reference', sa.String(length=255), nullable=True),
+        sa.Column('response_code', sa.String(length=10), nullable=True),
+        sa.Column('amount', sa.DECIMAL(precision=12, scale=2), nullable=True),
+        sa.Column('outcome', sa.Enum('APPLIED', 'DUPLICATE', 'IGNORED', 'UNKNOWN_TRANSACTION', 'AMOUNT_MISMATCH'), nullable=False),
+        sa.Column('resulting_status', sa.String(length=20), nullable=True),
+        sa.Column('payload', sa.Text(), nullable=True),
+        sa.Column('received_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('event_id'),
+        sa.UniqueConstraint('dedupe_key', name='uq_payment_events_dedupe_key')
+    )
+    with op.batch_alter_table('payment_events', schema=None) as batch_op:
+        batch_op.create_index('idx_payment_events_transaction', ['transaction_id'], unique=False)
+
+    op.create_table(
+        'payment_notification_tasks',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('event_id', sa.BigInteger(), nullable=False),
+        sa.Column('transaction_id', sa.BigInteger(), nullable=False),
+        sa.Column('kind', sa.Enum('SUCCESS', 'FAILED'), nullable=False),
+        sa.Column('status', sa.Enum('PENDING', 'PROCESSING', 'DONE', 'FAILED'), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['event_id'], ['payment_events.event_id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('event_id')
+    )
+    with op.batch_alter_table('payment_notification_tasks', schema=None) as batch_op:
+        batch_op.create_index('idx_payment_notification_tasks_status_next', ['status', 'next_attempt_at'], unique=False)
+
+def downgrade():
+    with op.batch_alter_table('payment_notification_tasks', schema=None) as batch_op:
+        batch_op.drop_index('idx_payment_notification_tasks_status_next')
+    op.drop_table('payment_notification_tasks')
+    with op.batch_alter_table('payment_events', schema=None) as batch_op:
+        batch_op.drop_index('idx_payment_events_transaction')
+    op.drop_table('payment_events')
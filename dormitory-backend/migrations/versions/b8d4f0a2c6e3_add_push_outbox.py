@@ -0,0 +1,39 @@
+"""add push_outbox for asynchronous FCM delivery
+
+Revision ID: b8d4f0a2c6e3
+Revises: a7c3e9f1b5d2
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b8d4f0a2c6e3'
+down_revision = 'a7c3e9f1b5d2'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'push_outbox',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('notification_id', sa.BigInteger(), nullable=False),
+        sa.Column('status', sa.Enum('PENDING', 'PROCESSING', 'DONE', 'FAILED'), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['notification_id'], ['notification.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('notification_id')
+    )
+    with op.batch_alter_table('push_outbox', schema=None) as batch_op:
+        batch_op.create_index('idx_push_outbox_status_next', ['status', 'next_attempt_at'], unique=False)
+
+def downgrade():
+    with op.batch_alter_table('push_outbox', schema=None) as batch_op:
+        batch_op.drop_index('idx_push_outbox_status_next')
+    op.drop_table('push_outbox')
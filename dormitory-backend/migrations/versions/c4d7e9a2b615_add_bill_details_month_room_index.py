@@ -0,0 +1,24 @@
+"""add bill_details (bill_month, room_id) index for monthly rollover
+
+Revision ID: c4d7e9a2b615
+Revises: 8b2e4f6a1c3d
+Create Date: 2026-10-19 04:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c4d7e9a2b615'
+down_revision = '8b2e4f6a1c3d'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('bill_details', schema=None) as batch_op:
+        batch_op.create_index('idx_bill_details_month_room', ['bill_month', 'room_id'], unique=False)
+
+def downgrade():
+    with op.batch_alter_table('bill_details', schema=None) as batch_op:
+        batch_op.drop_index('idx_bill_details_month_room')
@@ -0,0 +1,27 @@
+"""add services.is_metered (metered vs flat-rate billing)
+
+Revision ID: c9e5a1b3d7f4
+Revises: b8d4f0a2c6e3
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c9e5a1b3d7f4'
+down_revision = 'b8d4f0a2c6e3'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('services', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_metered', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+    # Trước đây điện (1) và nước (2) được coi là dịch vụ tính theo chỉ số trong code
+    op.execute("UPDATE services SET is_metered = 1 WHERE service_id IN (1, 2)")
+
+def downgrade():
+    with op.batch_alter_table('services', schema=None) as batch_op:
+        batch_op.drop_column('is_metered')
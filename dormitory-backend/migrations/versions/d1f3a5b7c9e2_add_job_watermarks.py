@@ -0,0 +1,34 @@
+"""add job_watermarks table and contract date boundary indexes
+
+Revision ID: d1f3a5b7c9e2
+Revises: c4d7e9a2b615
+Create Date: 2026-10-19 05:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd1f3a5b7c9e2'
+down_revision = 'c4d7e9a2b615'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'job_watermarks',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('watermark', sa.Date(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    with op.batch_alter_table('contracts', schema=None) as batch_op:
+        batch_op.create_index('idx_contract_status_start', ['status', 'start_date'], unique=False)
+        batch_op.create_index('idx_contract_status_end', ['status', 'end_date'], unique=False)
+
+def downgrade():
+    with op.batch_alter_table('contracts', schema=None) as batch_op:
+        batch_op.drop_index('idx_contract_status_end')
+        batch_op.drop_index('idx_contract_status_start')
+    op.drop_table('job_watermarks')
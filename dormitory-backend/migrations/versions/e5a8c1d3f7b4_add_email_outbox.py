@@ -0,0 +1,42 @@
+"""add email_outbox table
+
+Revision ID: e5a8c1d3f7b4
+Revises: d1f3a5b7c9e2
+Create Date: 2026-10-19 06:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e5a8c1d3f7b4'
+down_revision = 'd1f3a5b7c9e2'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'email_outbox',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('subject', sa.String(length=255), nullable=False),
+        sa.Column('sender', sa.String(length=255), nullable=True),
+        sa.Column('recipients', sa.Text(), nullable=False),
+        sa.Column('html', sa.Text(length=16777215), nullable=True),
+        sa.Column('body', sa.Text(), nullable=True),
+        sa.Column('template', sa.String(length=100), nullable=True),
+        sa.Column('status', sa.Enum('PENDING', 'SENDING', 'SENT', 'FAILED'), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.create_index('idx_email_outbox_status_next', ['status', 'next_attempt_at'], unique=False)
+
+def downgrade():
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.drop_index('idx_email_outbox_status_next')
+    op.drop_table('email_outbox')
@@ -0,0 +1,38 @@
+"""add search_documents table (accent-folded search index)
+
+Revision ID: f2b6d8e0a4c1
+Revises: e5a8c1d3f7b4
+Create Date: 2026-10-19 07:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f2b6d8e0a4c1'
+down_revision = 'e5a8c1d3f7b4'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'search_documents',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('entity_type', sa.String(length=32), nullable=False),
+        sa.Column('entity_id', sa.BigInteger(), nullable=False),
+        sa.Column('title', sa.String(length=512), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('entity_type', 'entity_id', name='uq_search_documents_entity')
+    )
+    with op.batch_alter_table('search_documents', schema=None) as batch_op:
+        batch_op.create_index('idx_search_documents_type_updated', ['entity_type', 'updated_at'], unique=False)
+    if op.get_bind().dialect.name == 'mysql':
+        op.create_index('ft_search_documents_title', 'search_documents', ['title'], mysql_prefix='FULLTEXT')
+        op.create_index('ft_search_documents_content', 'search_documents', ['content'], mysql_prefix='FULLTEXT')
+    # Dữ liệu được nạp bằng: python run_search_index.py rebuild
+
+def downgrade():
+    op.drop_table('search_documents')
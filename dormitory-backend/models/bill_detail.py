@@ -2,6 +2,9 @@ from extensions import db
 from models.room import Room
 class BillDetail(db.Model):
     __tablename__ = 'bill_details'
+    __table_args__ = (
+        db.Index('idx_bill_details_month_room', 'bill_month', 'room_id'),
+    )
     detail_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
     rate_id = db.Column(db.BigInteger, db.ForeignKey('service_rates.rate_id', ondelete='RESTRICT'), nullable=False)
     previous_reading = db.Column(db.DECIMAL(10, 2), default=0.00, nullable=False)
@@ -9,6 +9,8 @@ class Contract(db.Model):
         db.Index('idx_contract_room_id', 'room_id'),
         db.Index('idx_contract_status', 'status'),
         db.Index('idx_contract_room_status', 'room_id', 'status'),
+        db.Index('idx_contract_status_start', 'status', 'start_date'),
+        db.Index('idx_contract_status_end', 'status', 'end_date'),
     )
     contract_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
     room_id = db.Column(db.Integer, db.ForeignKey('rooms.room_id', ondelete='RESTRICT'), nullable=False)
@@ -19,6 +21,7 @@ class Contract(db.Model):
     start_date = db.Column(db.Date, nullable=False)
     end_date = db.Column(db.Date, nullable=False)
     is_deleted = db.Column(db.Boolean, default=False)
+    deleted_at = db.Column(db.DateTime, nullable=True)
     # relationships
     room = db.relationship('Room', backref='contracts', lazy=True)
     user = db.relationship('User', backref='contracts', lazy=True)
@@ -52,6 +55,5 @@ class Contract(db.Model):
         return self.status
 
     def update_status(self):
-        """Cập nhật trạng thái hợp đồng dựa trên calculated_status."""
-        self.status = self.calculated_status
-        db.session.commit()
\ No newline at end of file
+        """Cập nhật trạng thái hợp đồng dựa trên calculated_status (người gọi tự commit)."""
+        self.status = self.calculated_status
\ No newline at end of file
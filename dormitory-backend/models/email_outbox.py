@@ -0,0 +1,41 @@
+from extensions import db
+from datetime import datetime
+import json
+
+class EmailOutbox(db.Model):
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('idx_email_outbox_status_next', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    subject = db.Column(db.String(255), nullable=False)
+    sender = db.Column(db.String(255), nullable=True)
+    recipients = db.Column(db.Text, nullable=False)  # JSON list
+    html = db.Column(db.Text(length=16777215), nullable=True)
+    body = db.Column(db.Text, nullable=True)
+    template = db.Column(db.String(100), nullable=True)
+    status = db.Column(db.Enum('PENDING', 'SENDING', 'SENT', 'FAILED'), default='PENDING', nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def recipient_list(self):
+        return json.loads(self.recipients) if self.recipients else []
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'subject': self.subject,
+            'recipients': self.recipient_list,
+            'template': self.template,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None
+        }
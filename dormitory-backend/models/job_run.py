@@ -0,0 +1,31 @@
+from extensions import db
+from datetime import datetime
+
+class JobRun(db.Model):
+    __tablename__ = 'job_runs'
+    __table_args__ = (
+        db.Index('idx_job_runs_job_started', 'job_name', 'started_at'),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    job_name = db.Column(db.String(100), nullable=False)
+    triggered_by = db.Column(db.Enum('SCHEDULER', 'MANUAL'), default='SCHEDULER', nullable=False)
+    status = db.Column(db.Enum('RUNNING', 'SUCCESS', 'FAILED', 'SKIPPED'), default='RUNNING', nullable=False)
+    host = db.Column(db.String(255), nullable=True)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    duration_ms = db.Column(db.Integer, nullable=True)
+    error_message = db.Column(db.Text, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_name': self.job_name,
+            'triggered_by': self.triggered_by,
+            'status': self.status,
+            'host': self.host,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration_ms': self.duration_ms,
+            'error_message': self.error_message
+        }
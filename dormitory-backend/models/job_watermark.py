@@ -0,0 +1,19 @@
+from extensions import db
+from datetime import datetime
+
+class JobWatermark(db.Model):
+    __tablename__ = 'job_watermarks'
+
+    name = db.Column(db.String(64), primary_key=True)
+    watermark = db.Column(db.Date, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'watermark': self.watermark.isoformat() if self.watermark else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f"<JobWatermark name={self.name} watermark={self.watermark}>"
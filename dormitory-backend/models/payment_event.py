@@ -0,0 +1,80 @@
+from extensions import db
+from datetime import datetime
+from sqlalchemy import event
+import json
+
+class PaymentEvent(db.Model):
+    """Nhật ký callback từ cổng thanh toán, chỉ ghi thêm (không sửa, không xóa)."""
+    __tablename__ = 'payment_events'
+    __table_args__ = (
+        db.UniqueConstraint('dedupe_key', name='uq_payment_events_dedupe_key'),
+        db.Index('idx_payment_events_transaction', 'transaction_id'),
+    )
+
+    OUTCOMES = ['APPLIED', 'DUPLICATE', 'IGNORED', 'UNKNOWN_TRANSACTION', 'AMOUNT_MISMATCH']
+
+    event_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    gateway = db.Column(db.String(20), nullable=False)
+    # gateway + mã giao dịch + mã cổng + mã kết quả: callback lặp lại có cùng khóa
+    dedupe_key = db.Column(db.String(191), nullable=False)
+    transaction_id = db.Column(db.BigInteger, nullable=True)
+    gateway_reference = db.Column(db.String(255), nullable=True)
+    response_code = db.Column(db.String(10), nullable=True)
+    amount = db.Column(db.DECIMAL(12, 2), nullable=True)
+    outcome = db.Column(db.Enum(*OUTCOMES), nullable=False)
+    resulting_status = db.Column(db.String(20), nullable=True)
+    payload = db.Column(db.Text, nullable=True)  # JSON tham số callback (không gồm chữ ký)
+    received_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'event_id': self.event_id,
+            'gateway': self.gateway,
+            'transaction_id': self.transaction_id,
+            'gateway_reference': self.gateway_reference,
+            'response_code': self.response_code,
+            'amount': str(self.amount) if self.amount is not None else None,
+            'outcome': self.outcome,
+            'resulting_status': self.resulting_status,
+            'payload': json.loads(self.payload) if self.payload else None,
+            'received_at': self.received_at.isoformat() if self.received_at else None
+        }
+
+
+@event.listens_for(PaymentEvent, 'before_update')
+@event.listens_for(PaymentEvent, 'before_delete')
+def _payment_event_is_append_only(mapper, connection, target):
+    raise ValueError("payment_events là nhật ký chỉ ghi thêm")
+
+
+class PaymentNotificationTask(db.Model):
+    """Việc gửi thông báo sau khi một giao dịch đổi trạng thái, xử lý bởi worker nền."""
+    __tablename__ = 'payment_notification_tasks'
+    __table_args__ = (
+        db.Index('idx_payment_notification_tasks_status_next', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    event_id = db.Column(db.BigInteger, db.ForeignKey('payment_events.event_id'), nullable=False, unique=True)
+    transaction_id = db.Column(db.BigInteger, nullable=False)
+    kind = db.Column(db.Enum('SUCCESS', 'FAILED'), nullable=False)
+    status = db.Column(db.Enum('PENDING', 'PROCESSING', 'DONE', 'FAILED'), default='PENDING', nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'event_id': self.event_id,
+            'transaction_id': self.transaction_id,
+            'kind': self.kind,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None
+        }
@@ -0,0 +1,25 @@
+from extensions import db
+from datetime import datetime
+
+class PurgeCheckpoint(db.Model):
+    __tablename__ = 'purge_checkpoints'
+
+    target = db.Column(db.String(64), primary_key=True)
+    last_id = db.Column(db.BigInteger, nullable=False, default=0)
+    rows_deleted = db.Column(db.BigInteger, nullable=False, default=0)
+    files_deleted = db.Column(db.BigInteger, nullable=False, default=0)
+    started_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'target': self.target,
+            'last_id': self.last_id,
+            'rows_deleted': self.rows_deleted,
+            'files_deleted': self.files_deleted,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f"<PurgeCheckpoint target={self.target} last_id={self.last_id}>"
@@ -0,0 +1,30 @@
+from extensions import db
+from datetime import datetime
+
+class PushTask(db.Model):
+    """Việc gửi FCM cho một thông báo (tới các recipient của nó), xử lý bởi worker nền."""
+    __tablename__ = 'push_outbox'
+    __table_args__ = (
+        db.Index('idx_push_outbox_status_next', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    notification_id = db.Column(db.BigInteger, db.ForeignKey('notification.id', ondelete='CASCADE'), nullable=False, unique=True)
+    status = db.Column(db.Enum('PENDING', 'PROCESSING', 'DONE', 'FAILED'), default='PENDING', nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'notification_id': self.notification_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None
+        }
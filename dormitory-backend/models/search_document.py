@@ -0,0 +1,19 @@
+from extensions import db
+from datetime import datetime
+
+class SearchDocument(db.Model):
+    """Văn bản đã chuẩn hóa (bỏ dấu, tách token) của một bản ghi cần tìm kiếm."""
+    __tablename__ = 'search_documents'
+    __table_args__ = (
+        db.UniqueConstraint('entity_type', 'entity_id', name='uq_search_documents_entity'),
+        db.Index('idx_search_documents_type_updated', 'entity_type', 'updated_at'),
+        db.Index('ft_search_documents_title', 'title', mysql_prefix='FULLTEXT'),
+        db.Index('ft_search_documents_content', 'content', mysql_prefix='FULLTEXT'),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    entity_type = db.Column(db.String(32), nullable=False)
+    entity_id = db.Column(db.BigInteger, nullable=False)
+    title = db.Column(db.String(512), nullable=False, default='')
+    content = db.Column(db.Text, nullable=False, default='')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -5,6 +5,8 @@ class Service(db.Model):
     service_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(100), unique=True, nullable=False, comment='ví dụ: Điện, Nước')
     unit = db.Column(db.String(10), nullable=False, comment='ví dụ: kWh, m3, Month')
+    is_metered = db.Column(db.Boolean, default=False, server_default=db.false(), nullable=False,
+                           comment='True: tính theo (chỉ số hiện tại - chỉ số trước) x đơn giá; False: giá cố định')
 
     rates = db.relationship('ServiceRate', back_populates='service', lazy=True)
 
@@ -12,5 +14,6 @@ class Service(db.Model):
         return {
             'service_id': self.service_id,
             'name': self.name,
-            'unit': self.unit
+            'unit': self.unit,
+            'is_metered': self.is_metered
         }
\ No newline at end of file
@@ -0,0 +1,44 @@
+import sys
+import os
+import time
+import signal
+import argparse
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from app import create_app
+from utils.email_outbox import OutboxSender, start_outbox_worker, warm_email_templates
+import logging
+
+app = create_app(start_background=False)
+
+logger = logging.getLogger(__name__)
+
+def send_once():
+    with app.app_context():
+        warm_email_templates(app)
+        sent, failed = OutboxSender.from_config(app.config).drain()
+        print(f"Sent {sent} emails, {failed} failed")
+
+def serve():
+    worker = start_outbox_worker(app)
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    try:
+        while not stopping and worker.is_alive():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    worker.stop()
+    worker.join(timeout=30)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send queued emails from the email_outbox table")
+    parser.add_argument('--once', action='store_true', help="Send all due emails and exit")
+    args = parser.parse_args()
+
+    if args.once:
+        send_once()
+    else:
+        serve()
@@ -0,0 +1,53 @@
+import sys
+import os
+import argparse
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from app import create_app
+from extensions import db
+from utils.occupancy import find_drift, reconcile_occupancy, recompute_occupancy
+from utils.availability import get_availability
+import logging
+
+app = create_app(start_background=False)
+
+logger = logging.getLogger(__name__)
+
+def print_drift(drift):
+    for row in drift:
+        print(f"room {row['room_id']}: current_person_number={row['stored']} (actual {row['actual']}), "
+              f"status={row['status']} (expected {row['expected_status']})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check and repair room occupancy (current_person_number)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    check_parser = subparsers.add_parser('check', help="List rooms whose occupancy differs from ACTIVE contracts")
+    check_parser.add_argument('--room', type=int, action='append', help="Room id to check (repeatable, default: all)")
+
+    subparsers.add_parser('reconcile', help="Repair rooms that drifted")
+    subparsers.add_parser('rebuild', help="Recompute occupancy for every room")
+    subparsers.add_parser('availability', help="Rebuild the room availability index from the database")
+
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.command == 'check':
+            drift = find_drift(args.room)
+            print_drift(drift)
+            print(f"{len(drift)} rooms out of sync")
+            sys.exit(1 if drift else 0)
+        elif args.command == 'reconcile':
+            drift = reconcile_occupancy()
+            get_availability().rebuild()
+            print_drift(drift)
+            print(f"Repaired {len(drift)} rooms")
+        elif args.command == 'rebuild':
+            rows = recompute_occupancy()
+            db.session.commit()
+            get_availability().rebuild()
+            print(f"Recomputed {rows} rooms")
+        elif args.command == 'availability':
+            print(f"Indexed {get_availability().rebuild()} rooms")
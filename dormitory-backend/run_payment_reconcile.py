@@ -0,0 +1,50 @@
+import sys
+import os
+import json
+import argparse
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from app import create_app
+from utils.payment_reconciliation import PaymentReconciler, StubGateway, create_payment_gateway
+import logging
+
+app = create_app(start_background=False)
+
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile payment transactions with monthly bills")
+    parser.add_argument('--dry-run', action='store_true', help="Report only, change nothing")
+    parser.add_argument('--stale-minutes', type=int, help="Expire PENDING transactions older than this (default: PAYMENT_PENDING_EXPIRE_MINUTES)")
+    parser.add_argument('--batch-size', type=int, help="Rows per batch (default: PAYMENT_RECONCILE_BATCH_SIZE)")
+    parser.add_argument('--gateway', choices=['vnpay', 'stub', 'none'], help="Status query gateway (default: PAYMENT_QUERY_GATEWAY)")
+    parser.add_argument('--stub-file', help="JSON {transaction_id: status} answered by the stub gateway")
+    parser.add_argument('--output', help="Write the full JSON report to this file")
+    args = parser.parse_args()
+
+    with app.app_context():
+        config = dict(app.config)
+        if args.gateway:
+            config['PAYMENT_QUERY_GATEWAY'] = args.gateway
+        if args.stub_file:
+            config['PAYMENT_STUB_GATEWAY_FILE'] = args.stub_file
+        options = {'gateway': create_payment_gateway(config)}
+        if args.stale_minutes is not None:
+            options['stale_minutes'] = args.stale_minutes
+        if args.batch_size:
+            options['batch_size'] = args.batch_size
+        reconciler = PaymentReconciler.from_config(config, **options)
+        if isinstance(reconciler.gateway, StubGateway):
+            print(f"Using stub gateway ({len(reconciler.gateway.answers)} answers)")
+
+        report = reconciler.run(dry_run=args.dry_run).to_dict()
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        summary = {key: value for key, value in report.items() if key != 'mismatches'}
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        for mismatch in report['mismatches'][:20]:
+            print(mismatch)
+        sys.exit(1 if report['mismatch_counts'] else 0)
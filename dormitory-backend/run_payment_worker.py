@@ -0,0 +1,43 @@
+import sys
+import os
+import time
+import signal
+import argparse
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from app import create_app
+from utils.payment_events import PaymentNotifier, start_payment_worker
+import logging
+
+app = create_app(start_background=False)
+
+logger = logging.getLogger(__name__)
+
+def process_once():
+    with app.app_context():
+        done, failed = PaymentNotifier.from_config(app.config).drain()
+        print(f"Processed {done} payment notifications, {failed} failed")
+
+def serve():
+    worker = start_payment_worker(app)
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    try:
+        while not stopping and worker.is_alive():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    worker.stop()
+    worker.join(timeout=30)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send payment notifications queued by the VNPay callback")
+    parser.add_argument('--once', action='store_true', help="Process all due notifications and exit")
+    args = parser.parse_args()
+
+    if args.once:
+        process_once()
+    else:
+        serve()
@@ -0,0 +1,77 @@
+import sys
+import os
+import time
+import signal
+import argparse
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from app import create_app
+from models.job_run import JobRun
+import scheduler as jobs
+import logging
+
+app = create_app(start_background=False)
+
+logger = logging.getLogger(__name__)
+
+def serve():
+    """Process scheduler riêng: chỉ chạy 1 instance (hoặc nhiều, lease lock sẽ chặn chạy trùng)."""
+    sched = jobs.init_scheduler(app)
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    try:
+        while not stopping:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    logger.info("Shutting down scheduler")
+    sched.shutdown(wait=True)
+
+def list_jobs():
+    for name, job in jobs.JOBS.items():
+        trigger = ', '.join(f"{k}={v}" for k, v in job['trigger'].items())
+        print(f"{name:30} {trigger}")
+
+def trigger_job(name):
+    if name not in jobs.JOBS:
+        print(f"Unknown job: {name}. Dùng 'list' để xem danh sách job")
+        return 1
+    jobs._app = app
+    status = jobs.run_job(name, triggered_by='MANUAL')
+    print(f"{name}: {status}")
+    return 0 if status == 'SUCCESS' else 1
+
+def show_history(name=None, limit=20):
+    with app.app_context():
+        query = JobRun.query
+        if name:
+            query = query.filter_by(job_name=name)
+        runs = query.order_by(JobRun.started_at.desc()).limit(limit).all()
+        for run in runs:
+            duration = f"{run.duration_ms}ms" if run.duration_ms is not None else '-'
+            print(f"{run.started_at.isoformat()}  {run.job_name:30} {run.status:8} {run.triggered_by:9} {duration:>10}  {run.host or ''}")
+            if run.error_message:
+                print(f"    error: {run.error_message}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dormitory scheduler")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('run', help="Start the scheduler process")
+    subparsers.add_parser('list', help="List registered jobs")
+    trigger_parser = subparsers.add_parser('trigger', help="Run a job immediately")
+    trigger_parser.add_argument('job', help="Job name (see 'list')")
+    history_parser = subparsers.add_parser('history', help="Show recent job runs")
+    history_parser.add_argument('--job', help="Filter by job name")
+    history_parser.add_argument('--limit', type=int, default=20, help="Number of runs to show (default: 20)")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        serve()
+    elif args.command == 'list':
+        list_jobs()
+    elif args.command == 'trigger':
+        sys.exit(trigger_job(args.job))
+    elif args.command == 'history':
+        show_history(name=args.job, limit=args.limit)
@@ -0,0 +1,31 @@
+import sys
+import os
+import argparse
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from app import create_app
+from utils.search import rebuild_index, ENTITY_TYPES
+import logging
+
+app = create_app(start_background=False)
+
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the search_documents index")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    rebuild_parser = subparsers.add_parser('rebuild', help="Rebuild search documents from the source tables")
+    rebuild_parser.add_argument('--entity', action='append', choices=ENTITY_TYPES,
+                                help="Entity type to rebuild (repeatable, default: all)")
+    rebuild_parser.add_argument('--batch-size', type=int, default=1000)
+
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.command == 'rebuild':
+            counts = rebuild_index(args.entity, batch_size=args.batch_size)
+            for entity_type, total in counts.items():
+                print(f"{entity_type}: {total} documents")
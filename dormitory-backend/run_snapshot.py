@@ -8,11 +8,12 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.append(project_root)
 
 from extensions import db
-from app import app
+from app import create_app
 from controllers.statistics_controller import snapshot_room_status
 import logging
 
-logging.basicConfig(level=logging.INFO)
+app = create_app(start_background=False)
+
 logger = logging.getLogger(__name__)
 
 def run_room_snapshot(year=None, month=None):
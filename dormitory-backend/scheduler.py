@@ -1,26 +1,27 @@
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from datetime import datetime, timedelta
 from models.bill_detail import BillDetail
-from models.service_rate import ServiceRate
 from models.monthly_bill import MonthlyBill
-from models.contract import Contract
-from models.service import Service
-from models.room import Room
-from models.roomimage import RoomImage
-from models.reportimage import ReportImage
 from models.user import User
-from models.register import Register
-from dateutil.relativedelta import relativedelta
+from models.job_run import JobRun
 from extensions import db
-import os
+import socket
+import time
 import logging
 import pendulum
-import shutil
-import json
 from flask import current_app
+from utils.storage import get_storage, trash_key, avatar_key_from_url
+from utils.purge import PurgeEngine
+from utils.bill_rollover import rollover_bill_details
+from utils.contract_status import update_contract_statuses
+from utils.occupancy import reconcile_occupancy
+from utils.availability import get_availability
+from utils.job_lock import JobLock
+from utils.payment_reconciliation import PaymentReconciler
+from utils.overdue import run_overdue_engine
 from controllers.statistics_controller import snapshot_room_status, save_user_room_snapshot
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def snapshot_wrapper(func):
@@ -34,228 +35,85 @@ def snapshot_wrapper(func):
             try:
                 success = func(year, month)
                 logger.info(f"{func.__name__} for {year}-{month} {'succeeded' if success else 'failed'}")
+                if not success:
+                    # Hàm snapshot tự bắt lỗi và trả về False: báo lỗi để run_job ghi FAILED
+                    raise RuntimeError(f"{func.__name__} for {year}-{month} failed")
             except Exception as e:
-                logger.error(f"Error in {func.__name__} for {year}-{month}: {str(e)}")
+                db.session.rollback()
+                logger.error(f"Error in {func.__name__} for {year}-{month}: {str(e)}", exc_info=True)
+                raise
     return wrapper
 
-def cleanup_deleted_report_images():
-    logger.info("Starting cleanup_deleted_report_images")
+def purge_soft_deleted_records():
+    """Xóa vĩnh viễn ảnh báo cáo, ảnh phòng, đăng ký, hợp đồng và phòng đã soft delete quá hạn."""
+    logger.info("Starting purge_soft_deleted_records")
     try:
         with current_app.app_context():
-            threshold = datetime.utcnow() - timedelta(days=30)
-            deleted_images = ReportImage.query.filter(
-                ReportImage.is_deleted == True,
-                ReportImage.deleted_at <= threshold
-            ).all()
-            for image in deleted_images:
-                trash_path = os.path.join(current_app.config['UPLOAD_BASE'], 'trash', image.image_url)
-                if os.path.exists(trash_path):
-                    try:
-                        os.remove(trash_path)
-                        logger.info(f"Deleted file: {trash_path}")
-                    except Exception as e:
-                        logger.error(f"Error deleting file {trash_path}: {str(e)}")
-                db.session.delete(image)
-            db.session.commit()
-            logger.info(f"Cleaned up {len(deleted_images)} deleted report images.")
+            results = PurgeEngine.from_config(current_app.config).run()
+            total = sum(r.get('rows_deleted', 0) for r in results)
+            logger.info(f"purge_soft_deleted_records completed: {total} rows deleted")
     except Exception as e:
         with current_app.app_context():
             db.session.rollback()
-            logger.error(f"Error during cleanup_deleted_report_images: {str(e)}", exc_info=True)
+            logger.error(f"Error during purge_soft_deleted_records: {str(e)}", exc_info=True)
+        raise
 
-def update_bill_details_job():
-    logger.info("Starting update_bill_details_job")
+def rollover_bill_details_job():
+    """Đầu tháng: tạo sẵn BillDetail của tháng mới với previous_reading lấy từ tháng trước."""
+    logger.info("Starting rollover_bill_details_job")
     try:
-        with current_app.app_context():
-            today = datetime.date.today()
-            current_month = today.replace(day=1)
-            previous_month = current_month - relativedelta(months=1)
-            services = Service.query.all()
-            if not services:
-                logger.error("No services found")
-                return
-            rooms = Room.query.all()
-            for room in rooms:
-                for service in services:
-                    rate = ServiceRate.query.filter(
-                        ServiceRate.service_id == service.service_id,
-                        ServiceRate.effective_date <= today
-                    ).order_by(ServiceRate.effective_date.desc()).first()
-                    if not rate:
-                        logger.warning(f"No rate found for service {service.name} on {today}")
-                        continue
-                    existing_detail = BillDetail.query.filter_by(
-                        room_id=room.room_id,
-                        bill_month=current_month,
-                        rate_id=rate.rate_id
-                    ).first()
-                    if existing_detail:
-                        continue
-                    previous_detail = BillDetail.query.filter_by(
-                        room_id=room.room_id,
-                        bill_month=previous_month,
-                        rate_id=rate.rate_id
-                    ).first()
-                    previous_reading = previous_detail.current_reading if previous_detail else 0.0
-                    new_detail = BillDetail(
-                        rate_id=rate.rate_id,
-                        previous_reading=previous_reading,
-                        current_reading=0.0,
-                        price=0.0,
-                        room_id=room.room_id,
-                        bill_month=current_month
-                    )
-                    db.session.add(new_detail)
-            db.session.commit()
-            logger.info("update_bill_details_job completed successfully")
+        created = rollover_bill_details(pendulum.now('Asia/Ho_Chi_Minh').date())
+        logger.info(f"rollover_bill_details_job completed: {created} bill details created")
     except Exception as e:
-        with current_app.app_context():
-            db.session.rollback()
-            logger.error(f"Error in update_bill_details_job: {str(e)}", exc_info=True)
+        db.session.rollback()
+        logger.error(f"Error in rollover_bill_details_job: {str(e)}", exc_info=True)
+        raise
 
-def cleanup_deleted_rooms():
-    logger.info("Starting cleanup_deleted_rooms")
+def update_contract_status():
+    logger.info("Starting update_contract_status")
     try:
-        with current_app.app_context():
-            threshold = datetime.utcnow() - timedelta(days=30)
-            deleted_rooms = Room.query.filter(
-                Room.is_deleted == True,
-                Room.deleted_at <= threshold
-            ).all()
-            for room in deleted_rooms:
-                db.session.delete(room)
-                logger.info(f"Permanently deleted room: room_id={room.room_id}")
-            db.session.commit()
-            logger.info(f"Cleaned up {len(deleted_rooms)} deleted rooms.")
+        result = update_contract_statuses()
+        logger.info(f"Activated {result['activated']}, expired {result['expired']} contracts; updated {result['rooms_updated']} rooms")
     except Exception as e:
-        with current_app.app_context():
-            db.session.rollback()
-            logger.error(f"Error during cleanup_deleted_rooms: {str(e)}", exc_info=True)
+        db.session.rollback()
+        logger.error(f"Error during update_contract_status: {str(e)}", exc_info=True)
+        raise
 
-def cleanup_deleted_contracts():
-    logger.info("Starting cleanup_deleted_contracts")
+def reconcile_room_occupancy():
+    """Sửa current_person_number/status của các phòng lệch với số hợp đồng ACTIVE."""
+    logger.info("Starting reconcile_room_occupancy")
     try:
-        with current_app.app_context():
-            threshold = datetime.utcnow() - timedelta(days=30)
-            deleted_contracts = Contract.query.filter(
-                Contract.is_deleted == True,
-                Contract.deleted_at <= threshold
-            ).all()
-            for contract in deleted_contracts:
-                db.session.delete(contract)
-                logger.info(f"Permanently deleted contract: contract_id={contract.id}")
-            db.session.commit()
-            logger.info(f"Cleaned up {len(deleted_contracts)} deleted contracts.")
+        drift = reconcile_occupancy()
+        logger.info(f"Reconciled occupancy for {len(drift)} rooms")
+        # Dựng lại availability index từ database (sửa lệch nếu Redis bị mất dữ liệu)
+        get_availability().rebuild()
     except Exception as e:
-        with current_app.app_context():
-            db.session.rollback()
-            logger.error(f"Error during cleanup_deleted_contracts: {str(e)}", exc_info=True)
+        db.session.rollback()
+        logger.error(f"Error during reconcile_room_occupancy: {str(e)}", exc_info=True)
+        raise
 
-def cleanup_deleted_images():
-    logger.info("Starting cleanup_deleted_images")
+def reconcile_payments():
+    """Hỏi cổng các giao dịch PENDING quá hạn, hủy phần còn lại và đối soát với hóa đơn."""
+    logger.info("Starting reconcile_payments")
     try:
-        with current_app.app_context():
-            threshold = datetime.utcnow() - timedelta(days=30)
-            deleted_images = RoomImage.query.filter(
-                RoomImage.is_deleted == True,
-                RoomImage.deleted_at <= threshold
-            ).all()
-            for image in deleted_images:
-                trash_path = os.path.join(current_app.config['UPLOAD_BASE'], 'trash', image.image_url)
-                if os.path.exists(trash_path):
-                    try:
-                        os.remove(trash_path)
-                        logger.info(f"Deleted file: {trash_path}")
-                    except Exception as e:
-                        logger.error(f"Error deleting file {trash_path}: {str(e)}")
-                db.session.delete(image)
-            db.session.commit()
-            logger.info(f"Cleaned up {len(deleted_images)} deleted images.")
+        report = PaymentReconciler.from_config(current_app.config).run()
+        logger.info(f"reconcile_payments completed: expired {report.expired}, repaired {report.repaired}, "
+                    f"mismatches {report.mismatch_counts}")
     except Exception as e:
-        with current_app.app_context():
-            db.session.rollback()
-            logger.error(f"Error during cleanup_deleted_images: {str(e)}", exc_info=True)
+        db.session.rollback()
+        logger.error(f"Error during reconcile_payments: {str(e)}", exc_info=True)
+        raise
 
-def update_previous_readings_job(app):
-    logger.info("Starting update_previous_readings_job")
+def mark_overdue_bills():
+    """Chuyển hóa đơn quá hạn sang OVERDUE và nhắc các phòng còn nợ."""
+    logger.info("Starting mark_overdue_bills")
     try:
-        with app.app_context():
-            today = datetime.today().date()
-            current_month = today.replace(day=1)
-            previous_month = current_month - relativedelta(months=1)
-            services = Service.query.all()
-            if not services:
-                logger.info("Không tìm thấy dịch vụ nào")
-                return
-            default_reading = {service.name.lower(): 0.0 for service in services}
-            rooms = Room.query.all()
-            for room in rooms:
-                previous_detail = BillDetail.query.filter_by(
-                    room_id=room.room_id,
-                    bill_month=previous_month
-                ).first()
-                current_detail = BillDetail.query.filter_by(
-                    room_id=room.room_id,
-                    bill_month=current_month
-                ).first()
-                if current_detail:
-                    continue
-                if previous_detail:
-                    new_previous_reading = previous_detail.current_reading
-                else:
-                    new_previous_reading = json.dumps(default_reading)
-                new_detail = BillDetail(
-                    bill_month=current_month,
-                    previous_reading=new_previous_reading,
-                    current_reading=json.dumps(default_reading),
-                    price=0.0,
-                    submitted_by=None,
-                    room_id=room.room_id
-                )
-                db.session.add(new_detail)
-            db.session.commit()
-            logger.info(f"Cập nhật previous_reading thành công vào {today}")
+        result = run_overdue_engine(current_app.config, pendulum.now('Asia/Ho_Chi_Minh').date())
+        logger.info(f"mark_overdue_bills completed: {result['marked']} bills, {result['reminded_rooms']} rooms reminded")
     except Exception as e:
-        with app.app_context():
-            db.session.rollback()
-            logger.error(f"Error in update_previous_readings_job: {str(e)}", exc_info=True)
-
-def update_contract_status():
-    logger.info("Starting update_contract_status")
-    try:
-        with current_app.app_context():
-            now = pendulum.now('Asia/Ho_Chi_Minh').date()
-            window_start = now - timedelta(hours=2)
-            window_end = now + timedelta(hours=2)
-            contracts = Contract.query.filter(
-                (
-                    (Contract.start_date >= window_start) & (Contract.start_date <= window_end)
-                ) | (
-                    (Contract.end_date >= window_start) & (Contract.end_date <= window_end)
-                ) | (
-                    Contract.status.in_(['PENDING', 'ACTIVE'])
-                )
-            ).all()
-            updated_count = 0
-            for contract in contracts:
-                try:
-                    if not contract.start_date or not contract.end_date:
-                        logger.warning(f"Contract {contract.contract_id} has invalid start_date or end_date")
-                        continue
-                    old_status = contract.status
-                    contract.update_status()
-                    if old_status != contract.status:
-                        updated_count += 1
-                        logger.debug(f"Updated contract {contract.contract_id} status from {old_status} to {contract.status}")
-                except Exception as e:
-                    logger.error(f"Error updating contract {contract.contract_id}: {str(e)}")
-                    continue
-            db.session.commit()
-            logger.info(f"Updated status for {updated_count} contracts")
-    except Exception as e:
-        with current_app.app_context():
-            db.session.rollback()
-            logger.error(f"Error during update_contract_status: {str(e)}", exc_info=True)
+        db.session.rollback()
+        logger.error(f"Error during mark_overdue_bills: {str(e)}", exc_info=True)
+        raise
 
 def cleanup_deleted_avatars():
     logger.info("Starting cleanup_deleted_avatars")
@@ -267,15 +125,16 @@ def cleanup_deleted_avatars():
                 User.is_deleted == True,
                 User.deleted_at <= threshold
             ).all()
+            storage = get_storage()
             for user in users:
                 if user.avatar_url:
-                    trash_path = os.path.join(current_app.config['TRASH_BASE'], f"{datetime.utcnow().timestamp()}_{os.path.basename(user.avatar_url)}")
-                    if os.path.exists(trash_path):
+                    key = avatar_key_from_url(user.avatar_url)
+                    for candidate in (key, trash_key(key)):
                         try:
-                            os.remove(trash_path)
-                            logger.info(f"Deleted avatar from trash: {trash_path}")
+                            if storage.delete(candidate):
+                                logger.info(f"Deleted avatar: {candidate}")
                         except Exception as e:
-                            logger.error(f"Error deleting avatar {trash_path}: {str(e)}")
+                            logger.error(f"Error deleting avatar {candidate}: {str(e)}")
                     user.avatar_url = None
                     db.session.add(user)
             db.session.commit()
@@ -284,6 +143,7 @@ def cleanup_deleted_avatars():
         with current_app.app_context():
             db.session.rollback()
             logger.error(f"Error during cleanup_deleted_avatars: {str(e)}", exc_info=True)
+        raise
 
 def delete_old_paid_bills():
     logger.info("Starting delete_old_paid_bills")
@@ -313,144 +173,166 @@ def delete_old_paid_bills():
         with current_app.app_context():
             db.session.rollback()
             logger.error(f"Error in delete_old_paid_bills: {str(e)}", exc_info=True)
-
-def cleanup_deleted_registrations():
-    logger.info("Starting cleanup_deleted_registrations")
-    try:
-        with current_app.app_context():
-            threshold = datetime.utcnow() - timedelta(days=30)
-            deleted_registrations = Register.query.filter(
-                Register.is_deleted == True,
-                Register.deleted_at <= threshold
-            ).all()
-            for registration in deleted_registrations:
-                db.session.delete(registration)
-                logger.info(f"Permanently deleted registration: registration_id={registration.id}")
-            db.session.commit()
-            logger.info(f"Cleaned up {len(deleted_registrations)} deleted registrations.")
-    except Exception as e:
-        with current_app.app_context():
-            db.session.rollback()
-            logger.error(f"Error during cleanup_deleted_registrations: {str(e)}", exc_info=True)
+        raise
 
 def cleanup_trash_folder():
     logger.info("Starting cleanup_trash_folder")
     try:
         with current_app.app_context():
-            trash_path = current_app.config['TRASH_BASE']
-            if not os.path.exists(trash_path):
-                logger.info(f"Trash folder does not exist: {trash_path}")
-                return
+            storage = get_storage()
             deleted_files = 0
-            deleted_dirs = 0
-            for root, dirs, files in os.walk(trash_path, topdown=False):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    try:
-                        os.remove(file_path)
-                        logger.info(f"Deleted file from trash: {file_path}")
+            for key in list(storage.list('trash/')):
+                try:
+                    if storage.delete(key):
+                        logger.info(f"Deleted file from trash: {key}")
                         deleted_files += 1
-                    except Exception as e:
-                        logger.error(f"Error deleting file {file_path}: {str(e)}")
-                for dir_name in dirs:
-                    dir_path = os.path.join(root, dir_name)
-                    try:
-                        shutil.rmtree(dir_path)
-                        logger.info(f"Deleted directory from trash: {dir_path}")
-                        deleted_dirs += 1
-                    except Exception as e:
-                        logger.error(f"Error deleting directory {dir_path}: {str(e)}")
-            logger.info(f"Cleaned up {deleted_files} files and {deleted_dirs} directories from trash folder")
+                except Exception as e:
+                    logger.error(f"Error deleting file {key}: {str(e)}")
+            logger.info(f"Cleaned up {deleted_files} files from trash folder")
     except Exception as e:
         with current_app.app_context():
             logger.error(f"Error during cleanup_trash_folder: {str(e)}", exc_info=True)
+        raise
+
+# Registry các job: id cố định để job store không bị nhân bản giữa các lần khởi động
+JOBS = {
+    'cleanup_deleted_avatars': {
+        'func': cleanup_deleted_avatars,
+        'trigger': {'trigger': 'cron', 'hour': 2, 'minute': 0},
+    },
+    'rollover_bill_details': {
+        'func': rollover_bill_details_job,
+        'trigger': {'trigger': 'cron', 'day': 1, 'hour': 0, 'minute': 0},
+    },
+    'delete_old_paid_bills': {
+        'func': delete_old_paid_bills,
+        'trigger': {'trigger': 'cron', 'day': 1, 'hour': 0, 'minute': 0},
+    },
+    'update_contract_status': {
+        'func': update_contract_status,
+        'trigger': {'trigger': 'interval', 'hours': 2},
+    },
+    'reconcile_room_occupancy': {
+        'func': reconcile_room_occupancy,
+        'trigger': {'trigger': 'cron', 'hour': 3, 'minute': 0},
+    },
+    'reconcile_payments': {
+        'func': reconcile_payments,
+        'trigger': {'trigger': 'interval', 'minutes': 15},
+    },
+    'mark_overdue_bills': {
+        'func': mark_overdue_bills,
+        'trigger': {'trigger': 'cron', 'hour': 8, 'minute': 0},
+    },
+    'purge_soft_deleted_records': {
+        'func': purge_soft_deleted_records,
+        'trigger': {'trigger': 'cron', 'hour': 2, 'minute': 15},
+    },
+    'cleanup_trash_folder': {
+        'func': cleanup_trash_folder,
+        'trigger': {'trigger': 'cron', 'month': 12, 'day': 31, 'hour': 0, 'minute': 0},
+    },
+    'snapshot_room_status': {
+        'func': snapshot_wrapper(snapshot_room_status),
+        'trigger': {'trigger': 'cron', 'day': 'last', 'hour': 23, 'minute': 59},
+    },
+    'save_user_room_snapshot': {
+        'func': snapshot_wrapper(save_user_room_snapshot),
+        'trigger': {'trigger': 'cron', 'day': 'last', 'hour': 23, 'minute': 59},
+    },
+}
+
+_app = None
+
+def _save_run(run):
+    try:
+        db.session.add(run)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Không thể lưu lịch sử chạy job {run.job_name}: {str(e)}")
+
+def run_job(name, triggered_by='SCHEDULER'):
+    """Chạy một job trong app context, giữ lease lock và ghi lịch sử chạy.
+
+    Trả về trạng thái của lần chạy: SUCCESS, FAILED hoặc SKIPPED (process khác đang giữ lock).
+    """
+    if name not in JOBS:
+        raise KeyError(f"Unknown job: {name}")
+    app = _app or current_app._get_current_object()
+    with app.app_context():
+        run = JobRun(
+            job_name=name,
+            triggered_by=triggered_by,
+            status='RUNNING',
+            host=socket.gethostname(),
+            started_at=datetime.utcnow()
+        )
+        try:
+            lock = JobLock.from_config(app.config, name)
+            acquired = lock.acquire()
+        except Exception as e:
+            # Không lấy được lock (Redis lỗi, URI sai, ...): vẫn ghi lại lần chạy FAILED
+            run.status = 'FAILED'
+            run.error_message = f"Lock error: {str(e)}"[:2000]
+            run.finished_at = datetime.utcnow()
+            run.duration_ms = 0
+            _save_run(run)
+            logger.error(f"Job {name} could not acquire its lock: {str(e)}", exc_info=True)
+            return run.status
+        if not acquired:
+            run.status = 'SKIPPED'
+            run.finished_at = run.started_at
+            run.duration_ms = 0
+            _save_run(run)
+            logger.info(f"Skip job {name}: đang chạy ở process khác")
+            return run.status
+
+        _save_run(run)
+        started = time.monotonic()
+        # Job chạy lâu hơn SCHEDULER_LOCK_TTL vẫn giữ lock: gia hạn lease định kỳ
+        lock.start_renewal()
+        try:
+            JOBS[name]['func']()
+            run.status = 'SUCCESS'
+        except Exception as e:
+            db.session.rollback()
+            run.status = 'FAILED'
+            run.error_message = str(e)[:2000]
+            logger.error(f"Job {name} failed: {str(e)}", exc_info=True)
+        finally:
+            run.duration_ms = int((time.monotonic() - started) * 1000)
+            run.finished_at = datetime.utcnow()
+            _save_run(run)
+            lock.release()
+        logger.info(f"Job {name} finished with {run.status} in {run.duration_ms}ms")
+        return run.status
 
 def init_scheduler(app):
-    scheduler = BackgroundScheduler()
+    """Khởi động scheduler với job store trong database.
+
+    Chỉ nên gọi từ process scheduler riêng (``python run_scheduler.py run``); các
+    worker gunicorn không tự khởi động scheduler trừ khi bật SCHEDULER_ENABLED.
+    """
+    global _app
+    _app = app
+    jobstores = {
+        'default': SQLAlchemyJobStore(url=app.config['SQLALCHEMY_DATABASE_URI'], tablename='apscheduler_jobs')
+    }
+    job_defaults = {
+        'coalesce': True,
+        'max_instances': 1,
+        'misfire_grace_time': app.config.get('SCHEDULER_MISFIRE_GRACE_TIME', 3600)
+    }
+    scheduler = BackgroundScheduler(jobstores=jobstores, job_defaults=job_defaults, timezone='Asia/Ho_Chi_Minh')
     logger.info("Initializing APScheduler")
-    scheduler.add_job(
-        cleanup_deleted_avatars,
-        'cron',
-        hour=2,
-        minute=0
-    )
-    scheduler.add_job(
-        lambda: update_previous_readings_job(app),
-        'cron',
-        day=1,
-        hour=0,
-        minute=0
-    )
-    scheduler.add_job(
-        delete_old_paid_bills,
-        'cron',
-        day=1,
-        hour=0,
-        minute=0
-    )
-    scheduler.add_job(
-        cleanup_deleted_report_images,
-        'cron',
-        hour=2,
-        minute=0
-    )
-    scheduler.add_job(
-        cleanup_deleted_images,
-        'cron',
-        hour=2,
-        minute=0
-    )
-    scheduler.add_job(
-        update_contract_status,
-        'interval',
-        hours=2
-    )
-    scheduler.add_job(
-        update_bill_details_job,
-        'cron',
-        day=1,
-        hour=0,
-        minute=0
-    )
-    scheduler.add_job(
-        cleanup_deleted_rooms,
-        'cron',
-        hour=2,
-        minute=0
-    )
-    scheduler.add_job(
-        cleanup_deleted_contracts,
-        'cron',
-        hour=2,
-        minute=0
-    )
-    scheduler.add_job(
-        cleanup_deleted_registrations,
-        'cron',
-        hour=2,
-        minute=0
-    )
-    scheduler.add_job(
-        cleanup_trash_folder,
-        'cron',
-        month=12,
-        day=31,
-        hour=0,
-        minute=0
-    )
-    scheduler.add_job(
-        snapshot_wrapper(snapshot_room_status),
-        'cron',
-        day='last',
-        hour=23,
-        minute=59
-    )
-    scheduler.add_job(
-        snapshot_wrapper(save_user_room_snapshot),
-        'cron',
-        day='last',
-        hour=23,
-        minute=59
-    )
+    for name, job in JOBS.items():
+        # Tham chiếu dạng chuỗi để job store lưu được (không pickle hàm/lambda)
+        scheduler.add_job('scheduler:run_job', args=[name], id=name, name=name, replace_existing=True, **job['trigger'])
     scheduler.start()
-    logger.info("APScheduler started with jobs.")
\ No newline at end of file
+    for job in scheduler.get_jobs():
+        if job.id not in JOBS:
+            logger.info(f"Removing stale job {job.id} from job store")
+            job.remove()
+    logger.info("APScheduler started with jobs.")
+    return scheduler
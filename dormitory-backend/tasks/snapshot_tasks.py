@@ -1,11 +1,13 @@
-from celery import Celery
-from extensions import db
+import logging
 from app import create_app
-from controllers.statistics_controller import save_user_room_snapshot, save_room_status_snapshot
+from utils.celery_app import get_celery
+from controllers.statistics_controller import save_user_room_snapshot, snapshot_room_status
 from datetime import datetime
 
-app = create_app()
-celery = Celery(app.import_name, broker=app.config['CELERY_BROKER_URL'])
+logger = logging.getLogger(__name__)
+
+app = create_app(start_background=False)
+celery = get_celery(app)
 celery.conf.update(app.config)
 
 @celery.task
@@ -15,8 +17,8 @@ def run_snapshots():
         year = current_time.year
         month = current_time.month
         success_user = save_user_room_snapshot(year, month)
-        success_room = save_room_status_snapshot(year, month)
+        success_room = snapshot_room_status(year, month)
         if success_user and success_room:
-            print(f"Successfully ran snapshots for {year}-{month}")
+            logger.info(f"Successfully ran snapshots for {year}-{month}")
         else:
-            print(f"Failed to run snapshots for {year}-{month}")
\ No newline at end of file
+            logger.error(f"Failed to run snapshots for {year}-{month}")
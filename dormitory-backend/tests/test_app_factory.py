@@ -0,0 +1,39 @@
+import pytest
+
+from app import UPLOAD_FOLDERS, create_app
+
+ENV_KEYS = ('DATABASE_URL', 'REDIS_STORAGE_URI', 'REDIS_CACHE_URI', 'RATE_LIMIT_DEFAULT', 'UPLOAD_BASE') + \
+    tuple(key for key, _ in UPLOAD_FOLDERS)
+
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    for key in ENV_KEYS:
+        monkeypatch.delenv(key, raising=False)
+
+
+def test_create_app_with_minimal_dict(tmp_path):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'UPLOAD_BASE': str(tmp_path),
+        'ROOM_IMAGES_BASE': str(tmp_path / 'rooms'),
+    }, start_background=False)
+
+    assert app.config['RATELIMIT_STORAGE_URI'] == 'memory://'
+    assert app.config['UPLOAD_BASE'] == str(tmp_path)
+    assert app.config['ROOM_IMAGES_BASE'] == str(tmp_path / 'rooms')
+    assert app.config['AVATAR_UPLOAD_FOLDER'] == str(tmp_path / 'avatars')
+    assert app.test_client().get('/debug/routes').status_code == 200
+
+
+def test_dict_config_overrides_environment(monkeypatch, tmp_path):
+    monkeypatch.setenv('UPLOAD_BASE', str(tmp_path / 'from_env'))
+    monkeypatch.setenv('REDIS_STORAGE_URI', 'memory://')
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'UPLOAD_BASE': str(tmp_path / 'from_config'),
+    }, start_background=False)
+
+    assert app.config['UPLOAD_BASE'] == str(tmp_path / 'from_config')
+    assert app.config['TRASH_BASE'] == str(tmp_path / 'from_config' / 'trash')
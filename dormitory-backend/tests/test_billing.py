@@ -0,0 +1,113 @@
+from decimal import Decimal
+
+import pytest
+from hypothesis import example, given, strategies as st
+
+from utils.billing import compute_amounts, detail_amount
+
+# DECIMAL(10, 2): chỉ số và đơn giá lưu theo xu (1/100)
+MAX_CENTS = 9_999_999_999
+
+
+def cents(value):
+    return Decimal(value) / 100
+
+
+def oracle(previous_cents, current_cents, price_cents, is_metered):
+    """Thành tiền tính bằng số nguyên (đơn vị 1/10000 đồng), làm tròn nửa lên tới đồng."""
+    if is_metered:
+        amount = (current_cents - previous_cents) * price_cents
+    else:
+        amount = price_cents * 100
+    return (amount + 5000) // 10000
+
+
+def legacy_price(previous, current, unit_price, is_metered):
+    """Công thức cũ trong monthly_bill_controller: (chỉ số hiện tại - chỉ số trước) x đơn giá, tính bằng float."""
+    if not is_metered:
+        return float(unit_price)
+    return (float(current) - float(previous)) * float(unit_price)
+
+
+@st.composite
+def rows(draw):
+    previous = draw(st.integers(0, MAX_CENTS))
+    current = previous + draw(st.integers(0, min(10_000_000, MAX_CENTS - previous)))
+    price = draw(st.integers(0, 100_000_000))
+    return previous, current, price, draw(st.booleans())
+
+
+@given(st.lists(rows(), max_size=50))
+def test_compute_amounts_matches_integer_oracle(batch):
+    columns = [[cents(p) for p, _, _, _ in batch], [cents(c) for _, c, _, _ in batch],
+               [cents(u) for _, _, u, _ in batch], [m for _, _, _, m in batch]]
+
+    usage, amounts = compute_amounts(*columns)
+
+    assert amounts == [oracle(*row) for row in batch]
+    assert usage == [cents(c - p) if m else 0 for p, c, _, m in batch]
+
+
+@given(rows())
+@example((0, 50, 100, True))            # 0.5 đồng
+@example((0, 29, 5000, True))           # 0.29 x 50 = 14.5, float cho 14.4999...
+@example((10_000, 10_000, 350_000, True))        # không dùng: 0
+@example((10_000, 10_000, 5_000_000, False))     # giá cố định, không phụ thuộc chỉ số
+@example((MAX_CENTS - 99, MAX_CENTS, 350_000, True))
+@example((0, MAX_CENTS, 100, True))
+def test_detail_amount_matches_legacy_float_path(row):
+    previous, current, price, is_metered = row
+    expected = oracle(*row)
+
+    # Cùng kết quả dù đầu vào là Decimal (từ DB) hay float (từ JSON)
+    assert detail_amount(cents(previous), cents(current), cents(price), is_metered) == expected
+    assert detail_amount(previous / 100, current / 100, price / 100, is_metered) == expected
+
+    legacy = legacy_price(previous / 100, current / 100, price / 100, is_metered)
+    exact = Decimal((current - previous) * price if is_metered else price * 100) / 10000
+    # Đường float cũ chỉ lệch do sai số biểu diễn; ngoài điểm .5 đúng thì làm tròn ra cùng số đồng
+    assert abs(Decimal(repr(legacy)) - exact) < Decimal('0.01')
+    if exact % 1 != Decimal('0.5'):
+        assert round(legacy) == expected
+
+
+@pytest.mark.parametrize('previous, current, unit_price, legacy_rounded, expected', [
+    ('0', '0.5', '1', 0, 1),              # round() của Python làm tròn về số chẵn
+    ('0', '1.5', '1', 2, 2),
+    ('0', '2.5', '1', 2, 3),
+    ('0', '0.29', '50', 14, 15),          # float: 14.499999999999998
+    ('0', '1.15', '50', 57, 58),          # float: 57.49999999999999
+    ('10.00', '10.01', '49.99', 0, 0),    # 0.4999
+    ('10.00', '10.01', '50.01', 1, 1),    # 0.5001
+])
+def test_half_vnd_rounds_up_where_legacy_did_not(previous, current, unit_price, legacy_rounded, expected):
+    assert round(legacy_price(previous, current, unit_price, True)) == legacy_rounded
+    assert detail_amount(Decimal(previous), Decimal(current), Decimal(unit_price), True) == expected
+    assert detail_amount(float(previous), float(current), float(unit_price), True) == expected
+
+
+@pytest.mark.parametrize('previous, current, unit_price, is_metered, expected', [
+    ('1234.56', '1234.56', '3500', True, 0),                   # không dùng
+    ('0', '0', '0', True, 0),
+    ('99999999.00', '99999999.99', '3500', True, 3465),         # chỉ số lớn nhất của DECIMAL(10, 2)
+    ('0', '99999999.99', '1', True, 100000000),
+    ('0', '99999999.99', '99999999.99', False, 100000000),      # giá cố định lớn nhất
+    ('10', '25', '1500.5', False, 1501),
+    ('10', '25', '1500.49', False, 1500),
+])
+def test_boundary_values(previous, current, unit_price, is_metered, expected):
+    assert detail_amount(Decimal(previous), Decimal(current), Decimal(unit_price), is_metered) == expected
+    legacy = legacy_price(previous, current, unit_price, is_metered)
+    assert abs(legacy - expected) <= 0.5
+
+
+def test_flat_service_has_no_usage():
+    usage, amounts = compute_amounts([Decimal('10')], [Decimal('25')], [Decimal('50000')], [False])
+
+    assert usage == [0]
+    assert amounts == [50000]
+
+
+def test_compute_amounts_rejects_columns_of_different_length():
+    with pytest.raises(ValueError):
+        compute_amounts([0, 1], [1], [100], [True])
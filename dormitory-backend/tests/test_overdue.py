@@ -0,0 +1,71 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import BigInteger
+from sqlalchemy.ext.compiler import compiles
+
+from app import create_app
+from extensions import db
+from models.area import Area
+from models.bill_detail import BillDetail
+from models.contract import Contract
+from models.monthly_bill import MonthlyBill
+from models.notification import Notification
+from models.room import Room
+from models.search_document import SearchDocument
+from models.user import User
+from utils.overdue import OVERDUE_REMINDER_TITLE, run_overdue_engine
+from utils.search import search
+
+
+# SQLite chỉ tự tăng khóa chính kiểu INTEGER
+@compiles(BigInteger, 'sqlite')
+def _bigint_as_integer(type_, compiler, **kw):
+    return 'INTEGER'
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.delenv('DATABASE_URL', raising=False)
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'UPLOAD_BASE': str(tmp_path),
+        'REDIS_STORAGE_URI': 'memory://',
+    }, start_background=False)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+def seed_overdue_room():
+    area = Area(name='A')
+    db.session.add(area)
+    db.session.flush()
+    room = Room(name='P101', capacity=4, price=Decimal('1500000'), area_id=area.area_id)
+    user = User(fullname='Nguyen Van A', email='a@example.com', password_hash='x')
+    db.session.add_all([room, user])
+    db.session.flush()
+    detail = BillDetail(rate_id=1, price=Decimal('50000'), room_id=room.room_id, bill_month=date(2026, 9, 1))
+    db.session.add_all([
+        detail,
+        Contract(room_id=room.room_id, user_id=user.user_id, status='ACTIVE', contract_type='LONG_TERM',
+                 start_date=date(2026, 1, 1), end_date=date(2027, 1, 1)),
+    ])
+    db.session.flush()
+    db.session.add(MonthlyBill(user_id=user.user_id, detail_id=detail.detail_id, room_id=room.room_id,
+                               bill_month=date(2026, 9, 1), total_amount=Decimal('50000')))
+    db.session.commit()
+
+
+def test_overdue_reminders_are_searchable(app):
+    seed_overdue_room()
+
+    result = run_overdue_engine(app.config, today=date(2026, 10, 19))
+
+    assert result == {'marked': 1, 'reminded_rooms': 1}
+    reminder = Notification.query.filter_by(title=OVERDUE_REMINDER_TITLE).one()
+    assert SearchDocument.query.filter_by(entity_type='notification', entity_id=reminder.id).count() == 1
+    for text in ('qua han', 'P101', 'Nhắc nhở quá hạn'):
+        assert search(Notification.query, 'notification', text, 10).items == [reminder]
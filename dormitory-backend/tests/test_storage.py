@@ -0,0 +1,77 @@
+import io
+
+import pytest
+
+moto = pytest.importorskip('moto')
+boto3 = pytest.importorskip('boto3')
+
+from utils.storage import S3Storage, storage_key, trash_key
+
+BUCKET = 'dormitory-test'
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    with moto.mock_aws():
+        boto3.client('s3', region_name='us-east-1').create_bucket(Bucket=BUCKET)
+        yield S3Storage(BUCKET, region='us-east-1', access_key='testing', secret_key='testing', key_prefix='uploads')
+
+
+def test_put_stat_get(storage):
+    key = storage_key('roomimage', 'a.png')
+
+    assert storage.put(key, io.BytesIO(b'12345')) == 5
+    info = storage.stat(key)
+    assert info['size'] == 5
+    assert info['content_type'] == 'image/png'
+    assert storage.get(key).read() == b'12345'
+    # key prefix chỉ nằm trên bucket, không lộ ra key logic
+    assert storage.client.head_object(Bucket=BUCKET, Key=f'uploads/{key}')['ContentLength'] == 5
+
+
+def test_missing_key(storage):
+    assert storage.stat('roomimage/missing.png') is None
+    assert storage.exists('roomimage/missing.png') is False
+    assert storage.delete('roomimage/missing.png') is False
+    assert storage.move('roomimage/missing.png', 'trash/missing.png') is False
+    with pytest.raises(FileNotFoundError):
+        storage.get('roomimage/missing.png')
+
+
+def test_list_move_and_delete(storage):
+    for name in ('a.png', 'b.png'):
+        storage.put(storage_key('roomimage', '7', name), io.BytesIO(b'x'))
+    storage.put(storage_key('avatars', 'c.png'), io.BytesIO(b'x'))
+
+    assert sorted(storage.list('roomimage/7/')) == ['roomimage/7/a.png', 'roomimage/7/b.png']
+
+    assert storage.move('roomimage/7/a.png', trash_key('roomimage/7/a.png')) is True
+    assert not storage.exists('roomimage/7/a.png')
+    assert storage.exists(trash_key('roomimage/7/a.png'))
+
+    assert storage.move_prefix('roomimage/7', 'roomimage/8') == 1
+    assert list(storage.list('roomimage/7/')) == []
+    assert list(storage.list('roomimage/8/')) == ['roomimage/8/b.png']
+
+    assert storage.delete('roomimage/8/b.png') is True
+    assert list(storage.list('roomimage/')) == []
+
+
+def test_unique_key(storage):
+    storage.put(storage_key('report_images', 'r.jpg'), io.BytesIO(b'x'))
+
+    assert storage.unique_key('report_images', 'r.jpg') == 'report_images/r_1.jpg'
+    assert storage.unique_key('report_images', 'new.jpg') == 'report_images/new.jpg'
+
+
+def test_presigned_url(storage):
+    key = storage_key('notification_media', 'v.mp4')
+    storage.put(key, io.BytesIO(b'video'))
+
+    url = storage.presigned_url(key, expires_in=60, as_attachment=True, download_name='clip.mp4')
+
+    assert f'/{BUCKET}/uploads/{key}?' in url
+    assert 'X-Amz-Expires=60' in url
+    assert 'clip.mp4' in url
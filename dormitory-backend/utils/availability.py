@@ -0,0 +1,623 @@
+# utils/availability.py
+"""Chỉ mục chỗ trống của phòng cho đăng ký và lọc danh mục phòng.
+
+Mỗi phòng lưu (khu vực, sức chứa, số người đang ở, có nhận đăng ký không). Chỗ
+trống = sức chứa - số người đang ở - số chỗ đang được giữ. Đăng ký PENDING giữ
+chỗ (hold) có TTL ``AVAILABILITY_HOLD_TTL``; hết hạn thì chỗ tự trả lại.
+
+Phòng còn chỗ được gom vào các tập theo (khu vực, sức chứa), nên
+``/rooms?available=true`` và kiểm tra chỗ khi đăng ký không phải đếm hợp đồng.
+Giữ chỗ là thao tác nguyên tử (Lua trên Redis, lock trong process với
+``memory://``) nên hai đăng ký đồng thời không vượt quá sức chứa.
+
+Chỉ mục được cập nhật sau khi commit các thay đổi hợp đồng/phòng (cùng sự kiện
+với ``utils/occupancy.py``) và được dựng lại bởi job đối soát hằng ngày. Database
+vẫn là nguồn dữ liệu gốc; khi Redis lỗi, API quay về truy vấn SQL.
+"""
+import heapq
+import logging
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event, inspect, select
+
+from extensions import db
+from models.register import Register
+from models.room import Room
+from utils.occupancy import MANUAL_ROOM_STATUSES, affected_room_ids
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOLD_TTL = 48 * 3600
+
+
+def registration_hold_id(registration_id):
+    return f"registration:{registration_id}"
+
+
+def _room_values(row):
+    bookable = not row.is_deleted and row.status not in MANUAL_ROOM_STATUSES
+    return row.area_id, row.capacity, row.current_person_number, bookable
+
+
+def _room_rows(connection, room_ids=None):
+    stmt = select(
+        Room.room_id, Room.area_id, Room.capacity, Room.current_person_number, Room.status, Room.is_deleted
+    )
+    if room_ids is not None:
+        stmt = stmt.where(Room.room_id.in_(list(room_ids)))
+    return connection.execute(stmt).all()
+
+
+class AvailabilityIndex:
+    """Interface chung; ``hold_id`` là chuỗi dạng ``registration:12``."""
+
+    name = None
+
+    def set_room(self, room_id, area_id, capacity, occupied, bookable):
+        raise NotImplementedError
+
+    def remove_room(self, room_id):
+        raise NotImplementedError
+
+    def free_slots(self, room_id):
+        """Số chỗ còn trống, None nếu phòng chưa có trong chỉ mục."""
+        raise NotImplementedError
+
+    def hold(self, room_id, hold_id, count, ttl):
+        """Giữ ``count`` chỗ nếu còn đủ. Trả về True/False, None nếu phòng chưa có trong chỉ mục."""
+        raise NotImplementedError
+
+    def release(self, hold_id):
+        raise NotImplementedError
+
+    def consume(self, hold_id, count=1):
+        """Bớt ``count`` chỗ của hold (đã thành hợp đồng ACTIVE); hết chỗ thì bỏ hold. Trả về số chỗ còn giữ."""
+        raise NotImplementedError
+
+    def available_rooms(self, area_id=None, min_capacity=None, max_capacity=None):
+        """Tập room_id còn ít nhất một chỗ và đang nhận đăng ký."""
+        raise NotImplementedError
+
+    def is_loaded(self):
+        raise NotImplementedError
+
+    def mark_loaded(self):
+        raise NotImplementedError
+
+    def load(self, rows, present_only=False):
+        """Nạp các dòng phòng; ``present_only=False`` bỏ các phòng không còn trong ``rows``."""
+        raise NotImplementedError
+
+    def sync_rooms(self, room_ids, connection=None):
+        """Đọc lại các phòng từ database (phòng không còn thì xóa khỏi chỉ mục)."""
+        room_ids = set(room_ids)
+        if not room_ids:
+            return
+        if connection is None:
+            with db.engine.connect() as conn:
+                rows = _room_rows(conn, room_ids)
+        else:
+            rows = _room_rows(connection, room_ids)
+        for row in rows:
+            self.set_room(row.room_id, *_room_values(row))
+            room_ids.discard(row.room_id)
+        for room_id in room_ids:
+            self.remove_room(room_id)
+
+    def rebuild(self):
+        with db.engine.connect() as conn:
+            rows = _room_rows(conn)
+        self.load(rows)
+        self.mark_loaded()
+        logger.info(f"Availability index rebuilt for {len(rows)} rooms ({self.name})")
+        return len(rows)
+
+
+class MemoryAvailabilityIndex(AvailabilityIndex):
+    """Lưu trong process (dev/test); không dùng khi chạy nhiều worker."""
+
+    name = 'memory'
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._rooms = {}        # room_id -> (area_id, capacity, occupied, bookable)
+        self._holds = {}        # hold_id -> (room_id, count, expires_at)
+        self._room_holds = {}   # room_id -> {hold_id: (count, expires_at)}
+        self._open = {}         # (area_id, capacity) -> {room_id}
+        self._expiry = []       # heap (expires_at, room_id)
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _free(self, room_id):
+        area_id, capacity, occupied, bookable = self._rooms[room_id]
+        now = self.clock()
+        holds = self._room_holds.get(room_id, {})
+        for hold_id in [h for h, (_, expires_at) in holds.items() if expires_at <= now]:
+            del holds[hold_id]
+            self._holds.pop(hold_id, None)
+        held = sum(count for count, _ in holds.values())
+        return capacity - occupied - held
+
+    def _refresh(self, room_id):
+        area_id, capacity, occupied, bookable = self._rooms[room_id]
+        free = self._free(room_id)
+        bucket = self._open.setdefault((area_id, capacity), set())
+        if bookable and free > 0:
+            bucket.add(room_id)
+        else:
+            bucket.discard(room_id)
+        return free
+
+    def _sweep(self):
+        now = self.clock()
+        while self._expiry and self._expiry[0][0] <= now:
+            _, room_id = heapq.heappop(self._expiry)
+            if room_id in self._rooms:
+                self._refresh(room_id)
+
+    def _discard(self, room_id):
+        old = self._rooms.pop(room_id, None)
+        if old:
+            self._open.get((old[0], old[1]), set()).discard(room_id)
+
+    def set_room(self, room_id, area_id, capacity, occupied, bookable):
+        with self._lock:
+            self._discard(room_id)
+            self._rooms[room_id] = (area_id, capacity, occupied, bookable)
+            self._refresh(room_id)
+
+    def remove_room(self, room_id):
+        with self._lock:
+            self._discard(room_id)
+
+    def free_slots(self, room_id):
+        with self._lock:
+            if room_id not in self._rooms:
+                return None
+            return max(0, self._free(room_id))
+
+    def hold(self, room_id, hold_id, count, ttl):
+        with self._lock:
+            if room_id not in self._rooms:
+                return None
+            self._release(hold_id)
+            if self._free(room_id) < count:
+                self._refresh(room_id)
+                return False
+            expires_at = self.clock() + ttl
+            self._holds[hold_id] = (room_id, count, expires_at)
+            self._room_holds.setdefault(room_id, {})[hold_id] = (count, expires_at)
+            heapq.heappush(self._expiry, (expires_at, room_id))
+            self._refresh(room_id)
+            return True
+
+    def _release(self, hold_id):
+        item = self._holds.pop(hold_id, None)
+        if item:
+            room_id = item[0]
+            self._room_holds.get(room_id, {}).pop(hold_id, None)
+            if room_id in self._rooms:
+                self._refresh(room_id)
+
+    def release(self, hold_id):
+        with self._lock:
+            self._release(hold_id)
+
+    def consume(self, hold_id, count=1):
+        with self._lock:
+            item = self._holds.get(hold_id)
+            if item is None:
+                return 0
+            room_id, held, expires_at = item
+            if held <= count:
+                self._release(hold_id)
+                return 0
+            self._holds[hold_id] = (room_id, held - count, expires_at)
+            self._room_holds.setdefault(room_id, {})[hold_id] = (held - count, expires_at)
+            if room_id in self._rooms:
+                self._refresh(room_id)
+            return held - count
+
+    def available_rooms(self, area_id=None, min_capacity=None, max_capacity=None):
+        with self._lock:
+            self._sweep()
+            result = set()
+            for (bucket_area, capacity), room_ids in self._open.items():
+                if area_id is not None and bucket_area != area_id:
+                    continue
+                if min_capacity is not None and capacity < min_capacity:
+                    continue
+                if max_capacity is not None and capacity > max_capacity:
+                    continue
+                result.update(room_ids)
+            return result
+
+    def is_loaded(self):
+        return self._loaded
+
+    def mark_loaded(self):
+        self._loaded = True
+
+    def load(self, rows, present_only=False):
+        with self._lock:
+            seen = set()
+            for row in rows:
+                self._discard(row.room_id)
+                self._rooms[row.room_id] = _room_values(row)
+                self._refresh(row.room_id)
+                seen.add(row.room_id)
+            if not present_only:
+                for room_id in set(self._rooms) - seen:
+                    self._discard(room_id)
+
+
+# Hàm Lua dùng chung: bỏ hold hết hạn, tính chỗ trống, cập nhật tập phòng còn chỗ
+# và thời điểm hold sớm nhất hết hạn của phòng. KEYS/ARGV: xem từng script.
+_LUA_REFRESH = """
+local function refresh(prefix, room_id, now)
+    local room_key = prefix .. 'room:' .. room_id
+    local data = redis.call('HMGET', room_key, 'area', 'cap', 'occ', 'ok')
+    if not data[1] then
+        return nil
+    end
+    local holds_key = prefix .. 'holds:' .. room_id
+    local counts_key = prefix .. 'holdcount:' .. room_id
+    local expired = redis.call('ZRANGEBYSCORE', holds_key, '-inf', now)
+    for _, hold_id in ipairs(expired) do
+        redis.call('HDEL', counts_key, hold_id)
+    end
+    if #expired > 0 then
+        redis.call('ZREMRANGEBYSCORE', holds_key, '-inf', now)
+    end
+    local held = 0
+    for _, count in ipairs(redis.call('HVALS', counts_key)) do
+        held = held + tonumber(count)
+    end
+    local free = tonumber(data[2]) - tonumber(data[3]) - held
+    local bucket = data[1] .. ':' .. data[2]
+    redis.call('SADD', prefix .. 'buckets', bucket)
+    if data[4] == '1' and free > 0 then
+        redis.call('SADD', prefix .. 'open:' .. bucket, room_id)
+    else
+        redis.call('SREM', prefix .. 'open:' .. bucket, room_id)
+    end
+    local first = redis.call('ZRANGE', holds_key, 0, 0, 'WITHSCORES')
+    if first[2] then
+        redis.call('ZADD', prefix .. 'expiry', first[2], room_id)
+    else
+        redis.call('ZREM', prefix .. 'expiry', room_id)
+    end
+    return free
+end
+
+local function discard(prefix, room_id)
+    local room_key = prefix .. 'room:' .. room_id
+    local data = redis.call('HMGET', room_key, 'area', 'cap')
+    if data[1] then
+        redis.call('SREM', prefix .. 'open:' .. data[1] .. ':' .. data[2], room_id)
+    end
+end
+"""
+
+# ARGV: prefix, now, room_id, area_id, capacity, occupied, bookable(0/1)
+_LUA_SET_ROOM = _LUA_REFRESH + """
+local prefix, now, room_id = ARGV[1], tonumber(ARGV[2]), ARGV[3]
+discard(prefix, room_id)
+redis.call('HSET', prefix .. 'room:' .. room_id, 'area', ARGV[4], 'cap', ARGV[5], 'occ', ARGV[6], 'ok', ARGV[7])
+return refresh(prefix, room_id, now)
+"""
+
+# ARGV: prefix, room_id
+_LUA_REMOVE_ROOM = _LUA_REFRESH + """
+local prefix, room_id = ARGV[1], ARGV[2]
+discard(prefix, room_id)
+redis.call('DEL', prefix .. 'room:' .. room_id)
+redis.call('ZREM', prefix .. 'expiry', room_id)
+return 1
+"""
+
+# ARGV: prefix, now, room_id
+_LUA_FREE = _LUA_REFRESH + """
+return refresh(ARGV[1], ARGV[3], tonumber(ARGV[2]))
+"""
+
+# ARGV: prefix, now, room_id, hold_id, count, ttl. Trả về -2 nếu phòng chưa có, -1 nếu không đủ chỗ.
+_LUA_HOLD = _LUA_REFRESH + """
+local prefix, now, room_id, hold_id = ARGV[1], tonumber(ARGV[2]), ARGV[3], ARGV[4]
+local count, ttl = tonumber(ARGV[5]), tonumber(ARGV[6])
+local old_room = redis.call('GET', prefix .. 'hold:' .. hold_id)
+if old_room then
+    redis.call('ZREM', prefix .. 'holds:' .. old_room, hold_id)
+    redis.call('HDEL', prefix .. 'holdcount:' .. old_room, hold_id)
+    refresh(prefix, old_room, now)
+end
+local free = refresh(prefix, room_id, now)
+if not free then
+    return -2
+end
+if free < count then
+    return -1
+end
+redis.call('ZADD', prefix .. 'holds:' .. room_id, now + ttl, hold_id)
+redis.call('HSET', prefix .. 'holdcount:' .. room_id, hold_id, count)
+redis.call('SET', prefix .. 'hold:' .. hold_id, room_id, 'EX', math.ceil(ttl))
+refresh(prefix, room_id, now)
+return free - count
+"""
+
+# ARGV: prefix, now, hold_id
+_LUA_RELEASE = _LUA_REFRESH + """
+local prefix, now, hold_id = ARGV[1], tonumber(ARGV[2]), ARGV[3]
+local room_id = redis.call('GET', prefix .. 'hold:' .. hold_id)
+if not room_id then
+    return 0
+end
+redis.call('ZREM', prefix .. 'holds:' .. room_id, hold_id)
+redis.call('HDEL', prefix .. 'holdcount:' .. room_id, hold_id)
+redis.call('DEL', prefix .. 'hold:' .. hold_id)
+refresh(prefix, room_id, now)
+return 1
+"""
+
+# ARGV: prefix, now, hold_id, count. Trả về số chỗ còn giữ.
+_LUA_CONSUME = _LUA_REFRESH + """
+local prefix, now, hold_id, count = ARGV[1], tonumber(ARGV[2]), ARGV[3], tonumber(ARGV[4])
+local room_id = redis.call('GET', prefix .. 'hold:' .. hold_id)
+if not room_id then
+    return 0
+end
+local left = redis.call('HINCRBY', prefix .. 'holdcount:' .. room_id, hold_id, -count)
+if left <= 0 then
+    redis.call('ZREM', prefix .. 'holds:' .. room_id, hold_id)
+    redis.call('HDEL', prefix .. 'holdcount:' .. room_id, hold_id)
+    redis.call('DEL', prefix .. 'hold:' .. hold_id)
+    left = 0
+end
+refresh(prefix, room_id, now)
+return left
+"""
+
+# ARGV: prefix, now. Tính lại các phòng có hold vừa hết hạn.
+_LUA_SWEEP = _LUA_REFRESH + """
+local prefix, now = ARGV[1], tonumber(ARGV[2])
+local rooms = redis.call('ZRANGEBYSCORE', prefix .. 'expiry', '-inf', now)
+for _, room_id in ipairs(rooms) do
+    if not refresh(prefix, room_id, now) then
+        redis.call('ZREM', prefix .. 'expiry', room_id)
+    end
+end
+return #rooms
+"""
+
+
+class RedisAvailabilityIndex(AvailabilityIndex):
+    """Chỉ mục dùng chung giữa các worker. Khóa (prefix ``availability:``):
+
+    - ``room:<id>`` hash area/cap/occ/ok
+    - ``holds:<id>`` zset hold_id -> thời điểm hết hạn, ``holdcount:<id>`` hash hold_id -> số chỗ
+    - ``hold:<hold_id>`` -> room_id (để trả chỗ), ``expiry`` zset room_id -> hold sớm nhất hết hạn
+    - ``open:<area>:<capacity>`` set các phòng còn chỗ, ``buckets`` set các cặp area:capacity
+    """
+
+    name = 'redis'
+
+    def __init__(self, client, prefix='availability:', clock=time.time):
+        self.client = client
+        self.prefix = prefix
+        self.clock = clock
+        self._loaded = False
+        self._set_room = client.register_script(_LUA_SET_ROOM)
+        self._remove_room = client.register_script(_LUA_REMOVE_ROOM)
+        self._free = client.register_script(_LUA_FREE)
+        self._hold = client.register_script(_LUA_HOLD)
+        self._release = client.register_script(_LUA_RELEASE)
+        self._consume = client.register_script(_LUA_CONSUME)
+        self._sweep = client.register_script(_LUA_SWEEP)
+
+    @classmethod
+    def from_url(cls, url):
+        import redis
+        return cls(redis.Redis.from_url(url, decode_responses=True))
+
+    def _room_args(self, room_id, area_id, capacity, occupied, bookable):
+        return [self.prefix, self.clock(), room_id, area_id, capacity, occupied, 1 if bookable else 0]
+
+    def set_room(self, room_id, area_id, capacity, occupied, bookable):
+        self._set_room(args=self._room_args(room_id, area_id, capacity, occupied, bookable))
+
+    def remove_room(self, room_id):
+        self._remove_room(args=[self.prefix, room_id])
+
+    def free_slots(self, room_id):
+        free = self._free(args=[self.prefix, self.clock(), room_id])
+        return None if free is None else max(0, int(free))
+
+    def hold(self, room_id, hold_id, count, ttl):
+        result = int(self._hold(args=[self.prefix, self.clock(), room_id, hold_id, count, ttl]))
+        if result == -2:
+            return None
+        return result >= 0
+
+    def release(self, hold_id):
+        self._release(args=[self.prefix, self.clock(), hold_id])
+
+    def consume(self, hold_id, count=1):
+        return int(self._consume(args=[self.prefix, self.clock(), hold_id, count]))
+
+    def available_rooms(self, area_id=None, min_capacity=None, max_capacity=None):
+        self._sweep(args=[self.prefix, self.clock()])
+        keys = []
+        for bucket in self.client.smembers(f"{self.prefix}buckets"):
+            bucket_area, capacity = (int(part) for part in bucket.split(':'))
+            if area_id is not None and bucket_area != area_id:
+                continue
+            if min_capacity is not None and capacity < min_capacity:
+                continue
+            if max_capacity is not None and capacity > max_capacity:
+                continue
+            keys.append(f"{self.prefix}open:{bucket}")
+        if not keys:
+            return set()
+        return {int(room_id) for room_id in self.client.sunion(keys)}
+
+    def is_loaded(self):
+        # Chỉ hỏi Redis tới khi thấy cờ; sau đó đối soát hằng ngày sẽ dựng lại nếu Redis bị xóa
+        if not self._loaded:
+            self._loaded = bool(self.client.exists(f"{self.prefix}loaded"))
+        return self._loaded
+
+    def mark_loaded(self):
+        self.client.set(f"{self.prefix}loaded", 1)
+        self._loaded = True
+
+    def load(self, rows, present_only=False):
+        pipe = self.client.pipeline(transaction=False)
+        seen = set()
+        for row in rows:
+            self._set_room(args=self._room_args(row.room_id, *_room_values(row)), client=pipe)
+            seen.add(str(row.room_id))
+        pipe.execute()
+        if not present_only:
+            stale = [
+                key.rsplit(':', 1)[1]
+                for key in self.client.scan_iter(f"{self.prefix}room:*")
+                if key.rsplit(':', 1)[1] not in seen
+            ]
+            for room_id in stale:
+                self.remove_room(room_id)
+
+
+def create_availability_index(config):
+    url = config.get('AVAILABILITY_STORE_URI') or config.get('REDIS_STORAGE_URI')
+    if not url or url.startswith('memory://'):
+        logger.info("Using in-memory availability index")
+        return MemoryAvailabilityIndex()
+    return RedisAvailabilityIndex.from_url(url)
+
+
+def _after_flush(session, flush_context):
+    room_ids = affected_room_ids(session)
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, Room):
+            room_ids.add(obj.room_id)
+    for obj in session.dirty:
+        if isinstance(obj, Room):
+            state = inspect(obj)
+            if state.attrs.is_deleted.history.has_changes() or state.attrs.area_id.history.has_changes():
+                room_ids.add(obj.room_id)
+    room_ids.discard(None)
+    if room_ids:
+        session.info.setdefault('availability_sync', set()).update(room_ids)
+
+
+def _after_commit(session):
+    room_ids = session.info.pop('availability_sync', None)
+    if room_ids:
+        # Đã commit; nếu lỗi, chỉ mục sẽ được sửa ở lần đối soát kế tiếp
+        sync_rooms(room_ids)
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop('availability_sync', None)
+
+
+def init_availability(app):
+    """Tạo chỉ mục chỗ trống và đăng ký event đồng bộ sau commit."""
+    app.extensions['availability'] = create_availability_index(app.config)
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+        event.listen(db.session, 'after_commit', _after_commit)
+        event.listen(db.session, 'after_soft_rollback', _after_soft_rollback)
+    return app.extensions['availability']
+
+
+def get_availability():
+    """Chỉ mục của app hiện tại, dựng từ database ở lần dùng đầu tiên nếu còn trống."""
+    index = current_app.extensions.get('availability')
+    if index is None:
+        index = init_availability(current_app)
+    if not index.is_loaded():
+        index.rebuild()
+    return index
+
+
+def hold_ttl():
+    return current_app.config.get('AVAILABILITY_HOLD_TTL', DEFAULT_HOLD_TTL)
+
+
+def hold_room_slots(room, hold_id, count):
+    """Giữ ``count`` chỗ của ``room``, trả về True nếu còn đủ chỗ.
+
+    Khi chỉ mục lỗi thì chỉ so với current_person_number (không giữ chỗ được).
+    """
+    try:
+        index = get_availability()
+        held = index.hold(room.room_id, hold_id, count, hold_ttl())
+        if held is None:
+            index.sync_rooms([room.room_id])
+            held = index.hold(room.room_id, hold_id, count, hold_ttl())
+        if held is not None:
+            return held
+    except Exception as e:
+        logger.warning(f"Availability index unavailable, falling back to database for room {room.room_id}: {str(e)}")
+    return room.capacity - room.current_person_number >= count
+
+
+def release_holds(hold_ids):
+    """Trả lại chỗ đã giữ; lỗi chỉ ghi log vì hold sẽ tự hết hạn."""
+    try:
+        index = get_availability()
+        for hold_id in hold_ids:
+            index.release(hold_id)
+    except Exception as e:
+        logger.warning(f"Không trả được hold {list(hold_ids)}: {str(e)}")
+
+
+def release_registration_slots(residents):
+    """Mỗi người vừa có hợp đồng ACTIVE (``residents``: các cặp (email, room_id)) trả lại một chỗ
+    của đăng ký PENDING/APPROVED của họ, ưu tiên đăng ký cùng phòng. Gọi sau commit.
+
+    Chỉ trả một chỗ: đăng ký nhiều người vẫn giữ phần còn lại tới khi các hợp đồng
+    khác được kích hoạt hoặc hold hết hạn.
+    """
+    residents = [(email, room_id) for email, room_id in residents if email]
+    if not residents:
+        return
+    try:
+        registrations = {}
+        for registration_id, email, room_id in db.session.execute(
+            select(Register.registration_id, Register.email, Register.room_id).where(
+                Register.email.in_({email for email, _ in residents}),
+                Register.status.in_(['PENDING', 'APPROVED']),
+                Register.is_deleted == False
+            ).order_by(Register.registration_id.desc())
+        ):
+            registrations.setdefault(email, []).append((registration_id, room_id))
+        index = get_availability()
+        for email, room_id in residents:
+            candidates = registrations.get(email)
+            if not candidates:
+                continue
+            registration_id = next((reg_id for reg_id, reg_room in candidates if reg_room == room_id), candidates[0][0])
+            index.consume(registration_hold_id(registration_id), 1)
+    except Exception as e:
+        logger.warning(f"Không trả được chỗ giữ của đăng ký cho {residents}: {str(e)}")
+
+
+def sync_rooms(room_ids):
+    """Cập nhật chỉ mục cho các phòng đã đổi bằng UPDATE hàng loạt (gọi sau commit)."""
+    try:
+        get_availability().sync_rooms(room_ids)
+    except Exception as e:
+        logger.warning(f"Không cập nhật được availability index cho phòng {sorted(room_ids)}: {str(e)}")
+
+
+def available_room_ids(area_id=None, min_capacity=None, max_capacity=None):
+    """Các phòng còn chỗ theo chỉ mục, None nếu chỉ mục lỗi (người gọi tự lọc bằng SQL)."""
+    try:
+        return get_availability().available_rooms(area_id, min_capacity, max_capacity)
+    except Exception as e:
+        logger.warning(f"Availability index unavailable, falling back to database: {str(e)}")
+        return None
@@ -0,0 +1,127 @@
+# utils/bill_rollover.py
+"""Tạo sẵn BillDetail cho tháng mới từ chỉ số tháng trước.
+
+Một câu ``INSERT … SELECT`` cho các phòng đang có hợp đồng ACTIVE × dịch vụ: lấy
+mức giá hiệu lực của từng dịch vụ trong tháng, chỉ số ``current_reading`` của tháng trước làm
+``previous_reading``. Các cặp (phòng, dịch vụ) đã có bản ghi trong tháng bị bỏ
+qua nên chạy lại nhiều lần vẫn an toàn.
+
+Bản ghi tạo sẵn có ``submitted_by`` là NULL (chưa nộp chỉ số); khi sinh viên nộp
+chỉ số, bản ghi này được cập nhật thay vì tạo mới. Khi xóa mức giá hoặc dịch vụ,
+``delete_unsubmitted_details`` xóa các bản ghi chưa nộp này trước.
+"""
+import logging
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import Date, and_, delete, func, insert, literal, null, or_, select, true
+from sqlalchemy.orm import aliased
+
+from extensions import db
+from models.bill_detail import BillDetail
+from models.contract import Contract
+from models.monthly_bill import MonthlyBill
+from models.room import Room
+from models.service_rate import ServiceRate
+
+logger = logging.getLogger(__name__)
+
+
+def resolved_rates(as_of):
+    """Subquery (rate_id, service_id): mức giá mới nhất có hiệu lực tới ngày ``as_of`` của mỗi dịch vụ."""
+    newer = aliased(ServiceRate)
+    has_newer = select(newer.rate_id).where(
+        newer.service_id == ServiceRate.service_id,
+        newer.effective_date <= as_of,
+        or_(
+            newer.effective_date > ServiceRate.effective_date,
+            and_(newer.effective_date == ServiceRate.effective_date, newer.rate_id > ServiceRate.rate_id)
+        )
+    ).exists()
+    return select(ServiceRate.rate_id, ServiceRate.service_id).where(
+        ServiceRate.effective_date <= as_of,
+        ~has_newer
+    ).subquery('rates')
+
+
+def rollover_bill_details(bill_month=None):
+    """Tạo BillDetail cho tháng ``bill_month`` (mặc định tháng hiện tại), trả về số dòng đã tạo."""
+    bill_month = (bill_month or date.today()).replace(day=1)
+    previous_month = bill_month - relativedelta(months=1)
+    last_day = bill_month + relativedelta(months=1) - relativedelta(days=1)
+
+    # Dùng cùng quy tắc chọn giá với submit_bill_detail: giá hiệu lực tới ngày cuối tháng
+    rates = resolved_rates(last_day)
+
+    previous_rate = aliased(ServiceRate)
+    previous = select(
+        BillDetail.room_id,
+        previous_rate.service_id,
+        func.max(BillDetail.current_reading).label('reading')
+    ).join(
+        previous_rate, previous_rate.rate_id == BillDetail.rate_id
+    ).where(
+        BillDetail.bill_month == previous_month
+    ).group_by(BillDetail.room_id, previous_rate.service_id).subquery('previous')
+
+    current_detail = aliased(BillDetail)
+    current_rate = aliased(ServiceRate)
+    already_seeded = select(current_detail.detail_id).join(
+        current_rate, current_rate.rate_id == current_detail.rate_id
+    ).where(
+        current_detail.room_id == Room.room_id,
+        current_detail.bill_month == bill_month,
+        current_rate.service_id == rates.c.service_id
+    ).exists()
+
+    # Phòng trống không cần chỉ số: chỉ tạo cho phòng đang có người ở
+    occupied = select(Contract.contract_id).where(
+        Contract.room_id == Room.room_id,
+        Contract.status == 'ACTIVE',
+        Contract.is_deleted == False
+    ).exists()
+
+    reading = func.coalesce(previous.c.reading, 0)
+    source = select(
+        rates.c.rate_id,
+        reading,
+        reading,
+        literal(0),
+        Room.room_id,
+        literal(bill_month, Date),
+        null(),
+        null()
+    ).select_from(Room).join(rates, true()).outerjoin(
+        previous,
+        and_(previous.c.room_id == Room.room_id, previous.c.service_id == rates.c.service_id)
+    ).where(
+        Room.is_deleted == False,
+        occupied,
+        ~already_seeded
+    )
+
+    stmt = insert(BillDetail.__table__).from_select(
+        ['rate_id', 'previous_reading', 'current_reading', 'price', 'room_id', 'bill_month', 'submitted_by', 'submitted_at'],
+        source
+    )
+    result = db.session.execute(stmt)
+    db.session.commit()
+    logger.info(f"Rollover bill details for {bill_month.strftime('%Y-%m')}: {result.rowcount} rows created")
+    return result.rowcount
+
+
+def delete_unsubmitted_details(rate_ids):
+    """Xóa các BillDetail tạo sẵn chưa nộp chỉ số (và chưa có hóa đơn) của ``rate_ids``. Không commit."""
+    rate_ids = list(rate_ids)
+    if not rate_ids:
+        return 0
+    billed = select(MonthlyBill.bill_id).where(MonthlyBill.detail_id == BillDetail.detail_id).exists()
+    result = db.session.execute(
+        delete(BillDetail).where(
+            BillDetail.rate_id.in_(rate_ids),
+            BillDetail.submitted_by.is_(None),
+            ~billed
+        ).execution_options(synchronize_session=False)
+    )
+    logger.info(f"Deleted {result.rowcount} unsubmitted bill details for rates {rate_ids}")
+    return result.rowcount
@@ -0,0 +1,74 @@
+# utils/billing.py
+"""Tính tiền dịch vụ theo lô, chính xác tới đồng.
+
+Dịch vụ có ``Service.is_metered`` tính ``(chỉ số hiện tại - chỉ số trước) x đơn
+giá``; dịch vụ khác tính đơn giá cố định. ``compute_amounts`` nhận các cột
+(chỉ số trước, chỉ số hiện tại, đơn giá, is_metered) của cả tháng và tính lượng
+dùng, thành tiền trong một lượt bằng ``Decimal`` (không qua float), làm tròn
+tới đồng (ROUND_HALF_UP).
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from sqlalchemy import select
+
+from extensions import db
+from models.service import Service
+from models.service_rate import ServiceRate
+
+VND = Decimal('1')
+ZERO = Decimal('0')
+
+
+def to_decimal(value):
+    """Chuyển số (kể cả float từ JSON) sang Decimal theo dạng thập phân hiển thị, không theo nhị phân."""
+    if value is None:
+        return ZERO
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    return Decimal(value)
+
+
+def compute_amounts(previous, current, unit_prices, metered):
+    """Tính (usage, amounts) cho các cột cùng độ dài; dịch vụ giá cố định có usage = 0."""
+    if not len(previous) == len(current) == len(unit_prices) == len(metered):
+        raise ValueError('Các cột chỉ số, đơn giá và is_metered phải cùng độ dài')
+    usage = [
+        to_decimal(cur) - to_decimal(prev) if is_metered else ZERO
+        for prev, cur, is_metered in zip(previous, current, metered)
+    ]
+    amounts = [
+        ((used * to_decimal(price)) if is_metered else to_decimal(price)).quantize(VND, rounding=ROUND_HALF_UP)
+        for used, price, is_metered in zip(usage, unit_prices, metered)
+    ]
+    return usage, amounts
+
+
+def detail_amount(previous, current, unit_price, is_metered):
+    """Thành tiền của một chi tiết hóa đơn."""
+    return compute_amounts([previous], [current], [unit_price], [is_metered])[1][0]
+
+
+def load_rate_prices(rate_ids=None):
+    """``{rate_id: (unit_price, is_metered)}`` cho các mức giá (mặc định tất cả) bằng một query."""
+    stmt = select(ServiceRate.rate_id, ServiceRate.unit_price, Service.is_metered) \
+        .join(Service, Service.service_id == ServiceRate.service_id)
+    if rate_ids is not None:
+        stmt = stmt.where(ServiceRate.rate_id.in_(set(rate_ids)))
+    return {rate_id: (unit_price, is_metered) for rate_id, unit_price, is_metered in db.session.execute(stmt)}
+
+
+def price_rows(rows, rate_prices):
+    """Điền ``price`` cho các dict có rate_id, previous_reading, current_reading trong một lượt tính."""
+    rows = list(rows)
+    prices = [rate_prices[row['rate_id']] for row in rows]
+    _, amounts = compute_amounts(
+        [row['previous_reading'] for row in rows],
+        [row['current_reading'] for row in rows],
+        [unit_price for unit_price, _ in prices],
+        [is_metered for _, is_metered in prices]
+    )
+    for row, amount in zip(rows, amounts):
+        row['price'] = amount
+    return rows
@@ -0,0 +1,23 @@
+# utils/celery_app.py
+"""Celery của ứng dụng, chỉ tạo khi có nơi dùng tới (không tạo lúc khởi động web worker)."""
+import logging
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+def init_celery(app):
+    app.extensions['celery'] = None
+
+
+def get_celery(app=None):
+    """Celery gắn với ``app`` (mặc định ứng dụng hiện tại), broker ``CELERY_BROKER_URL``; tạo ở lần gọi đầu."""
+    app = app or current_app._get_current_object()
+    celery = app.extensions.get('celery')
+    if celery is None:
+        from celery import Celery
+        celery = Celery(app.import_name, broker=app.config['CELERY_BROKER_URL'])
+        app.extensions['celery'] = celery
+        logger.info("Celery initialized")
+    return celery
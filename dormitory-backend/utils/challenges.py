@@ -0,0 +1,166 @@
+# utils/challenges.py
+"""Lưu mã xác nhận (reset password) và bộ đếm thử sai có TTL.
+
+Dữ liệu ngắn hạn này trước đây nằm trên bảng ``users``/``admins`` (reset_token,
+reset_token_expiry, reset_attempts) nên mỗi lần quên mật khẩu hay nhập sai đều
+ghi vào bảng nóng. Mặc định dùng Redis (``CHALLENGE_STORE_URI``, mặc định là
+``REDIS_STORAGE_URI``); ``memory://`` dùng dict trong process cho dev/test.
+"""
+import logging
+import secrets
+import threading
+import time
+
+from flask import current_app
+
+from utils.passwords import hash_reset_code, verify_reset_code
+
+logger = logging.getLogger(__name__)
+
+RESET_SCOPE = 'reset'
+PASSWORD_CHANGE_SCOPE = 'password_change'
+
+RESET_CODE_TTL = 30 * 60
+MAX_RESET_ATTEMPTS = 3
+
+# Kết quả kiểm tra mã
+CODE_OK = 'ok'
+CODE_MISSING = 'missing'   # chưa yêu cầu mã hoặc mã đã hết hạn
+CODE_LOCKED = 'locked'     # nhập sai quá số lần cho phép
+CODE_INVALID = 'invalid'
+
+
+def subject_key(account_type, account_id):
+    return f"{account_type.lower()}:{account_id}"
+
+
+class ChallengeStore:
+    """Interface chung; ``subject`` là chuỗi dạng ``user:5`` hoặc ``admin:1``."""
+
+    def set_code(self, scope, subject, code_hash, ttl):
+        raise NotImplementedError
+
+    def get_code(self, scope, subject):
+        raise NotImplementedError
+
+    def incr_attempts(self, scope, subject, ttl):
+        """Tăng bộ đếm số lần thử (nguyên tử), đặt lại TTL, trả về số lần thử kể cả lần này."""
+        raise NotImplementedError
+
+    def clear(self, scope, subject):
+        """Xóa mã và bộ đếm."""
+        raise NotImplementedError
+
+    def issue_code(self, scope, subject, ttl=RESET_CODE_TTL):
+        """Tạo mã 6 chữ số, lưu bản hash (bộ đếm thử sai về 0) và trả về mã gốc để gửi email."""
+        code = ''.join(str(secrets.randbelow(10)) for _ in range(6))
+        self.clear(scope, subject)
+        self.set_code(scope, subject, hash_reset_code(code), ttl)
+        return code
+
+    def verify_code(self, scope, subject, code, max_attempts=MAX_RESET_ATTEMPTS):
+        """Trả về (kết quả, số lần thử còn lại). Mã đúng hoặc bị khóa thì xóa luôn."""
+        code_hash = self.get_code(scope, subject)
+        if not code_hash:
+            return CODE_MISSING, 0
+        # Tăng bộ đếm trước khi so mã: các request song song không thể cùng đọc
+        # thấy số lần thử cũ rồi cùng được so mã vượt quá max_attempts
+        attempts = self.incr_attempts(scope, subject, RESET_CODE_TTL)
+        if attempts > max_attempts:
+            self.clear(scope, subject)
+            return CODE_LOCKED, 0
+        if not verify_reset_code(code_hash, code):
+            return CODE_INVALID, max(0, max_attempts - attempts)
+        self.clear(scope, subject)
+        return CODE_OK, max_attempts
+
+
+class RedisChallengeStore(ChallengeStore):
+    def __init__(self, client, prefix='challenge:'):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url):
+        import redis
+        return cls(redis.Redis.from_url(url, decode_responses=True))
+
+    def _key(self, kind, scope, subject):
+        return f"{self.prefix}{scope}:{kind}:{subject}"
+
+    def set_code(self, scope, subject, code_hash, ttl):
+        self.client.set(self._key('code', scope, subject), code_hash, ex=ttl)
+
+    def get_code(self, scope, subject):
+        return self.client.get(self._key('code', scope, subject))
+
+    def incr_attempts(self, scope, subject, ttl):
+        key = self._key('fail', scope, subject)
+        # pipeline mặc định chạy trong MULTI/EXEC nên INCR và EXPIRE là một thao tác
+        pipe = self.client.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, ttl)
+        count, _ = pipe.execute()
+        return int(count)
+
+    def clear(self, scope, subject):
+        self.client.delete(self._key('code', scope, subject), self._key('fail', scope, subject))
+
+
+class MemoryChallengeStore(ChallengeStore):
+    """Lưu trong process (dev/test); không dùng khi chạy nhiều worker."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at <= self.clock():
+            del self._data[key]
+            return None
+        return value
+
+    def set_code(self, scope, subject, code_hash, ttl):
+        with self._lock:
+            self._data[('code', scope, subject)] = (code_hash, self.clock() + ttl)
+
+    def get_code(self, scope, subject):
+        with self._lock:
+            return self._get(('code', scope, subject))
+
+    def incr_attempts(self, scope, subject, ttl):
+        key = ('fail', scope, subject)
+        with self._lock:
+            count = (self._get(key) or 0) + 1
+            self._data[key] = (count, self.clock() + ttl)
+            return count
+
+    def clear(self, scope, subject):
+        with self._lock:
+            self._data.pop(('code', scope, subject), None)
+            self._data.pop(('fail', scope, subject), None)
+
+
+def create_challenge_store(config):
+    url = config.get('CHALLENGE_STORE_URI') or config.get('REDIS_STORAGE_URI')
+    if not url or url.startswith('memory://'):
+        logger.info("Using in-memory challenge store")
+        return MemoryChallengeStore()
+    return RedisChallengeStore.from_url(url)
+
+
+def init_challenge_store(app):
+    app.extensions['challenge_store'] = create_challenge_store(app.config)
+    return app.extensions['challenge_store']
+
+
+def get_challenge_store():
+    store = current_app.extensions.get('challenge_store')
+    if store is None:
+        store = init_challenge_store(current_app)
+    return store
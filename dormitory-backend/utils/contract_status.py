@@ -0,0 +1,91 @@
+# utils/contract_status.py
+"""Chuyển trạng thái hợp đồng theo ngày bằng UPDATE hàng loạt.
+
+Mỗi lần chạy chỉ xét các hợp đồng có ``start_date``/``end_date`` nằm giữa
+watermark (ngày chạy thành công gần nhất) và hôm nay:
+
+- PENDING -> ACTIVE khi đã tới ``start_date``
+- PENDING/ACTIVE -> EXPIRED khi đã qua ``end_date``
+
+Sau đó chỉ tính lại số người cho các phòng có hợp đồng đổi trạng thái. Watermark
+được lưu trong cùng transaction nên nếu job lỗi, lần chạy sau sẽ xét lại.
+"""
+import logging
+
+import pendulum
+from sqlalchemy import and_, or_, select, update
+
+from extensions import db
+from models.contract import Contract
+from models.job_watermark import JobWatermark
+from utils.occupancy import recompute_occupancy
+from models.user import User
+from utils.availability import release_registration_slots, sync_rooms
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = 'contract_status'
+
+
+def _today():
+    return pendulum.now('Asia/Ho_Chi_Minh').date()
+
+
+def update_contract_statuses(today=None, full=False):
+    """Chạy engine, trả về dict số hợp đồng đã kích hoạt/hết hạn và số phòng cập nhật.
+
+    ``full=True`` bỏ qua watermark và quét lại toàn bộ hợp đồng PENDING/ACTIVE.
+    """
+    today = today or _today()
+    watermark = db.session.get(JobWatermark, WATERMARK_NAME, with_for_update=True)
+    if watermark is None:
+        watermark = JobWatermark(name=WATERMARK_NAME)
+        db.session.add(watermark)
+    since = None if full else watermark.watermark
+
+    to_active = and_(
+        Contract.status == 'PENDING',
+        Contract.start_date <= today,
+        Contract.end_date >= today
+    )
+    to_expired = and_(
+        Contract.status.in_(['PENDING', 'ACTIVE']),
+        Contract.end_date < today
+    )
+    if since is not None:
+        to_active = and_(to_active, Contract.start_date > since)
+        to_expired = and_(to_expired, Contract.end_date >= since)
+
+    room_ids = db.session.execute(
+        select(Contract.room_id).where(or_(to_active, to_expired)).distinct()
+    ).scalars().all()
+    # Người sắp được kích hoạt: trả chỗ giữ của đăng ký sau commit
+    activating = db.session.execute(
+        select(User.email, Contract.room_id).join(User, User.user_id == Contract.user_id).where(to_active)
+    ).all()
+
+    expired = db.session.execute(
+        update(Contract).where(to_expired).values(status='EXPIRED').execution_options(synchronize_session=False)
+    ).rowcount
+    activated = db.session.execute(
+        update(Contract).where(to_active).values(status='ACTIVE').execution_options(synchronize_session=False)
+    ).rowcount
+
+    rooms = recompute_occupancy(room_ids) if room_ids else 0
+    watermark.watermark = today
+    db.session.commit()
+    # UPDATE hàng loạt không qua ORM nên tự cập nhật availability index
+    if room_ids:
+        sync_rooms(room_ids)
+    if activating:
+        release_registration_slots(activating)
+
+    result = {
+        'since': since.isoformat() if since else None,
+        'today': today.isoformat(),
+        'activated': activated,
+        'expired': expired,
+        'rooms_updated': rooms
+    }
+    logger.info(f"Contract status engine: {result}")
+    return result
@@ -0,0 +1,200 @@
+# utils/email_outbox.py
+"""Hàng đợi email (outbox) ghi cùng transaction với dữ liệu nghiệp vụ.
+
+Controller gọi ``queue_email`` trước ``db.session.commit()``: template được
+render ngay lúc đó và lưu HTML vào bảng ``email_outbox``. ``OutboxSender`` lấy
+từng lô email đến hạn, mở một kết nối SMTP (``mail.connect()``) cho cả lô và
+gửi lại với backoff tăng dần khi lỗi. Request không còn chờ SMTP.
+"""
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app, render_template
+from flask_mail import Message
+
+from extensions import db, mail
+from models.email_outbox import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_MAX_ATTEMPTS = 6
+DEFAULT_BASE_DELAY = 30          # giây; lần thử thứ n chờ base * 2^(n-1)
+MAX_DELAY = 6 * 60 * 60
+SENDING_LEASE = 10 * 60          # email kẹt ở SENDING quá lâu (worker chết) sẽ được lấy lại
+
+
+def queue_email(subject, recipients, template=None, sender=None, html=None, body=None, **context):
+    """Thêm email vào outbox (chưa commit). Trả về bản ghi EmailOutbox."""
+    if isinstance(recipients, str):
+        recipients = [recipients]
+    if template:
+        html = render_template(template, **context)
+    entry = EmailOutbox(
+        subject=subject,
+        sender=sender or current_app.config.get('MAIL_DEFAULT_SENDER'),
+        recipients=json.dumps(list(recipients)),
+        html=html,
+        body=body,
+        template=template,
+        status='PENDING',
+        attempts=0,
+        next_attempt_at=datetime.utcnow(),
+        created_at=datetime.utcnow()
+    )
+    db.session.add(entry)
+    return entry
+
+
+def warm_email_templates(app):
+    """Biên dịch trước các template trong templates/emails để lần render đầu không phải parse."""
+    loaded = 0
+    for name in app.jinja_env.list_templates(filter_func=lambda n: n.startswith('emails/')):
+        try:
+            app.jinja_env.get_template(name)
+            loaded += 1
+        except Exception as e:
+            logger.error(f"Không thể biên dịch template {name}: {str(e)}")
+    logger.info(f"Preloaded {loaded} email templates")
+    return loaded
+
+
+def backoff_delay(attempts, base_delay=DEFAULT_BASE_DELAY):
+    return min(MAX_DELAY, base_delay * (2 ** max(0, attempts - 1)))
+
+
+class OutboxSender:
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            batch_size=config.get('EMAIL_OUTBOX_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+            max_attempts=config.get('EMAIL_OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS),
+            base_delay=config.get('EMAIL_OUTBOX_BASE_DELAY', DEFAULT_BASE_DELAY)
+        )
+
+    def _claim(self):
+        """Khóa và đánh dấu SENDING một lô email đến hạn; SKIP LOCKED để nhiều worker chạy song song."""
+        now = datetime.utcnow()
+        rows = EmailOutbox.query.filter(
+            EmailOutbox.status.in_(['PENDING', 'SENDING']),
+            EmailOutbox.next_attempt_at <= now
+        ).order_by(EmailOutbox.id).limit(self.batch_size).with_for_update(skip_locked=True).all()
+        for row in rows:
+            row.status = 'SENDING'
+            row.next_attempt_at = now + timedelta(seconds=SENDING_LEASE)
+        db.session.commit()
+        return rows
+
+    def _message(self, row):
+        return Message(
+            subject=row.subject,
+            sender=row.sender,
+            recipients=row.recipient_list,
+            html=row.html,
+            body=row.body
+        )
+
+    def _failed(self, row, error):
+        row.attempts += 1
+        row.last_error = str(error)[:2000]
+        if row.attempts >= self.max_attempts:
+            row.status = 'FAILED'
+            logger.error(f"Email {row.id} tới {row.recipient_list} thất bại sau {row.attempts} lần: {error}")
+        else:
+            row.status = 'PENDING'
+            row.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff_delay(row.attempts, self.base_delay))
+            logger.warning(f"Email {row.id} gửi lỗi (lần {row.attempts}), thử lại lúc {row.next_attempt_at}: {error}")
+
+    def send_batch(self):
+        """Gửi một lô, trả về (số đã gửi, số lỗi)."""
+        rows = self._claim()
+        if not rows:
+            return 0, 0
+        sent = failed = 0
+        try:
+            with mail.connect() as connection:
+                for row in rows:
+                    try:
+                        connection.send(self._message(row))
+                        row.status = 'SENT'
+                        row.sent_at = datetime.utcnow()
+                        row.last_error = None
+                        # Không giữ lại nội dung đã gửi (mật khẩu tạm, mã xác nhận)
+                        row.html = None
+                        row.body = None
+                        sent += 1
+                    except Exception as e:
+                        self._failed(row, e)
+                        failed += 1
+        except Exception as e:
+            # Không kết nối được SMTP: cả lô được hẹn gửi lại
+            logger.error(f"Không thể kết nối SMTP: {str(e)}")
+            for row in rows:
+                if row.status == 'SENDING':
+                    self._failed(row, e)
+                    failed += 1
+        db.session.commit()
+        logger.info(f"Email outbox batch: {sent} sent, {failed} failed")
+        return sent, failed
+
+    def drain(self, max_batches=None):
+        """Gửi tới khi hết email đến hạn (hoặc đủ ``max_batches`` lô)."""
+        total_sent = total_failed = batches = 0
+        while max_batches is None or batches < max_batches:
+            sent, failed = self.send_batch()
+            if not sent and not failed:
+                break
+            total_sent += sent
+            total_failed += failed
+            batches += 1
+        return total_sent, total_failed
+
+
+class OutboxWorker(threading.Thread):
+    """Thread nền gọi ``drain()`` của sender theo chu kỳ ``interval`` giây.
+
+    ``sender_factory(config)`` mặc định là ``OutboxSender.from_config``; các hàng
+    đợi khác (ví dụ thông báo thanh toán) dùng lại worker này với sender riêng.
+    """
+
+    def __init__(self, app, interval=5.0, sender_factory=None, name='email-outbox'):
+        super().__init__(name=name, daemon=True)
+        self.app = app
+        self.interval = interval
+        self.sender_factory = sender_factory or OutboxSender.from_config
+        self._stop_event = threading.Event()
+
+    def run(self):
+        sender = self.sender_factory(self.app.config)
+        logger.info(f"Outbox worker {self.name} started")
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            with self.app.app_context():
+                try:
+                    sender.drain()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Outbox worker {self.name} error: {str(e)}", exc_info=True)
+                finally:
+                    db.session.remove()
+            self._stop_event.wait(max(0.0, self.interval - (time.monotonic() - started)))
+        logger.info(f"Outbox worker {self.name} stopped")
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_outbox_worker(app):
+    warm_email_templates(app)
+    worker = OutboxWorker(app, interval=app.config.get('EMAIL_OUTBOX_INTERVAL', 5.0))
+    worker.start()
+    app.extensions['email_outbox_worker'] = worker
+    return worker
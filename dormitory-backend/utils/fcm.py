@@ -1,11 +1,27 @@
 # utils/fcm.py
-from firebase_admin import messaging
 import logging
+import threading
+from flask import current_app
 from models.user import User
 from extensions import db
 
 logger = logging.getLogger(__name__)
 
+_firebase_lock = threading.Lock()
+
+def _messaging():
+    """Firebase Admin SDK được khởi tạo ở lần gửi đầu tiên thay vì lúc import ứng dụng."""
+    import firebase_admin
+    from firebase_admin import credentials, messaging
+    with _firebase_lock:
+        try:
+            firebase_admin.get_app()
+        except ValueError:
+            path = current_app.config.get('FIREBASE_CREDENTIALS', 'firebase-adminsdk.json')
+            firebase_admin.initialize_app(credentials.Certificate(path))
+            logger.info("Firebase Admin SDK initialized")
+    return messaging
+
 def send_fcm_notification(user_id, title, message, data=None):
     """Gửi FCM notification đến một người dùng."""
     user = User.query.get(user_id)
@@ -13,6 +29,7 @@ def send_fcm_notification(user_id, title, message, data=None):
         logger.warning(f"No FCM token for user_id={user_id}")
         return False
 
+    messaging = _messaging()
     fcm_message = messaging.Message(
         notification=messaging.Notification(
             title=title,
@@ -36,6 +53,7 @@ def send_fcm_notification_to_multiple(user_ids, title, message, data=None):
         logger.warning(f"No users with FCM tokens for user_ids={user_ids}")
         return False
 
+    messaging = _messaging()
     messages = [
         messaging.Message(
             notification=messaging.Notification(
@@ -0,0 +1,147 @@
+# utils/job_lock.py
+"""Lease lock để mỗi job chỉ chạy ở một process tại một thời điểm.
+
+Mặc định dùng Redis (``SCHEDULER_LOCK_URI``, mặc định là ``REDIS_STORAGE_URI``);
+``memory://`` dùng lock trong process cho dev/test (chỉ chặn được các job chạy
+cùng process). Lease có TTL ``SCHEDULER_LOCK_TTL`` giây và được gia hạn định kỳ
+khi job còn chạy, nên job chạy lâu hơn TTL vẫn giữ lock.
+"""
+import logging
+import socket
+import threading
+import time
+import uuid
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+# Chỉ xóa lock nếu vẫn còn thuộc về process hiện tại
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Chỉ gia hạn lock nếu vẫn còn thuộc về process hiện tại
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class JobLock:
+    """Interface chung và luồng gia hạn lease; ``from_config`` chọn Redis hoặc memory theo URI."""
+
+    def __init__(self, name, ttl_seconds=3600, prefix='scheduler:lock:'):
+        self.key = f"{prefix}{name}"
+        self.ttl_seconds = ttl_seconds
+        self.token = f"{socket.gethostname()}:{uuid.uuid4().hex}"
+        self.acquired = False
+        self._stop_renewal = None
+
+    @classmethod
+    def from_config(cls, config, name):
+        url = config.get('SCHEDULER_LOCK_URI') or config.get('REDIS_STORAGE_URI')
+        ttl_seconds = config.get('SCHEDULER_LOCK_TTL', 3600)
+        if not url or url.startswith('memory://'):
+            return MemoryJobLock(name, ttl_seconds=ttl_seconds)
+        return RedisJobLock(redis.Redis.from_url(url), name, ttl_seconds=ttl_seconds)
+
+    def acquire(self):
+        raise NotImplementedError
+
+    def renew(self):
+        """Gia hạn lease thêm ``ttl_seconds``; trả về False nếu lock không còn thuộc về process này."""
+        raise NotImplementedError
+
+    def release(self):
+        raise NotImplementedError
+
+    def start_renewal(self, interval=None):
+        """Gia hạn lease trong thread nền (mặc định mỗi 1/3 TTL) tới khi ``stop_renewal``."""
+        if not self.acquired or self._stop_renewal is not None:
+            return
+        interval = interval or max(1, self.ttl_seconds / 3)
+        stop = threading.Event()
+        self._stop_renewal = stop
+
+        def renew_until_stopped():
+            while not stop.wait(interval):
+                try:
+                    if not self.renew():
+                        logger.warning("Mất lock %s trong khi job đang chạy", self.key)
+                        return
+                except Exception as e:
+                    logger.warning("Không thể gia hạn lock %s: %s", self.key, str(e))
+
+        threading.Thread(target=renew_until_stopped, name=f"lease-{self.key}", daemon=True).start()
+
+    def stop_renewal(self):
+        if self._stop_renewal is not None:
+            self._stop_renewal.set()
+            self._stop_renewal = None
+
+
+class RedisJobLock(JobLock):
+    def __init__(self, client, name, ttl_seconds=3600, prefix='scheduler:lock:'):
+        super().__init__(name, ttl_seconds=ttl_seconds, prefix=prefix)
+        self.client = client
+
+    def acquire(self):
+        self.acquired = bool(self.client.set(self.key, self.token, nx=True, ex=self.ttl_seconds))
+        if not self.acquired:
+            logger.info("Lock %s đang được giữ bởi %s", self.key, self.client.get(self.key))
+        return self.acquired
+
+    def renew(self):
+        return bool(self.client.eval(_RENEW_SCRIPT, 1, self.key, self.token, self.ttl_seconds))
+
+    def release(self):
+        self.stop_renewal()
+        if not self.acquired:
+            return
+        try:
+            self.client.eval(_RELEASE_SCRIPT, 1, self.key, self.token)
+        except redis.RedisError as e:
+            logger.warning("Không thể giải phóng lock %s: %s", self.key, str(e))
+        self.acquired = False
+
+
+class MemoryJobLock(JobLock):
+    """Lock trong process (dev/test); không chặn được process scheduler khác."""
+
+    _leases = {}
+    _guard = threading.Lock()
+
+    def acquire(self):
+        with self._guard:
+            lease = self._leases.get(self.key)
+            if lease and lease[1] > time.monotonic():
+                logger.info("Lock %s đang được giữ bởi %s", self.key, lease[0])
+                self.acquired = False
+            else:
+                self._leases[self.key] = (self.token, time.monotonic() + self.ttl_seconds)
+                self.acquired = True
+        return self.acquired
+
+    def renew(self):
+        with self._guard:
+            lease = self._leases.get(self.key)
+            if not lease or lease[0] != self.token:
+                return False
+            self._leases[self.key] = (self.token, time.monotonic() + self.ttl_seconds)
+            return True
+
+    def release(self):
+        self.stop_renewal()
+        if not self.acquired:
+            return
+        with self._guard:
+            lease = self._leases.get(self.key)
+            if lease and lease[0] == self.token:
+                del self._leases[self.key]
+        self.acquired = False
@@ -0,0 +1,219 @@
+# utils/logging_config.py
+"""Cấu hình logging tập trung cho toàn ứng dụng.
+
+- Mọi logger ghi qua ``QueueHandler`` (không chặn): request chỉ đẩy record vào
+  hàng đợi, ``QueueListener`` chạy ở thread riêng mới format JSON và ghi file /
+  stdout. Khi hàng đợi đầy, record bị bỏ (đếm lại) thay vì làm chậm request.
+- Log level đặt duy nhất ở đây (``LOG_LEVEL`` và ``LOG_LEVELS`` cho từng logger);
+  các module chỉ dùng ``logging.getLogger(__name__)``.
+- Access log mỗi request là một record JSON (method, path, status, thời gian),
+  lấy mẫu theo route (``LOG_ROUTE_SAMPLE_RATES``); lỗi và request chậm luôn được
+  ghi. Header (nếu bật) được che các giá trị nhạy cảm.
+"""
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request
+
+REDACTED = '[REDACTED]'
+SENSITIVE_HEADERS = {
+    'authorization', 'cookie', 'set-cookie', 'proxy-authorization',
+    'x-api-key', 'x-csrf-token', 'x-refresh-token'
+}
+# Route phục vụ file tĩnh gọi rất nhiều, mặc định chỉ ghi 5%
+DEFAULT_ROUTE_SAMPLE_RATES = {
+    'serve_room_image': 0.05,
+    'serve_report_image': 0.05,
+    'serve_noti_image': 0.05,
+    'serve_avatar': 0.05,
+    'serve_signed_storage': 0.05,
+    'uploaded_file': 0.05,
+}
+
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+_exception_formatter = logging.Formatter()
+
+
+def parse_mapping(value, cast=str):
+    """'a=1,b=2' -> {'a': cast('1'), 'b': cast('2')}."""
+    result = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            key, raw = item.split('=', 1)
+            if key.strip():
+                result[key.strip()] = cast(raw.strip())
+    return result
+
+
+def redact_headers(headers):
+    return {
+        name: REDACTED if name.lower() in SENSITIVE_HEADERS else value
+        for name, value in headers.items()
+    }
+
+
+class JsonFormatter(logging.Formatter):
+    """Một dòng JSON cho mỗi record, kèm các trường ``extra``."""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc_info'] = record.exc_text
+        if record.stack_info:
+            data['stack_info'] = record.stack_info
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Gắn request_id vào record (chạy trong thread của request)."""
+
+    def filter(self, record):
+        if has_request_context() and not hasattr(record, 'request_id'):
+            record.request_id = getattr(g, 'request_id', None)
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler không bao giờ chặn: hàng đợi đầy thì bỏ record."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Chỉ ghép message và traceback ở thread gọi; format JSON và ghi file làm ở listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        record.message = record.msg
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _output_handlers(config):
+    fmt = (config.get('LOG_FORMAT') or 'json').lower()
+    formatter = JsonFormatter() if fmt == 'json' else logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')
+    handlers = []
+    log_file = config.get('LOG_FILE')
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+    if config.get('LOG_STDOUT') or not handlers:
+        handlers.append(logging.StreamHandler(sys.stdout))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def configure_logging(config):
+    """Cấu hình root logger một lần cho cả process (app, scheduler, worker)."""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    log_queue = queue.Queue(maxsize=config.get('LOG_QUEUE_SIZE', 10000))
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(config.get('LOG_LEVEL') or 'INFO')
+    for name, level in parse_mapping(config.get('LOG_LEVELS'), str.upper).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, *_output_handlers(config), respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Ghi nốt các record còn trong hàng đợi rồi dừng listener."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def init_request_logging(app):
+    """Access log có cấu trúc cho mỗi request, lấy mẫu theo route."""
+    access_logger = logging.getLogger('http.access')
+    default_rate = float(app.config.get('LOG_SAMPLE_RATE', 1.0))
+    route_rates = dict(DEFAULT_ROUTE_SAMPLE_RATES)
+    route_rates.update(parse_mapping(app.config.get('LOG_ROUTE_SAMPLE_RATES'), float))
+    slow_ms = app.config.get('LOG_SLOW_REQUEST_MS', 1000)
+    log_headers = app.config.get('LOG_REQUEST_HEADERS', False)
+
+    @app.before_request
+    def _start_request_log():
+        g.request_started = time.perf_counter()
+        g.request_id = (request.headers.get('X-Request-ID') or uuid.uuid4().hex)[:64]
+
+    @app.after_request
+    def _write_request_log(response):
+        started = g.pop('request_started', None)
+        duration_ms = round((time.perf_counter() - started) * 1000, 2) if started else None
+        response.headers['X-Request-ID'] = g.get('request_id', '')
+
+        endpoint = request.endpoint or ''
+        short_endpoint = endpoint.rsplit('.', 1)[-1]
+        rate = route_rates.get(endpoint, route_rates.get(short_endpoint, default_rate))
+        important = response.status_code >= 400 or (duration_ms is not None and duration_ms >= slow_ms)
+        if not important and (rate <= 0 or (rate < 1 and random.random() >= rate)):
+            return response
+        if not access_logger.isEnabledFor(logging.INFO):
+            return response
+
+        http = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'duration_ms': duration_ms,
+            'remote_addr': request.remote_addr,
+            'user_agent': request.user_agent.string,
+            'response_size': response.calculate_content_length(),
+            'sample_rate': 1.0 if important else rate,
+        }
+        if log_headers:
+            http['headers'] = redact_headers(request.headers)
+        if response.status_code >= 500:
+            level = logging.ERROR
+        elif response.status_code >= 400:
+            level = logging.WARNING
+        else:
+            level = logging.INFO
+        access_logger.log(level, 'request', extra={'http': http})
+        return response
+
+    return access_logger
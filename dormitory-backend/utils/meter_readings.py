@@ -0,0 +1,422 @@
+# utils/meter_readings.py
+"""Ghi chỉ số dịch vụ: người ở nộp cho phòng mình, admin nhập hàng loạt từ file CSV/XLSX.
+
+Dữ liệu tham chiếu của tháng (dịch vụ, mức giá hiệu lực, chỉ số tháng trước,
+bản ghi đã có, phòng, người ở) được nạp trước bằng vài query; từng chỉ số chỉ
+kiểm tra trong bộ nhớ. File nhập được đọc tuần tự (csv hoặc openpyxl read-only)
+và các dòng hợp lệ được ghi theo lô.
+"""
+import csv
+import io
+import logging
+import math
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import aliased
+
+from extensions import db
+from models.area import Area
+from models.bill_detail import BillDetail
+from models.contract import Contract
+from models.notification import Notification
+from models.notification_recipient import NotificationRecipient
+from models.room import Room
+from models.service import Service
+from models.service_rate import ServiceRate
+from utils.bill_rollover import resolved_rates
+from utils.billing import price_rows
+from utils.push_outbox import enqueue_pushes
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+
+HEADER_ALIASES = {
+    'room_id': 'room_id',
+    'room': 'room', 'room_name': 'room', 'phong': 'room', 'phòng': 'room',
+    'area': 'area', 'area_name': 'area', 'khu': 'area',
+    'service_id': 'service_id',
+    'service': 'service', 'service_name': 'service', 'dich_vu': 'service', 'dịch_vụ': 'service',
+    'current_reading': 'current_reading', 'current': 'current_reading', 'reading': 'current_reading',
+    'chi_so': 'current_reading', 'chỉ_số': 'current_reading',
+}
+
+
+class SubmissionError(ValueError):
+    """Chỉ số người dùng gửi không hợp lệ; ``status`` là mã HTTP trả về."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _header(value):
+    key = _text(value).lower().replace(' ', '_')
+    return HEADER_ALIASES.get(key, key)
+
+
+def iter_import_rows(file_storage):
+    """Đọc tuần tự file CSV/XLSX, sinh ra (số dòng, dict theo header chuẩn hóa)."""
+    filename = (file_storage.filename or '').lower()
+    if filename.endswith('.xlsx'):
+        import openpyxl
+        workbook = openpyxl.load_workbook(file_storage.stream, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            headers = [_header(cell) for cell in next(rows, ())]
+            for number, row in enumerate(rows, start=2):
+                if row and any(cell is not None and _text(cell) for cell in row):
+                    yield number, dict(zip(headers, row))
+        finally:
+            workbook.close()
+    elif filename.endswith('.csv'):
+        reader = csv.reader(io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig', newline=''))
+        headers = [_header(cell) for cell in next(reader, [])]
+        for number, row in enumerate(reader, start=2):
+            if any(cell.strip() for cell in row):
+                yield number, dict(zip(headers, row))
+    else:
+        raise ValueError('Chỉ hỗ trợ file .csv hoặc .xlsx')
+
+
+class MeterReadingContext:
+    """Dữ liệu tham chiếu của một tháng, nạp một lần cho cả file (hoặc cho các phòng ``room_ids``).
+
+    Dịch vụ kèm mức giá hiệu lực là một query; chỉ số tháng trước và bản ghi
+    tháng này (cùng ``extra_months``) là một query. Danh sách phòng và người ở
+    chỉ nạp khi cần (nhập từ file).
+    """
+
+    def __init__(self, bill_month, room_ids=None, extra_months=()):
+        self.bill_month = bill_month
+        self.previous_month = bill_month - relativedelta(months=1)
+        self.room_ids = room_ids
+        last_day = bill_month + relativedelta(months=1) - relativedelta(days=1)
+
+        self.services = {}
+        self.services_by_name = {}
+        self.rates = {}
+        self.rate_prices = {}
+        rates = resolved_rates(last_day)
+        for service_id, name, is_metered, rate_id, unit_price in db.session.execute(
+            select(Service.service_id, Service.name, Service.is_metered, rates.c.rate_id, ServiceRate.unit_price)
+            .outerjoin(rates, rates.c.service_id == Service.service_id)
+            .outerjoin(ServiceRate, ServiceRate.rate_id == rates.c.rate_id)
+        ):
+            self.services[service_id] = name
+            self.services_by_name[name.strip().lower()] = service_id
+            if rate_id is not None:
+                self.rates[service_id] = (rate_id, unit_price)
+                self.rate_prices[rate_id] = (unit_price, is_metered)
+
+        # previous: (phòng, dịch vụ) -> chỉ số lớn nhất tháng trước
+        # existing: (phòng, dịch vụ) -> (detail_id, submitted_by) của tháng này (kể cả bản ghi tạo sẵn bởi rollover)
+        # submitted: (phòng, tháng) đã có người gửi chỉ số
+        self.previous = {}
+        self.existing = {}
+        self.submitted = set()
+        rate = aliased(ServiceRate)
+        stmt = (
+            select(BillDetail.detail_id, BillDetail.room_id, rate.service_id, BillDetail.bill_month,
+                   BillDetail.current_reading, BillDetail.submitted_by)
+            .join(rate, rate.rate_id == BillDetail.rate_id)
+            .where(BillDetail.bill_month.in_({self.previous_month, bill_month, *extra_months}))
+            .order_by(BillDetail.detail_id)
+        )
+        if room_ids is not None:
+            stmt = stmt.where(BillDetail.room_id.in_(room_ids))
+        for detail_id, room_id, service_id, month, reading, submitted_by in db.session.execute(stmt):
+            key = (room_id, service_id)
+            if submitted_by is not None:
+                self.submitted.add((room_id, month))
+            if month == self.previous_month:
+                if key not in self.previous or reading > self.previous[key]:
+                    self.previous[key] = reading
+            if month == bill_month:
+                current = self.existing.get(key)
+                if current is None or (current[1] is None and submitted_by is not None):
+                    self.existing[key] = (detail_id, submitted_by)
+
+        self._rooms = None
+        self._residents = None
+
+    def _load_rooms(self):
+        self._rooms = {}
+        self._rooms_by_name = {}
+        stmt = select(Room.room_id, Room.name, Area.name).outerjoin(Area, Area.area_id == Room.area_id) \
+            .where(Room.is_deleted == False)
+        if self.room_ids is not None:
+            stmt = stmt.where(Room.room_id.in_(self.room_ids))
+        for room_id, name, area_name in db.session.execute(stmt):
+            self._rooms[room_id] = (name, area_name)
+            self._rooms_by_name.setdefault(name.strip().lower(), []).append((room_id, (area_name or '').strip().lower()))
+
+    @property
+    def rooms(self):
+        if self._rooms is None:
+            self._load_rooms()
+        return self._rooms
+
+    @property
+    def rooms_by_name(self):
+        if self._rooms is None:
+            self._load_rooms()
+        return self._rooms_by_name
+
+    @property
+    def residents(self):
+        # Chỉ số nhập bởi admin được ghi nhận cho một người đang ở phòng (như khi tạo hóa đơn)
+        if self._residents is None:
+            stmt = select(Contract.room_id, func.min(Contract.user_id)).where(
+                Contract.status == 'ACTIVE',
+                Contract.is_deleted == False,
+                Contract.user_id.isnot(None)
+            ).group_by(Contract.room_id)
+            if self.room_ids is not None:
+                stmt = stmt.where(Contract.room_id.in_(self.room_ids))
+            self._residents = dict(db.session.execute(stmt).all())
+        return self._residents
+
+    def detail_fields(self, room_id, service_id, current, submitted_by, submitted_at):
+        """Giá trị cột BillDetail (chưa có ``price``, xem ``price_rows``) cho một chỉ số đã kiểm tra;
+        kèm ``detail_id`` nếu cập nhật bản ghi tạo sẵn."""
+        rate_id, _ = self.rates[service_id]
+        previous = Decimal(self.previous.get((room_id, service_id)) or 0)
+        fields = {
+            'rate_id': rate_id,
+            'previous_reading': previous,
+            'current_reading': current,
+            'submitted_by': submitted_by,
+            'submitted_at': submitted_at
+        }
+        existing = self.existing.get((room_id, service_id))
+        if existing:
+            return {'detail_id': existing[0], **fields}
+        return {'room_id': room_id, 'bill_month': self.bill_month, **fields}
+
+    def resolve_room(self, values):
+        room_id = _text(values.get('room_id'))
+        if room_id:
+            try:
+                room_id = int(room_id)
+            except ValueError:
+                raise ValueError(f'room_id không hợp lệ: {room_id}')
+            if room_id not in self.rooms:
+                raise ValueError(f'Không tìm thấy phòng ID {room_id}')
+            return room_id
+        name = _text(values.get('room')).lower()
+        if not name:
+            raise ValueError('Thiếu phòng')
+        candidates = self.rooms_by_name.get(name, [])
+        area = _text(values.get('area')).lower()
+        if area:
+            candidates = [c for c in candidates if c[1] == area]
+        if not candidates:
+            raise ValueError(f'Không tìm thấy phòng {_text(values.get("room"))}')
+        if len(candidates) > 1:
+            raise ValueError(f'Tên phòng {_text(values.get("room"))} có ở nhiều khu, cần thêm cột area')
+        return candidates[0][0]
+
+    def resolve_service(self, values):
+        service_id = _text(values.get('service_id'))
+        if service_id:
+            try:
+                service_id = int(service_id)
+            except ValueError:
+                raise ValueError(f'service_id không hợp lệ: {service_id}')
+            if service_id not in self.services:
+                raise ValueError(f'ID dịch vụ {service_id} không hợp lệ')
+            return service_id
+        name = _text(values.get('service'))
+        if not name:
+            raise ValueError('Thiếu dịch vụ')
+        if name.lower() not in self.services_by_name:
+            raise ValueError(f'Không tìm thấy dịch vụ {name}')
+        return self.services_by_name[name.lower()]
+
+
+def _parse_reading(value):
+    try:
+        reading = Decimal(_text(value).replace(',', '.')).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f'Chỉ số hiện tại phải là số hợp lệ: {_text(value)}')
+    if reading < 0:
+        raise ValueError('Chỉ số hiện tại không được âm')
+    return reading
+
+
+def import_meter_readings(file_storage, bill_month, dry_run=False, batch_size=DEFAULT_BATCH_SIZE):
+    """Kiểm tra và ghi chỉ số từ file; dòng lỗi được bỏ qua và trả về trong ``errors``. Commit nếu không dry_run."""
+    context = MeterReadingContext(bill_month)
+    now = datetime.utcnow()
+    inserts, updates, errors, seen = [], [], [], set()
+    report = {'total_rows': 0, 'imported': 0, 'updated': 0}
+
+    def write_batch():
+        price_rows(inserts + updates, context.rate_prices)
+        if not dry_run:
+            if inserts:
+                db.session.execute(insert(BillDetail), inserts)
+            if updates:
+                db.session.execute(update(BillDetail), updates)
+        report['imported'] += len(inserts)
+        report['updated'] += len(updates)
+        inserts.clear()
+        updates.clear()
+
+    try:
+        for number, values in iter_import_rows(file_storage):
+            report['total_rows'] += 1
+            try:
+                room_id = context.resolve_room(values)
+                service_id = context.resolve_service(values)
+                if (room_id, service_id) in seen:
+                    raise ValueError('Trùng phòng và dịch vụ với một dòng trước trong file')
+                current = _parse_reading(values.get('current_reading'))
+                if service_id not in context.rates:
+                    raise ValueError(f'Không tìm thấy mức giá hiện tại cho dịch vụ {context.services[service_id]}')
+                existing = context.existing.get((room_id, service_id))
+                if existing and existing[1] is not None:
+                    raise ValueError(f'Đã có người gửi chỉ số cho dịch vụ {context.services[service_id]} trong tháng này')
+                user_id = context.residents.get(room_id)
+                if user_id is None:
+                    raise ValueError('Phòng không có hợp đồng đang hoạt động')
+                previous = Decimal(context.previous.get((room_id, service_id)) or 0)
+                if current < previous:
+                    raise ValueError(f'Chỉ số hiện tại phải lớn hơn hoặc bằng chỉ số trước đó ({previous})')
+            except ValueError as e:
+                errors.append({
+                    'row': number,
+                    'room': _text(values.get('room_id')) or _text(values.get('room')),
+                    'service': _text(values.get('service_id')) or _text(values.get('service')),
+                    'error': str(e)
+                })
+                continue
+
+            seen.add((room_id, service_id))
+            fields = context.detail_fields(room_id, service_id, current, user_id, now)
+            (updates if 'detail_id' in fields else inserts).append(fields)
+            if len(inserts) + len(updates) >= batch_size:
+                write_batch()
+        write_batch()
+        if not dry_run:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    report['errors'] = errors
+    logger.info(f"Meter reading import for {bill_month.strftime('%Y-%m')}{' (dry run)' if dry_run else ''}: "
+                f"{report['total_rows']} rows, {report['imported']} inserted, {report['updated']} updated, {len(errors)} errors")
+    return report
+
+
+def submit_room_readings(room_id, user_id, bill_month, readings, today=None):
+    """Ghi chỉ số người ở gửi cho phòng ``room_id`` tháng ``bill_month`` và tạo thông báo xác nhận.
+
+    ``readings`` là ``{service_id: {'current': số}}`` như trong request. Mọi chỉ
+    số được kiểm tra trước khi ghi (lỗi -> ``SubmissionError``); các BillDetail
+    được ghi bằng một lần flush, thông báo và push FCM được xếp hàng cho worker
+    trong cùng transaction. Commit, trả về danh sách detail_id theo thứ tự gửi.
+    """
+    current_month = (today or date.today()).replace(day=1)
+    context = MeterReadingContext(bill_month, room_ids=[room_id], extra_months=(current_month,))
+
+    if (room_id, current_month) in context.submitted and bill_month < current_month:
+        raise SubmissionError(
+            f'Không thể gửi chỉ số cho tháng {bill_month.strftime("%Y-%m")} vì tháng hiện tại '
+            f'({current_month.strftime("%Y-%m")}) đã có bản ghi', 409)
+    if not context.services:
+        raise SubmissionError('Không tìm thấy dịch vụ nào', 404)
+
+    valid_service_ids = {str(service_id): service_id for service_id in context.services}
+    for key in readings:
+        service_id = valid_service_ids.get(str(key))
+        if service_id is None:
+            raise SubmissionError(f'ID dịch vụ {key} không hợp lệ')
+        if service_id not in context.rates:
+            raise SubmissionError(f'Không tìm thấy mức giá hiện tại cho dịch vụ ID {key}', 404)
+        existing = context.existing.get((room_id, service_id))
+        if existing and existing[1] is not None:
+            raise SubmissionError(f'Đã có người gửi chỉ số cho dịch vụ ID {key} trong tháng này', 409)
+
+    now = datetime.utcnow()
+    details = []
+    for key, value in readings.items():
+        service_id = valid_service_ids[str(key)]
+        label = f'dịch vụ ID {key} ({context.services[service_id]})'
+        if not isinstance(value, dict):
+            raise SubmissionError(f'Chỉ số cho {label} phải là một object')
+        current = value.get('current')
+        if current is None:
+            raise SubmissionError(f'Vui lòng nhập chỉ số hiện tại cho {label}')
+        try:
+            current = float(current)
+        except (TypeError, ValueError):
+            current = None
+        if current is None or not math.isfinite(current):
+            raise SubmissionError(f'Chỉ số hiện tại cho {label} phải là số hợp lệ')
+        if current < 0:
+            raise SubmissionError(f'Chỉ số hiện tại cho {label} không được âm')
+        current = Decimal(str(current)).quantize(Decimal('0.01'))
+        previous = Decimal(context.previous.get((room_id, service_id)) or 0)
+        if current < previous:
+            raise SubmissionError(f'Chỉ số hiện tại phải lớn hơn hoặc bằng chỉ số trước đó ({previous}) cho {label}')
+        details.append(context.detail_fields(room_id, service_id, current, user_id, now))
+
+    price_rows(details, context.rate_prices)
+    try:
+        # Chỉ nhận bản ghi tạo sẵn còn chưa ai nộp: hai người cùng phòng gửi đồng thời
+        # thì người sau không ghi đè được chỉ số của người trước
+        updates = [fields for fields in details if 'detail_id' in fields]
+        claimed = 0
+        for fields in updates:
+            values = {key: value for key, value in fields.items() if key != 'detail_id'}
+            claimed += db.session.execute(
+                update(BillDetail).where(
+                    BillDetail.detail_id == fields['detail_id'],
+                    BillDetail.submitted_by.is_(None)
+                ).values(**values).execution_options(synchronize_session=False)
+            ).rowcount
+        if claimed != len(updates):
+            raise SubmissionError('Đã có người gửi chỉ số cho phòng này trong tháng này', 409)
+        created = {id(fields): BillDetail(**fields) for fields in details if 'detail_id' not in fields}
+        db.session.add_all(created.values())
+        db.session.flush()
+        detail_ids = [
+            fields['detail_id'] if 'detail_id' in fields else created[id(fields)].detail_id
+            for fields in details
+        ]
+
+        service_names = [context.services[valid_service_ids[str(key)]] for key in readings]
+        notification = Notification(
+            title="Gửi chỉ số thành công",
+            message=f"Bạn đã gửi chỉ số cho tháng {bill_month.strftime('%Y-%m')} của các dịch vụ ({', '.join(service_names)}) thành công.",
+            target_type="SYSTEM",
+            target_id=user_id,
+            related_entity_type="BILL_DETAIL",
+            related_entity_id=detail_ids[0] if detail_ids else None,
+            created_at=now
+        )
+        db.session.add(notification)
+        db.session.add(NotificationRecipient(notification=notification, user_id=user_id, is_read=False))
+        db.session.flush()
+        enqueue_pushes(Notification.id == notification.id, now=now)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info(f"User {user_id} submitted {len(detail_ids)} readings for room {room_id}, {bill_month.strftime('%Y-%m')}")
+    return detail_ids
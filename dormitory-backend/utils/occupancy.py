@@ -0,0 +1,155 @@
+# utils/occupancy.py
+"""Số người đang ở (current_person_number) và trạng thái phòng.
+
+Giá trị được duy trì theo sự kiện: mỗi lần flush có hợp đồng được tạo, đổi
+trạng thái, chuyển phòng hoặc bị xóa (hay phòng đổi sức chứa/trạng thái),
+listener ``after_flush`` tính lại bằng
+một câu UPDATE cho đúng các phòng bị ảnh hưởng, trong cùng transaction. Job
+chuyển trạng thái hợp đồng (UPDATE hàng loạt, không qua ORM) tự gọi
+``recompute_occupancy``. Vì vậy API đọc phòng chỉ cần SELECT.
+
+``find_drift``/``reconcile_occupancy`` kiểm tra và sửa các phòng bị lệch (ví dụ
+do sửa tay trong database), chạy định kỳ bởi scheduler hoặc ``run_occupancy.py``.
+"""
+import logging
+
+from sqlalchemy import case, event, func, inspect, select, update
+
+from extensions import db
+from models.contract import Contract
+from models.room import Room
+
+logger = logging.getLogger(__name__)
+
+# Trạng thái do admin đặt tay, không tự chuyển theo số người
+MANUAL_ROOM_STATUSES = ('MAINTENANCE', 'DISABLED')
+
+
+def active_count_subquery():
+    return select(func.count(Contract.contract_id)).where(
+        Contract.room_id == Room.room_id,
+        Contract.status == 'ACTIVE'
+    ).scalar_subquery()
+
+
+def recompute_occupancy(room_ids=None, connection=None):
+    """Một câu UPDATE cho các phòng ``room_ids`` (tất cả nếu None). Không commit, trả về rowcount."""
+    if room_ids is not None:
+        room_ids = list(room_ids)
+        if not room_ids:
+            return 0
+    active_count = active_count_subquery()
+    stmt = update(Room).values(
+        current_person_number=active_count,
+        status=case(
+            (Room.status.in_(MANUAL_ROOM_STATUSES), Room.status),
+            (active_count >= Room.capacity, 'OCCUPIED'),
+            else_='AVAILABLE'
+        )
+    ).execution_options(synchronize_session=False)
+    if room_ids is not None:
+        stmt = stmt.where(Room.room_id.in_(room_ids))
+    result = (connection or db.session).execute(stmt)
+    logger.debug(f"Recomputed occupancy for {'rooms ' + str(room_ids) if room_ids is not None else 'all rooms'}")
+    return result.rowcount
+
+
+def affected_room_ids(session):
+    """Các phòng cần tính lại trong lần flush này.
+
+    Gồm phòng có hợp đồng ACTIVE được tạo/xóa/đổi trạng thái (kể cả phòng cũ khi
+    chuyển phòng) và phòng được sửa sức chứa hoặc trạng thái.
+    """
+    room_ids = set()
+    for obj in session.new:
+        if isinstance(obj, Contract) and obj.status == 'ACTIVE':
+            room_ids.add(obj.room_id)
+    for obj in session.deleted:
+        if isinstance(obj, Contract):
+            room_ids.add(obj.room_id)
+    for obj in session.dirty:
+        if isinstance(obj, Room):
+            state = inspect(obj)
+            if state.attrs.capacity.history.has_changes() or state.attrs.status.history.has_changes():
+                room_ids.add(obj.room_id)
+            continue
+        if not isinstance(obj, Contract):
+            continue
+        state = inspect(obj)
+        status = state.attrs.status.history
+        room = state.attrs.room_id.history
+        if not status.has_changes() and not room.has_changes():
+            continue
+        statuses = set(status.deleted or ()) | set(status.unchanged or ()) | {obj.status}
+        if 'ACTIVE' in statuses:
+            room_ids.update(room.deleted or ())
+            room_ids.add(obj.room_id)
+    room_ids.discard(None)
+    return room_ids
+
+
+def _after_flush(session, flush_context):
+    room_ids = affected_room_ids(session)
+    if room_ids:
+        recompute_occupancy(sorted(room_ids), connection=session.connection())
+        # Object Room đã nạp trong session sẽ đọc lại giá trị mới ở lần truy cập sau
+        session.info.setdefault('occupancy_expire', set()).update(room_ids)
+
+
+def _after_flush_postexec(session, flush_context):
+    room_ids = session.info.pop('occupancy_expire', None)
+    for room_id in room_ids or ():
+        room = session.identity_map.get(inspect(Room).identity_key_from_primary_key((room_id,)))
+        if room is not None:
+            session.expire(room, ['current_person_number', 'status'])
+
+
+def init_occupancy(app):
+    """Đăng ký listener duy trì current_person_number khi hợp đồng hoặc phòng thay đổi."""
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+        event.listen(db.session, 'after_flush_postexec', _after_flush_postexec)
+
+
+def find_drift(room_ids=None):
+    """Các phòng có current_person_number/status khác với số hợp đồng ACTIVE thực tế."""
+    active = select(
+        Contract.room_id, func.count(Contract.contract_id).label('active_count')
+    ).where(Contract.status == 'ACTIVE').group_by(Contract.room_id).subquery()
+    actual = func.coalesce(active.c.active_count, 0)
+    expected_status = case(
+        (Room.status.in_(MANUAL_ROOM_STATUSES), Room.status),
+        (actual >= Room.capacity, 'OCCUPIED'),
+        else_='AVAILABLE'
+    )
+    stmt = select(
+        Room.room_id, Room.current_person_number, actual.label('actual'),
+        Room.status, expected_status.label('expected_status')
+    ).outerjoin(active, active.c.room_id == Room.room_id).where(
+        (Room.current_person_number != actual) | (Room.status != expected_status)
+    ).order_by(Room.room_id)
+    if room_ids is not None:
+        stmt = stmt.where(Room.room_id.in_(list(room_ids)))
+    return [
+        {
+            'room_id': row.room_id,
+            'stored': row.current_person_number,
+            'actual': row.actual,
+            'status': row.status,
+            'expected_status': row.expected_status
+        }
+        for row in db.session.execute(stmt)
+    ]
+
+
+def reconcile_occupancy(dry_run=False):
+    """Tìm và sửa các phòng bị lệch, trả về danh sách lệch. ``dry_run`` chỉ kiểm tra."""
+    drift = find_drift()
+    if drift:
+        logger.warning(f"Occupancy drift in {len(drift)} rooms: {drift[:20]}")
+        if not dry_run:
+            recompute_occupancy([row['room_id'] for row in drift])
+            db.session.commit()
+    else:
+        logger.info("Occupancy consistent for all rooms")
+    return drift
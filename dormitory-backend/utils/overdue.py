@@ -0,0 +1,67 @@
+# utils/overdue.py
+"""Chuyển hóa đơn quá hạn sang OVERDUE và nhắc các phòng còn nợ.
+
+Hóa đơn tháng M đến hạn vào ngày ``BILL_DUE_DAY`` của tháng M+1. Job hằng ngày
+chuyển mọi hóa đơn PENDING/FAILED đã quá hạn bằng một câu UPDATE theo
+``bill_month``, rồi tạo thông báo nhắc cho các phòng có hóa đơn OVERDUE (không
+nhắc lại một phòng trong ``OVERDUE_REMINDER_INTERVAL_DAYS`` ngày).
+"""
+import logging
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select, update
+
+from extensions import db
+from models.monthly_bill import MonthlyBill
+from utils.room_reminders import notify_rooms
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DUE_DAY = 10
+DEFAULT_REMINDER_INTERVAL_DAYS = 3
+OVERDUE_FROM = ('PENDING', 'FAILED')
+OVERDUE_REMINDER_TITLE = "Nhắc nhở hóa đơn quá hạn"
+
+
+def overdue_cutoff(today, due_day=DEFAULT_DUE_DAY):
+    """Hóa đơn có ``bill_month`` trước ngày này (ngày 1 của tháng) là đã quá hạn."""
+    first_of_month = today.replace(day=1)
+    if today.day > due_day:
+        return first_of_month
+    return (first_of_month - timedelta(days=1)).replace(day=1)
+
+
+def mark_overdue_bills(today=None, due_day=DEFAULT_DUE_DAY):
+    """Một câu UPDATE chuyển hóa đơn chưa thanh toán đã quá hạn sang OVERDUE. Không commit."""
+    cutoff = overdue_cutoff(today or date.today(), due_day)
+    return db.session.execute(
+        update(MonthlyBill).where(
+            MonthlyBill.payment_status.in_(OVERDUE_FROM),
+            MonthlyBill.bill_month < cutoff
+        ).values(payment_status='OVERDUE').execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def remind_overdue_rooms(interval_days=DEFAULT_REMINDER_INTERVAL_DAYS):
+    """Thông báo (và push) cho các phòng có hóa đơn OVERDUE. Không commit."""
+    rooms = select(MonthlyBill.room_id).where(MonthlyBill.payment_status == 'OVERDUE').distinct()
+    return notify_rooms(
+        rooms,
+        OVERDUE_REMINDER_TITLE,
+        "có hóa đơn đã quá hạn thanh toán. Vui lòng thanh toán sớm nhất.",
+        'MONTHLY_BILL',
+        skip_notified_since=datetime.utcnow() - timedelta(days=interval_days)
+    )
+
+
+def run_overdue_engine(config, today=None):
+    """Đánh dấu OVERDUE và gửi nhắc nhở trong một transaction, trả về số hóa đơn và số phòng."""
+    try:
+        marked = mark_overdue_bills(today, config.get('BILL_DUE_DAY', DEFAULT_DUE_DAY))
+        reminded = remind_overdue_rooms(config.get('OVERDUE_REMINDER_INTERVAL_DAYS', DEFAULT_REMINDER_INTERVAL_DAYS))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    logger.info(f"Marked {marked} bills OVERDUE, reminded {len(reminded)} rooms")
+    return {'marked': marked, 'reminded_rooms': len(reminded)}
@@ -0,0 +1,221 @@
+# utils/pagination.py
+"""Tiện ích phân trang dùng chung cho các API danh sách.
+
+- Keyset: cursor là chuỗi base64 của các giá trị sắp xếp của dòng cuối trang
+  trước, ví dụ ``[created_at, id]``. Client gửi lại ``cursor`` để lấy trang kế
+  tiếp mà không phải OFFSET qua các dòng đã đọc.
+- Tổng số dòng: ``COUNT(*)`` trên các join lớn rất tốn, nên mặc định kết quả đếm
+  được cache theo chữ ký bộ lọc (SQL + tham số) trong ``PAGINATION_COUNT_TTL``
+  giây. ``count='estimate'`` dùng số dòng ước lượng của MySQL khi query không
+  có bộ lọc; ``count='none'`` bỏ qua việc đếm.
+"""
+import base64
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import current_app
+from sqlalchemy import and_, or_, text
+
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COUNT_TTL = 30
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Giải mã cursor, ném ValueError nếu không hợp lệ."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except Exception:
+        raise ValueError('Cursor không hợp lệ')
+    if not isinstance(values, list):
+        raise ValueError('Cursor không hợp lệ')
+    return values
+
+
+def page_count(total, limit):
+    return math.ceil(total / limit) if total and limit else 0
+
+
+class _LocalCountCache:
+    """Cache trong process khi ứng dụng không cấu hình Flask-Caching."""
+
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.values.get(key)
+            if entry and entry[1] > time.monotonic():
+                return entry[0]
+            self.values.pop(key, None)
+            return None
+
+    def set(self, key, value, timeout=None):
+        with self.lock:
+            if len(self.values) > 10000:
+                self.values.clear()
+            self.values[key] = (value, time.monotonic() + (timeout or DEFAULT_COUNT_TTL))
+
+
+_local_cache = _LocalCountCache()
+
+
+def _count_cache():
+    caches = current_app.extensions.get('cache') or {}
+    for backend in caches.values():
+        return backend
+    return _local_cache
+
+
+def filter_signature(query):
+    """Chữ ký của bộ lọc: hash của câu SQL (không ORDER BY) và các tham số."""
+    compiled = query.order_by(None).statement.compile(dialect=db.engine.dialect)
+    params = sorted((k, repr(v)) for k, v in compiled.params.items())
+    raw = f"{compiled}|{params}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def exact_count(query):
+    return query.order_by(None).count()
+
+
+def cached_count(query, ttl=None):
+    ttl = ttl or current_app.config.get('PAGINATION_COUNT_TTL', DEFAULT_COUNT_TTL)
+    key = f"pagination:count:{filter_signature(query)}"
+    cache = _count_cache()
+    try:
+        total = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Không đọc được count cache: {str(e)}")
+        total = None
+    if total is not None:
+        return int(total)
+    total = exact_count(query)
+    try:
+        cache.set(key, total, timeout=ttl)
+    except Exception as e:
+        logger.warning(f"Không ghi được count cache: {str(e)}")
+    return total
+
+
+def estimated_count(query, model):
+    """Số dòng ước lượng (information_schema) khi query không lọc gì; ngược lại dùng cached_count."""
+    if query.whereclause is None and db.engine.dialect.name == 'mysql':
+        row = db.session.execute(text(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+        ), {'table': model.__tablename__}).first()
+        if row and row[0] is not None:
+            return int(row[0]), True
+    return cached_count(query), False
+
+
+def _coerce(column, value):
+    """Chuyển giá trị trong cursor (JSON) về kiểu của cột."""
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    if python_type is Decimal:
+        return Decimal(str(value))
+    return python_type(value)
+
+
+def keyset_condition(order, values):
+    """Điều kiện "sau dòng cursor" cho danh sách (cột, 'asc'|'desc'), mở rộng theo thứ tự từ điển."""
+    clauses = []
+    for i, (column, direction) in enumerate(order):
+        equal = [order[j][0] == values[j] for j in range(i)]
+        after = column < values[i] if direction == 'desc' else column > values[i]
+        clauses.append(and_(*equal, after))
+    return or_(*clauses)
+
+
+class Page:
+    def __init__(self, items, total, page, limit, next_cursor=None, estimated=False):
+        self.items = items
+        self.total = total
+        self.page = page
+        self.limit = limit
+        self.next_cursor = next_cursor
+        self.estimated = estimated
+
+    @property
+    def pages(self):
+        return page_count(self.total, self.limit) if self.total is not None else None
+
+    def to_dict(self, key, serialize=None):
+        serialize = serialize or (lambda item: item.to_dict())
+        data = {
+            key: [serialize(item) for item in self.items],
+            'total': self.total,
+            'pages': self.pages,
+            'current_page': self.page,
+            'next_cursor': self.next_cursor
+        }
+        if self.estimated:
+            data['total_is_estimate'] = True
+        return data
+
+
+def paginate(query, order, page=1, limit=10, cursor=None, count='cached'):
+    """Phân trang ``query`` theo ``order`` = [(cột, 'asc'|'desc'), ...].
+
+    Cột cuối của ``order`` phải là khóa chính để thứ tự là duy nhất và các cột
+    phải NOT NULL. Có ``cursor`` thì dùng keyset, ngược lại OFFSET theo ``page``.
+    Ném ValueError nếu cursor không hợp lệ.
+    """
+    limit = max(1, limit)
+    estimated = False
+    if count == 'none':
+        total = None
+    elif count == 'exact':
+        total = exact_count(query)
+    elif count == 'estimate':
+        total, estimated = estimated_count(query, order[-1][0].class_)
+    else:
+        total = cached_count(query)
+
+    ordered = query.order_by(*[column.desc() if direction == 'desc' else column.asc() for column, direction in order])
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(order):
+            raise ValueError('Cursor không hợp lệ')
+        try:
+            values = [_coerce(column, value) for (column, _), value in zip(order, values)]
+        except (TypeError, ValueError):
+            raise ValueError('Cursor không hợp lệ')
+        ordered = ordered.filter(keyset_condition(order, values))
+        page = None
+    else:
+        page = max(page, 1)
+        ordered = ordered.offset((page - 1) * limit)
+
+    items = ordered.limit(limit + 1).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column, _ in order])
+    return Page(items, total, page, limit, next_cursor, estimated)
@@ -0,0 +1,128 @@
+# utils/passwords.py
+"""Chính sách băm mật khẩu cấu hình được theo từng deployment.
+
+Thuật toán và chi phí (scrypt N/r/p hoặc số vòng pbkdf2) lấy từ config. Hash
+lưu theo định dạng của Werkzeug (``method$salt$hash``) nên các hash cũ vẫn kiểm
+tra được; khi đăng nhập thành công với hash có tham số khác chính sách hiện
+tại, mật khẩu được băm lại (``verify_and_update``).
+"""
+import logging
+
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_METHODS = ('scrypt', 'pbkdf2')
+
+DEFAULT_SCRYPT_N = 2 ** 15
+DEFAULT_SCRYPT_R = 8
+DEFAULT_SCRYPT_P = 1
+DEFAULT_PBKDF2_HASH = 'sha256'
+DEFAULT_PBKDF2_ITERATIONS = 600000
+DEFAULT_SALT_LENGTH = 16
+# Mã xác nhận 6 số chỉ sống 30 phút và giới hạn 3 lần thử, không cần chi phí cao như mật khẩu
+DEFAULT_RESET_CODE_ITERATIONS = 10000
+
+
+class PasswordPolicy:
+    def __init__(self, method='scrypt', scrypt_n=DEFAULT_SCRYPT_N, scrypt_r=DEFAULT_SCRYPT_R,
+                 scrypt_p=DEFAULT_SCRYPT_P, pbkdf2_hash=DEFAULT_PBKDF2_HASH,
+                 pbkdf2_iterations=DEFAULT_PBKDF2_ITERATIONS, salt_length=DEFAULT_SALT_LENGTH):
+        method = (method or 'scrypt').lower()
+        if method not in SUPPORTED_METHODS:
+            raise ValueError(f"Unsupported password hash method: {method}")
+        self.method = method
+        self.scrypt_n = int(scrypt_n)
+        self.scrypt_r = int(scrypt_r)
+        self.scrypt_p = int(scrypt_p)
+        self.pbkdf2_hash = pbkdf2_hash
+        self.pbkdf2_iterations = int(pbkdf2_iterations)
+        self.salt_length = int(salt_length)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            method=config.get('PASSWORD_HASH_METHOD', 'scrypt'),
+            scrypt_n=config.get('PASSWORD_SCRYPT_N', DEFAULT_SCRYPT_N),
+            scrypt_r=config.get('PASSWORD_SCRYPT_R', DEFAULT_SCRYPT_R),
+            scrypt_p=config.get('PASSWORD_SCRYPT_P', DEFAULT_SCRYPT_P),
+            pbkdf2_hash=config.get('PASSWORD_PBKDF2_HASH', DEFAULT_PBKDF2_HASH),
+            pbkdf2_iterations=config.get('PASSWORD_PBKDF2_ITERATIONS', DEFAULT_PBKDF2_ITERATIONS)
+        )
+
+    @classmethod
+    def for_reset_codes(cls, config=None):
+        iterations = (config or {}).get('RESET_CODE_PBKDF2_ITERATIONS', DEFAULT_RESET_CODE_ITERATIONS)
+        return cls(method='pbkdf2', pbkdf2_iterations=iterations)
+
+    @property
+    def method_string(self):
+        """Chuỗi method theo định dạng Werkzeug, ví dụ ``scrypt:32768:8:1``."""
+        if self.method == 'scrypt':
+            return f"scrypt:{self.scrypt_n}:{self.scrypt_r}:{self.scrypt_p}"
+        return f"pbkdf2:{self.pbkdf2_hash}:{self.pbkdf2_iterations}"
+
+    def hash(self, password):
+        return generate_password_hash(password, method=self.method_string, salt_length=self.salt_length)
+
+    def verify(self, pwhash, password):
+        if not pwhash or password is None:
+            return False
+        return check_password_hash(pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        if not pwhash or pwhash.count('$') < 2:
+            return True
+        method, salt, _ = pwhash.split('$', 2)
+        return method != self.method_string or len(salt) != self.salt_length
+
+    def verify_and_update(self, pwhash, password):
+        """Trả về (hợp lệ, hash mới hoặc None nếu không cần băm lại)."""
+        if not self.verify(pwhash, password):
+            return False, None
+        if self.needs_rehash(pwhash):
+            return True, self.hash(password)
+        return True, None
+
+
+def get_password_policy():
+    """Policy của app hiện tại (tạo từ config lần đầu); ngoài app context dùng mặc định."""
+    if not has_app_context():
+        return PasswordPolicy()
+    policy = current_app.extensions.get('password_policy')
+    if policy is None:
+        policy = PasswordPolicy.from_config(current_app.config)
+        current_app.extensions['password_policy'] = policy
+    return policy
+
+
+def get_reset_code_policy():
+    if not has_app_context():
+        return PasswordPolicy.for_reset_codes()
+    policy = current_app.extensions.get('reset_code_policy')
+    if policy is None:
+        policy = PasswordPolicy.for_reset_codes(current_app.config)
+        current_app.extensions['reset_code_policy'] = policy
+    return policy
+
+
+def hash_password(password):
+    return get_password_policy().hash(password)
+
+
+def verify_password(account, password):
+    """Kiểm tra mật khẩu của User/Admin; nếu đúng và hash đã cũ thì gán hash mới (người gọi commit)."""
+    ok, new_hash = get_password_policy().verify_and_update(account.password_hash, password)
+    if ok and new_hash:
+        account.password_hash = new_hash
+        logger.info("Rehashed password for %s", account)
+    return ok
+
+
+def hash_reset_code(code):
+    return get_reset_code_policy().hash(code)
+
+
+def verify_reset_code(code_hash, code):
+    return get_reset_code_policy().verify(code_hash, code)
@@ -0,0 +1,361 @@
+# utils/payment_events.py
+"""Xử lý callback cổng thanh toán: idempotent, không khóa bi quan.
+
+- Mỗi callback được ghi vào ``payment_events`` (chỉ ghi thêm) với
+  ``dedupe_key`` duy nhất (cổng + mã giao dịch + mã cổng + mã kết quả). VNPay gửi
+  lại hoặc người dùng bấm hai lần sẽ đụng unique key và được trả về là DUPLICATE.
+- Chuyển trạng thái bằng một câu UPDATE có điều kiện trên trạng thái hiện tại và
+  số tiền (``WHERE status IN (...) AND amount = ...``); hai request đồng thời
+  chỉ một request có rowcount = 1. Hóa đơn được cập nhật theo cùng transaction.
+- Thông báo trong app và FCM không gửi trong request: một
+  ``payment_notification_tasks`` được ghi cùng transaction và worker nền
+  (``run_payment_worker.py``) xử lý sau.
+"""
+import json
+import logging
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models.contract import Contract
+from models.monthly_bill import MonthlyBill
+from models.notification import Notification
+from models.notification_recipient import NotificationRecipient
+from models.payment_event import PaymentEvent, PaymentNotificationTask
+from models.payment_transaction import PaymentTransaction
+from utils.email_outbox import OutboxWorker, backoff_delay
+from utils.fcm import send_fcm_notification_to_multiple
+
+logger = logging.getLogger(__name__)
+
+GATEWAY_VNPAY = 'VNPAY'
+VNPAY_SUCCESS_CODE = '00'
+
+# Tiền đã bị trừ thì vẫn ghi nhận, kể cả khi link thanh toán cũ đã bị hủy/thất bại
+SUCCESS_FROM = ('PENDING', 'CANCELLED', 'FAILED')
+FAILURE_FROM = ('PENDING',)
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_MAX_ATTEMPTS = 6
+DEFAULT_BASE_DELAY = 10
+PROCESSING_LEASE = 5 * 60
+
+
+class CallbackResult:
+    def __init__(self, outcome, transaction_id, status, event_id=None):
+        self.outcome = outcome
+        self.transaction_id = transaction_id
+        self.status = status
+        self.event_id = event_id
+
+    @property
+    def applied(self):
+        return self.outcome == 'APPLIED'
+
+    def to_dict(self):
+        return {
+            'outcome': self.outcome,
+            'transaction_id': self.transaction_id,
+            'status': self.status,
+            'event_id': self.event_id
+        }
+
+
+def vnpay_amount(raw):
+    """vnp_Amount là số tiền x100 (chuỗi), trả về Decimal hoặc None nếu không hợp lệ."""
+    try:
+        return (Decimal(str(raw)) / 100).quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _bill_of(transaction_id):
+    return select(PaymentTransaction.bill_id).where(
+        PaymentTransaction.transaction_id == transaction_id
+    ).scalar_subquery()
+
+
+def apply_transition(transaction_id, amount, succeeded, gateway_reference=None, error_message=None, now=None):
+    """Chuyển giao dịch sang SUCCESS/FAILED nếu trạng thái hiện tại cho phép. Không commit.
+
+    Trả về True nếu câu UPDATE có điều kiện đổi được đúng một dòng.
+    """
+    now = now or datetime.utcnow()
+    if succeeded:
+        values = {'status': 'SUCCESS', 'processed_at': now, 'error_message': None}
+        allowed = SUCCESS_FROM
+    else:
+        values = {'status': 'FAILED', 'processed_at': now, 'error_message': error_message}
+        allowed = FAILURE_FROM
+    if gateway_reference:
+        values['gateway_reference'] = gateway_reference
+    changed = db.session.execute(
+        update(PaymentTransaction).where(
+            PaymentTransaction.transaction_id == transaction_id,
+            PaymentTransaction.status.in_(allowed),
+            PaymentTransaction.amount == amount
+        ).values(**values).execution_options(synchronize_session=False)
+    ).rowcount
+    if changed != 1:
+        return False
+
+    if succeeded:
+        db.session.execute(
+            update(MonthlyBill).where(
+                MonthlyBill.bill_id == _bill_of(transaction_id),
+                MonthlyBill.payment_status != 'PAID'
+            ).values(
+                payment_status='PAID', paid_at=now, transaction_reference=gateway_reference
+            ).execution_options(synchronize_session=False)
+        )
+    else:
+        db.session.execute(
+            update(MonthlyBill).where(
+                MonthlyBill.bill_id == _bill_of(transaction_id),
+                MonthlyBill.payment_status.in_(['PENDING', 'FAILED'])
+            ).values(payment_status='FAILED').execution_options(synchronize_session=False)
+        )
+    return True
+
+
+def _classify(transaction_id, amount, target_status):
+    """Lý do callback không đổi trạng thái, kèm trạng thái hiện tại của giao dịch."""
+    if transaction_id is None:
+        return 'UNKNOWN_TRANSACTION', None
+    row = db.session.execute(
+        select(PaymentTransaction.status, PaymentTransaction.amount).where(
+            PaymentTransaction.transaction_id == transaction_id
+        )
+    ).first()
+    if row is None:
+        return 'UNKNOWN_TRANSACTION', None
+    if amount is None or Decimal(str(row.amount)) != amount:
+        return 'AMOUNT_MISMATCH', row.status
+    if row.status == target_status:
+        return 'DUPLICATE', row.status
+    return 'IGNORED', row.status
+
+
+def _current_status(transaction_id):
+    if transaction_id is None:
+        return None
+    return db.session.execute(
+        select(PaymentTransaction.status).where(PaymentTransaction.transaction_id == transaction_id)
+    ).scalar()
+
+
+def process_vnpay_callback(params):
+    """Ghi nhận một callback VNPay (đã kiểm tra chữ ký) và commit. Trả về CallbackResult."""
+    transaction_id = _to_int(params.get('vnp_TxnRef'))
+    response_code = params.get('vnp_ResponseCode')
+    gateway_reference = params.get('vnp_TransactionNo') or None
+    amount = vnpay_amount(params.get('vnp_Amount'))
+    succeeded = response_code == VNPAY_SUCCESS_CODE
+    target_status = 'SUCCESS' if succeeded else 'FAILED'
+    now = datetime.utcnow()
+
+    applied = False
+    if transaction_id is not None and amount is not None:
+        applied = apply_transition(
+            transaction_id, amount, succeeded,
+            gateway_reference=gateway_reference,
+            error_message=params.get('vnp_Message') or f"VNPay response code {response_code}",
+            now=now
+        )
+    if applied:
+        outcome, status = 'APPLIED', target_status
+    else:
+        outcome, status = _classify(transaction_id, amount, target_status)
+
+    event = PaymentEvent(
+        gateway=GATEWAY_VNPAY,
+        dedupe_key=f"{GATEWAY_VNPAY}:{params.get('vnp_TxnRef')}:{gateway_reference}:{response_code}"[:191],
+        transaction_id=transaction_id,
+        gateway_reference=gateway_reference,
+        response_code=response_code,
+        amount=amount,
+        outcome=outcome,
+        resulting_status=status,
+        payload=json.dumps(params, ensure_ascii=False, sort_keys=True),
+        received_at=now
+    )
+    try:
+        db.session.add(event)
+        db.session.flush()
+        if applied:
+            db.session.add(PaymentNotificationTask(
+                event_id=event.event_id,
+                transaction_id=transaction_id,
+                kind=target_status,
+                status='PENDING',
+                attempts=0,
+                next_attempt_at=now,
+                created_at=now
+            ))
+        db.session.commit()
+    except IntegrityError:
+        # Callback này đã được ghi (VNPay gửi lại hoặc request song song)
+        db.session.rollback()
+        status = _current_status(transaction_id)
+        logger.info(f"Duplicate VNPay callback for transaction {transaction_id} ({response_code})")
+        return CallbackResult('DUPLICATE', transaction_id, status)
+
+    log = logger.info if outcome in ('APPLIED', 'DUPLICATE') else logger.warning
+    log(f"VNPay callback for transaction {transaction_id}: {outcome}, status={status}")
+    return CallbackResult(outcome, transaction_id, status, event.event_id)
+
+
+class PaymentNotifier:
+    """Tạo thông báo trong app và gửi FCM cho các ``payment_notification_tasks`` đến hạn."""
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            batch_size=config.get('PAYMENT_NOTIFY_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+            max_attempts=config.get('PAYMENT_NOTIFY_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS),
+            base_delay=config.get('PAYMENT_NOTIFY_BASE_DELAY', DEFAULT_BASE_DELAY)
+        )
+
+    def _claim(self):
+        now = datetime.utcnow()
+        tasks = PaymentNotificationTask.query.filter(
+            PaymentNotificationTask.status.in_(['PENDING', 'PROCESSING']),
+            PaymentNotificationTask.next_attempt_at <= now
+        ).order_by(PaymentNotificationTask.id).limit(self.batch_size).with_for_update(skip_locked=True).all()
+        for task in tasks:
+            task.status = 'PROCESSING'
+            task.next_attempt_at = now + timedelta(seconds=PROCESSING_LEASE)
+        db.session.commit()
+        return tasks
+
+    def _message(self, kind, transaction, bill):
+        if kind == 'SUCCESS':
+            return (
+                "Thanh toán hóa đơn thành công",
+                f"Hóa đơn #{bill.bill_id} cho phòng đã được thanh toán thành công. Số tiền: {bill.total_amount} VND."
+            )
+        return (
+            "Thanh toán hóa đơn thất bại",
+            f"Thanh toán hóa đơn #{bill.bill_id} cho phòng thất bại. Lý do: {transaction.error_message or 'Lỗi không xác định'}."
+        )
+
+    def process(self, task):
+        """Tạo thông báo cho một task (không commit), trả về (user_ids, title, message, data) để gửi FCM."""
+        row = db.session.query(PaymentTransaction, MonthlyBill).join(
+            MonthlyBill, MonthlyBill.bill_id == PaymentTransaction.bill_id
+        ).filter(PaymentTransaction.transaction_id == task.transaction_id).first()
+        if row is None:
+            logger.warning(f"Payment notification task {task.id}: transaction {task.transaction_id} no longer exists")
+            return None
+        transaction, bill = row
+        title, message = self._message(task.kind, transaction, bill)
+
+        # Worker chết giữa chừng: không tạo thông báo lần hai
+        exists = db.session.query(Notification.id).filter_by(
+            related_entity_type='PAYMENT_TRANSACTION',
+            related_entity_id=transaction.transaction_id,
+            title=title
+        ).first()
+        if exists:
+            return None
+
+        notification = Notification(
+            title=title,
+            message=message,
+            target_type='SYSTEM',
+            target_id=bill.room_id,  # target_id is room_id
+            related_entity_type='PAYMENT_TRANSACTION',
+            related_entity_id=transaction.transaction_id,
+            created_at=datetime.utcnow()
+        )
+        db.session.add(notification)
+        db.session.flush()
+
+        user_ids = db.session.execute(
+            select(Contract.user_id).where(Contract.room_id == bill.room_id, Contract.status == 'ACTIVE')
+        ).scalars().all()
+        db.session.add_all([
+            NotificationRecipient(notification_id=notification.id, user_id=user_id, is_read=False)
+            for user_id in user_ids
+        ])
+        data = {
+            'notification_id': str(notification.id),
+            'related_entity_type': 'PAYMENT_TRANSACTION',
+            'related_entity_id': str(transaction.transaction_id)
+        }
+        return user_ids, title, message, data
+
+    def _failed(self, task, error):
+        task.attempts += 1
+        task.last_error = str(error)[:2000]
+        if task.attempts >= self.max_attempts:
+            task.status = 'FAILED'
+            logger.error(f"Payment notification task {task.id} failed after {task.attempts} attempts: {error}")
+        else:
+            task.status = 'PENDING'
+            task.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff_delay(task.attempts, self.base_delay))
+
+    def run_batch(self):
+        """Xử lý một lô, trả về (số thành công, số lỗi)."""
+        tasks = self._claim()
+        done = failed = 0
+        for task in tasks:
+            push = None
+            try:
+                push = self.process(task)
+                task.status = 'DONE'
+                task.processed_at = datetime.utcnow()
+                task.last_error = None
+                db.session.commit()
+                done += 1
+            except Exception as e:
+                db.session.rollback()
+                self._failed(task, e)
+                db.session.commit()
+                failed += 1
+                continue
+            # FCM gửi sau commit; lỗi FCM không làm tạo lại thông báo
+            if push and push[0]:
+                user_ids, title, message, data = push
+                send_fcm_notification_to_multiple(user_ids, title, message, data=data)
+        if tasks:
+            logger.info(f"Payment notifications batch: {done} done, {failed} failed")
+        return done, failed
+
+    def drain(self, max_batches=None):
+        total_done = total_failed = batches = 0
+        while max_batches is None or batches < max_batches:
+            done, failed = self.run_batch()
+            if not done and not failed:
+                break
+            total_done += done
+            total_failed += failed
+            batches += 1
+        return total_done, total_failed
+
+
+def start_payment_worker(app):
+    worker = OutboxWorker(
+        app,
+        interval=app.config.get('PAYMENT_WORKER_INTERVAL', 2.0),
+        sender_factory=PaymentNotifier.from_config,
+        name='payment-notifications'
+    )
+    worker.start()
+    app.extensions['payment_worker'] = worker
+    return worker
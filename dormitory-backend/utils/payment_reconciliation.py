@@ -0,0 +1,338 @@
+# utils/payment_reconciliation.py
+"""Đối soát giao dịch thanh toán với trạng thái hóa đơn.
+
+Một lần chạy gồm:
+
+1. Hỏi cổng thanh toán trạng thái của các giao dịch PENDING quá ``stale_minutes``
+   (theo lô, thứ tự transaction_id). Kết quả cuối cùng (thành công/thất bại) được
+   ghi như một callback qua ``process_vnpay_callback`` nên vẫn có event log,
+   idempotent và thông báo cho sinh viên.
+2. Hủy hàng loạt (một câu UPDATE) các giao dịch PENDING còn lại quá hạn và đưa
+   hóa đơn FAILED không còn giao dịch đang chờ về PENDING để sinh viên trả lại.
+3. Duyệt toàn bộ giao dịch theo lô (keyset trên transaction_id, chỉ đọc cột cần
+   thiết) và đánh dấu các chỗ lệch với ``MonthlyBill.payment_status``.
+
+Cổng ``stub`` trả lời từ một file JSON để chạy thử offline.
+"""
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import requests
+from sqlalchemy import and_, exists, func, select, update
+
+from extensions import db
+from models.monthly_bill import MonthlyBill
+from models.payment_transaction import PaymentTransaction
+from utils.payment_events import VNPAY_SUCCESS_CODE, process_vnpay_callback
+from utils.vnpay import VnpaySigner
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STALE_MINUTES = 30
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_QUERY_URL = 'https://sandbox.vnpayment.vn/merchant_webapi/api/transaction'
+MAX_REPORTED_MISMATCHES = 200
+
+# vnp_TransactionStatus của querydr
+VNPAY_TXN_SUCCESS = '00'
+VNPAY_TXN_PENDING = '01'
+VNPAY_QUERY_NOT_FOUND = '91'
+
+
+class StubGateway:
+    """Cổng giả để chạy offline: ``answers`` map transaction_id -> trạng thái.
+
+    Mỗi giá trị là ``"SUCCESS"``/``"FAILED"``/``"PENDING"`` hoặc dict
+    ``{"status": ..., "amount": ..., "reference": ...}``; giao dịch không có trong
+    ``answers`` nhận trạng thái ``default``.
+    """
+
+    def __init__(self, answers=None, default='PENDING'):
+        self.answers = {str(key): value for key, value in (answers or {}).items()}
+        self.default = default
+
+    @classmethod
+    def from_file(cls, path, default='PENDING'):
+        if not path:
+            return cls(default=default)
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f), default=default)
+
+    def query(self, transaction):
+        answer = self.answers.get(str(transaction.transaction_id), self.default)
+        if isinstance(answer, str):
+            answer = {'status': answer}
+        status = answer.get('status', 'PENDING').upper()
+        if status not in ('SUCCESS', 'FAILED'):
+            return None
+        amount = Decimal(str(answer.get('amount', transaction.amount)))
+        return {
+            'vnp_TxnRef': str(transaction.transaction_id),
+            'vnp_Amount': str(int(amount * 100)),
+            'vnp_ResponseCode': VNPAY_SUCCESS_CODE if status == 'SUCCESS' else answer.get('response_code', '24'),
+            'vnp_TransactionNo': str(answer.get('reference', f"STUB{transaction.transaction_id}")),
+            'vnp_Message': 'Stub gateway'
+        }
+
+
+class VnpayQueryGateway:
+    """Hỏi trạng thái giao dịch bằng API querydr của VNPay."""
+
+    def __init__(self, signer, query_url=DEFAULT_QUERY_URL, ip_addr='127.0.0.1', timeout=15):
+        self.signer = signer
+        self.query_url = query_url or DEFAULT_QUERY_URL
+        self.ip_addr = ip_addr
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(VnpaySigner.from_config(config), query_url=config.get('VNPAY_QUERY_URL'))
+
+    def query(self, transaction):
+        now = datetime.now()
+        body = {
+            'vnp_RequestId': uuid.uuid4().hex,
+            'vnp_Version': '2.1.0',
+            'vnp_Command': 'querydr',
+            'vnp_TmnCode': self.signer.tmn_code,
+            'vnp_TxnRef': str(transaction.transaction_id),
+            'vnp_OrderInfo': f'Query transaction {transaction.transaction_id}',
+            # vnp_CreateDate lúc tạo URL thanh toán ~ created_at của giao dịch
+            'vnp_TransactionDate': (transaction.created_at or now).strftime('%Y%m%d%H%M%S'),
+            'vnp_CreateDate': now.strftime('%Y%m%d%H%M%S'),
+            'vnp_IpAddr': self.ip_addr,
+        }
+        body['vnp_SecureHash'] = self.signer.sign('|'.join(body[key] for key in (
+            'vnp_RequestId', 'vnp_Version', 'vnp_Command', 'vnp_TmnCode', 'vnp_TxnRef',
+            'vnp_TransactionDate', 'vnp_CreateDate', 'vnp_IpAddr', 'vnp_OrderInfo'
+        )))
+        result = self.session.post(self.query_url, json=body, timeout=self.timeout).json()
+
+        expected = self.signer.sign('|'.join(str(result.get(key) or '') for key in (
+            'vnp_ResponseId', 'vnp_Command', 'vnp_ResponseCode', 'vnp_Message', 'vnp_TmnCode',
+            'vnp_TxnRef', 'vnp_Amount', 'vnp_BankCode', 'vnp_PayDate', 'vnp_TransactionNo',
+            'vnp_TransactionType', 'vnp_TransactionStatus', 'vnp_OrderInfo', 'vnp_PromotionCode',
+            'vnp_PromotionAmount'
+        )))
+        if (result.get('vnp_SecureHash') or '').lower() != expected:
+            raise ValueError(f"VNPay querydr signature mismatch for transaction {transaction.transaction_id}")
+
+        response_code = result.get('vnp_ResponseCode')
+        if response_code == VNPAY_QUERY_NOT_FOUND:
+            return None
+        if response_code != '00':
+            raise ValueError(f"VNPay querydr error {response_code}: {result.get('vnp_Message')}")
+        status = result.get('vnp_TransactionStatus')
+        if status == VNPAY_TXN_PENDING:
+            return None
+        return {
+            'vnp_TxnRef': result.get('vnp_TxnRef'),
+            'vnp_Amount': result.get('vnp_Amount'),
+            'vnp_ResponseCode': VNPAY_SUCCESS_CODE if status == VNPAY_TXN_SUCCESS else status,
+            'vnp_TransactionNo': result.get('vnp_TransactionNo'),
+            'vnp_TransactionStatus': status,
+            'vnp_Message': result.get('vnp_Message')
+        }
+
+
+def create_payment_gateway(config):
+    """``PAYMENT_QUERY_GATEWAY``: ``vnpay``, ``stub`` hoặc ``none`` (không hỏi cổng).
+
+    Mặc định là ``vnpay`` nếu đã cấu hình VNPay, ngược lại ``none``.
+    """
+    kind = config.get('PAYMENT_QUERY_GATEWAY')
+    if not kind:
+        kind = 'vnpay' if config.get('VNPAY_TMN_CODE') and config.get('VNPAY_HASH_SECRET') else 'none'
+    kind = kind.lower()
+    if kind == 'none':
+        return None
+    if kind == 'stub':
+        return StubGateway.from_file(config.get('PAYMENT_STUB_GATEWAY_FILE'))
+    if kind == 'vnpay':
+        return VnpayQueryGateway.from_config(config)
+    raise ValueError(f"Unknown PAYMENT_QUERY_GATEWAY: {kind}")
+
+
+class ReconciliationReport:
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.started_at = datetime.utcnow()
+        self.finished_at = None
+        self.scanned = 0
+        self.queried = 0
+        self.query_errors = 0
+        self.recovered = {}
+        self.expired = 0
+        self.bills_reopened = 0
+        self.repaired = 0
+        self.mismatch_counts = {}
+        self.mismatches = []
+
+    def flag(self, kind, **details):
+        self.mismatch_counts[kind] = self.mismatch_counts.get(kind, 0) + 1
+        if len(self.mismatches) < MAX_REPORTED_MISMATCHES:
+            self.mismatches.append({'kind': kind, **details})
+
+    def to_dict(self):
+        return {
+            'dry_run': self.dry_run,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'scanned': self.scanned,
+            'queried': self.queried,
+            'query_errors': self.query_errors,
+            'recovered': self.recovered,
+            'expired': self.expired,
+            'bills_reopened': self.bills_reopened,
+            'repaired': self.repaired,
+            'mismatch_counts': self.mismatch_counts,
+            'mismatches': self.mismatches
+        }
+
+
+class PaymentReconciler:
+    def __init__(self, gateway=None, stale_minutes=DEFAULT_STALE_MINUTES, batch_size=DEFAULT_BATCH_SIZE):
+        self.gateway = gateway
+        self.stale_minutes = stale_minutes
+        self.batch_size = batch_size
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        kwargs.setdefault('gateway', create_payment_gateway(config))
+        kwargs.setdefault('stale_minutes', config.get('PAYMENT_PENDING_EXPIRE_MINUTES', DEFAULT_STALE_MINUTES))
+        kwargs.setdefault('batch_size', config.get('PAYMENT_RECONCILE_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+        return cls(**kwargs)
+
+    def _batches(self, stmt, key):
+        """Đọc ``stmt`` theo lô ``batch_size`` dòng, keyset trên cột ``key`` tăng dần."""
+        last = None
+        while True:
+            batch_stmt = stmt.order_by(key).limit(self.batch_size)
+            if last is not None:
+                batch_stmt = batch_stmt.where(key > last)
+            rows = db.session.execute(batch_stmt).all()
+            if not rows:
+                return
+            yield rows
+            last = getattr(rows[-1], key.key)
+
+    def _stale_filter(self, cutoff):
+        return and_(PaymentTransaction.status == 'PENDING', PaymentTransaction.created_at < cutoff)
+
+    def query_stale(self, cutoff, report):
+        """Hỏi cổng các giao dịch PENDING quá hạn; kết quả cuối cùng được ghi như callback."""
+        stmt = select(
+            PaymentTransaction.transaction_id, PaymentTransaction.amount, PaymentTransaction.created_at
+        ).where(self._stale_filter(cutoff))
+        for rows in self._batches(stmt, PaymentTransaction.transaction_id):
+            db.session.commit()  # không giữ transaction đọc trong lúc gọi cổng
+            for row in rows:
+                report.queried += 1
+                try:
+                    params = self.gateway.query(row)
+                except Exception as e:
+                    report.query_errors += 1
+                    logger.warning(f"Payment status query failed for transaction {row.transaction_id}: {str(e)}")
+                    continue
+                if params is None or report.dry_run:
+                    continue
+                result = process_vnpay_callback(params)
+                report.recovered[result.outcome] = report.recovered.get(result.outcome, 0) + 1
+
+    def expire_stale(self, cutoff, report):
+        """Hủy hàng loạt giao dịch PENDING quá hạn và mở lại hóa đơn FAILED không còn giao dịch chờ."""
+        if report.dry_run:
+            report.expired = db.session.execute(
+                select(func.count()).select_from(PaymentTransaction).where(self._stale_filter(cutoff))
+            ).scalar()
+            return
+        report.expired = db.session.execute(
+            update(PaymentTransaction).where(self._stale_filter(cutoff)).values(
+                status='CANCELLED', error_message='Hết hạn thanh toán (đối soát)'
+            ).execution_options(synchronize_session=False)
+        ).rowcount
+        recent = datetime.utcnow() - timedelta(minutes=self.stale_minutes)
+        report.bills_reopened = db.session.execute(
+            update(MonthlyBill).where(
+                MonthlyBill.payment_status == 'FAILED',
+                ~exists().where(
+                    PaymentTransaction.bill_id == MonthlyBill.bill_id,
+                    (PaymentTransaction.status == 'PENDING') | (PaymentTransaction.processed_at >= recent)
+                )
+            ).values(payment_status='PENDING').execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+
+    def scan(self, report):
+        """Duyệt mọi giao dịch theo lô và đánh dấu chỗ lệch với hóa đơn."""
+        stmt = select(
+            PaymentTransaction.transaction_id, PaymentTransaction.bill_id, PaymentTransaction.status,
+            PaymentTransaction.amount, PaymentTransaction.gateway_reference, PaymentTransaction.processed_at,
+            MonthlyBill.payment_status, MonthlyBill.total_amount, MonthlyBill.transaction_reference
+        ).join(MonthlyBill, MonthlyBill.bill_id == PaymentTransaction.bill_id)
+        for rows in self._batches(stmt, PaymentTransaction.transaction_id):
+            unpaid = []
+            for row in rows:
+                report.scanned += 1
+                details = {'transaction_id': row.transaction_id, 'bill_id': row.bill_id,
+                           'transaction_status': row.status, 'bill_status': row.payment_status}
+                if row.status == 'SUCCESS':
+                    if row.payment_status != 'PAID':
+                        report.flag('SUCCESS_BILL_UNPAID', **details)
+                        unpaid.append(row)
+                    if Decimal(str(row.amount)) != Decimal(str(row.total_amount)):
+                        report.flag('AMOUNT_DIFFERS', amount=str(row.amount), total_amount=str(row.total_amount), **details)
+                elif row.status == 'PENDING' and row.payment_status == 'PAID':
+                    report.flag('PENDING_ON_PAID_BILL', **details)
+                elif (row.payment_status == 'PAID' and row.gateway_reference
+                        and row.transaction_reference == row.gateway_reference):
+                    report.flag('PAID_BY_UNSUCCESSFUL_TRANSACTION', **details)
+            if unpaid and not report.dry_run:
+                self.repair_unpaid(unpaid, report)
+            db.session.commit()
+
+        duplicates = db.session.execute(
+            select(PaymentTransaction.bill_id, func.count().label('successes')).where(
+                PaymentTransaction.status == 'SUCCESS'
+            ).group_by(PaymentTransaction.bill_id).having(func.count() > 1)
+        ).all()
+        for row in duplicates:
+            report.flag('MULTIPLE_SUCCESS', bill_id=row.bill_id, successes=row.successes)
+
+    def repair_unpaid(self, rows, report):
+        """Giao dịch đã SUCCESS nhưng hóa đơn chưa PAID: đánh dấu hóa đơn đã thanh toán."""
+        for row in rows:
+            report.repaired += db.session.execute(
+                update(MonthlyBill).where(
+                    MonthlyBill.bill_id == row.bill_id,
+                    MonthlyBill.payment_status != 'PAID'
+                ).values(
+                    payment_status='PAID',
+                    paid_at=row.processed_at or datetime.utcnow(),
+                    transaction_reference=row.gateway_reference
+                ).execution_options(synchronize_session=False)
+            ).rowcount
+
+    def run(self, dry_run=False):
+        report = ReconciliationReport(dry_run=dry_run)
+        # created_at dùng CURRENT_TIMESTAMP của database (giờ địa phương)
+        cutoff = datetime.now() - timedelta(minutes=self.stale_minutes)
+        try:
+            if self.gateway is not None:
+                self.query_stale(cutoff, report)
+            self.expire_stale(cutoff, report)
+            self.scan(report)
+        except Exception:
+            db.session.rollback()
+            raise
+        report.finished_at = datetime.utcnow()
+        log = logger.warning if report.mismatch_counts else logger.info
+        log(f"Payment reconciliation{' (dry run)' if dry_run else ''}: scanned {report.scanned}, "
+            f"queried {report.queried} ({report.query_errors} errors), recovered {report.recovered}, "
+            f"expired {report.expired}, reopened {report.bills_reopened} bills, repaired {report.repaired}, "
+            f"mismatches {report.mismatch_counts}")
+        return report
@@ -0,0 +1,216 @@
+# utils/purge.py
+"""Engine xóa vĩnh viễn các bản ghi đã soft delete quá thời gian lưu giữ.
+
+Mỗi bảng (target) được xử lý theo từng lô id tăng dần: chọn tối đa ``batch_size``
+id đã hết hạn, xóa bằng một câu DELETE theo khoảng id, commit cùng checkpoint rồi
+xóa file liên quan song song trong thread pool. Document tìm kiếm
+(``search_documents``) của các dòng bị xóa được xóa trong cùng transaction. Nếu job bị dừng giữa chừng, lần
+chạy sau tiếp tục từ ``PurgeCheckpoint.last_id``.
+"""
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models.purge_checkpoint import PurgeCheckpoint
+from utils.search import delete_documents
+from utils.storage import get_storage, storage_key, trash_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_RETENTION_DAYS = 30
+
+
+def live_and_trash_keys(namespace):
+    """Trả về hàm lấy key gốc và key trong trash từ cột đường dẫn file."""
+    def keys(row):
+        if not row[1]:
+            return []
+        key = storage_key(namespace, row[1])
+        return [key, trash_key(key)]
+    return keys
+
+
+class PurgeTarget:
+    """Một bảng cần dọn: model, cột chứa đường dẫn file (nếu có), cách tính key và loại document tìm kiếm."""
+
+    def __init__(self, name, model, file_columns=(), file_keys=None, search_entity=None):
+        self.name = name
+        self.model = model
+        self.pk = model.__mapper__.primary_key[0]
+        self.file_columns = tuple(file_columns)
+        self.file_keys = file_keys
+        self.search_entity = search_entity
+
+    def expired(self, threshold):
+        return and_(self.model.is_deleted == True, self.model.deleted_at <= threshold)
+
+
+def default_targets():
+    """Thứ tự quan trọng: ảnh trước phòng vì roomimage tham chiếu rooms."""
+    from models.reportimage import ReportImage
+    from models.roomimage import RoomImage
+    from models.register import Register
+    from models.contract import Contract
+    from models.room import Room
+
+    return [
+        PurgeTarget('report_images', ReportImage, (ReportImage.image_url,), live_and_trash_keys('report_images')),
+        PurgeTarget('room_images', RoomImage, (RoomImage.image_url,), live_and_trash_keys('roomimage')),
+        PurgeTarget('registrations', Register, search_entity='registration'),
+        PurgeTarget('contracts', Contract),
+        PurgeTarget('rooms', Room, search_entity='room'),
+    ]
+
+
+class PurgeEngine:
+    def __init__(self, targets=None, batch_size=DEFAULT_BATCH_SIZE, max_workers=DEFAULT_MAX_WORKERS,
+                 retention_days=DEFAULT_RETENTION_DAYS, storage=None):
+        self.targets = targets if targets is not None else default_targets()
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.retention_days = retention_days
+        self.storage = storage
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        return cls(
+            batch_size=config.get('PURGE_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+            max_workers=config.get('PURGE_MAX_WORKERS', DEFAULT_MAX_WORKERS),
+            retention_days=config.get('PURGE_RETENTION_DAYS', DEFAULT_RETENTION_DAYS),
+            **kwargs
+        )
+
+    def run(self, names=None):
+        """Chạy purge cho các target (tất cả nếu names là None), trả về list metrics."""
+        if self.storage is None:
+            self.storage = get_storage()
+        threshold = datetime.utcnow() - timedelta(days=self.retention_days)
+        results = []
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='purge') as pool:
+            for target in self.targets:
+                if names and target.name not in names:
+                    continue
+                try:
+                    results.append(self.purge_target(target, threshold, pool))
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Purge failed for {target.name}: {str(e)}", exc_info=True)
+                    results.append({'target': target.name, 'error': str(e)})
+        return results
+
+    def _checkpoint(self, target):
+        checkpoint = PurgeCheckpoint.query.get(target.name)
+        if checkpoint is None:
+            checkpoint = PurgeCheckpoint(target=target.name, last_id=0, rows_deleted=0, files_deleted=0)
+            db.session.add(checkpoint)
+        if not checkpoint.last_id:
+            checkpoint.started_at = datetime.utcnow()
+            checkpoint.rows_deleted = 0
+            checkpoint.files_deleted = 0
+        db.session.commit()
+        return checkpoint
+
+    def purge_target(self, target, threshold, pool):
+        started = time.monotonic()
+        checkpoint = self._checkpoint(target)
+        metrics = {
+            'target': target.name,
+            'resumed_from': checkpoint.last_id,
+            'batches': 0,
+            'rows_deleted': 0,
+            'rows_skipped': 0,
+            'files_deleted': 0,
+            'file_errors': 0,
+        }
+
+        while True:
+            rows = db.session.query(target.pk, *target.file_columns).filter(
+                target.expired(threshold),
+                target.pk > checkpoint.last_id
+            ).order_by(target.pk).limit(self.batch_size).all()
+            if not rows:
+                # Hết dữ liệu: reset checkpoint để lần sau quét lại từ đầu (kể cả các dòng bị bỏ qua)
+                checkpoint.last_id = 0
+                db.session.commit()
+                break
+
+            ids = [row[0] for row in rows]
+            deleted_ids = self._delete_batch(target, ids, threshold)
+            if target.search_entity and deleted_ids:
+                delete_documents(db.session.connection(), target.search_entity, sorted(deleted_ids))
+            metrics['batches'] += 1
+            metrics['rows_deleted'] += len(deleted_ids)
+            metrics['rows_skipped'] += len(ids) - len(deleted_ids)
+
+            checkpoint.last_id = ids[-1]
+            checkpoint.rows_deleted += len(deleted_ids)
+            db.session.commit()
+
+            if target.file_keys and deleted_ids:
+                keys = [key for row in rows if row[0] in deleted_ids for key in target.file_keys(row)]
+                deleted, errors = self._delete_files(keys, pool)
+                metrics['files_deleted'] += deleted
+                metrics['file_errors'] += errors
+                checkpoint.files_deleted += deleted
+                db.session.commit()
+
+        metrics['duration_seconds'] = round(time.monotonic() - started, 3)
+        logger.info("purge_metrics %s", json.dumps(metrics))
+        return metrics
+
+    def _delete_batch(self, target, ids, threshold):
+        """DELETE theo khoảng id; nếu vướng khóa ngoại thì xóa từng dòng và bỏ qua dòng lỗi.
+
+        Mọi câu DELETE đều giữ điều kiện hết hạn: dòng được khôi phục sau khi SELECT không bị xóa.
+        Trả về tập id thực sự đã xóa.
+        """
+        table = target.model.__table__
+        try:
+            result = db.session.execute(
+                table.delete().where(target.pk.between(ids[0], ids[-1]), target.expired(threshold))
+            )
+            if result.rowcount == len(ids):
+                return set(ids)
+            remaining = {row[0] for row in db.session.query(target.pk).filter(target.pk.in_(ids))}
+            return set(ids) - remaining
+        except IntegrityError:
+            db.session.rollback()
+            logger.warning(f"Bulk delete on {target.name} hit a constraint, falling back to per-row delete")
+
+        deleted_ids = set()
+        for row_id in ids:
+            try:
+                with db.session.begin_nested():
+                    result = db.session.execute(
+                        table.delete().where(target.pk == row_id, target.expired(threshold))
+                    )
+                if result.rowcount:
+                    deleted_ids.add(row_id)
+            except IntegrityError as e:
+                logger.warning(f"Skip {target.name} id={row_id}: {str(e.orig)}")
+        return deleted_ids
+
+    def _delete_files(self, keys, pool):
+        deleted = 0
+        errors = 0
+        for result in pool.map(self._delete_key, keys):
+            if result is None:
+                errors += 1
+            elif result:
+                deleted += 1
+        return deleted, errors
+
+    def _delete_key(self, key):
+        try:
+            return self.storage.delete(key)
+        except Exception as e:
+            logger.error(f"Error deleting file {key}: {str(e)}")
+            return None
@@ -0,0 +1,139 @@
+# utils/push_outbox.py
+"""Gửi FCM bất đồng bộ cho thông báo đã lưu.
+
+Code tạo thông báo chỉ ghi một dòng ``push_outbox`` (thường bằng một câu
+``INSERT ... SELECT`` cho cả lô thông báo) trong cùng transaction; worker nền
+(``run_push_worker.py``) gửi FCM tới các recipient của thông báo, có retry với
+backoff như email outbox.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import exists, insert, literal, select
+
+from extensions import db
+from models.notification import Notification
+from models.notification_recipient import NotificationRecipient
+from models.push_task import PushTask
+from utils.email_outbox import OutboxWorker, backoff_delay
+from utils.fcm import send_fcm_notification_to_multiple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_MAX_ATTEMPTS = 6
+DEFAULT_BASE_DELAY = 10
+PROCESSING_LEASE = 5 * 60
+
+
+def enqueue_pushes(notification_filter, now=None):
+    """Xếp hàng gửi FCM cho mọi thông báo thỏa ``notification_filter`` bằng một câu INSERT ... SELECT. Không commit."""
+    now = now or datetime.utcnow()
+    return db.session.execute(
+        insert(PushTask).from_select(
+            ['notification_id', 'status', 'attempts', 'next_attempt_at', 'created_at'],
+            select(Notification.id, literal('PENDING'), literal(0), literal(now), literal(now)).where(
+                notification_filter,
+                ~exists().where(PushTask.notification_id == Notification.id)
+            )
+        )
+    ).rowcount
+
+
+class PushSender:
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            batch_size=config.get('PUSH_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+            max_attempts=config.get('PUSH_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS),
+            base_delay=config.get('PUSH_BASE_DELAY', DEFAULT_BASE_DELAY)
+        )
+
+    def _claim(self):
+        now = datetime.utcnow()
+        tasks = PushTask.query.filter(
+            PushTask.status.in_(['PENDING', 'PROCESSING']),
+            PushTask.next_attempt_at <= now
+        ).order_by(PushTask.id).limit(self.batch_size).with_for_update(skip_locked=True).all()
+        for task in tasks:
+            task.status = 'PROCESSING'
+            task.next_attempt_at = now + timedelta(seconds=PROCESSING_LEASE)
+        db.session.commit()
+        return tasks
+
+    def process(self, task):
+        notification = db.session.get(Notification, task.notification_id)
+        if notification is None or notification.is_deleted:
+            return
+        user_ids = db.session.execute(
+            select(NotificationRecipient.user_id).where(
+                NotificationRecipient.notification_id == notification.id,
+                NotificationRecipient.is_deleted == False
+            )
+        ).scalars().all()
+        if not user_ids:
+            return
+        data = {
+            'notification_id': str(notification.id),
+            'related_entity_type': notification.related_entity_type or '',
+            'related_entity_id': str(notification.related_entity_id or '')
+        }
+        send_fcm_notification_to_multiple(user_ids, notification.title, notification.message, data=data)
+
+    def _failed(self, task, error):
+        task.attempts += 1
+        task.last_error = str(error)[:2000]
+        if task.attempts >= self.max_attempts:
+            task.status = 'FAILED'
+            logger.error(f"Push task {task.id} failed after {task.attempts} attempts: {error}")
+        else:
+            task.status = 'PENDING'
+            task.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff_delay(task.attempts, self.base_delay))
+
+    def run_batch(self):
+        """Gửi một lô, trả về (số thành công, số lỗi)."""
+        tasks = self._claim()
+        done = failed = 0
+        for task in tasks:
+            try:
+                self.process(task)
+                task.status = 'DONE'
+                task.processed_at = datetime.utcnow()
+                task.last_error = None
+                done += 1
+            except Exception as e:
+                db.session.rollback()
+                self._failed(task, e)
+                failed += 1
+            db.session.commit()
+        if tasks:
+            logger.info(f"Push batch: {done} done, {failed} failed")
+        return done, failed
+
+    def drain(self, max_batches=None):
+        total_done = total_failed = batches = 0
+        while max_batches is None or batches < max_batches:
+            done, failed = self.run_batch()
+            if not done and not failed:
+                break
+            total_done += done
+            total_failed += failed
+            batches += 1
+        return total_done, total_failed
+
+
+def start_push_worker(app):
+    worker = OutboxWorker(
+        app,
+        interval=app.config.get('PUSH_WORKER_INTERVAL', 5.0),
+        sender_factory=PushSender.from_config,
+        name='push-outbox'
+    )
+    worker.start()
+    app.extensions['push_worker'] = worker
+    return worker
@@ -0,0 +1,112 @@
+# utils/room_reminders.py
+"""Thông báo nhắc nhở gửi theo phòng, tạo theo tập hợp.
+
+Với một tập phòng (subquery ``room_id``), ``notify_rooms`` tạo thông báo cho mọi
+phòng còn người ở bằng một câu ``INSERT ... SELECT``, thêm recipient (người có
+hợp đồng ACTIVE) bằng câu thứ hai, ghi document tìm kiếm (``INSERT ... SELECT``
+không đi qua ``after_flush`` của utils/search) và xếp hàng push FCM. Số câu lệnh
+không phụ thuộc số phòng.
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy import and_, exists, func, insert, literal, null, select, String
+
+from extensions import db
+from models.area import Area
+from models.contract import Contract
+from models.notification import Notification
+from models.notification_recipient import NotificationRecipient
+from models.room import Room
+from utils.push_outbox import enqueue_pushes
+from utils.search import index_where
+
+logger = logging.getLogger(__name__)
+
+
+def _has_active_contract():
+    return exists().where(
+        Contract.room_id == Room.room_id,
+        Contract.status == 'ACTIVE',
+        Contract.is_deleted == False
+    )
+
+
+def notify_rooms(room_ids, title, message_suffix, related_entity_type, skip_notified_since=None, push=True):
+    """Tạo thông báo "Phòng <tên> - Khu <khu> <message_suffix>" cho các phòng ``room_ids``. Không commit.
+
+    ``room_ids`` là một select trả về room_id. Phòng đã bị xóa hoặc không có hợp
+    đồng ACTIVE được bỏ qua; ``skip_notified_since`` bỏ qua phòng đã nhận thông
+    báo cùng tiêu đề từ thời điểm đó. Trả về danh sách phòng đã được thông báo.
+    """
+    # Lô này: id lớn hơn id cuối trước khi INSERT, cùng tiêu đề và created_at
+    # (DATETIME không lưu phần micro giây)
+    now = datetime.utcnow().replace(microsecond=0)
+    last_id = db.session.execute(select(func.max(Notification.id))).scalar() or 0
+    conditions = [
+        Room.room_id.in_(room_ids),
+        Room.is_deleted == False,
+        _has_active_contract()
+    ]
+    if skip_notified_since is not None:
+        conditions.append(~exists().where(
+            Notification.target_type == 'ROOM',
+            Notification.target_id == Room.room_id,
+            Notification.title == title,
+            Notification.created_at >= skip_notified_since,
+            Notification.is_deleted == False
+        ))
+    message = (
+        literal('Phòng ', String) + Room.name + ' - Khu '
+        + func.coalesce(Area.name, 'Không xác định') + ' ' + message_suffix
+    )
+    db.session.execute(insert(Notification).from_select(
+        ['title', 'message', 'target_type', 'target_id', 'related_entity_type', 'related_entity_id', 'created_at', 'is_deleted'],
+        select(
+            literal(title), message, literal('ROOM'), Room.room_id, literal(related_entity_type),
+            null(), literal(now), literal(False)
+        ).select_from(Room).outerjoin(Area, Area.area_id == Room.area_id).where(*conditions)
+    ))
+
+    batch = and_(
+        Notification.id > last_id,
+        Notification.target_type == 'ROOM',
+        Notification.title == title,
+        Notification.related_entity_type == related_entity_type,
+        Notification.created_at == now
+    )
+    db.session.execute(insert(NotificationRecipient).from_select(
+        ['notification_id', 'user_id', 'is_read', 'is_deleted'],
+        select(Notification.id, Contract.user_id, literal(False), literal(False)).join(
+            Contract, and_(
+                Contract.room_id == Notification.target_id,
+                Contract.status == 'ACTIVE',
+                Contract.is_deleted == False
+            )
+        ).where(batch, ~exists().where(NotificationRecipient.notification_id == Notification.id))
+    ))
+    index_where('notification', batch)
+    if push:
+        enqueue_pushes(batch, now=now)
+
+    rows = db.session.execute(
+        select(
+            Notification.id, Notification.target_id, Room.name, Area.name.label('area_name'),
+            NotificationRecipient.user_id
+        ).join(Room, Room.room_id == Notification.target_id)
+        .outerjoin(Area, Area.area_id == Room.area_id)
+        .join(NotificationRecipient, NotificationRecipient.notification_id == Notification.id)
+        .where(batch).order_by(Notification.target_id, NotificationRecipient.user_id)
+    ).all()
+    notified = {}
+    for row in rows:
+        room = notified.setdefault(row.target_id, {
+            'room_id': row.target_id,
+            'room_name': row.name,
+            'area_name': row.area_name or 'Không xác định',
+            'notification_id': row.id,
+            'notified_users': []
+        })
+        room['notified_users'].append(row.user_id)
+    logger.info(f"Created '{title}' notifications for {len(notified)} rooms")
+    return list(notified.values())
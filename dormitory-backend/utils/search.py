@@ -0,0 +1,434 @@
+# utils/search.py
+"""Tìm kiếm không dấu cho người dùng, phòng, thông báo và đăng ký.
+
+Mỗi bản ghi được chuẩn hóa (``unidecode`` + chữ thường + tách token) và lưu vào
+bảng ``search_documents`` ngay trong transaction ghi bản ghi đó (event
+``after_flush``). Có hai backend:
+
+- ``fulltext``: MySQL FULLTEXT ``MATCH ... AGAINST`` (BOOLEAN MODE) trên bảng
+  ``search_documents``, dùng index thay cho ``ilike('%...%')``.
+- ``memory``: inverted index trong process (SQLite, môi trường dev), đồng bộ
+  tăng dần từ ``search_documents`` theo ``updated_at``.
+
+Mỗi token được lưu với tiền tố ``TERM_PREFIX`` để token ngắn ("an", "le") và
+stopword của MySQL vẫn được index. Kết quả được xếp hạng (khớp ở tiêu đề/họ tên
+cao hơn, khớp nguyên từ cao hơn khớp tiền tố) và hỗ trợ phân trang keyset qua
+cursor ``[score, id]``.
+"""
+import bisect
+import logging
+import re
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import Float, and_, event, inspect, or_, select, type_coerce
+from unidecode import unidecode
+
+from extensions import db
+from models.search_document import SearchDocument
+from utils.pagination import decode_cursor, encode_cursor, page_count
+
+logger = logging.getLogger(__name__)
+
+TERM_PREFIX = 'ft'
+MAX_QUERY_TERMS = 8
+IN_CHUNK_SIZE = 500
+ENTITY_TYPES = ('user', 'room', 'notification', 'registration')
+REFRESH_OVERLAP = timedelta(seconds=5)  # bù lệch đồng hồ giữa các process khi đồng bộ index
+
+
+def normalize_terms(text):
+    """'Nguyễn Văn Đức' -> ['nguyen', 'van', 'duc']."""
+    if not text:
+        return []
+    return re.findall(r'[a-z0-9]+', unidecode(str(text)).lower())
+
+
+def index_terms(*values):
+    terms = []
+    seen = set()
+    for value in values:
+        for term in normalize_terms(value):
+            term = TERM_PREFIX + term
+            if term not in seen:
+                seen.add(term)
+                terms.append(term)
+    return terms
+
+
+def query_terms(text):
+    return index_terms(text)[:MAX_QUERY_TERMS]
+
+
+class SearchSpec:
+    """Một loại bản ghi được index: trường tiêu đề (xếp hạng cao hơn) và các trường phụ."""
+
+    def __init__(self, entity_type, model, title_field, fields=()):
+        self.entity_type = entity_type
+        self.model = model
+        self.pk = model.__mapper__.primary_key[0]
+        self.title_field = title_field
+        self.fields = tuple(fields)
+
+    def entity_id(self, obj):
+        return getattr(obj, self.pk.key)
+
+    def document(self, obj):
+        title = index_terms(getattr(obj, self.title_field))
+        content = index_terms(getattr(obj, self.title_field), *(getattr(obj, f) for f in self.fields))
+        return {
+            'entity_type': self.entity_type,
+            'entity_id': self.entity_id(obj),
+            'title': ' '.join(title)[:512],
+            'content': ' '.join(content),
+            'updated_at': datetime.utcnow()
+        }
+
+    def changed(self, obj):
+        state = inspect(obj)
+        return any(state.attrs[f].history.has_changes() for f in (self.title_field,) + self.fields)
+
+
+_specs = None
+
+
+def search_specs():
+    global _specs
+    if _specs is None:
+        from models.user import User
+        from models.room import Room
+        from models.notification import Notification
+        from models.register import Register
+
+        _specs = {spec.entity_type: spec for spec in (
+            SearchSpec('user', User, 'fullname', ('email', 'phone', 'class_name', 'student_code')),
+            SearchSpec('room', Room, 'name', ('description',)),
+            SearchSpec('notification', Notification, 'title', ('message',)),
+            SearchSpec('registration', Register, 'name_student', ('email', 'phone_number')),
+        )}
+    return _specs
+
+
+def _spec_for(obj):
+    for spec in search_specs().values():
+        if isinstance(obj, spec.model):
+            return spec
+    return None
+
+
+def write_documents(connection, docs):
+    """Thay thế document của các bản ghi (xóa rồi chèn lại, cùng transaction)."""
+    table = SearchDocument.__table__
+    by_type = defaultdict(list)
+    for doc in docs:
+        by_type[doc['entity_type']].append(doc['entity_id'])
+    for entity_type, ids in by_type.items():
+        connection.execute(table.delete().where(table.c.entity_type == entity_type, table.c.entity_id.in_(ids)))
+    if docs:
+        connection.execute(table.insert(), docs)
+
+
+def index_where(entity_type, condition):
+    """Ghi document cho các bản ghi ``entity_type`` thỏa ``condition`` bằng một query đọc và một lệnh ghi.
+
+    Dùng sau ``INSERT ... SELECT``/UPDATE theo tập hợp, vốn không đi qua ``after_flush``.
+    Không commit, trả về số document đã ghi.
+    """
+    spec = search_specs()[entity_type]
+    columns = [spec.pk] + [getattr(spec.model, field) for field in (spec.title_field,) + spec.fields]
+    rows = db.session.execute(select(*columns).where(condition)).all()
+    write_documents(db.session.connection(), [spec.document(row) for row in rows])
+    return len(rows)
+
+
+def delete_documents(connection, entity_type, ids):
+    table = SearchDocument.__table__
+    connection.execute(table.delete().where(table.c.entity_type == entity_type, table.c.entity_id.in_(ids)))
+
+
+def _after_flush(session, flush_context):
+    docs = []
+    deleted = defaultdict(list)
+    for obj in session.new:
+        spec = _spec_for(obj)
+        if spec:
+            docs.append(spec.document(obj))
+    for obj in session.dirty:
+        spec = _spec_for(obj)
+        if spec and spec.changed(obj):
+            docs.append(spec.document(obj))
+    for obj in session.deleted:
+        spec = _spec_for(obj)
+        if spec:
+            deleted[spec.entity_type].append(spec.entity_id(obj))
+    if not docs and not deleted:
+        return
+    connection = session.connection()
+    for entity_type, ids in deleted.items():
+        delete_documents(connection, entity_type, ids)
+    write_documents(connection, docs)
+
+
+def rebuild_index(entity_types=None, batch_size=1000):
+    """Dựng lại toàn bộ search_documents từ dữ liệu gốc, trả về số document theo loại."""
+    counts = {}
+    for entity_type, spec in search_specs().items():
+        if entity_types and entity_type not in entity_types:
+            continue
+        table = SearchDocument.__table__
+        db.session.execute(table.delete().where(table.c.entity_type == entity_type))
+        total = 0
+        last_id = None
+        while True:
+            query = spec.model.query.order_by(spec.pk)
+            if last_id is not None:
+                query = query.filter(spec.pk > last_id)
+            rows = query.limit(batch_size).all()
+            if not rows:
+                break
+            db.session.execute(table.insert(), [spec.document(row) for row in rows])
+            total += len(rows)
+            last_id = spec.entity_id(rows[-1])
+            db.session.expunge_all()
+        db.session.commit()
+        counts[entity_type] = total
+        logger.info(f"Rebuilt search index for {entity_type}: {total} documents")
+    return counts
+
+
+class SearchResult:
+    def __init__(self, items, total, limit, page=None, next_cursor=None):
+        self.items = items
+        self.total = total
+        self.limit = limit
+        self.page = page
+        self.next_cursor = next_cursor
+
+    @property
+    def pages(self):
+        return page_count(self.total, self.limit)
+
+
+def _parse_cursor(cursor):
+    values = decode_cursor(cursor)
+    if len(values) != 2:
+        raise ValueError('Cursor không hợp lệ')
+    return float(values[0]), int(values[1])
+
+
+class FulltextSearchBackend:
+    """MySQL FULLTEXT trên search_documents (title và content có index riêng)."""
+
+    name = 'fulltext'
+
+    def search(self, query, spec, text, limit, page=1, cursor=None):
+        from sqlalchemy.dialects.mysql import match
+
+        terms = query_terms(text)
+        if not terms:
+            return SearchResult([], 0, limit, page)
+        against = ' '.join(f'+{term}*' for term in terms)
+        content_match = match(SearchDocument.content, against=against).in_boolean_mode()
+        title_match = match(SearchDocument.title, against=against).in_boolean_mode()
+        score = type_coerce(title_match * 2 + content_match, Float)
+
+        matched = query.join(SearchDocument, and_(
+            SearchDocument.entity_type == spec.entity_type,
+            SearchDocument.entity_id == spec.pk
+        )).filter(content_match)
+        total = matched.order_by(None).count()
+
+        ranked = matched.add_columns(score.label('search_score')).order_by(score.desc(), spec.pk.desc())
+        if cursor:
+            last_score, last_id = _parse_cursor(cursor)
+            ranked = ranked.filter(or_(score < last_score, and_(score == last_score, spec.pk < last_id)))
+        else:
+            ranked = ranked.offset((page - 1) * limit)
+        rows = ranked.limit(limit + 1).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([float(rows[-1][1]), spec.entity_id(rows[-1][0])])
+        return SearchResult([row[0] for row in rows], total, limit, None if cursor else page, next_cursor)
+
+
+class InvertedIndex:
+    """Inverted index của một loại bản ghi: term -> tập id, kèm danh sách term đã sắp xếp để tra tiền tố."""
+
+    def __init__(self, entity_type):
+        self.entity_type = entity_type
+        self.postings = defaultdict(set)
+        self.docs = {}
+        self.vocabulary = []
+        self._vocabulary_dirty = False
+        self.synced_at = None
+        self.lock = threading.Lock()
+
+    def _remove(self, entity_id):
+        old = self.docs.pop(entity_id, None)
+        if old:
+            for term in old[1]:
+                ids = self.postings.get(term)
+                if ids is not None:
+                    ids.discard(entity_id)
+                    if not ids:
+                        del self.postings[term]
+                        self._vocabulary_dirty = True
+
+    def _add(self, entity_id, title, content):
+        self._remove(entity_id)
+        title_terms = frozenset(title.split())
+        content_terms = frozenset(content.split())
+        self.docs[entity_id] = (title_terms, content_terms)
+        for term in content_terms:
+            if term not in self.postings:
+                self._vocabulary_dirty = True
+            self.postings[term].add(entity_id)
+
+    def refresh(self):
+        """Nạp các document mới/đổi kể từ lần đồng bộ trước."""
+        query = db.session.query(
+            SearchDocument.entity_id, SearchDocument.title, SearchDocument.content, SearchDocument.updated_at
+        ).filter(SearchDocument.entity_type == self.entity_type)
+        if self.synced_at is not None:
+            query = query.filter(SearchDocument.updated_at >= self.synced_at - REFRESH_OVERLAP)
+        rows = query.all()
+        with self.lock:
+            for entity_id, title, content, updated_at in rows:
+                self._add(entity_id, title or '', content or '')
+                if self.synced_at is None or updated_at > self.synced_at:
+                    self.synced_at = updated_at
+            if self.synced_at is None:
+                self.synced_at = datetime.utcnow() - REFRESH_OVERLAP
+            if self._vocabulary_dirty:
+                self.vocabulary = sorted(self.postings)
+                self._vocabulary_dirty = False
+
+    def _expand(self, term):
+        start = bisect.bisect_left(self.vocabulary, term)
+        words = []
+        for word in self.vocabulary[start:]:
+            if not word.startswith(term):
+                break
+            words.append(word)
+        return words
+
+    def match(self, terms):
+        """Trả về {id: score}; mọi term phải khớp (tiền tố) với document."""
+        with self.lock:
+            scores = None
+            for term in terms:
+                term_scores = {}
+                for word in self._expand(term):
+                    exact = word == term
+                    for entity_id in self.postings[word]:
+                        title_terms = self.docs[entity_id][0]
+                        value = (2 if exact else 1) + (1 if word in title_terms else 0)
+                        if value > term_scores.get(entity_id, 0):
+                            term_scores[entity_id] = value
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {i: s + term_scores[i] for i, s in scores.items() if i in term_scores}
+                if not scores:
+                    return {}
+            return scores or {}
+
+
+class MemorySearchBackend:
+    """Inverted index trong process, dùng khi database không có FULLTEXT (SQLite)."""
+
+    name = 'memory'
+
+    def __init__(self):
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def index_for(self, entity_type):
+        with self.lock:
+            if entity_type not in self.indexes:
+                self.indexes[entity_type] = InvertedIndex(entity_type)
+            return self.indexes[entity_type]
+
+    def search(self, query, spec, text, limit, page=1, cursor=None):
+        terms = query_terms(text)
+        if not terms:
+            return SearchResult([], 0, limit, page)
+        index = self.index_for(spec.entity_type)
+        index.refresh()
+        scores = index.match(terms)
+
+        # Áp dụng các bộ lọc còn lại (is_deleted, status, ...) của query gốc
+        allowed = set()
+        candidate_ids = list(scores)
+        for start in range(0, len(candidate_ids), IN_CHUNK_SIZE):
+            chunk = candidate_ids[start:start + IN_CHUNK_SIZE]
+            allowed.update(row[0] for row in query.order_by(None).with_entities(spec.pk).filter(spec.pk.in_(chunk)))
+        ranked = sorted(((scores[i], i) for i in allowed), key=lambda item: (-item[0], -item[1]))
+
+        if cursor:
+            last_score, last_id = _parse_cursor(cursor)
+            ranked = [item for item in ranked if item[0] < last_score or (item[0] == last_score and item[1] < last_id)]
+            window = ranked[:limit + 1]
+        else:
+            window = ranked[(page - 1) * limit:page * limit + 1]
+
+        next_cursor = None
+        if len(window) > limit:
+            window = window[:limit]
+            next_cursor = encode_cursor([window[-1][0], window[-1][1]])
+        ids = [entity_id for _, entity_id in window]
+        by_id = {spec.entity_id(obj): obj for obj in query.filter(spec.pk.in_(ids)).all()} if ids else {}
+        items = [by_id[i] for i in ids if i in by_id]
+        return SearchResult(items, len(allowed), limit, None if cursor else page, next_cursor)
+
+
+def create_search_backend(config):
+    backend = (config.get('SEARCH_BACKEND') or 'auto').lower()
+    if backend == 'auto':
+        uri = config.get('SQLALCHEMY_DATABASE_URI') or ''
+        backend = 'fulltext' if uri.startswith('mysql') else 'memory'
+    if backend == 'fulltext':
+        return FulltextSearchBackend()
+    if backend == 'memory':
+        return MemorySearchBackend()
+    raise ValueError(f"Unsupported SEARCH_BACKEND: {backend}")
+
+
+def init_search(app):
+    """Tạo backend tìm kiếm và đăng ký event cập nhật search_documents khi flush."""
+    backend = create_search_backend(app.config)
+    app.extensions['search'] = backend
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+    logger.info("Search backend: %s", backend.name)
+    return backend
+
+
+def get_search():
+    backend = current_app.extensions.get('search')
+    if backend is None:
+        backend = init_search(current_app)
+    return backend
+
+
+def search(query, entity_type, text, limit, page=1, cursor=None):
+    """Tìm trong ``query`` (đã có các bộ lọc khác) theo ``text``, xếp hạng theo độ khớp.
+
+    Ném ValueError nếu cursor không hợp lệ.
+    """
+    spec = search_specs()[entity_type]
+    return get_search().search(query, spec, text, limit, page=page, cursor=cursor)
+
+
+def search_response(result):
+    """Các trường phân trang chung cho response JSON."""
+    return {
+        'total': result.total,
+        'pages': result.pages,
+        'current_page': result.page,
+        'next_cursor': result.next_cursor
+    }
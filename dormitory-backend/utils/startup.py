@@ -0,0 +1,43 @@
+# utils/startup.py
+"""Đo thời gian từng bước khởi tạo ứng dụng trong ``create_app``.
+
+Mỗi bước (cấu hình, extension, import model, import controller, ...) được bọc
+trong ``profile.phase(name)``; thời gian import module nằm trong bước import nó
+lần đầu. Kết quả lưu ở ``app.extensions['startup_profile']`` và được ghi log ở
+mức INFO khi ``STARTUP_PROFILE=true`` (DEBUG nếu không).
+Chi tiết theo từng module: ``python -X importtime`` (xem ``bench_startup.py``).
+"""
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, (time.perf_counter() - started) * 1000))
+
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def to_dict(self):
+        return {
+            'total_ms': round(self.total_ms, 1),
+            'phases': [{'name': name, 'ms': round(ms, 1)} for name, ms in self.phases]
+        }
+
+    def log(self, verbose=False):
+        summary = ', '.join(f"{name}={ms:.1f}ms" for name, ms in self.phases)
+        logger.log(logging.INFO if verbose else logging.DEBUG,
+                   "App created in %.1fms (%s)", self.total_ms, summary)
@@ -0,0 +1,381 @@
+# utils/storage.py
+"""Lớp trừu tượng lưu trữ file (ổ đĩa cục bộ hoặc S3/MinIO).
+
+Mọi file upload được định danh bằng một key dạng ``<namespace>/<đường dẫn>``,
+ví dụ ``roomimage/abc.jpg`` hoặc ``trash/roomimage/abc.jpg``. Controller và
+scheduler chỉ làm việc với key, không đụng tới đường dẫn trên đĩa.
+"""
+import hashlib
+import hmac
+import logging
+import mimetypes
+import os
+import shutil
+import time
+import uuid
+
+from flask import current_app, send_file, redirect, url_for
+from werkzeug.security import safe_join
+
+logger = logging.getLogger(__name__)
+
+# Namespace -> khóa cấu hình chứa thư mục gốc tương ứng (driver local)
+NAMESPACE_CONFIG_KEYS = {
+    'roomimage': 'ROOM_IMAGES_BASE',
+    'report_images': 'REPORT_IMAGES_FOLDER',
+    'notification_media': 'NOTIFICATION_MEDIA_BASE',
+    'avatars': 'AVATAR_UPLOAD_FOLDER',
+    'trash': 'TRASH_BASE',
+}
+
+COPY_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+class StorageError(Exception):
+    """Lỗi chung của tầng lưu trữ."""
+
+
+def storage_key(namespace, *parts):
+    """Ghép namespace và các thành phần thành một key."""
+    cleaned = [str(p).strip('/') for p in parts if p not in (None, '')]
+    return '/'.join([namespace] + cleaned)
+
+
+def trash_key(key):
+    """Key trong thùng rác tương ứng với một key đang dùng."""
+    return storage_key('trash', key)
+
+
+def avatar_key_from_url(avatar_url):
+    """Lấy key avatar từ avatar_url (URL công khai hoặc tên file)."""
+    if not avatar_url:
+        return None
+    return storage_key('avatars', os.path.basename(avatar_url.rstrip('/')))
+
+
+def guess_content_type(key):
+    content_type, _ = mimetypes.guess_type(key)
+    return content_type or 'application/octet-stream'
+
+
+class StorageBackend:
+    """Giao diện chung: put/get/stat/delete/move/presigned_url."""
+
+    def put(self, key, stream, content_type=None):
+        """Ghi dữ liệu từ stream vào key, trả về số byte đã ghi."""
+        raise NotImplementedError
+
+    def get(self, key):
+        """Trả về file-like object (binary) để đọc; FileNotFoundError nếu không tồn tại."""
+        raise NotImplementedError
+
+    def stat(self, key):
+        """Trả về dict {'size', 'modified', 'content_type'} hoặc None nếu không tồn tại."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Xóa key, trả về True nếu có file bị xóa."""
+        raise NotImplementedError
+
+    def move(self, src_key, dst_key):
+        """Di chuyển file, trả về True nếu file nguồn tồn tại."""
+        raise NotImplementedError
+
+    def list(self, prefix):
+        """Liệt kê các key bắt đầu bằng prefix."""
+        raise NotImplementedError
+
+    def presigned_url(self, key, expires_in=None):
+        """URL tạm thời để tải file trực tiếp."""
+        raise NotImplementedError
+
+    def send(self, key, mimetype=None, as_attachment=False, download_name=None):
+        """Tạo Flask response phục vụ file."""
+        raise NotImplementedError
+
+    def exists(self, key):
+        return self.stat(key) is not None
+
+    def move_prefix(self, src_prefix, dst_prefix):
+        """Di chuyển toàn bộ key dưới src_prefix sang dst_prefix."""
+        src_prefix = src_prefix.rstrip('/') + '/'
+        dst_prefix = dst_prefix.rstrip('/') + '/'
+        moved = 0
+        for key in list(self.list(src_prefix)):
+            if self.move(key, dst_prefix + key[len(src_prefix):]):
+                moved += 1
+        return moved
+
+    def unique_key(self, namespace, filename, max_attempts=1000):
+        """Trả về key chưa tồn tại, thêm hậu tố _1, _2... nếu cần."""
+        base, ext = os.path.splitext(filename)
+        candidate = storage_key(namespace, filename)
+        counter = 1
+        while self.exists(candidate):
+            if counter > max_attempts:
+                candidate = storage_key(namespace, f"{base}_{uuid.uuid4().hex[:8]}{ext}")
+                break
+            candidate = storage_key(namespace, f"{base}_{counter}{ext}")
+            counter += 1
+        return candidate
+
+
+class LocalStorage(StorageBackend):
+    """Driver lưu file trên ổ đĩa cục bộ, giữ nguyên cấu trúc thư mục hiện có."""
+
+    def __init__(self, base_path, namespace_roots=None, secret_key=None, default_expires=3600):
+        self.base_path = base_path
+        self.namespace_roots = dict(namespace_roots or {})
+        self.secret_key = secret_key
+        self.default_expires = default_expires
+
+    def path_for(self, key):
+        namespace, _, rest = key.partition('/')
+        root = self.namespace_roots.get(namespace)
+        if root:
+            path = safe_join(root, rest) if rest else root
+        else:
+            path = safe_join(self.base_path, key)
+        if path is None:
+            raise StorageError(f"Key không hợp lệ: {key}")
+        return path
+
+    def put(self, key, stream, content_type=None):
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as out:
+                while True:
+                    chunk = stream.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return size
+
+    def get(self, key):
+        return open(self.path_for(key), 'rb')
+
+    def stat(self, key):
+        path = self.path_for(key)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        return {'size': st.st_size, 'modified': st.st_mtime, 'content_type': guess_content_type(key)}
+
+    def delete(self, key):
+        try:
+            os.remove(self.path_for(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def move(self, src_key, dst_key):
+        src = self.path_for(src_key)
+        if not os.path.exists(src):
+            return False
+        dst = self.path_for(dst_key)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.move(src, dst)
+        return True
+
+    def list(self, prefix):
+        prefix_path = self.path_for(prefix.rstrip('/')) if prefix.strip('/') else self.base_path
+        if os.path.isfile(prefix_path):
+            yield prefix.rstrip('/')
+            return
+        prefix_key = prefix.rstrip('/')
+        for root, _, files in os.walk(prefix_path):
+            rel_dir = os.path.relpath(root, prefix_path)
+            for name in files:
+                rel = name if rel_dir == '.' else os.path.join(rel_dir, name)
+                yield f"{prefix_key}/{rel.replace(os.sep, '/')}" if prefix_key else rel.replace(os.sep, '/')
+
+    def _signature(self, key, expires):
+        message = f"{key}:{expires}".encode('utf-8')
+        return hmac.new(self.secret_key.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+    def verify_signature(self, key, expires, signature):
+        if not self.secret_key or not signature:
+            return False
+        try:
+            if int(expires) < time.time():
+                return False
+        except (TypeError, ValueError):
+            return False
+        return hmac.compare_digest(self._signature(key, expires), signature)
+
+    def presigned_url(self, key, expires_in=None):
+        if not self.secret_key:
+            raise StorageError("SECRET_KEY chưa được cấu hình để ký URL")
+        expires = int(time.time()) + int(expires_in or self.default_expires)
+        return url_for('serve_signed_storage', key=key, expires=expires,
+                       signature=self._signature(key, expires), _external=True)
+
+    def send(self, key, mimetype=None, as_attachment=False, download_name=None):
+        path = self.path_for(key)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(key)
+        return send_file(path, mimetype=mimetype or guess_content_type(key), conditional=True,
+                         as_attachment=as_attachment, download_name=download_name)
+
+
+class _CountingReader:
+    """Bọc stream để đếm số byte đã đọc (boto3 không trả về kích thước)."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = self.stream.read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+class S3Storage(StorageBackend):
+    """Driver cho S3 hoặc dịch vụ tương thích S3 (MinIO, Ceph...)."""
+
+    def __init__(self, bucket, endpoint_url=None, region=None, access_key=None, secret_key=None,
+                 key_prefix='', default_expires=3600, client=None):
+        if client is None:
+            try:
+                import boto3
+                from botocore.config import Config as BotoConfig
+            except ImportError as e:
+                raise StorageError("Cần cài đặt boto3 để dùng STORAGE_BACKEND=s3") from e
+            client = boto3.client(
+                's3',
+                endpoint_url=endpoint_url,
+                region_name=region,
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                config=BotoConfig(signature_version='s3v4', s3={'addressing_style': 'path'})
+            )
+        self.client = client
+        self.bucket = bucket
+        self.key_prefix = key_prefix.strip('/')
+        self.default_expires = default_expires
+
+    def _object_key(self, key):
+        return f"{self.key_prefix}/{key}" if self.key_prefix else key
+
+    def _logical_key(self, object_key):
+        if self.key_prefix and object_key.startswith(self.key_prefix + '/'):
+            return object_key[len(self.key_prefix) + 1:]
+        return object_key
+
+    @staticmethod
+    def _is_not_found(error):
+        code = getattr(error, 'response', {}).get('Error', {}).get('Code')
+        return code in ('404', 'NoSuchKey', 'NotFound')
+
+    def put(self, key, stream, content_type=None):
+        reader = _CountingReader(stream)
+        self.client.upload_fileobj(
+            reader, self.bucket, self._object_key(key),
+            ExtraArgs={'ContentType': content_type or guess_content_type(key)}
+        )
+        return reader.bytes_read
+
+    def get(self, key):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))['Body']
+        except Exception as e:
+            if self._is_not_found(e):
+                raise FileNotFoundError(key) from e
+            raise
+
+    def stat(self, key):
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except Exception as e:
+            if self._is_not_found(e):
+                return None
+            raise
+        modified = head.get('LastModified')
+        return {
+            'size': head.get('ContentLength'),
+            'modified': modified.timestamp() if modified else None,
+            'content_type': head.get('ContentType') or guess_content_type(key)
+        }
+
+    def delete(self, key):
+        if not self.exists(key):
+            return False
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        return True
+
+    def move(self, src_key, dst_key):
+        if not self.exists(src_key):
+            return False
+        self.client.copy({'Bucket': self.bucket, 'Key': self._object_key(src_key)},
+                         self.bucket, self._object_key(dst_key))
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(src_key))
+        return True
+
+    def list(self, prefix):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._object_key(prefix)):
+            for obj in page.get('Contents', []):
+                yield self._logical_key(obj['Key'])
+
+    def presigned_url(self, key, expires_in=None, mimetype=None, as_attachment=False, download_name=None):
+        params = {'Bucket': self.bucket, 'Key': self._object_key(key)}
+        if mimetype:
+            params['ResponseContentType'] = mimetype
+        if as_attachment:
+            params['ResponseContentDisposition'] = f'attachment; filename="{download_name or os.path.basename(key)}"'
+        return self.client.generate_presigned_url(
+            'get_object', Params=params, ExpiresIn=int(expires_in or self.default_expires)
+        )
+
+    def send(self, key, mimetype=None, as_attachment=False, download_name=None):
+        if not self.exists(key):
+            raise FileNotFoundError(key)
+        return redirect(self.presigned_url(key, mimetype=mimetype, as_attachment=as_attachment,
+                                           download_name=download_name), code=302)
+
+
+def create_storage(config):
+    """Tạo backend lưu trữ từ cấu hình ứng dụng."""
+    backend = (config.get('STORAGE_BACKEND') or 'local').lower()
+    expires = config.get('STORAGE_URL_EXPIRES', 3600)
+    if backend == 's3':
+        if not config.get('S3_BUCKET'):
+            raise ValueError("S3_BUCKET is not set in environment variables")
+        return S3Storage(
+            bucket=config['S3_BUCKET'],
+            endpoint_url=config.get('S3_ENDPOINT_URL'),
+            region=config.get('S3_REGION'),
+            access_key=config.get('S3_ACCESS_KEY_ID'),
+            secret_key=config.get('S3_SECRET_ACCESS_KEY'),
+            key_prefix=config.get('S3_KEY_PREFIX') or '',
+            default_expires=expires
+        )
+    if backend != 'local':
+        raise ValueError(f"STORAGE_BACKEND không hợp lệ: {backend}")
+    roots = {ns: config[cfg_key] for ns, cfg_key in NAMESPACE_CONFIG_KEYS.items() if config.get(cfg_key)}
+    return LocalStorage(config['UPLOAD_BASE'], roots, secret_key=config.get('SECRET_KEY'), default_expires=expires)
+
+
+def init_storage(app):
+    storage = create_storage(app.config)
+    app.extensions['storage'] = storage
+    logger.info("Storage backend: %s", type(storage).__name__)
+    return storage
+
+
+def get_storage():
+    """Backend lưu trữ của ứng dụng hiện tại."""
+    return current_app.extensions['storage']
@@ -0,0 +1,342 @@
+# utils/uploads.py
+"""Nhận file upload dạng stream từ request multipart.
+
+Body multipart được đọc từng chunk qua ``request.stream``; mỗi file được kiểm tra
+magic bytes và giới hạn kích thước trong lúc ghi thẳng vào storage, nên không
+còn bước Werkzeug ghi ra file tạm rồi ``file.save()`` copy lại lần nữa. Vượt giới
+hạn thì dừng đọc ngay và xóa phần đã ghi.
+"""
+import logging
+import uuid
+
+from flask import request
+from werkzeug.datastructures import MultiDict
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+
+from utils.storage import get_storage, storage_key
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 64 * 1024
+MAX_FORM_FIELD_SIZE = 500 * 1024  # Giới hạn cho mỗi trường text trong form
+SIGNATURE_PEEK_SIZE = 16
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+VIDEO_EXTENSIONS = {'mp4', 'mov', 'avi'}
+DOCUMENT_EXTENSIONS = {'pdf', 'doc', 'docx'}
+
+
+def _is_iso_media(header):
+    return header[4:8] in (b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip')
+
+
+# Phần mở rộng -> hàm kiểm tra các byte đầu file
+MAGIC_SIGNATURES = {
+    'png': lambda h: h.startswith(b'\x89PNG\r\n\x1a\n'),
+    'jpg': lambda h: h.startswith(b'\xff\xd8\xff'),
+    'jpeg': lambda h: h.startswith(b'\xff\xd8\xff'),
+    'gif': lambda h: h.startswith((b'GIF87a', b'GIF89a')),
+    'mp4': _is_iso_media,
+    'mov': _is_iso_media,
+    'avi': lambda h: h.startswith(b'RIFF') and h[8:12] == b'AVI ',
+    'pdf': lambda h: h.startswith(b'%PDF-'),
+    'doc': lambda h: h.startswith(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'),
+    'docx': lambda h: h.startswith(b'PK\x03\x04'),
+}
+
+
+def get_extension(filename):
+    return filename.rsplit('.', 1)[1].lower() if filename and '.' in filename else ''
+
+
+def get_file_type(extension):
+    if extension in VIDEO_EXTENSIONS:
+        return 'video'
+    if extension in DOCUMENT_EXTENSIONS:
+        return 'document'
+    return 'image'
+
+
+def _mb(size):
+    return size // (1024 * 1024)
+
+
+class UploadError(Exception):
+    """Lỗi upload trả về cho client (message + HTTP status)."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class UploadPolicy:
+    """Giới hạn áp dụng cho một endpoint upload.
+
+    ``size_limits`` cho phép đặt giới hạn riêng theo phần mở rộng, các phần mở
+    rộng còn lại dùng ``max_file_size``. Khi ``fail_fast`` là False, file lỗi
+    được ghi nhận trong ``UploadedFile.error`` thay vì hủy cả request.
+    """
+
+    def __init__(self, allowed_extensions, max_file_size, max_files=None, max_total_size=None,
+                 size_limits=None, fail_fast=True):
+        self.allowed_extensions = set(allowed_extensions)
+        self.max_file_size = max_file_size
+        self.max_files = max_files
+        self.max_total_size = max_total_size
+        self.size_limits = dict(size_limits or {})
+        self.fail_fast = fail_fast
+
+    def limit_for(self, extension):
+        return self.size_limits.get(extension, self.max_file_size)
+
+
+class UploadedFile:
+    """Thông tin một file đã nhận (hoặc bị từ chối nếu ``error`` khác None)."""
+
+    def __init__(self, index, field_name, filename, content_type):
+        self.index = index
+        self.field_name = field_name
+        self.filename = filename or ''
+        self.content_type = content_type
+        self.extension = get_extension(self.filename)
+        self.file_type = get_file_type(self.extension)
+        self.stored_name = None
+        self.key = None
+        self.size = 0
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.error is None and self.key is not None
+
+
+class _PartReader:
+    """File-like object đọc dữ liệu của part hiện tại từ decoder."""
+
+    def __init__(self, events):
+        self._events = events
+        self._buffer = b''
+        self._eof = False
+
+    def _fill(self):
+        while not self._buffer and not self._eof:
+            event = next(self._events)
+            if not isinstance(event, Data):
+                raise UploadError('Dữ liệu multipart không hợp lệ')
+            self._buffer = event.data
+            self._eof = not event.more_data
+
+    def read(self, size=-1):
+        self._fill()
+        if size is None or size < 0:
+            chunks = [self._buffer]
+            self._buffer = b''
+            while not self._eof:
+                self._fill()
+                chunks.append(self._buffer)
+                self._buffer = b''
+            return b''.join(chunks)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+    def drain(self):
+        while True:
+            self._buffer = b''
+            if self._eof:
+                return
+            self._fill()
+
+
+class _ValidatingReader:
+    """Kiểm tra magic bytes và kích thước trong lúc storage đọc dữ liệu."""
+
+    def __init__(self, source, upload, limit, budget):
+        self.source = source
+        self.upload = upload
+        self.limit = limit
+        self.budget = budget
+        self._header = b''
+        self._checked = False
+
+    def _check_signature(self):
+        check = MAGIC_SIGNATURES.get(self.upload.extension)
+        if check is not None and not check(self._header):
+            raise UploadError(f'File {self.upload.filename} không đúng định dạng {self.upload.extension}')
+        self._checked = True
+
+    def read(self, size=-1):
+        if not self._checked:
+            # Gom đủ vài byte đầu để nhận diện định dạng
+            while len(self._header) < SIGNATURE_PEEK_SIZE:
+                chunk = self.source.read(SIGNATURE_PEEK_SIZE - len(self._header))
+                if not chunk:
+                    break
+                self._header += chunk
+            self._count(len(self._header))
+            self._check_signature()
+            if self._header:
+                header, self._header = self._header, b''
+                return header
+        chunk = self.source.read(size if size and size > 0 else READ_CHUNK_SIZE)
+        self._count(len(chunk))
+        return chunk
+
+    def _count(self, length):
+        self.upload.size += length
+        if self.upload.size > self.limit:
+            raise UploadError(f'File {self.upload.filename} ({self.upload.file_type}) quá lớn. Tối đa {_mb(self.limit)}MB')
+        self.budget.consume(length)
+
+
+class _TotalSizeExceeded(UploadError):
+    """Vượt tổng dung lượng của request, luôn hủy toàn bộ upload."""
+
+
+class _Budget:
+    def __init__(self, max_total_size):
+        self.max_total_size = max_total_size
+        self.used = 0
+
+    def consume(self, length):
+        self.used += length
+        if self.max_total_size is not None and self.used > self.max_total_size:
+            raise _TotalSizeExceeded(f'Tổng kích thước file vượt quá {_mb(self.max_total_size)}MB')
+
+
+class StreamingUpload:
+    """Đọc body multipart, ghi các file thuộc ``file_fields`` vào storage.
+
+    Cách dùng trong controller::
+
+        upload = StreamingUpload('report_images', policy, file_fields=('images',))
+        try:
+            data = upload.receive()
+            ...
+            db.session.commit()
+            upload.keep()
+        finally:
+            upload.discard()
+
+    Các file chưa được ``keep()`` sẽ bị xóa khỏi storage trong ``discard()``.
+    """
+
+    def __init__(self, namespace, policy, file_fields=('images',), name_func=None):
+        self.namespace = namespace
+        self.policy = policy
+        self.file_fields = set(file_fields)
+        self.name_func = name_func or (lambda upload: f"{uuid.uuid4().hex}.{upload.extension}")
+        self.form = MultiDict()
+        self.files = []
+        self._kept = False
+
+    @property
+    def saved(self):
+        return [f for f in self.files if f.ok]
+
+    @property
+    def failed(self):
+        return [f for f in self.files if f.error is not None]
+
+    def _events(self, stream, decoder):
+        while True:
+            event = decoder.next_event()
+            if isinstance(event, NeedData):
+                chunk = stream.read(READ_CHUNK_SIZE)
+                decoder.receive_data(chunk or None)
+            elif isinstance(event, Epilogue):
+                return
+            else:
+                yield event
+
+    def receive(self, stream=None, boundary=None):
+        """Đọc toàn bộ request; trả về MultiDict các trường text."""
+        if boundary is None:
+            if request.mimetype != 'multipart/form-data':
+                raise UploadError('Yêu cầu multipart/form-data')
+            boundary = request.mimetype_params.get('boundary')
+        if not boundary:
+            raise UploadError('Thiếu boundary trong Content-Type')
+        stream = stream if stream is not None else request.stream
+        decoder = MultipartDecoder(boundary.encode('latin-1'), max_form_memory_size=MAX_FORM_FIELD_SIZE)
+        events = self._events(stream, decoder)
+        budget = _Budget(self.policy.max_total_size)
+        try:
+            for event in events:
+                if isinstance(event, Field):
+                    value = _PartReader(events).read()
+                    self.form.add(event.name, value.decode('utf-8', errors='replace'))
+                elif isinstance(event, File):
+                    reader = _PartReader(events)
+                    if event.name not in self.file_fields or not event.filename:
+                        reader.drain()
+                        continue
+                    self._receive_file(event, reader, budget)
+        except UploadError:
+            self.discard()
+            raise
+        except ValueError as e:
+            self.discard()
+            raise UploadError(f'Dữ liệu multipart không hợp lệ: {str(e)}')
+        except BaseException:
+            self.discard()
+            raise
+        logger.info("Received %s file(s) for %s, %s bytes", len(self.saved), self.namespace, budget.used)
+        return self.form
+
+    def _receive_file(self, event, reader, budget):
+        upload = UploadedFile(len(self.files), event.name, event.filename, event.headers.get('content-type'))
+        self.files.append(upload)
+
+        if self.policy.max_files is not None and len(self.files) > self.policy.max_files:
+            raise UploadError(f'Tối đa {self.policy.max_files} file mỗi yêu cầu')
+
+        if upload.extension not in self.policy.allowed_extensions:
+            self._reject(upload, reader, UploadError(
+                f'File {upload.filename} có định dạng không hỗ trợ. Chỉ chấp nhận: {", ".join(sorted(self.policy.allowed_extensions))}'))
+            return
+
+        upload.stored_name = self.name_func(upload)
+        key = storage_key(self.namespace, upload.stored_name)
+        validating = _ValidatingReader(reader, upload, self.policy.limit_for(upload.extension), budget)
+        try:
+            get_storage().put(key, validating, content_type=upload.content_type)
+        except _TotalSizeExceeded:
+            raise
+        except UploadError as e:
+            self._reject(upload, reader, e)
+            return
+        upload.key = key
+        logger.debug("Stored upload %s as %s (%s bytes)", upload.filename, key, upload.size)
+
+    def _reject(self, upload, reader, error):
+        logger.warning("Từ chối file upload %s: %s", upload.filename, error.message)
+        upload.error = error.message
+        if self.policy.fail_fast:
+            raise error
+        reader.drain()
+
+    def remove(self, upload, error=None):
+        """Xóa một file đã lưu (ví dụ vượt quá số lượng cho phép theo loại)."""
+        if upload.key:
+            get_storage().delete(upload.key)
+            upload.key = None
+        if error:
+            upload.error = error
+
+    def keep(self):
+        """Giữ lại các file đã lưu (gọi sau khi commit thành công)."""
+        self._kept = True
+
+    def discard(self):
+        if self._kept:
+            return
+        storage = get_storage()
+        for upload in self.files:
+            if upload.key:
+                try:
+                    storage.delete(upload.key)
+                    logger.info("Cleaned up upload: %s", upload.key)
+                except Exception as e:
+                    logger.warning("Failed to clean up upload %s: %s", upload.key, str(e))
+                upload.key = None
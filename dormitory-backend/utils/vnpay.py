@@ -0,0 +1,96 @@
+# utils/vnpay.py
+"""Ký và kiểm tra tham số VNPay.
+
+Chuỗi ký là các cặp ``key=quote_plus(value)`` sắp theo key, nối bằng ``&``;
+chính chuỗi này cũng là query string của URL thanh toán nên chỉ encode và tính
+HMAC-SHA512 một lần. Tham số cố định (version, TMN code, tiền tệ, ...) được
+encode sẵn khi tạo signer, thứ tự key cũng được sắp sẵn.
+"""
+import hashlib
+import hmac
+import logging
+import urllib.parse
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAY_URL = 'https://sandbox.vnpayment.vn/paymentv2/vpcpay.html'
+PAYMENT_EXPIRE_MINUTES = 15
+
+_REQUEST_KEYS = (
+    'vnp_Amount', 'vnp_TxnRef', 'vnp_OrderInfo', 'vnp_ReturnUrl', 'vnp_IpAddr',
+    'vnp_CreateDate', 'vnp_ExpireDate'
+)
+
+
+def encode_value(value):
+    return urllib.parse.quote_plus(str(value))
+
+
+class VnpaySigner:
+    def __init__(self, tmn_code, hash_secret, pay_url=DEFAULT_PAY_URL, locale='vn', expire_minutes=PAYMENT_EXPIRE_MINUTES):
+        if not tmn_code or not hash_secret:
+            raise ValueError("Cấu hình VNPay không đầy đủ")
+        self.tmn_code = tmn_code
+        self.pay_url = pay_url or DEFAULT_PAY_URL
+        self.expire_minutes = expire_minutes
+        self._secret = hash_secret.encode('utf-8')
+        static = {
+            'vnp_Version': '2.1.0',
+            'vnp_Command': 'pay',
+            'vnp_TmnCode': tmn_code,
+            'vnp_CurrCode': 'VND',
+            'vnp_OrderType': 'billpayment',
+            'vnp_Locale': locale,
+        }
+        # (key, "key=value" đã encode) cho tham số cố định, None cho tham số theo request
+        self._layout = [
+            (key, f"{key}={encode_value(static[key])}" if key in static else None)
+            for key in sorted(set(static) | set(_REQUEST_KEYS))
+        ]
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.get('VNPAY_TMN_CODE'),
+            config.get('VNPAY_HASH_SECRET'),
+            pay_url=config.get('VNPAY_URL')
+        )
+
+    def sign(self, data_string):
+        return hmac.new(self._secret, data_string.encode('utf-8'), hashlib.sha512).hexdigest()
+
+    def payment_url(self, transaction_id, amount, order_info, return_url, ip_addr, now=None):
+        """URL thanh toán cho ``amount`` (VND); chuỗi query chính là chuỗi ký."""
+        now = now or datetime.now()
+        values = {
+            'vnp_Amount': int(round(amount * 100)),
+            'vnp_TxnRef': transaction_id,
+            'vnp_OrderInfo': order_info,
+            'vnp_ReturnUrl': return_url,
+            'vnp_IpAddr': ip_addr,
+            'vnp_CreateDate': now.strftime('%Y%m%d%H%M%S'),
+            'vnp_ExpireDate': (now + timedelta(minutes=self.expire_minutes)).strftime('%Y%m%d%H%M%S'),
+        }
+        query = '&'.join(
+            encoded if encoded is not None else f"{key}={encode_value(values[key])}"
+            for key, encoded in self._layout
+        )
+        return f"{self.pay_url}?{query}&vnp_SecureHash={self.sign(query)}"
+
+    def verify(self, params, secure_hash):
+        """Kiểm tra chữ ký của tham số callback (đã bỏ vnp_SecureHash/vnp_SecureHashType)."""
+        if not secure_hash:
+            return False
+        data_string = '&'.join(f"{key}={encode_value(value)}" for key, value in sorted(params.items()))
+        return hmac.compare_digest(secure_hash.lower(), self.sign(data_string))
+
+
+def get_vnpay_signer():
+    signer = current_app.extensions.get('vnpay')
+    if signer is None:
+        signer = VnpaySigner.from_config(current_app.config)
+        current_app.extensions['vnpay'] = signer
+    return signer